@@ -0,0 +1,6 @@
+"""
+热点路径基准
+
+合成仓库 + 本地桩服务（LLM / embeddings / LSP 回放），输出可跨提交对比的 JSON 结果。
+入口见 benchmarks/run.py。
+"""
@@ -0,0 +1,381 @@
+"""
+基准场景
+
+BenchEnv 负责准备合成仓库和桩服务（LLM / embeddings / LSP），
+build_benchmarks 返回所有热点路径的 Benchmark 列表：
+
+- repomap.*          RepoMapTool.execute（冷启动 / 热缓存 / 个性化 / 增量）
+- codebase_index.*   CodebaseIndex.build_index / search_hybrid
+- search.*           text_search / regex_search
+- diff.*             diff_tools.replace（精确 / 模糊）
+- conversation_tree  ConversationTree.add_conversation
+- turn.execute_skill 完整的 execute_skill 一轮（LLM 回放）
+"""
+
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+import asyncio
+import logging
+import shutil
+import sys
+import uuid
+
+from .harness import Benchmark
+from .stub_llm import LLMFixture, StubLLMServer
+from .synthetic_repo import SyntheticRepo, generate_repo, touch_module
+
+logger = logging.getLogger(__name__)
+
+FIXTURES_DIR = Path(__file__).parent / "fixtures"
+DEFAULT_LLM_FIXTURE = FIXTURES_DIR / "llm_turn.json"
+DEFAULT_LSP_FIXTURE = FIXTURES_DIR / "lsp_python.json"
+STUB_LSP_SCRIPT = Path(__file__).parent / "stub_lsp.py"
+
+GROUPS = ("repomap", "codebase_index", "search", "diff", "conversation_tree", "turn")
+
+
+class BenchEnv:
+    """
+    基准环境：合成仓库 + 桩服务
+
+    使用示例：
+        with BenchEnv(workdir, num_files=200) as env:
+            benches = build_benchmarks(env)
+    """
+
+    def __init__(
+        self,
+        workdir: Path,
+        num_files: int = 200,
+        functions_per_file: int = 8,
+        llm_fixture: Optional[Path] = None,
+        lsp_fixture: Optional[Path] = None,
+        llm_latency: float = 0.0,
+        use_lsp: bool = True,
+        seed: int = 42,
+        record_upstream: Optional[str] = None,
+        record_key: Optional[str] = None
+    ):
+        self.workdir = Path(workdir)
+        self.num_files = num_files
+        self.functions_per_file = functions_per_file
+        self.llm_fixture_path = Path(llm_fixture or DEFAULT_LLM_FIXTURE)
+        self.lsp_fixture_path = Path(lsp_fixture or DEFAULT_LSP_FIXTURE)
+        self.llm_latency = llm_latency
+        self.use_lsp = use_lsp
+        self.seed = seed
+        self.record_upstream = record_upstream
+        self.record_key = record_key
+
+        self.loop = asyncio.new_event_loop()
+        self.repo: Optional[SyntheticRepo] = None
+        self.fixture: Optional[LLMFixture] = None
+        self.server: Optional[StubLLMServer] = None
+        self._saved_lsp_config = None
+        self._saved_retriever = None
+
+    @property
+    def root(self) -> Path:
+        return self.repo.root
+
+    def __enter__(self) -> "BenchEnv":
+        asyncio.set_event_loop(self.loop)
+        self.repo = generate_repo(
+            self.workdir / "repo",
+            num_files=self.num_files,
+            functions_per_file=self.functions_per_file,
+            seed=self.seed
+        )
+
+        if self.record_upstream and not self.llm_fixture_path.exists():
+            self.fixture = LLMFixture()
+        else:
+            self.fixture = LLMFixture.load(self.llm_fixture_path)
+        self.server = StubLLMServer(
+            self.fixture,
+            latency=self.llm_latency,
+            upstream=self.record_upstream,
+            upstream_key=self.record_key
+        ).start()
+
+        self._configure_llm()
+        self._configure_embeddings()
+        if self.use_lsp:
+            self._configure_lsp()
+        return self
+
+    def __exit__(self, *exc):
+        # 写回队列里的记忆数据要在临时仓库删除前落盘
+        try:
+            from daoyoucode.agents.memory.write_behind import flush_all
+            flush_all()
+        except Exception:
+            pass
+        try:
+            from daoyoucode.agents.tools.lsp_tools import get_lsp_manager
+            self.loop.run_until_complete(get_lsp_manager().stop_all())
+        except Exception as e:
+            logger.debug(f"停止 LSP 失败: {e}")
+        try:
+            from daoyoucode.agents.llm.client_manager import get_client_manager
+            self.loop.run_until_complete(get_client_manager().close())
+        except Exception:
+            pass
+
+        if self._saved_lsp_config is not None:
+            from daoyoucode.agents.tools.lsp_tools import BUILTIN_LSP_SERVERS
+            BUILTIN_LSP_SERVERS["pyright"] = self._saved_lsp_config
+        from daoyoucode.agents.memory import vector_retriever_factory
+        vector_retriever_factory._retriever_instance = self._saved_retriever
+
+        if self.server:
+            self.server.stop()
+        self.loop.close()
+
+    # ========== 桩服务接入 ==========
+
+    def _configure_llm(self):
+        from daoyoucode.agents.llm.client_manager import get_client_manager
+        manager = get_client_manager()
+        for provider in ("qwen", "deepseek", "openai"):
+            manager.configure_provider(provider, api_key="bench", base_url=self.server.base_url)
+
+    def _configure_embeddings(self):
+        from daoyoucode.agents.memory import vector_retriever_factory
+        from daoyoucode.agents.memory.vector_retriever_api import VectorRetrieverAPI
+
+        self._saved_retriever = vector_retriever_factory._retriever_instance
+        retriever = VectorRetrieverAPI(
+            provider="custom",
+            api_key="bench",
+            base_url=self.server.base_url,
+            model="stub-embedding"
+        )
+        retriever.dimensions = self.server.embedding_dimensions
+        vector_retriever_factory._retriever_instance = retriever
+
+    def _configure_lsp(self):
+        from daoyoucode.agents.tools.lsp_tools import BUILTIN_LSP_SERVERS, LSPServerConfig
+
+        self._saved_lsp_config = BUILTIN_LSP_SERVERS.get("pyright")
+        BUILTIN_LSP_SERVERS["pyright"] = LSPServerConfig(
+            id="pyright",
+            command=[sys.executable, str(STUB_LSP_SCRIPT), str(self.lsp_fixture_path)],
+            extensions=[".py"]
+        )
+
+    def tool_context(self):
+        from daoyoucode.agents.tools.base import ToolContext
+        return ToolContext(repo_path=self.root)
+
+
+# ========== 场景 ==========
+
+def _repomap_benchmarks(env: BenchEnv, repeat: int) -> List[Benchmark]:
+    from daoyoucode.agents.tools.repomap_tools import RepoMapTool
+    from daoyoucode.agents.tools.file_inventory import get_file_inventory
+
+    state: Dict[str, Any] = {}
+    cache_dir = env.root / ".daoyoucode" / "cache" / "repomap"
+
+    def new_tool():
+        tool = RepoMapTool()
+        tool.set_context(env.tool_context())
+        return tool
+
+    async def execute(tool, **kwargs):
+        result = await tool.execute(repo_path=".", enable_lsp=env.use_lsp, **kwargs)
+        if not result.success:
+            raise RuntimeError(result.error)
+        return {"chars": len(result.content or "")}
+
+    def cold_setup():
+        shutil.rmtree(cache_dir, ignore_errors=True)
+        get_file_inventory(env.root).invalidate()
+        state["cold"] = new_tool()
+
+    async def warm_setup():
+        if "warm" not in state:
+            state["warm"] = new_tool()
+            await execute(state["warm"])
+
+    async def personalized():
+        state["personalized_n"] = state.get("personalized_n", 0) + 1
+        ident = env.repo.symbols[(state["personalized_n"] * 7) % len(env.repo.symbols)]
+        return await execute(state["warm"], mentioned_idents=[ident])
+
+    def incremental_setup():
+        state["edits"] = state.get("edits", 0) + 1
+        touch_module(env.repo, index=state["edits"] % len(env.repo.modules), marker=f"e{state['edits']}")
+
+    return [
+        Benchmark("repomap.cold", "repomap", lambda: execute(state["cold"]), setup=cold_setup,
+                  repeat=max(1, repeat // 2), warmup=0, description="无磁盘缓存、新实例"),
+        Benchmark("repomap.warm", "repomap", lambda: execute(state["warm"]), setup=warm_setup,
+                  repeat=repeat, description="结果缓存命中"),
+        Benchmark("repomap.personalized", "repomap", personalized, setup=warm_setup,
+                  repeat=repeat, description="定义缓存命中，按新的 mentioned_idents 重新排序"),
+        Benchmark("repomap.incremental", "repomap", lambda: execute(state["warm"]), setup=incremental_setup,
+                  repeat=repeat, description="修改一个文件后重新生成"),
+    ]
+
+
+def _codebase_index_benchmarks(env: BenchEnv, repeat: int) -> List[Benchmark]:
+    from daoyoucode.agents.memory.codebase_index import CodebaseIndex
+
+    state: Dict[str, Any] = {}
+
+    def build_setup():
+        index = CodebaseIndex(env.root)
+        shutil.rmtree(index.index_dir, ignore_errors=True)
+        state["index"] = index
+
+    def build():
+        count = state["index"].build_index(force=True)
+        return {"chunks": count}
+
+    def search_setup():
+        if "search" not in state:
+            index = CodebaseIndex(env.root)
+            index.build_index()
+            state["search"] = index
+            state["queries"] = 0
+
+    def search():
+        state["queries"] += 1
+        symbol = env.repo.symbols[(state["queries"] * 13) % len(env.repo.symbols)]
+        results = state["search"].search_hybrid(f"where is {symbol} implemented", top_k=10)
+        return {"results": len(results)}
+
+    return [
+        Benchmark("codebase_index.build", "codebase_index", build, setup=build_setup,
+                  repeat=max(1, repeat // 2), warmup=0, description="分块 + 编码 + 持久化"),
+        Benchmark("codebase_index.search_hybrid", "codebase_index", search, setup=search_setup,
+                  repeat=repeat),
+    ]
+
+
+def _search_benchmarks(env: BenchEnv, repeat: int) -> List[Benchmark]:
+    from daoyoucode.agents.tools.search_tools import TextSearchTool, RegexSearchTool
+
+    text_tool = TextSearchTool()
+    text_tool.set_context(env.tool_context())
+    regex_tool = RegexSearchTool()
+    regex_tool.set_context(env.tool_context())
+    symbol = env.repo.symbols[len(env.repo.symbols) // 2]
+
+    async def text_search():
+        result = await text_tool.execute(query=symbol, directory=".", max_results=100)
+        return {"matches": len(result.content or [])}
+
+    async def text_search_miss():
+        result = await text_tool.execute(query="no_such_identifier_anywhere", directory=".")
+        return {"matches": len(result.content or [])}
+
+    async def regex_search():
+        result = await regex_tool.execute(pattern=r"def compute_\d+_3\(", directory=".", max_results=1000)
+        return {"matches": len(result.content or [])}
+
+    return [
+        Benchmark("search.text", "search", text_search, repeat=repeat),
+        Benchmark("search.text_miss", "search", text_search_miss, repeat=repeat, description="全量扫描无命中"),
+        Benchmark("search.regex", "search", regex_search, repeat=repeat),
+    ]
+
+
+def _diff_benchmarks(env: BenchEnv, repeat: int) -> List[Benchmark]:
+    from daoyoucode.agents.tools.diff_tools import replace
+
+    # 拼接多个模块得到一个数千行的大文件
+    content = "\n".join(p.read_text(encoding="utf-8") for p in env.repo.modules[:20])
+    lines = content.split("\n")
+    target = len(lines) * 3 // 4
+    start = next(i for i in range(target, len(lines)) if lines[i].startswith("def compute_"))
+    block = "\n".join(lines[start:start + 5])
+    # 改变缩进和空白，强制走模糊策略
+    fuzzy_block = "\n".join("  " + line.replace("    ", "  ").rstrip() + " " for line in lines[start:start + 5])
+
+    def exact():
+        replace(content, block, block + "\n    # edited")
+        return {"lines": len(lines)}
+
+    def fuzzy():
+        replace(content, fuzzy_block, block + "\n    # edited")
+        return {"lines": len(lines)}
+
+    return [
+        Benchmark("diff.replace_exact", "diff", exact, repeat=repeat),
+        Benchmark("diff.replace_fuzzy", "diff", fuzzy, repeat=repeat, description="缩进/空白不一致"),
+    ]
+
+
+def _conversation_tree_benchmarks(env: BenchEnv, repeat: int, turns: int = 60) -> List[Benchmark]:
+    from daoyoucode.agents.memory.conversation_tree import ConversationTree
+
+    topics = [
+        ("How does {s} aggregate values?", "{s} sums items divisible by a modulus."),
+        ("Write a unit test for {s}", "Here is a pytest case calling {s} with sample data."),
+        ("部署文档在哪里？", "部署步骤在 docs/guide_0.md 中。"),
+    ]
+
+    def run():
+        tree = ConversationTree()
+        for i in range(turns):
+            question, answer = topics[(i // 5) % len(topics)]
+            symbol = env.repo.symbols[i % len(env.repo.symbols)]
+            tree.add_conversation(question.format(s=symbol), answer.format(s=symbol))
+        return {"turns": turns, "branches": len(tree._branches)}
+
+    return [Benchmark("conversation_tree.add", "conversation_tree", run, repeat=repeat)]
+
+
+def _turn_benchmarks(env: BenchEnv, repeat: int) -> List[Benchmark]:
+    from daoyoucode.agents.init import initialize_agent_system
+    from daoyoucode.agents.memory.manager import get_memory_manager
+    from daoyoucode.agents.executor import execute_skill
+
+    get_memory_manager(project_path=env.root, force_new=True)
+    initialize_agent_system()
+    session_id = f"bench-{uuid.uuid4().hex[:8]}"
+
+    def setup():
+        env.fixture.reset()
+
+    async def run():
+        result = await execute_skill(
+            skill_name="chat-assistant",
+            user_input="Where is compute_3_0 defined and what does it call?",
+            session_id=session_id,
+            context={
+                "working_directory": str(env.root),
+                "repo": str(env.root),
+                "enable_streaming": False,
+            },
+            enable_timeout_recovery=False
+        )
+        if not result.get("success"):
+            raise RuntimeError(result.get("error") or "execute_skill failed")
+        return {"llm_requests": len(env.fixture.requests), "chars": len(result.get("content") or "")}
+
+    return [Benchmark("turn.execute_skill", "turn", run, setup=setup, repeat=repeat,
+                      description="完整一轮：工具调用 + LLM 回放")]
+
+
+_BUILDERS = {
+    "repomap": _repomap_benchmarks,
+    "codebase_index": _codebase_index_benchmarks,
+    "search": _search_benchmarks,
+    "diff": _diff_benchmarks,
+    "conversation_tree": _conversation_tree_benchmarks,
+    "turn": _turn_benchmarks,
+}
+
+
+def build_benchmarks(env: BenchEnv, groups: Optional[List[str]] = None, repeat: int = 5) -> List[Benchmark]:
+    """按分组构建场景（groups 为 None 时全部）"""
+    benches: List[Benchmark] = []
+    for group in groups or GROUPS:
+        if group not in _BUILDERS:
+            raise ValueError(f"未知的基准分组: {group}（可选: {', '.join(GROUPS)}）")
+        benches.extend(_BUILDERS[group](env, repeat))
+    return benches
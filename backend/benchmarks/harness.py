@@ -0,0 +1,213 @@
+"""
+基准测量框架
+
+- Benchmark：一个待测场景（setup / run / teardown，可以是同步或异步函数）
+- run_benchmark：预热后重复计时（不开 tracemalloc），再单独跑一轮记录峰值内存
+- 结果为 JSON 友好的 dict，compare_results 对比两次提交的结果
+"""
+
+from dataclasses import dataclass, field, asdict
+from typing import Any, Callable, Dict, List, Optional
+import asyncio
+import gc
+import inspect
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+
+# 结果文件格式版本
+SCHEMA_VERSION = 1
+
+
+@dataclass
+class Benchmark:
+    """
+    一个基准场景
+
+    run 的返回值若为 dict，会作为 extra 记录到结果中（如结果条数、缓存命中）。
+    setup 在每次 run 之前调用（不计时），teardown 在全部结束后调用。
+    """
+    name: str
+    group: str
+    run: Callable[[], Any]
+    setup: Optional[Callable[[], Any]] = None
+    teardown: Optional[Callable[[], Any]] = None
+    repeat: int = 5
+    warmup: int = 1
+    description: str = ""
+
+
+@dataclass
+class BenchmarkResult:
+    name: str
+    group: str
+    repeat: int
+    times_ms: List[float]
+    min_ms: float
+    median_ms: float
+    mean_ms: float
+    stdev_ms: float
+    peak_alloc_kb: Optional[float] = None
+    rss_mb: Optional[float] = None
+    extra: Dict[str, Any] = field(default_factory=dict)
+    error: Optional[str] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+def _call(fn: Optional[Callable[[], Any]], loop: asyncio.AbstractEventLoop) -> Any:
+    if fn is None:
+        return None
+    result = fn()
+    if inspect.isawaitable(result):
+        result = loop.run_until_complete(result)
+    return result
+
+
+def _rss_mb() -> Optional[float]:
+    """当前进程峰值常驻内存（MB，仅 Unix）"""
+    try:
+        import resource
+        usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux 单位 KB，macOS 单位字节
+        return usage / (1024 * 1024) if sys.platform == "darwin" else usage / 1024
+    except ImportError:
+        return None
+
+
+def run_benchmark(
+    bench: Benchmark,
+    loop: asyncio.AbstractEventLoop,
+    measure_memory: bool = True
+) -> BenchmarkResult:
+    """运行一个场景并汇总计时 / 内存"""
+    times: List[float] = []
+    extra: Dict[str, Any] = {}
+    error = None
+    peak_kb = None
+
+    try:
+        for _ in range(bench.warmup):
+            _call(bench.setup, loop)
+            _call(bench.run, loop)
+
+        for _ in range(bench.repeat):
+            _call(bench.setup, loop)
+            gc.collect()
+            start = time.perf_counter()
+            value = _call(bench.run, loop)
+            times.append((time.perf_counter() - start) * 1000)
+            if isinstance(value, dict):
+                extra = value
+
+        if measure_memory:
+            _call(bench.setup, loop)
+            gc.collect()
+            tracemalloc.start()
+            try:
+                _call(bench.run, loop)
+                _, peak = tracemalloc.get_traced_memory()
+            finally:
+                tracemalloc.stop()
+            peak_kb = round(peak / 1024, 1)
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    finally:
+        try:
+            _call(bench.teardown, loop)
+        except Exception:
+            pass
+
+    return BenchmarkResult(
+        name=bench.name,
+        group=bench.group,
+        repeat=len(times),
+        times_ms=[round(t, 3) for t in times],
+        min_ms=round(min(times), 3) if times else 0.0,
+        median_ms=round(statistics.median(times), 3) if times else 0.0,
+        mean_ms=round(statistics.fmean(times), 3) if times else 0.0,
+        stdev_ms=round(statistics.stdev(times), 3) if len(times) > 1 else 0.0,
+        peak_alloc_kb=peak_kb,
+        rss_mb=round(_rss_mb(), 1) if _rss_mb() is not None else None,
+        extra=extra,
+        error=error,
+    )
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, timeout=5,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        )
+        return out.stdout.strip() or None
+    except Exception:
+        return None
+
+
+def make_report(results: List[BenchmarkResult], params: Dict[str, Any]) -> Dict[str, Any]:
+    """完整结果文件内容"""
+    return {
+        "schema": SCHEMA_VERSION,
+        "meta": {
+            "commit": _git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "params": params,
+        },
+        "results": [r.to_dict() for r in results],
+    }
+
+
+def compare_results(
+    baseline: Dict[str, Any],
+    current: Dict[str, Any],
+    threshold: float = 0.2
+) -> List[Dict[str, Any]]:
+    """
+    对比两份结果（按 median）
+
+    Args:
+        threshold: 相对变慢超过该比例记为 regression
+
+    Returns:
+        [{name, baseline_ms, current_ms, ratio, status}, ...]
+    """
+    base = {r["name"]: r for r in baseline.get("results", [])}
+    rows = []
+    for r in current.get("results", []):
+        old = base.get(r["name"])
+        if old is None or r.get("error") or old.get("error") or not old.get("median_ms"):
+            rows.append({"name": r["name"], "baseline_ms": None, "current_ms": r.get("median_ms"),
+                         "ratio": None, "status": "new" if old is None else "n/a"})
+            continue
+        ratio = r["median_ms"] / old["median_ms"]
+        if ratio > 1 + threshold:
+            status = "regression"
+        elif ratio < 1 / (1 + threshold):
+            status = "improved"
+        else:
+            status = "same"
+        rows.append({"name": r["name"], "baseline_ms": old["median_ms"], "current_ms": r["median_ms"],
+                     "ratio": round(ratio, 3), "status": status})
+    return rows
+
+
+def format_table(results: List[BenchmarkResult]) -> str:
+    lines = [f"{'benchmark':<32} {'median ms':>10} {'min ms':>10} {'peak KB':>10}  extra"]
+    for r in results:
+        if r.error:
+            lines.append(f"{r.name:<32} {'ERROR':>10}  {r.error}")
+            continue
+        extra = ", ".join(f"{k}={v}" for k, v in r.extra.items())
+        peak = f"{r.peak_alloc_kb:.0f}" if r.peak_alloc_kb is not None else "-"
+        lines.append(f"{r.name:<32} {r.median_ms:>10.2f} {r.min_ms:>10.2f} {peak:>10}  {extra}")
+    return "\n".join(lines)
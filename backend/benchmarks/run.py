@@ -0,0 +1,122 @@
+"""
+基准入口
+
+在 backend 目录下运行：
+    python -m benchmarks.run --files 200 --output bench.json
+    python -m benchmarks.run --groups repomap,search --repeat 10
+    python -m benchmarks.run --compare baseline.json --fail-threshold 0.2
+
+录制真实 LLM 响应（之后回放）：
+    python -m benchmarks.run --groups turn --record https://api.example.com/v1 \\
+        --record-key sk-xxx --llm-fixture benchmarks/fixtures/my_turn.json
+"""
+
+from pathlib import Path
+import argparse
+import json
+import logging
+import sys
+import tempfile
+
+from .cases import BenchEnv, GROUPS, build_benchmarks
+from .harness import compare_results, format_table, make_report, run_benchmark
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="daoyoucode 热点路径基准")
+    parser.add_argument("--files", type=int, default=200, help="合成仓库模块数")
+    parser.add_argument("--functions", type=int, default=8, help="每个模块的方法数")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--repeat", type=int, default=5, help="每个场景的计时次数")
+    parser.add_argument("--groups", default=",".join(GROUPS), help=f"逗号分隔（{', '.join(GROUPS)}）")
+    parser.add_argument("--no-lsp", action="store_true", help="不启动 LSP 桩（RepoMap 不做 LSP 增强）")
+    parser.add_argument("--no-memory", action="store_true", help="不测峰值内存（省一轮运行）")
+    parser.add_argument("--llm-fixture", type=Path, help="LLM 回放文件")
+    parser.add_argument("--lsp-fixture", type=Path, help="LSP 回放文件")
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="模拟的 LLM 延迟（秒）")
+    parser.add_argument("--record", metavar="URL", help="录制模式：转发到真实 API 并写回 --llm-fixture")
+    parser.add_argument("--record-key", help="录制模式的 API 密钥")
+    parser.add_argument("--workdir", type=Path, help="合成仓库目录（默认临时目录）")
+    parser.add_argument("--output", "-o", type=Path, help="结果 JSON 输出路径")
+    parser.add_argument("--compare", type=Path, help="与之前的结果 JSON 对比")
+    parser.add_argument("--fail-threshold", type=float, default=None,
+                        help="对比时 median 变慢超过该比例则返回非零退出码（如 0.2）")
+    parser.add_argument("-v", "--verbose", action="store_true")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING)
+    if not args.verbose:
+        # 被测代码日志很多，默认只保留警告以上
+        logging.getLogger("daoyoucode").setLevel(logging.ERROR)
+
+    groups = [g.strip() for g in args.groups.split(",") if g.strip()]
+    params = {
+        "files": args.files,
+        "functions": args.functions,
+        "seed": args.seed,
+        "repeat": args.repeat,
+        "groups": groups,
+        "lsp": not args.no_lsp,
+        "llm_latency": args.llm_latency,
+    }
+
+    tmp = None
+    workdir = args.workdir
+    if workdir is None:
+        tmp = tempfile.TemporaryDirectory(prefix="daoyoucode-bench-")
+        workdir = Path(tmp.name)
+
+    try:
+        env = BenchEnv(
+            workdir,
+            num_files=args.files,
+            functions_per_file=args.functions,
+            llm_fixture=args.llm_fixture,
+            lsp_fixture=args.lsp_fixture,
+            llm_latency=args.llm_latency,
+            use_lsp=not args.no_lsp,
+            seed=args.seed,
+            record_upstream=args.record,
+            record_key=args.record_key
+        )
+
+        with env:
+            results = []
+            for bench in build_benchmarks(env, groups, args.repeat):
+                result = run_benchmark(bench, env.loop, measure_memory=not args.no_memory)
+                results.append(result)
+                print(format_table([result]).splitlines()[-1], file=sys.stderr)
+
+            if args.record and args.llm_fixture:
+                env.fixture.save(args.llm_fixture)
+    finally:
+        if tmp is not None:
+            tmp.cleanup()
+
+    report = make_report(results, params)
+    print(format_table(results))
+
+    if args.output:
+        args.output.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+        print(f"\n结果已写入 {args.output}")
+
+    exit_code = 1 if any(r.error for r in results) else 0
+    if args.compare:
+        baseline = json.loads(args.compare.read_text(encoding="utf-8"))
+        rows = compare_results(baseline, report, threshold=args.fail_threshold or 0.2)
+        print(f"\n对比 {args.compare}（baseline commit {baseline.get('meta', {}).get('commit')}）")
+        for row in rows:
+            ratio = f"x{row['ratio']:.2f}" if row["ratio"] is not None else "-"
+            base_ms = f"{row['baseline_ms']:.2f}" if row["baseline_ms"] is not None else "-"
+            print(f"  {row['name']:<32} {base_ms:>10} -> {row['current_ms']:>10.2f}  {ratio:>7}  {row['status']}")
+        if args.fail_threshold is not None and any(r["status"] == "regression" for r in rows):
+            exit_code = 1
+
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
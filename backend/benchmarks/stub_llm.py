@@ -0,0 +1,306 @@
+"""
+本地 LLM 桩服务器
+
+OpenAI 兼容的 /chat/completions 与 /embeddings，回放录制好的响应：
+- 回放：按顺序取第一条匹配规则的录制响应（match 条件：是否带 functions、
+  最后一条消息的角色、消息中包含的子串），repeat=true 的条目可重复使用
+- 录制：把请求转发到真实端点，并按同样格式保存响应
+- /embeddings 返回由文本哈希决定的确定性向量，不需要录制
+
+fixture 格式：
+    {
+      "default": {"content": "好的"},
+      "responses": [
+        {"match": {"functions": true, "last_role": "user"},
+         "response": {"choices": [{"message": {...}}], "usage": {...}},
+         "repeat": false}
+      ]
+    }
+"""
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+import hashlib
+import json
+import logging
+import math
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# 默认向量维度
+EMBEDDING_DIMENSIONS = 64
+
+
+def _message_text(messages: List[Dict[str, Any]]) -> str:
+    parts = []
+    for msg in messages:
+        content = msg.get("content")
+        if content:
+            parts.append(str(content))
+    return "\n".join(parts)
+
+
+def _estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+def _embed(text: str, dimensions: int) -> List[float]:
+    """确定性伪向量：按词哈希累加后归一化（相同词的文本彼此相近）"""
+    vec = [0.0] * dimensions
+    for word in text.lower().split():
+        digest = hashlib.md5(word.encode("utf-8")).digest()
+        vec[digest[0] % dimensions] += 1.0
+        vec[digest[1] % dimensions] -= 0.5
+    norm = math.sqrt(sum(v * v for v in vec)) or 1.0
+    return [v / norm for v in vec]
+
+
+class LLMFixture:
+    """录制的 LLM 响应集合（线程安全）"""
+
+    def __init__(self, data: Optional[Dict[str, Any]] = None):
+        data = data or {}
+        self.default: Dict[str, Any] = data.get("default") or {"content": "OK"}
+        self.responses: List[Dict[str, Any]] = list(data.get("responses", []))
+        self._used = [False] * len(self.responses)
+        self._lock = threading.Lock()
+        self.requests: List[Dict[str, Any]] = []     # 收到的请求摘要（便于调试 fixture）
+
+    @classmethod
+    def load(cls, path: Path) -> "LLMFixture":
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def save(self, path: Path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(
+                {"default": self.default, "responses": self.responses},
+                f, ensure_ascii=False, indent=2
+            )
+
+    def reset(self):
+        """重新开始回放（每轮基准开始前调用）"""
+        with self._lock:
+            self._used = [False] * len(self.responses)
+            self.requests.clear()
+
+    @staticmethod
+    def describe(payload: Dict[str, Any]) -> Dict[str, Any]:
+        messages = payload.get("messages") or []
+        return {
+            "functions": bool(payload.get("functions")),
+            "last_role": messages[-1].get("role") if messages else None,
+            "messages": len(messages),
+        }
+
+    @staticmethod
+    def _matches(rule: Dict[str, Any], payload: Dict[str, Any], summary: Dict[str, Any]) -> bool:
+        if "functions" in rule and rule["functions"] != summary["functions"]:
+            return False
+        if "last_role" in rule and rule["last_role"] != summary["last_role"]:
+            return False
+        if "contains" in rule and rule["contains"] not in _message_text(payload.get("messages") or []):
+            return False
+        return True
+
+    def reply(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """为请求选出录制响应（补全 usage 等字段）"""
+        summary = self.describe(payload)
+        chosen = None
+        with self._lock:
+            self.requests.append(summary)
+            for i, entry in enumerate(self.responses):
+                if self._used[i]:
+                    continue
+                if self._matches(entry.get("match", {}), payload, summary):
+                    if not entry.get("repeat"):
+                        self._used[i] = True
+                    chosen = entry.get("response")
+                    break
+
+        if chosen is None:
+            chosen = {"choices": [{"message": {"role": "assistant", "content": self.default.get("content", "")}}]}
+
+        response = json.loads(json.dumps(chosen))
+        response.setdefault("id", f"stub-{len(self.requests)}")
+        response.setdefault("object", "chat.completion")
+        response.setdefault("model", payload.get("model", "stub"))
+        message = response["choices"][0].setdefault("message", {})
+        message.setdefault("role", "assistant")
+        message.setdefault("content", None)
+        response["choices"][0].setdefault("finish_reason", "function_call" if message.get("function_call") else "stop")
+        if "usage" not in response:
+            prompt_tokens = _estimate_tokens(_message_text(payload.get("messages") or []))
+            completion_tokens = _estimate_tokens(message.get("content") or json.dumps(message.get("function_call") or ""))
+            response["usage"] = {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            }
+        return response
+
+    def record(self, payload: Dict[str, Any], response: Dict[str, Any]):
+        """录制模式：保存一条真实响应"""
+        summary = self.describe(payload)
+        with self._lock:
+            self.responses.append({
+                "match": {"functions": summary["functions"], "last_role": summary["last_role"]},
+                "response": response,
+            })
+            self._used.append(True)
+
+
+class StubLLMServer:
+    """
+    桩服务器（后台线程）
+
+    使用示例：
+        with StubLLMServer(LLMFixture.load(path)) as server:
+            client_manager.configure_provider("qwen", api_key="bench", base_url=server.base_url)
+    """
+
+    def __init__(
+        self,
+        fixture: LLMFixture,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency: float = 0.0,
+        upstream: Optional[str] = None,
+        upstream_key: Optional[str] = None,
+        embedding_dimensions: int = EMBEDDING_DIMENSIONS
+    ):
+        """
+        Args:
+            fixture: 回放数据
+            host/port: 监听地址（port=0 自动分配）
+            latency: 每个响应前的模拟延迟（秒）
+            upstream: 录制模式的真实 API 地址（为 None 时回放）
+            upstream_key: 真实 API 密钥
+            embedding_dimensions: /embeddings 向量维度
+        """
+        self.fixture = fixture
+        self.latency = latency
+        self.upstream = upstream.rstrip("/") if upstream else None
+        self.upstream_key = upstream_key
+        self.embedding_dimensions = embedding_dimensions
+        self.stats = {"chat": 0, "embeddings": 0, "embedded_texts": 0}
+        self._server = ThreadingHTTPServer((host, port), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> "StubLLMServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="stub-llm", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "StubLLMServer":
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    # ========== 请求处理 ==========
+
+    def _chat(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        self.stats["chat"] += 1
+        if self.upstream:
+            import httpx
+            upstream_payload = dict(payload)
+            upstream_payload.pop("stream", None)
+            resp = httpx.post(
+                f"{self.upstream}/chat/completions",
+                headers={"Authorization": f"Bearer {self.upstream_key}"},
+                json=upstream_payload,
+                timeout=600.0
+            )
+            resp.raise_for_status()
+            data = resp.json()
+            self.fixture.record(payload, data)
+            return data
+        if self.latency:
+            time.sleep(self.latency)
+        return self.fixture.reply(payload)
+
+    def _embeddings(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        inputs = payload.get("input")
+        if isinstance(inputs, str):
+            inputs = [inputs]
+        self.stats["embeddings"] += 1
+        self.stats["embedded_texts"] += len(inputs)
+        data = [
+            {"object": "embedding", "index": i, "embedding": _embed(text, self.embedding_dimensions)}
+            for i, text in enumerate(inputs)
+        ]
+        tokens = sum(_estimate_tokens(t) for t in inputs)
+        return {
+            "object": "list",
+            "data": data,
+            "model": payload.get("model", "stub-embedding"),
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+        }
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                logger.debug("stub-llm: " + format, *args)
+
+            def _send_json(self, status: int, body: Dict[str, Any]):
+                raw = json.dumps(body, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(raw)))
+                self.end_headers()
+                self.wfile.write(raw)
+
+            def _send_stream(self, response: Dict[str, Any]):
+                content = response["choices"][0]["message"].get("content") or ""
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                for i in range(0, len(content), 16):
+                    chunk = {"choices": [{"index": 0, "delta": {"content": content[i:i + 16]}}]}
+                    self.wfile.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode("utf-8"))
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.close_connection = True
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                try:
+                    payload = json.loads(self.rfile.read(length) or b"{}")
+                except json.JSONDecodeError:
+                    self._send_json(400, {"error": {"message": "invalid json"}})
+                    return
+
+                try:
+                    if self.path.endswith("/chat/completions"):
+                        response = server._chat(payload)
+                        if payload.get("stream"):
+                            self._send_stream(response)
+                        else:
+                            self._send_json(200, response)
+                    elif self.path.endswith("/embeddings"):
+                        self._send_json(200, server._embeddings(payload))
+                    else:
+                        self._send_json(404, {"error": {"message": f"unknown path {self.path}"}})
+                except Exception as e:
+                    logger.exception("stub-llm 处理请求失败")
+                    self._send_json(500, {"error": {"message": str(e)}})
+
+        return Handler
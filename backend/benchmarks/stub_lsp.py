@@ -0,0 +1,176 @@
+"""
+本地 LSP 桩服务器（stdio JSON-RPC）
+
+基准运行时把 pyright 的启动命令替换为本脚本，回放录制的 LSP 响应：
+- responses: {method: result}，所有文件共用
+- by_file: {相对路径: {method: result}}，按文件覆盖
+- synthesize_symbols: 为 true 时，没有录制结果的 documentSymbol 按源码中的
+  class/def 生成（合成仓库无法预先录制每个文件）
+
+用法：
+    python stub_lsp.py fixtures/lsp_python.json
+"""
+
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import unquote, urlparse
+import json
+import re
+import sys
+
+_DEF_RE = re.compile(r'^(\s*)(class|def|async\s+def)\s+(\w+)')
+
+# LSP SymbolKind
+_KIND_CLASS = 5
+_KIND_METHOD = 6
+_KIND_FUNCTION = 12
+
+
+def _uri_to_path(uri: str) -> Path:
+    return Path(unquote(urlparse(uri).path))
+
+
+def synthesize_symbols(path: Path) -> List[Dict[str, Any]]:
+    """按缩进生成层级 DocumentSymbol"""
+    try:
+        lines = path.read_text(encoding="utf-8", errors="ignore").splitlines()
+    except OSError:
+        return []
+
+    symbols: List[Dict[str, Any]] = []
+    stack: List[tuple] = []     # [(indent, symbol)]
+    for lineno, line in enumerate(lines):
+        m = _DEF_RE.match(line)
+        if not m:
+            continue
+        indent = len(m.group(1))
+        name = m.group(3)
+        col = line.index(name)
+        while stack and stack[-1][0] >= indent:
+            stack.pop()
+        kind = _KIND_CLASS if m.group(2) == "class" else (_KIND_METHOD if stack else _KIND_FUNCTION)
+        rng = {"start": {"line": lineno, "character": indent}, "end": {"line": lineno, "character": len(line)}}
+        symbol = {
+            "name": name,
+            "kind": kind,
+            "range": rng,
+            "selectionRange": {
+                "start": {"line": lineno, "character": col},
+                "end": {"line": lineno, "character": col + len(name)},
+            },
+            "children": [],
+        }
+        if stack:
+            stack[-1][1]["children"].append(symbol)
+        else:
+            symbols.append(symbol)
+        stack.append((indent, symbol))
+    return symbols
+
+
+class StubLSP:
+    def __init__(self, fixture: Dict[str, Any]):
+        self.responses: Dict[str, Any] = fixture.get("responses", {})
+        self.by_file: Dict[str, Dict[str, Any]] = fixture.get("by_file", {})
+        self.synthesize = fixture.get("synthesize_symbols", True)
+        self.root: Optional[Path] = None
+
+    def _file_result(self, method: str, params: Dict[str, Any]) -> Tuple[Any, bool]:
+        """按文件查找录制结果，返回 (结果, 是否找到)"""
+        uri = (params.get("textDocument") or {}).get("uri")
+        if not uri:
+            return None, False
+        path = _uri_to_path(uri)
+        if self.root is not None:
+            try:
+                rel = path.resolve().relative_to(self.root).as_posix()
+                overrides = self.by_file.get(rel)
+                if overrides and method in overrides:
+                    return overrides[method], True
+            except ValueError:
+                pass
+        if method == "textDocument/documentSymbol" and method not in self.responses and self.synthesize:
+            return synthesize_symbols(path), True
+        return None, False
+
+    def handle(self, method: str, params: Dict[str, Any]) -> Any:
+        if method == "initialize":
+            root_uri = params.get("rootUri")
+            if root_uri:
+                self.root = _uri_to_path(root_uri).resolve()
+            return self.responses.get(method) or {
+                "capabilities": {
+                    "textDocumentSync": 1,
+                    "definitionProvider": True,
+                    "referencesProvider": True,
+                    "hoverProvider": True,
+                    "documentSymbolProvider": True,
+                    "workspaceSymbolProvider": True,
+                },
+                "serverInfo": {"name": "daoyoucode-stub-lsp"},
+            }
+        result, found = self._file_result(method, params or {})
+        if found:
+            return result
+        if method in self.responses:
+            return self.responses[method]
+        if method in ("textDocument/references", "textDocument/documentSymbol",
+                      "workspace/symbol", "textDocument/codeAction"):
+            return []
+        return None
+
+
+def _read_message(stream) -> Optional[Dict[str, Any]]:
+    length = None
+    while True:
+        line = stream.readline()
+        if not line:
+            return None
+        line = line.strip()
+        if not line:
+            break
+        if line.lower().startswith(b"content-length:"):
+            length = int(line.split(b":", 1)[1])
+    if length is None:
+        return None
+    return json.loads(stream.read(length))
+
+
+def _write_message(stream, message: Dict[str, Any]):
+    body = json.dumps(message, ensure_ascii=False).encode("utf-8")
+    stream.write(f"Content-Length: {len(body)}\r\n\r\n".encode("ascii") + body)
+    stream.flush()
+
+
+def main(argv: List[str]) -> int:
+    fixture: Dict[str, Any] = {}
+    if len(argv) > 1 and Path(argv[1]).is_file():
+        with open(argv[1], "r", encoding="utf-8") as f:
+            fixture = json.load(f)
+
+    server = StubLSP(fixture)
+    stdin, stdout = sys.stdin.buffer, sys.stdout.buffer
+
+    while True:
+        msg = _read_message(stdin)
+        if msg is None:
+            return 0
+        method = msg.get("method")
+        params = msg.get("params") or {}
+
+        if "id" in msg and method:
+            _write_message(stdout, {"jsonrpc": "2.0", "id": msg["id"], "result": server.handle(method, params)})
+        elif method == "exit":
+            return 0
+        elif method in ("textDocument/didOpen", "textDocument/didChange"):
+            # 立即发布空诊断，避免客户端等待超时
+            uri = (params.get("textDocument") or {}).get("uri")
+            _write_message(stdout, {
+                "jsonrpc": "2.0",
+                "method": "textDocument/publishDiagnostics",
+                "params": {"uri": uri, "diagnostics": []},
+            })
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
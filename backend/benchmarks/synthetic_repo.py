@@ -0,0 +1,151 @@
+"""
+合成仓库生成器
+
+按给定规模生成确定性的 Python 项目（包、模块、类、函数、跨模块调用、文档），
+用于在不同提交之间复现相同的基准输入。
+"""
+
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import List, Tuple
+import random
+
+
+@dataclass
+class SyntheticRepo:
+    """生成结果"""
+    root: Path
+    files: List[Path] = field(default_factory=list)
+    symbols: List[str] = field(default_factory=list)    # 所有函数名（可用作查询词）
+
+    @property
+    def modules(self) -> List[Path]:
+        """生成的模块文件（不含 __init__.py 和文档）"""
+        return [f for f in self.files if f.name.startswith("mod_")]
+
+
+def _module_source(rng: random.Random, pkg: str, mod: str, index: int,
+                   functions: int, imports: List[Tuple[str, str]]) -> Tuple[str, List[str]]:
+    """生成一个模块的源码，返回 (源码, 函数名列表)"""
+    lines = ['"""', f"{pkg}.{mod}: synthetic module {index}", '"""', ""]
+    lines.append("import os")
+    lines.append("from typing import Dict, List, Optional")
+    for target_mod, target_func in imports:
+        lines.append(f"from {target_mod} import {target_func}")
+    lines.append("")
+    lines.append("")
+
+    names = []
+    class_name = f"Service{index}"
+    lines.append(f"class {class_name}:")
+    lines.append(f'    """Service {index} coordinating {functions} handlers."""')
+    lines.append("")
+    lines.append("    def __init__(self, config: Optional[Dict] = None):")
+    lines.append("        self.config = config or {}")
+    lines.append("        self.cache: Dict[str, int] = {}")
+    lines.append("")
+    for j in range(functions):
+        name = f"handle_{index}_{j}"
+        names.append(name)
+        lines.append(f"    def {name}(self, items: List[int], limit: int = {rng.randint(5, 50)}) -> int:")
+        lines.append(f'        """Handle batch {j} for service {index}."""')
+        lines.append("        total = 0")
+        lines.append("        for item in items[:limit]:")
+        lines.append(f"            if item % {rng.randint(2, 9)} == 0:")
+        lines.append("                total += item")
+        lines.append("            else:")
+        lines.append(f"                total -= {rng.randint(1, 5)}")
+        lines.append(f"        self.cache['{name}'] = total")
+        lines.append("        return total")
+        lines.append("")
+
+    for j in range(functions):
+        name = f"compute_{index}_{j}"
+        names.append(name)
+        lines.append("")
+        lines.append(f"def {name}(values: List[int]) -> int:")
+        lines.append(f'    """Compute aggregate {j} of module {index}."""')
+        lines.append(f"    service = {class_name}()")
+        lines.append(f"    result = service.handle_{index}_{j}(values)")
+        if imports and j < len(imports):
+            lines.append(f"    result += {imports[j][1]}(values)")
+        lines.append(f"    return result * {rng.randint(2, 7)}")
+        lines.append("")
+
+    lines.append("")
+    lines.append(f"def main_{index}() -> None:")
+    lines.append(f"    print(compute_{index}_0([1, 2, 3]))")
+    lines.append("")
+    return "\n".join(lines), names
+
+
+def generate_repo(
+    root: Path,
+    num_files: int = 200,
+    functions_per_file: int = 8,
+    files_per_package: int = 20,
+    seed: int = 42
+) -> SyntheticRepo:
+    """
+    生成合成仓库
+
+    Args:
+        root: 目标目录（会被创建）
+        num_files: Python 模块数
+        functions_per_file: 每个模块的方法数（另有同样数量的模块级函数）
+        files_per_package: 每个包的模块数
+        seed: 随机种子（相同参数生成完全相同的仓库）
+    """
+    rng = random.Random(seed)
+    root = Path(root)
+    root.mkdir(parents=True, exist_ok=True)
+    repo = SyntheticRepo(root=root)
+
+    (root / ".gitignore").write_text("__pycache__/\n*.log\n.daoyoucode/\n", encoding="utf-8")
+    (root / "pyproject.toml").write_text('[project]\nname = "synthetic"\nversion = "0.0.1"\n', encoding="utf-8")
+
+    modules = []    # [(import_path, first compute function)]
+    for i in range(num_files):
+        pkg = f"pkg_{i // files_per_package:03d}"
+        mod = f"mod_{i:04d}"
+        pkg_dir = root / "src" / pkg
+        if not pkg_dir.exists():
+            pkg_dir.mkdir(parents=True)
+            init = pkg_dir / "__init__.py"
+            init.write_text(f'"""{pkg}"""\n', encoding="utf-8")
+            repo.files.append(init)
+
+        # 从已生成的模块中随机选几个依赖，形成引用图
+        imports = []
+        if modules:
+            for _ in range(min(3, len(modules))):
+                imports.append(rng.choice(modules))
+
+        source, names = _module_source(rng, pkg, mod, i, functions_per_file, imports)
+        path = pkg_dir / f"{mod}.py"
+        path.write_text(source, encoding="utf-8")
+        repo.files.append(path)
+        repo.symbols.extend(names)
+        modules.append((f"src.{pkg}.{mod}", f"compute_{i}_0"))
+
+    docs = root / "docs"
+    docs.mkdir(exist_ok=True)
+    for k in range(max(1, num_files // 50)):
+        doc = docs / f"guide_{k}.md"
+        doc.write_text(
+            f"# Guide {k}\n\nUse `compute_{k}_0` to aggregate values.\n\n"
+            + "\n".join(f"- step {s}: call handle_{k}_{s % functions_per_file}" for s in range(20)),
+            encoding="utf-8"
+        )
+        repo.files.append(doc)
+
+    return repo
+
+
+def touch_module(repo: SyntheticRepo, index: int = 0, marker: str = "edit") -> Path:
+    """修改一个模块（增量基准用）：追加一个新函数"""
+    modules = repo.modules
+    path = modules[min(index, len(modules) - 1)]
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(f"\n\ndef added_{marker}(x: int) -> int:\n    return x + 1\n")
+    return path
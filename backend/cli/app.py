@@ -59,10 +59,11 @@ def edit(
 @app.command()
 def doctor(
     fix: bool = typer.Option(False, "--fix", help="自动修复问题"),
+    imports: bool = typer.Option(False, "--imports", help="显示导入耗时分析"),
 ):
     """诊断系统环境"""
     from cli.commands import doctor as doctor_cmd
-    doctor_cmd.main(fix)
+    doctor_cmd.main(fix, imports)
 
 
 @app.command()
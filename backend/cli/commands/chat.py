@@ -130,12 +130,13 @@ def main(
     console.print("\n[dim]正在初始化Agent系统...[/dim]")
     
     try:
-        from daoyoucode.agents.init import initialize_agent_system
+        from daoyoucode.agents.init import initialize_agent_system, warmup_embedding_model
         from daoyoucode.agents.tools.registry import get_tool_registry
         from daoyoucode.agents.tools.base import ToolContext
         from daoyoucode.agents.llm.client_manager import get_client_manager
         from daoyoucode.agents.llm.config_loader import auto_configure
         from daoyoucode.agents.memory.manager import get_memory_manager
+        from daoyoucode.agents.memory.codebase_warmup import start_index_warmup
         
         # 🆕 初始化记忆管理器（支持项目级存储）
         # 注意：必须在 initialize_agent_system() 之前初始化，这样 Agent 才能获取到正确的实例
@@ -154,6 +155,11 @@ def main(
         client_manager = get_client_manager()
         auto_configure(client_manager)
         
+        # 本地向量模型在后台线程加载，不阻塞输入
+        warmup_embedding_model()
+        # 代码库索引在后台构建，首次按问检索时不用等待
+        start_index_warmup(repo_path)
+        
         console.print("[dim]✓ 初始化完成[/dim]")
     except Exception as e:
         console.print(f"[red]初始化失败: {e}[/red]")
@@ -215,6 +221,30 @@ def main(
     except Exception as e:
         console.print(f"\n[red]❌ 错误: {e}[/red]\n")
         raise typer.Exit(1)
+    finally:
+        _finish_post_turn_jobs(memory_manager)
+
+
+# 退出时等待轮后任务（摘要、画像）的最长时间（秒）；未完成的已持久化，下次启动继续
+POST_TURN_EXIT_TIMEOUT = 30
+
+
+def _finish_post_turn_jobs(memory_manager):
+    """退出前等待后台的轮后任务完成"""
+    from cli.ui.console import console
+    
+    pipeline = getattr(memory_manager, 'post_turn', None)
+    if pipeline is None:
+        return
+    stats = pipeline.get_stats()
+    if not stats['pending'] and not stats['running']:
+        return
+    console.print("[dim]正在保存对话摘要和用户画像...[/dim]")
+    try:
+        if not pipeline.wait(timeout=POST_TURN_EXIT_TIMEOUT):
+            console.print("[dim]部分后台任务未完成，将在下次启动时继续[/dim]")
+    except KeyboardInterrupt:
+        pass
 
 
 def show_banner(model: str, repo: Path, files: Optional[List[Path]], skill: str, subtree_only: bool = False):
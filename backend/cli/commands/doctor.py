@@ -10,6 +10,7 @@ from typing import Optional
 
 def main(
     fix: bool = typer.Option(False, "--fix", help="自动修复问题"),
+    imports: bool = typer.Option(False, "--imports", help="显示导入耗时分析"),
 ):
     """
     诊断系统环境
@@ -19,10 +20,12 @@ def main(
     - 依赖包
     - API密钥配置
     - 核心系统状态
+    - 冷启动导入耗时
     
     示例:
         daoyoucode doctor
         daoyoucode doctor --fix
+        daoyoucode doctor --imports
     """
     from cli.ui.console import console
     
@@ -35,6 +38,7 @@ def main(
         ("API密钥", check_api_keys),
         ("核心系统", check_core_systems),
         ("工具系统", check_tools),
+        ("启动耗时", check_startup),
     ]
     
     passed = 0
@@ -57,6 +61,9 @@ def main(
         
         console.print()
     
+    if imports:
+        show_import_profile()
+    
     # 总结
     console.print("[bold]总结:[/bold]")
     console.print(f"  通过: {passed}")
@@ -130,3 +137,41 @@ def check_tools():
         return "pass", "25个工具正常"
     except Exception as e:
         return "fail", f"工具系统异常: {e}"
+
+
+def check_startup():
+    """检查 agents 包的冷启动导入耗时"""
+    from cli.utils.import_profile import IMPORT_BUDGET_MS, profile_import
+    
+    profile = profile_import("daoyoucode.agents")
+    if profile.error:
+        return "fail", f"导入 daoyoucode.agents 失败: {profile.error}"
+    if profile.within_budget():
+        return "pass", f"导入 daoyoucode.agents 用时 {profile.total_ms:.0f}ms"
+    return "warn", (
+        f"导入 daoyoucode.agents 用时 {profile.total_ms:.0f}ms，超过预算 {IMPORT_BUDGET_MS}ms"
+        "（用 --imports 查看最慢的模块）"
+    )
+
+
+def show_import_profile(limit: int = 15):
+    """显示导入耗时最多的模块"""
+    from cli.ui.console import console
+    from cli.utils.import_profile import profile_import
+    from rich.table import Table
+    
+    profile = profile_import("daoyoucode.agents")
+    if profile.error:
+        console.print(f"[red]导入失败: {profile.error}[/red]\n")
+        return
+    
+    table = Table(title=f"导入耗时（共 {profile.total_ms:.0f}ms）", border_style="cyan")
+    table.add_column("模块", style="bold")
+    table.add_column("自身(ms)", justify="right")
+    table.add_column("累计(ms)", justify="right", style="cyan")
+    
+    for entry in sorted(profile.entries, key=lambda e: e.self_ms, reverse=True)[:limit]:
+        table.add_row(entry.module, f"{entry.self_ms:.1f}", f"{entry.cumulative_ms:.1f}")
+    
+    console.print(table)
+    console.print()
@@ -0,0 +1,106 @@
+"""
+导入耗时分析
+
+在新的解释器里用 `python -X importtime` 导入模块，解析出总耗时和最慢的模块，
+用于检查冷启动预算（daoyoucode doctor --imports）
+"""
+
+from dataclasses import dataclass, field
+from typing import List, Optional
+import os
+import subprocess
+import sys
+
+# 冷启动导入预算（毫秒）
+IMPORT_BUDGET_MS = 1000
+
+
+@dataclass
+class ImportEntry:
+    """单个模块的导入耗时"""
+    module: str
+    self_ms: float
+    cumulative_ms: float
+    depth: int
+
+
+@dataclass
+class ImportProfile:
+    """一次导入的分析结果"""
+    module: str
+    total_ms: float
+    entries: List[ImportEntry] = field(default_factory=list)
+    error: Optional[str] = None
+
+    def slowest(self, limit: int = 15, own_package_only: bool = False) -> List[ImportEntry]:
+        """按累计耗时排序的最慢模块"""
+        entries = self.entries
+        if own_package_only:
+            root = self.module.split(".")[0]
+            entries = [e for e in entries if e.module.split(".")[0] == root]
+        return sorted(entries, key=lambda e: e.cumulative_ms, reverse=True)[:limit]
+
+    def within_budget(self, budget_ms: float = IMPORT_BUDGET_MS) -> bool:
+        return self.error is None and self.total_ms <= budget_ms
+
+
+_MARKER = "-- daoyoucode import profile --"
+
+
+def parse_importtime(output: str) -> List[ImportEntry]:
+    """解析 -X importtime 的输出（单位微秒），只保留标记行之后的导入"""
+    lines = output.splitlines()
+    if _MARKER in lines:
+        lines = lines[lines.index(_MARKER) + 1:]
+    entries = []
+    for line in lines:
+        if not line.startswith("import time:"):
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3 or not parts[0].strip().isdigit():
+            continue  # 表头
+        name = parts[2].rstrip()
+        stripped = name.lstrip()
+        entries.append(ImportEntry(
+            module=stripped,
+            self_ms=int(parts[0]) / 1000,
+            cumulative_ms=int(parts[1]) / 1000,
+            depth=(len(name) - len(stripped) - 1) // 2,
+        ))
+    return entries
+
+
+def profile_import(module: str, timeout: float = 60.0) -> ImportProfile:
+    """
+    在子进程中分析模块的冷启动导入耗时
+
+    Args:
+        module: 模块名，例如 daoyoucode.agents
+        timeout: 超时时间（秒）
+    """
+    code = (
+        "import sys, time\n"
+        f"sys.stderr.write({_MARKER!r} + '\\n'); sys.stderr.flush()\n"
+        "start = time.perf_counter()\n"
+        f"import {module}\n"
+        "print((time.perf_counter() - start) * 1000)\n"
+    )
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(p for p in sys.path if p)
+    try:
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", code],
+            capture_output=True, text=True, timeout=timeout, env=env
+        )
+    except subprocess.TimeoutExpired:
+        return ImportProfile(module, 0.0, error=f"导入超时（{timeout}秒）")
+
+    entries = parse_importtime(proc.stderr)
+    if proc.returncode != 0:
+        last = proc.stderr.strip().splitlines()[-1:] or ["未知错误"]
+        return ImportProfile(module, 0.0, entries, error=last[0])
+    try:
+        total = float(proc.stdout.strip().splitlines()[-1])
+    except (IndexError, ValueError):
+        total = sum(e.cumulative_ms for e in entries if e.depth == 0)
+    return ImportProfile(module, total, entries)
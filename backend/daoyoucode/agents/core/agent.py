@@ -79,6 +79,7 @@ class BaseAgent(ABC):
         
         # 用户画像缓存（按需加载，避免每轮都读取）
         self._user_profile_cache: Dict[str, Dict[str, Any]] = {}
+        self._user_profile_versions: Dict[str, int] = {}
         
         # 用户画像检查时间缓存（避免频繁检查）
         # 格式：{user_id: last_check_timestamp}
@@ -95,10 +96,16 @@ class BaseAgent(ABC):
         Returns:
             用户画像字典，如果不存在返回None
         """
+        # 后台流水线更新过画像后，缓存失效
+        version = self.memory.post_turn.profile_version(user_id)
+        if self._user_profile_versions.get(user_id) != version:
+            self._user_profile_cache.pop(user_id, None)
+        
         if force_reload or user_id not in self._user_profile_cache:
             profile = self.memory.long_term_memory.get_user_profile(user_id)
             if profile:
                 self._user_profile_cache[user_id] = profile
+                self._user_profile_versions[user_id] = version
                 self.logger.debug(f"加载用户画像: {user_id}")
         
         return self._user_profile_cache.get(user_id)
@@ -146,52 +153,30 @@ class BaseAgent(ABC):
             if should_update:
                 self.logger.info(f"🔄 触发用户画像更新: user_id={user_id}, conversations={total_conversations}")
                 
-                # 异步更新（不阻塞当前请求）
-                # 这里简化实现，实际应该放到后台任务队列
-                await self._update_user_profile_async(user_id)
+                # 交给后台流水线，不阻塞当前请求
+                self.memory.post_turn.submit('profile', user_id, model=self.config.model)
         
         except Exception as e:
             self.logger.warning(f"检查用户画像更新失败: {e}")
     
-    async def _update_user_profile_async(self, user_id: str):
+    def _schedule_summary(self, session_id: str, llm_config: Optional[Dict[str, Any]]):
         """
-        异步更新用户画像
+        检查是否需要生成摘要，需要时提交到后台流水线
+        
+        摘要要调用LLM，放在后台执行，回答可以立即返回。
         
         Args:
-            user_id: 用户ID
+            session_id: 会话ID
+            llm_config: 本轮的LLM配置（决定使用的模型）
         """
-        try:
-            # 收集用户的所有会话
-            all_sessions = self.memory.get_user_sessions(user_id)
-            
-            if not all_sessions:
-                self.logger.warning(f"用户 {user_id} 没有会话记录，跳过画像更新")
-                return
-            
-            # 获取LLM客户端
-            from ..llm import get_client_manager
-            client_manager = get_client_manager()
-            llm_client = client_manager.get_client(self.config.model)
-            
-            # 构建用户画像
-            profile = await self.memory.long_term_memory.build_user_profile(
-                user_id=user_id,
-                all_sessions=all_sessions,
-                llm_client=llm_client
-            )
-            
-            # 清除缓存，下次访问时会重新加载
-            if user_id in self._user_profile_cache:
-                del self._user_profile_cache[user_id]
-            
-            self.logger.info(
-                f"✅ 用户画像已更新: user_id={user_id}, "
-                f"sessions={len(all_sessions)}, "
-                f"topics={len(profile.get('common_topics', []))}"
-            )
+        current_round = len(self.memory.get_conversation_history(session_id))
+        if not self.memory.long_term_memory.should_generate_summary(session_id, current_round):
+            return
         
-        except Exception as e:
-            self.logger.error(f"更新用户画像失败: {e}", exc_info=True)
+        model = llm_config.get('model') if llm_config else None
+        model = model or self.config.model
+        self.logger.info(f"🔄 触发摘要生成: session={session_id}, round={current_round}")
+        self.memory.post_turn.submit('summary', session_id, model=model)
     
     async def execute_stream(
         self,
@@ -297,22 +282,8 @@ class BaseAgent(ABC):
                 user_id=user_id
             )
             
-            # 检查是否需要生成摘要
-            history_after = self.memory.get_conversation_history(session_id)
-            current_round = len(history_after)
-            
-            if self.memory.long_term_memory.should_generate_summary(session_id, current_round):
-                try:
-                    from ..llm import get_client_manager
-                    client_manager = get_client_manager()
-                    llm_client = client_manager.get_client(
-                        llm_config.get('model') if llm_config else self.config.model
-                    )
-                    summary = await self.memory.long_term_memory.generate_summary(
-                        session_id, history_after, llm_client
-                    )
-                except Exception as e:
-                    self.logger.warning(f"⚠️ 摘要生成失败: {e}")
+            # 检查是否需要生成摘要（后台执行）
+            self._schedule_summary(session_id, llm_config)
             
             # 保存任务
             # 🆕 只有主Agent才记录任务，避免辅助Agent重复记录
@@ -643,22 +614,8 @@ class BaseAgent(ABC):
                                 user_id=user_id
                             )
                             
-                            # 检查是否需要生成摘要
-                            history_after = self.memory.get_conversation_history(session_id)
-                            current_round = len(history_after)
-                            
-                            if self.memory.long_term_memory.should_generate_summary(session_id, current_round):
-                                try:
-                                    from ..llm import get_client_manager
-                                    client_manager = get_client_manager()
-                                    llm_client = client_manager.get_client(
-                                        llm_config.get('model') if llm_config else self.config.model
-                                    )
-                                    summary = await self.memory.long_term_memory.generate_summary(
-                                        session_id, history_after, llm_client
-                                    )
-                                except Exception as e:
-                                    self.logger.warning(f"⚠️ 摘要生成失败: {e}")
+                            # 检查是否需要生成摘要（后台执行）
+                            self._schedule_summary(session_id, llm_config)
                             
                             # 保存任务
                             self.memory.add_task(user_id, {
@@ -704,27 +661,8 @@ class BaseAgent(ABC):
                 user_id=user_id  # 传递user_id以维护映射
             )
             
-            # 5.2 检查是否需要生成摘要
-            history_after = self.memory.get_conversation_history(session_id)
-            current_round = len(history_after)
-            
-            if self.memory.long_term_memory.should_generate_summary(session_id, current_round):
-                self.logger.info(f"🔄 触发摘要生成: session={session_id}, round={current_round}")
-                try:
-                    # 获取LLM客户端
-                    from ..llm import get_client_manager
-                    client_manager = get_client_manager()
-                    llm_client = client_manager.get_client(
-                        llm_config.get('model') if llm_config else self.config.model
-                    )
-                    
-                    # 生成摘要
-                    summary = await self.memory.long_term_memory.generate_summary(
-                        session_id, history_after, llm_client
-                    )
-                    self.logger.info(f"✅ 摘要已生成: {len(summary)}字符")
-                except Exception as e:
-                    self.logger.warning(f"⚠️ 摘要生成失败: {e}")
+            # 5.2 检查是否需要生成摘要（后台执行）
+            self._schedule_summary(session_id, llm_config)
             
             # 5.3 保存任务（Agent层记忆）
             # 🆕 只有主Agent才记录任务，避免辅助Agent重复记录
@@ -1346,13 +1284,29 @@ class BaseAgent(ABC):
                     )
                 else:
                     # 🔥 普通工具
+                    from ..tools.base import set_tool_progress_callback, reset_tool_progress_callback
+
                     with display.show_progress(tool_name) as progress:
                         task = progress.add_task(f"正在执行 {tool_name}...", total=100)
-                        
-                        # 模拟进度
+
+                        # 工具上报真实进度（如测试通过/失败计数）时更新进度条
+                        def on_progress(event):
+                            description = f"{tool_name}: {event['message']}"
+                            if event.get('completed') is not None and event.get('total'):
+                                progress.update(
+                                    task, description=description,
+                                    completed=min(100, event['completed'] * 100 // event['total'])
+                                )
+                            else:
+                                progress.update(task, description=description)
+
                         progress.update(task, advance=30)
-                        tool_result = await tool_registry.execute_tool(tool_name, **tool_args)
-                        progress.update(task, advance=70)
+                        token = set_tool_progress_callback(on_progress)
+                        try:
+                            tool_result = await tool_registry.execute_tool(tool_name, **tool_args)
+                        finally:
+                            reset_tool_progress_callback(token)
+                        progress.update(task, completed=100)
                 
                 duration = time.time() - start_time
                 display.show_success(tool_name, duration)
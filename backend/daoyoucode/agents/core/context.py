@@ -18,11 +18,60 @@ from copy import deepcopy
 import uuid
 import logging
 import asyncio
+import sys
 from pathlib import Path
 
+from ..llm.utils.tokenizer import count_tokens, count_value_tokens
+
 logger = logging.getLogger(__name__)
 
 
+# 变更历史的总大小上限（字节，近似）
+MAX_HISTORY_BYTES = 1024 * 1024
+# 单条变更记录保存的值的大小上限，超过时只保存预览
+MAX_CHANGE_VALUE_BYTES = 4096
+# 快照中不需要复制的不可变类型
+_IMMUTABLE_TYPES = (str, bytes, int, float, complex, bool, type(None), frozenset)
+
+
+def _is_immutable(value: Any) -> bool:
+    if isinstance(value, _IMMUTABLE_TYPES):
+        return True
+    if isinstance(value, tuple):
+        return all(_is_immutable(v) for v in value)
+    return False
+
+
+def _approx_size(value: Any, limit: int) -> int:
+    """
+    近似占用字节数（超过 limit 后提前结束，返回值 > limit）
+    """
+    size = sys.getsizeof(value)
+    if size > limit or isinstance(value, (str, bytes)):
+        return size
+    if isinstance(value, dict):
+        items = (x for kv in value.items() for x in kv)
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        items = iter(value)
+    else:
+        return size
+    for item in items:
+        size += _approx_size(item, limit - size)
+        if size > limit:
+            break
+    return size
+
+
+def _preview(value: Any, size: int) -> str:
+    """大值在变更历史中的预览"""
+    return f"{str(value)[:200]}…（约 {size} 字节，未保存完整值）"
+
+
+def variable_tokens(key: str, value: Any) -> int:
+    """单个上下文变量（名称 + 值）的 token 数"""
+    return count_tokens(key) + count_value_tokens(value) + 1
+
+
 @dataclass
 class ContextSnapshot:
     """上下文快照"""
@@ -43,12 +92,17 @@ class ContextSnapshot:
 
 @dataclass
 class ContextChange:
-    """上下文变更记录"""
+    """
+    上下文变更记录
+    
+    超过 MAX_CHANGE_VALUE_BYTES 的值只保存预览字符串，避免历史记录让大值一直驻留内存
+    """
     key: str
     old_value: Any
     new_value: Any
     timestamp: datetime
     operation: str  # set, delete, update
+    size: int = 0   # 记录占用的近似字节数
     
     def to_dict(self) -> Dict[str, Any]:
         """转换为字典"""
@@ -77,7 +131,8 @@ class Context:
         session_id: str,
         parent: Optional['Context'] = None,
         max_history: int = 100,
-        max_snapshots: int = 10
+        max_snapshots: int = 10,
+        max_history_bytes: int = MAX_HISTORY_BYTES
     ):
         """
         初始化上下文
@@ -87,21 +142,31 @@ class Context:
             parent: 父上下文（支持嵌套）
             max_history: 最大历史记录数
             max_snapshots: 最大快照数
+            max_history_bytes: 变更历史的总大小上限（字节）
         """
         self.session_id = session_id
         self.parent = parent
         self.max_history = max_history
         self.max_snapshots = max_snapshots
+        self.max_history_bytes = max_history_bytes
         
         # 变量存储
         self.variables: Dict[str, Any] = {}
         
+        # 每个变量的token数（按需计算，变量被重新设置时失效）
+        self._token_counts: Dict[str, int] = {}
+        
         # 变更历史
         self.history: List[ContextChange] = []
+        self._history_bytes = 0
         
         # 快照列表
         self.snapshots: List[ContextSnapshot] = []
         
+        # 可变值最近一次冻结的副本：key -> (当前值, 冻结副本)
+        # 值没有变化时，新快照直接共享这份副本
+        self._frozen: Dict[str, Tuple[Any, Any]] = {}
+        
         # 元数据
         self.metadata: Dict[str, Any] = {
             'created_at': datetime.now(),
@@ -123,6 +188,7 @@ class Context:
         operation = 'update' if key in self.variables else 'set'
         
         self.variables[key] = value
+        self._token_counts.pop(key, None)
         self.metadata['last_modified'] = datetime.now()
         
         # 记录变更
@@ -161,6 +227,7 @@ class Context:
         if key in self.variables:
             old_value = self.variables[key]
             del self.variables[key]
+            self._token_counts.pop(key, None)
             self.metadata['last_modified'] = datetime.now()
             
             # 记录变更
@@ -208,6 +275,7 @@ class Context:
                 self.delete(key, track_change=True)
         else:
             self.variables.clear()
+            self._token_counts.clear()
             self.metadata['last_modified'] = datetime.now()
     
     def keys(self) -> List[str]:
@@ -234,12 +302,41 @@ class Context:
         
         return result
     
+    def token_count(self, key: str) -> int:
+        """
+        变量的token数（名称 + 值，结果缓存）
+        
+        缓存在 set/delete 时失效；原地修改可变值（如往 list 里追加）后需要重新 set。
+        """
+        if key in self.variables:
+            count = self._token_counts.get(key)
+            if count is None:
+                count = variable_tokens(key, self.variables[key])
+                self._token_counts[key] = count
+            return count
+        
+        if self.parent:
+            return self.parent.token_count(key)
+        
+        return 0
+    
+    def token_counts(self) -> Dict[str, int]:
+        """所有变量（含父上下文）的token数"""
+        return {key: self.token_count(key) for key in self.to_dict()}
+    
+    def total_tokens(self) -> int:
+        """上下文的总token数"""
+        return sum(self.token_counts().values())
+    
     # ========== 快照和回滚 ==========
     
     def create_snapshot(self, description: str = "") -> str:
         """
         创建快照
         
+        快照之间结构共享：不可变值（字符串等）直接引用，可变值只在内容
+        与上次冻结时不同的情况下才复制，所以连续快照的开销与变化量成正比。
+        
         Args:
             description: 快照描述
         
@@ -248,7 +345,7 @@ class Context:
         """
         snapshot = ContextSnapshot(
             id=str(uuid.uuid4()),
-            variables=deepcopy(self.variables),
+            variables={key: self._freeze(key, value) for key, value in self.variables.items()},
             timestamp=datetime.now(),
             description=description
         )
@@ -259,10 +356,33 @@ class Context:
         if len(self.snapshots) > self.max_snapshots:
             self.snapshots = self.snapshots[-self.max_snapshots:]
         
+        # 已删除的变量不再需要冻结副本
+        for key in list(self._frozen):
+            if key not in self.variables:
+                del self._frozen[key]
+        
         logger.info(f"创建快照: {snapshot.id[:8]}... - {description}")
         
         return snapshot.id
     
+    def _freeze(self, key: str, value: Any) -> Any:
+        """返回可以放进快照的值（不会被之后的原地修改影响）"""
+        if _is_immutable(value):
+            return value
+        
+        previous = self._frozen.get(key)
+        if previous is not None:
+            try:
+                if previous[0] is value and previous[1] == value:
+                    return previous[1]
+            except Exception:
+                # 无法比较的值（如 numpy 数组）直接复制
+                pass
+        
+        frozen = deepcopy(value)
+        self._frozen[key] = (value, frozen)
+        return frozen
+    
     def rollback_to_snapshot(self, snapshot_id: str) -> bool:
         """
         回滚到快照
@@ -282,8 +402,17 @@ class Context:
             logger.warning(f"快照不存在: {snapshot_id}")
             return False
         
-        # 回滚变量
-        self.variables = deepcopy(snapshot.variables)
+        # 回滚变量：不可变值直接共享，可变值复制一份（快照本身保持不变）
+        variables = {}
+        self._frozen = {}
+        for key, frozen in snapshot.variables.items():
+            if _is_immutable(frozen):
+                variables[key] = frozen
+            else:
+                variables[key] = deepcopy(frozen)
+                self._frozen[key] = (variables[key], frozen)
+        self.variables = variables
+        self._token_counts.clear()
         self.metadata['last_modified'] = datetime.now()
         
         # 记录回滚操作
@@ -318,20 +447,36 @@ class Context:
         new_value: Any,
         operation: str
     ):
-        """记录变更"""
+        """记录变更（按条数和总字节数限制历史大小）"""
+        old_size = _approx_size(old_value, MAX_CHANGE_VALUE_BYTES)
+        if old_size > MAX_CHANGE_VALUE_BYTES:
+            old_value = _preview(old_value, old_size)
+            old_size = sys.getsizeof(old_value)
+        new_size = _approx_size(new_value, MAX_CHANGE_VALUE_BYTES)
+        if new_size > MAX_CHANGE_VALUE_BYTES:
+            new_value = _preview(new_value, new_size)
+            new_size = sys.getsizeof(new_value)
+        
         change = ContextChange(
             key=key,
             old_value=old_value,
             new_value=new_value,
             timestamp=datetime.now(),
-            operation=operation
+            operation=operation,
+            size=old_size + new_size
         )
         
         self.history.append(change)
-        
-        # 保持最大历史数
-        if len(self.history) > self.max_history:
-            self.history = self.history[-self.max_history:]
+        self._history_bytes += change.size
+        
+        # 保持最大历史数和总大小
+        drop = 0
+        while (len(self.history) - drop > self.max_history
+               or (self._history_bytes > self.max_history_bytes and len(self.history) - drop > 1)):
+            self._history_bytes -= self.history[drop].size
+            drop += 1
+        if drop:
+            del self.history[:drop]
     
     def get_history(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
         """
@@ -376,7 +521,8 @@ class Context:
             session_id=f"{self.session_id}_child",
             parent=self,
             max_history=self.max_history,
-            max_snapshots=self.max_snapshots
+            max_snapshots=self.max_snapshots,
+            max_history_bytes=self.max_history_bytes
         )
         
         logger.debug(f"创建子上下文: parent={self.session_id}")
@@ -514,11 +660,16 @@ class ContextManager:
             len(ctx.history) for ctx in self.contexts.values()
         )
         
+        history_bytes = sum(
+            ctx._history_bytes for ctx in self.contexts.values()
+        )
+        
         return {
             'total_contexts': len(self.contexts),
             'total_variables': total_variables,
             'total_snapshots': total_snapshots,
             'total_history': total_history,
+            'history_bytes': history_bytes,
             'max_contexts': self.max_contexts
         }
     
@@ -625,8 +776,9 @@ class ContextManager:
         
         priority_keys = priority_keys or []
         
-        # 计算当前token数
-        current_tokens = self._estimate_tokens(context.to_dict())
+        # 计算当前token数（每个变量的计数缓存在上下文中，不重复序列化）
+        token_counts = context.token_counts()
+        current_tokens = sum(token_counts.values())
         
         if current_tokens <= token_budget:
             logger.debug(f"Token预算充足: {current_tokens}/{token_budget}")
@@ -644,11 +796,12 @@ class ContextManager:
         variables = context.to_dict()
         sorted_vars = self._sort_by_priority(variables, priority_keys)
         
-        # 二分查找最优变量数量
-        pruned_vars = self._binary_search_optimal_vars(
+        # 按预先计算的token数装箱
+        pruned_vars = self._pack_vars(
             sorted_vars,
             token_budget,
-            priority_keys
+            priority_keys,
+            token_counts
         )
         
         # 更新上下文
@@ -659,11 +812,15 @@ class ContextManager:
         # 创建快照（以便回滚）
         snapshot_id = context.create_snapshot("token_budget_enforcement")
         
-        # 清空并重新设置
-        context.clear(track_change=False)
-        context.update(pruned_vars, track_change=False)
+        # 只删除被剪掉的变量（保留的变量不变，token计数缓存仍然有效）；
+        # 父上下文中保留的变量复制到当前上下文
+        for key in removed_keys:
+            context.delete(key, track_change=False)
+        for key in pruned_keys:
+            if key not in context.variables:
+                context.set(key, pruned_vars[key], track_change=False)
         
-        final_tokens = self._estimate_tokens(pruned_vars)
+        final_tokens = sum(token_counts[key] for key in pruned_keys)
         
         logger.info(
             f"Token剪枝完成: {current_tokens} -> {final_tokens} "
@@ -682,12 +839,11 @@ class ContextManager:
     
     def _estimate_tokens(self, data: Dict[str, Any]) -> int:
         """
-        估算token数量
+        计算变量字典的token数
         
-        简化版：1 token ≈ 4 字符
+        使用共享分词器（tiktoken 或近似计数，见 llm/utils/tokenizer.py）逐个变量计数后求和
         """
-        text = str(data)
-        return len(text) // 4
+        return sum(variable_tokens(key, value) for key, value in data.items())
     
     def _sort_by_priority(
         self,
@@ -720,18 +876,34 @@ class ContextManager:
         
         return result
     
-    def _binary_search_optimal_vars(
+    def _pack_vars(
         self,
         sorted_vars: List[Tuple[str, Any, int]],
         token_budget: int,
-        priority_keys: List[str]
+        priority_keys: List[str],
+        token_counts: Optional[Dict[str, int]] = None
     ) -> Dict[str, Any]:
         """
-        二分查找最优变量数量
+        在预算内选择变量（贪心装箱）
+        
+        高优先级变量一定保留；其余按优先级顺序逐个尝试，放得下就保留，
+        放不下就跳过（后面更小的变量仍有机会放入）。只做加法，O(n)。
+        
+        Args:
+            sorted_vars: 按优先级排序的 [(key, value, priority), ...]
+            token_budget: Token预算
+            priority_keys: 高优先级key列表
+            token_counts: 预先计算的每个变量的token数（缺失的按需计算）
         
         Returns:
             剪枝后的变量字典
         """
+        token_counts = token_counts or {}
+        
+        def tokens_of(key: str, value: Any) -> int:
+            count = token_counts.get(key)
+            return count if count is not None else variable_tokens(key, value)
+        
         # 确保高优先级变量一定包含
         must_include = {
             key: value
@@ -739,7 +911,7 @@ class ContextManager:
             if key in priority_keys
         }
         
-        must_include_tokens = self._estimate_tokens(must_include)
+        must_include_tokens = sum(tokens_of(key, value) for key, value in must_include.items())
         
         if must_include_tokens > token_budget:
             logger.warning(
@@ -750,36 +922,14 @@ class ContextManager:
         # 剩余可用token
         remaining_budget = token_budget - must_include_tokens
         
-        # 可选变量（非高优先级）
-        optional_vars = [
-            (key, value)
-            for key, value, _ in sorted_vars
-            if key not in priority_keys
-        ]
-        
-        if not optional_vars:
-            return must_include
-        
-        # 二分查找
-        left, right = 0, len(optional_vars)
-        best_count = 0
-        
-        while left <= right:
-            mid = (left + right) // 2
-            
-            # 尝试包含前mid个变量
-            test_vars = dict(optional_vars[:mid])
-            test_tokens = self._estimate_tokens(test_vars)
-            
-            if test_tokens <= remaining_budget:
-                best_count = mid
-                left = mid + 1
-            else:
-                right = mid - 1
-        
-        # 构建最终结果
         result = must_include.copy()
-        result.update(dict(optional_vars[:best_count]))
+        for key, value, _ in sorted_vars:
+            if key in priority_keys:
+                continue
+            tokens = tokens_of(key, value)
+            if tokens <= remaining_budget:
+                result[key] = value
+                remaining_budget -= tokens
         
         return result
     
@@ -10,8 +10,13 @@ from pathlib import Path
 import re
 import logging
 
+from ..tools.symbol_index import get_symbol_index, FUNCTION_TYPES, CLASS_TYPES
+
 logger = logging.getLogger(__name__)
 
+# 同名定义出现在多个文件时的优先顺序
+_LANGUAGE_PRIORITY = {'.py': 0, '.js': 1, '.ts': 1, '.jsx': 1, '.tsx': 1}
+
 
 class ContextSelector:
     """智能上下文选择器"""
@@ -177,73 +182,38 @@ class ContextSelector:
         func_name: str,
         exclude_files: Set[str]
     ) -> Optional[str]:
-        """查找函数定义所在文件"""
-        try:
-            # 搜索Python文件
-            for py_file in self.repo_path.rglob('*.py'):
-                if str(py_file.relative_to(self.repo_path)) in exclude_files:
-                    continue
-                
-                try:
-                    content = py_file.read_text(encoding='utf-8', errors='ignore')
-                    # 匹配函数定义
-                    if re.search(rf'def\s+{re.escape(func_name)}\s*\(', content):
-                        return str(py_file.relative_to(self.repo_path))
-                except Exception:
-                    continue
-            
-            # 搜索JavaScript/TypeScript文件
-            for js_file in list(self.repo_path.rglob('*.js')) + list(self.repo_path.rglob('*.ts')):
-                if str(js_file.relative_to(self.repo_path)) in exclude_files:
-                    continue
-                
-                try:
-                    content = js_file.read_text(encoding='utf-8', errors='ignore')
-                    # 匹配函数定义
-                    if re.search(rf'function\s+{re.escape(func_name)}\s*\(', content):
-                        return str(js_file.relative_to(self.repo_path))
-                except Exception:
-                    continue
-        
-        except Exception as e:
-            logger.debug(f"查找函数定义失败: {e}")
-        
-        return None
+        """查找函数定义所在文件（查符号索引）"""
+        return self._find_definition(func_name, FUNCTION_TYPES, exclude_files)
     
     def _find_class_definition(
         self,
         class_name: str,
         exclude_files: Set[str]
     ) -> Optional[str]:
-        """查找类定义所在文件"""
-        try:
-            # 搜索Python文件
-            for py_file in self.repo_path.rglob('*.py'):
-                if str(py_file.relative_to(self.repo_path)) in exclude_files:
-                    continue
-                
-                try:
-                    content = py_file.read_text(encoding='utf-8', errors='ignore')
-                    # 匹配类定义
-                    if re.search(rf'class\s+{re.escape(class_name)}\s*[:\(]', content):
-                        return str(py_file.relative_to(self.repo_path))
-                except Exception:
-                    continue
-            
-            # 搜索JavaScript/TypeScript文件
-            for js_file in list(self.repo_path.rglob('*.js')) + list(self.repo_path.rglob('*.ts')):
-                if str(js_file.relative_to(self.repo_path)) in exclude_files:
-                    continue
-                
-                try:
-                    content = js_file.read_text(encoding='utf-8', errors='ignore')
-                    # 匹配类定义
-                    if re.search(rf'class\s+{re.escape(class_name)}\s*[{{]', content):
-                        return str(js_file.relative_to(self.repo_path))
-                except Exception:
-                    continue
+        """查找类定义所在文件（查符号索引）"""
+        return self._find_definition(class_name, CLASS_TYPES, exclude_files)
+    
+    def _find_definition(
+        self,
+        name: str,
+        types: Set[str],
+        exclude_files: Set[str]
+    ) -> Optional[str]:
+        """
+        在符号索引中查找定义，跳过已有文件
         
+        优先Python文件，其次JavaScript/TypeScript，最后其他语言
+        """
+        try:
+            locations = get_symbol_index(self.repo_path).find_definitions(name, types=types)
         except Exception as e:
-            logger.debug(f"查找类定义失败: {e}")
+            logger.debug(f"查找定义失败: {e}")
+            return None
+        
+        for loc in sorted(locations, key=lambda l: _LANGUAGE_PRIORITY.get(Path(l.path).suffix, 2)):
+            file_path = str(Path(loc.path))
+            if file_path in exclude_files or loc.path in exclude_files:
+                continue
+            return file_path
         
         return None
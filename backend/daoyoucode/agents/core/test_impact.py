@@ -0,0 +1,204 @@
+"""
+测试影响分析
+
+根据导入关系图找出受改动影响的测试文件，验证时只运行这些测试：
+- Python：ast 解析 import / from ... import（含相对导入）
+- JavaScript/TypeScript：相对路径的 import / export from / require / import()
+- 每个文件的导入按 mtime 缓存，图的构建只重新解析变化的文件
+- 改动涉及无法分析的文件（配置、conftest.py、其他语言等）时返回 None，
+  由调用方回退到运行全部测试
+"""
+
+from pathlib import Path, PurePosixPath
+from typing import Dict, Iterable, List, Optional, Set, Tuple, Union
+import ast
+import logging
+import posixpath
+import re
+import threading
+
+from ..tools.file_inventory import get_file_inventory
+
+logger = logging.getLogger(__name__)
+
+PY_EXTENSIONS = {".py"}
+JS_EXTENSIONS = {".js", ".jsx", ".ts", ".tsx", ".mjs", ".cjs"}
+SOURCE_EXTENSIONS = PY_EXTENSIONS | JS_EXTENSIONS
+
+# 改动后无法只靠导入关系判断影响范围的文件
+_GLOBAL_FILES = {"conftest.py", "setup.py", "__main__.py"}
+
+_JS_IMPORT_RE = re.compile(
+    r"""(?:\bfrom\s*|\brequire\s*\(\s*|\bimport\s*\(\s*|\bimport\s+)['"](\.{1,2}/[^'"]+)['"]"""
+)
+_JS_RESOLVE_SUFFIXES = ["", ".ts", ".tsx", ".js", ".jsx", ".mjs", ".cjs",
+                        "/index.ts", "/index.tsx", "/index.js", "/index.jsx"]
+
+
+def is_test_file(path: str) -> bool:
+    """是否测试文件（pytest / jest / vitest 的常见命名）"""
+    name = PurePosixPath(path).name
+    if name.endswith(".py"):
+        return name.startswith("test_") or name.endswith("_test.py")
+    stem, _, ext = name.rpartition(".")
+    return ("." + ext) in JS_EXTENSIONS and (stem.endswith(".test") or stem.endswith(".spec"))
+
+
+class TestImpactAnalyzer:
+    """
+    测试影响分析器
+
+    使用示例：
+        analyzer = TestImpactAnalyzer(Path("/project"))
+        tests = analyzer.affected_tests(["pkg/core.py"])
+        if tests is None:
+            ...  # 回退到运行全部测试
+    """
+
+    __test__ = False  # 不是 pytest 测试类
+
+    def __init__(self, root: Union[str, Path]):
+        self.root = Path(root).resolve()
+        self._lock = threading.Lock()
+        # 相对路径 -> (mtime_ns, 导入的原始说明)
+        self._imports: Dict[str, Tuple[int, List[Tuple]]] = {}
+
+    def affected_tests(self, modified_files: Iterable[Union[str, Path]]) -> Optional[List[str]]:
+        """
+        找出受改动影响的测试文件
+
+        Args:
+            modified_files: 修改的文件（绝对路径或相对仓库根的路径）
+
+        Returns:
+            相对路径列表（按路径排序）；无法判断影响范围时返回 None
+        """
+        modified = []
+        for file in modified_files:
+            rel = self._relative(file)
+            if rel is None:
+                return None
+            name = PurePosixPath(rel).name
+            if PurePosixPath(rel).suffix not in SOURCE_EXTENSIONS or name in _GLOBAL_FILES:
+                return None
+            modified.append(rel)
+
+        with self._lock:
+            files, importers = self._build_graph()
+
+        if any(rel not in files for rel in modified):
+            # 删除或被忽略的文件：导入它的模块已无法解析
+            return None
+
+        seen = set(modified)
+        stack = list(modified)
+        while stack:
+            current = stack.pop()
+            for importer in importers.get(current, ()):
+                if importer not in seen:
+                    seen.add(importer)
+                    stack.append(importer)
+
+        return sorted(rel for rel in seen if is_test_file(rel))
+
+    # ========== 导入图 ==========
+
+    def _build_graph(self) -> Tuple[Set[str], Dict[str, Set[str]]]:
+        entries = get_file_inventory(self.root).files(extensions=SOURCE_EXTENSIONS)
+        files = {e.path for e in entries}
+
+        for rel in [rel for rel in self._imports if rel not in files]:
+            del self._imports[rel]
+        for entry in entries:
+            cached = self._imports.get(entry.path)
+            if cached is None or cached[0] != entry.mtime_ns:
+                self._imports[entry.path] = (entry.mtime_ns, self._parse_imports(entry))
+
+        modules = self._module_map(files)
+        importers: Dict[str, Set[str]] = {}
+        for rel, (_, specs) in self._imports.items():
+            for target in self._resolve(rel, specs, files, modules):
+                if target != rel:
+                    importers.setdefault(target, set()).add(rel)
+        return files, importers
+
+    @staticmethod
+    def _module_map(files: Set[str]) -> Dict[str, Set[str]]:
+        """模块名 -> 文件；源码根未知，所以路径的每个后缀都登记（宁可多选测试）"""
+        modules: Dict[str, Set[str]] = {}
+        for rel in files:
+            if not rel.endswith(".py"):
+                continue
+            parts = rel[:-3].split("/")
+            if parts[-1] == "__init__":
+                parts = parts[:-1]
+            for i in range(len(parts)):
+                modules.setdefault(".".join(parts[i:]), set()).add(rel)
+        return modules
+
+    def _parse_imports(self, entry) -> List[Tuple]:
+        try:
+            source = entry.abs_path.read_text(encoding="utf-8", errors="ignore")
+        except OSError:
+            return []
+
+        if entry.path.endswith(".py"):
+            try:
+                tree = ast.parse(source)
+            except (SyntaxError, ValueError):
+                return []
+            specs = []
+            for node in ast.walk(tree):
+                if isinstance(node, ast.Import):
+                    for alias in node.names:
+                        specs.append(("py", 0, alias.name, ()))
+                elif isinstance(node, ast.ImportFrom):
+                    names = tuple(alias.name for alias in node.names if alias.name != "*")
+                    specs.append(("py", node.level, node.module or "", names))
+            return specs
+
+        return [("js", 0, m.group(1), ()) for m in _JS_IMPORT_RE.finditer(source)]
+
+    @staticmethod
+    def _resolve(rel: str, specs: List[Tuple], files: Set[str], modules: Dict[str, Set[str]]) -> Set[str]:
+        targets: Set[str] = set()
+        directory = posixpath.dirname(rel)
+        for lang, level, module, names in specs:
+            if lang == "js":
+                base = posixpath.normpath(posixpath.join(directory, module))
+                for suffix in _JS_RESOLVE_SUFFIXES:
+                    if base + suffix in files:
+                        targets.add(base + suffix)
+                        break
+                continue
+
+            if level:
+                # 相对导入：按文件所在包解析为完整路径
+                package = directory.split("/") if directory else []
+                if level > 1:
+                    package = package[:len(package) - (level - 1)]
+                base = ".".join(package + ([module] if module else []))
+                candidates = [f"{base}.{n}" if base else n for n in names] + [base]
+                for name in candidates:
+                    path = name.replace(".", "/")
+                    for candidate in (path + ".py", path + "/__init__.py"):
+                        if candidate in files:
+                            targets.add(candidate)
+                continue
+
+            for name in [f"{module}.{n}" for n in names] + [module]:
+                targets.update(modules.get(name, ()))
+            # import a.b.c 也会执行 a、a.b 的 __init__
+            parts = module.split(".")
+            for i in range(1, len(parts)):
+                targets.update(t for t in modules.get(".".join(parts[:i]), ()) if t.endswith("__init__.py"))
+        return targets
+
+    def _relative(self, file: Union[str, Path]) -> Optional[str]:
+        path = Path(file)
+        if path.is_absolute():
+            try:
+                path = path.resolve().relative_to(self.root)
+            except ValueError:
+                return None
+        return path.as_posix()
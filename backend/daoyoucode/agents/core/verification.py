@@ -3,15 +3,29 @@
 
 不信任子Agent的输出，通过独立验证确保结果可靠性。
 灵感来自daoyouCodePilot的验证机制。
+
+验证按改动范围进行，各项检查并发执行、逐项返回结果：
+- 诊断：修改文件的语法检查 + LSP诊断（服务器已安装时）
+- 静态检查：对修改文件运行 lint / 类型检查（工具已安装时）
+- 构建：运行构建命令
+- 测试：按导入关系只选出受影响的测试，分组并行运行
 """
 
 import asyncio
+import inspect
 import logging
-from dataclasses import dataclass
+import os
+import shlex
+import shutil
+import subprocess
+import time
+from dataclasses import dataclass, field, asdict
 from pathlib import Path
-from typing import Dict, List, Optional, Any
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, Any, Tuple
 from enum import Enum
 
+from ..tools.process_stream import run_streaming, TestProgressParser
+
 logger = logging.getLogger(__name__)
 
 
@@ -23,6 +37,24 @@ class VerificationLevel(Enum):
     STRICT = "strict"       # 严格验证（语法+构建+测试）
 
 
+# 按检查类型的外部工具：(适用扩展名, 可执行文件, 参数)；未安装时跳过
+EXTERNAL_CHECKERS = {
+    'lint': [
+        ({'.py'}, 'ruff', ['check', '--quiet']),
+        ({'.js', '.jsx', '.ts', '.tsx'}, 'eslint', []),
+    ],
+    'typecheck': [
+        ({'.py'}, 'mypy', ['--follow-imports=silent', '--no-error-summary', '--hide-error-context']),
+    ],
+}
+
+# 可以直接把测试文件作为参数的测试命令（其他命令总是运行全部测试）
+FILE_ARG_TEST_RUNNERS = ('pytest', 'py.test', 'jest', 'vitest', 'mocha')
+
+# 错误信息中保留的输出长度（取末尾）
+MAX_OUTPUT_CHARS = 4000
+
+
 @dataclass
 class VerificationResult:
     """验证结果"""
@@ -35,7 +67,7 @@ class VerificationResult:
     errors: List[str] = None              # 错误列表
     warnings: List[str] = None            # 警告列表
     details: Dict[str, Any] = None        # 详细信息
-    
+
     def __post_init__(self):
         if self.errors is None:
             self.errors = []
@@ -45,76 +77,126 @@ class VerificationResult:
             self.details = {}
 
 
+@dataclass
+class CheckResult:
+    """单项检查的结果（verify_stream 逐项返回）"""
+    name: str                             # 如 "diagnostics:pkg/a.py"、"lint:ruff"、"tests[1/2]"
+    kind: str                             # file_check / diagnostics / lint / typecheck / build / tests
+    passed: bool
+    hard: bool = True                     # 失败时是否判定验证不通过（否则只记为警告）
+    cancelled: bool = False               # 因 fail_fast 被取消
+    duration: float = 0.0
+    errors: List[str] = field(default_factory=list)
+    warnings: List[str] = field(default_factory=list)
+    details: Dict[str, Any] = field(default_factory=dict)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+# 检查类型 -> VerificationResult 上的标志
+_KIND_FLAGS = {
+    'file_check': 'file_check_passed',
+    'diagnostics': 'diagnostics_passed',
+    'lint': 'diagnostics_passed',
+    'typecheck': 'diagnostics_passed',
+    'build': 'build_passed',
+    'tests': 'tests_passed',
+}
+
+# 计划中的一项检查：(名称, 类型, 失败是否致命, 执行函数)
+_PlannedCheck = Tuple[str, str, bool, Callable[[], Awaitable[Dict[str, Any]]]]
+
+
 class VerificationManager:
     """
     验证管理器
-    
+
     不信任子Agent的输出，通过独立验证确保结果可靠性：
     1. 运行LSP诊断（语法、类型检查）
     2. 运行构建命令
     3. 运行测试套件
     4. 检查修改的文件
     """
-    
+
     _instance = None
-    
+
     def __new__(cls):
         """单例模式"""
         if cls._instance is None:
             cls._instance = super().__new__(cls)
             cls._instance._initialized = False
         return cls._instance
-    
+
     def __init__(self):
         """初始化验证管理器"""
         if self._initialized:
             return
-        
+
         self.project_root: Optional[Path] = None
         self.build_command: Optional[str] = None
         self.test_command: Optional[str] = None
         self.timeout: int = 300  # 5分钟超时
-        
+        self.max_workers: int = os.cpu_count() or 4
+        self.use_lsp: bool = True
+        self.lsp_wait_time: float = 2.0
+        self.select_tests: bool = True
+        self._test_analyzer = None
+
         self._initialized = True
         logger.info("验证管理器初始化完成")
-    
+
     def configure(
         self,
         project_root: Path,
         build_command: Optional[str] = None,
         test_command: Optional[str] = None,
-        timeout: int = 300
+        timeout: int = 300,
+        max_workers: Optional[int] = None,
+        use_lsp: bool = True,
+        select_tests: bool = True
     ):
         """
         配置验证管理器
-        
+
         Args:
             project_root: 项目根目录
             build_command: 构建命令（如 "npm run build", "python -m build"）
             test_command: 测试命令（如 "npm test", "pytest"）
             timeout: 超时时间（秒）
+            max_workers: 同时执行的检查数上限（默认CPU核数）
+            use_lsp: 是否使用LSP诊断（服务器已安装时）
+            select_tests: 是否只运行受改动影响的测试
         """
         self.project_root = project_root
         self.build_command = build_command
         self.test_command = test_command
         self.timeout = timeout
-        
+        self.max_workers = max(1, max_workers or os.cpu_count() or 4)
+        self.use_lsp = use_lsp
+        self.select_tests = select_tests
+        self._test_analyzer = None
+
         logger.info(f"验证管理器配置完成: root={project_root}, build={build_command}, test={test_command}")
-    
+
     async def verify(
         self,
         result: Dict[str, Any],
         level: VerificationLevel = VerificationLevel.STANDARD,
-        modified_files: Optional[List[Path]] = None
+        modified_files: Optional[List[Path]] = None,
+        fail_fast: bool = False,
+        on_check: Optional[Callable[[CheckResult], Any]] = None
     ) -> VerificationResult:
         """
         验证执行结果
-        
+
         Args:
             result: 执行结果
             level: 验证级别
             modified_files: 修改的文件列表
-        
+            fail_fast: 出现第一个致命失败时取消其余检查
+            on_check: 每项检查完成时的回调（可以是协程函数）
+
         Returns:
             验证结果
         """
@@ -124,189 +206,444 @@ class VerificationManager:
                 level=level,
                 details={'message': '跳过验证'}
             )
-        
+
         logger.info(f"开始验证，级别: {level.value}")
-        
+
         verification = VerificationResult(passed=True, level=level)
-        
-        # 1. 运行诊断（所有级别都需要）
-        if level in [VerificationLevel.BASIC, VerificationLevel.STANDARD, VerificationLevel.STRICT]:
-            diagnostics_result = await self._run_diagnostics(modified_files)
-            verification.diagnostics_passed = diagnostics_result['passed']
-            if not diagnostics_result['passed']:
-                verification.passed = False
-                verification.errors.extend(diagnostics_result.get('errors', []))
-            verification.details['diagnostics'] = diagnostics_result
-        
-        # 2. 运行构建（标准和严格级别）
-        if level in [VerificationLevel.STANDARD, VerificationLevel.STRICT]:
-            if self.build_command:
-                build_result = await self._run_build()
-                verification.build_passed = build_result['passed']
-                if not build_result['passed']:
-                    verification.passed = False
-                    verification.errors.extend(build_result.get('errors', []))
-                verification.details['build'] = build_result
-            else:
-                verification.warnings.append("未配置构建命令，跳过构建验证")
-        
-        # 3. 运行测试（严格级别）
-        if level == VerificationLevel.STRICT:
-            if self.test_command:
-                test_result = await self._run_tests()
-                verification.tests_passed = test_result['passed']
-                if not test_result['passed']:
-                    verification.passed = False
-                    verification.errors.extend(test_result.get('errors', []))
-                verification.details['tests'] = test_result
-            else:
-                verification.warnings.append("未配置测试命令，跳过测试验证")
-        
-        # 4. 检查修改的文件
-        if modified_files:
-            file_check_result = await self._check_modified_files(modified_files)
-            verification.file_check_passed = file_check_result['passed']
-            if not file_check_result['passed']:
-                verification.passed = False
-                verification.errors.extend(file_check_result.get('errors', []))
-            verification.details['file_check'] = file_check_result
-        
+
+        async for check in self.verify_stream(level, modified_files, fail_fast=fail_fast):
+            self._merge_check(verification, check)
+            if on_check is not None:
+                ret = on_check(check)
+                if inspect.isawaitable(ret):
+                    await ret
+
         logger.info(f"验证完成: passed={verification.passed}, errors={len(verification.errors)}")
         return verification
-    
-    async def _run_diagnostics(self, files: Optional[List[Path]] = None) -> Dict[str, Any]:
+
+    async def verify_stream(
+        self,
+        level: VerificationLevel = VerificationLevel.STANDARD,
+        modified_files: Optional[List[Path]] = None,
+        fail_fast: bool = False
+    ) -> AsyncIterator[CheckResult]:
         """
-        运行LSP诊断
-        
-        检查语法错误、类型错误等
+        并发执行各项检查，按完成顺序逐项返回结果
+
+        Args:
+            level: 验证级别
+            modified_files: 修改的文件列表（决定诊断、静态检查和测试的范围）
+            fail_fast: 出现第一个致命失败时取消其余检查（被取消的检查以 cancelled=True 返回）
         """
+        if level == VerificationLevel.NONE:
+            return
+
+        files = self._resolve_files(modified_files)
+        queue: asyncio.Queue = asyncio.Queue()
+        semaphore = asyncio.Semaphore(self.max_workers)
+        tasks: Dict[asyncio.Task, Tuple[str, str]] = {}
+        outstanding = 0     # 已启动、结果尚未取出的任务数
+
+        async def run_check(name: str, kind: str, hard: bool, func) -> CheckResult:
+            async with semaphore:
+                start = time.monotonic()
+                try:
+                    data = await func()
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logger.error(f"检查 {name} 失败: {e}")
+                    data = {'passed': False, 'errors': [f"{name} 失败: {e}"], 'warnings': []}
+                return CheckResult(
+                    name=name,
+                    kind=kind,
+                    passed=data['passed'],
+                    hard=hard,
+                    duration=round(time.monotonic() - start, 3),
+                    errors=list(data.get('errors', [])),
+                    warnings=list(data.get('warnings', [])),
+                    details=data.get('details', {}),
+                )
+
+        def spawn(planned: _PlannedCheck):
+            nonlocal outstanding
+            name, kind, hard, func = planned
+            task = asyncio.ensure_future(run_check(name, kind, hard, func))
+            tasks[task] = (name, kind)
+            outstanding += 1
+            task.add_done_callback(queue.put_nowait)
+
+        for planned in self._plan_checks(level, files):
+            spawn(planned)
+
+        # 测试的选择需要构建导入图，与其他检查并行进行
+        planner = None
+        if level == VerificationLevel.STRICT:
+            async def plan_tests():
+                for planned in await self._plan_tests(files, fail_fast):
+                    spawn(planned)
+            planner = asyncio.ensure_future(plan_tests())
+            outstanding += 1
+            planner.add_done_callback(queue.put_nowait)
+
+        reported = set()
+        stopped = False
         try:
-            logger.info("运行LSP诊断...")
-            
-            # 这里应该调用实际的LSP诊断工具
-            # 示例：使用pylint、mypy、eslint等
-            
-            # 模拟诊断结果
-            errors = []
-            warnings = []
-            
-            # TODO: 实际实现应该调用LSP工具
-            # 例如：
-            # if files:
-            #     for file in files:
-            #         result = await self._run_lsp_diagnostic(file)
-            #         errors.extend(result['errors'])
-            #         warnings.extend(result['warnings'])
-            
-            return {
-                'passed': len(errors) == 0,
-                'errors': errors,
-                'warnings': warnings,
-                'details': {
-                    'files_checked': len(files) if files else 0,
-                }
-            }
-        
+            while outstanding:
+                task = await queue.get()
+                outstanding -= 1
+                if task is planner:
+                    if not task.cancelled() and task.exception() is not None:
+                        raise task.exception()
+                    continue
+                check = task.result()
+                reported.add(task)
+                yield check
+                if fail_fast and check.hard and not check.passed:
+                    stopped = True
+                    break
+        finally:
+            pending = [t for t in [*tasks, planner] if t is not None and not t.done()]
+            for t in pending:
+                t.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+
+        if stopped:
+            for task, (name, kind) in tasks.items():
+                if task in reported:
+                    continue
+                if task.cancelled():
+                    yield CheckResult(name=name, kind=kind, passed=False, cancelled=True)
+                else:
+                    yield task.result()     # 与失败同时完成的检查
+
+    def _merge_check(self, verification: VerificationResult, check: CheckResult):
+        """把单项检查结果合并到总结果"""
+        summary = verification.details.setdefault(
+            check.kind, {'passed': True, 'errors': [], 'warnings': [], 'checks': []}
+        )
+        summary['checks'].append({
+            'name': check.name,
+            'passed': check.passed,
+            'cancelled': check.cancelled,
+            'duration': check.duration,
+            'details': check.details,
+        })
+        if check.cancelled:
+            verification.details.setdefault('cancelled', []).append(check.name)
+            return
+
+        summary['warnings'].extend(check.warnings)
+        verification.warnings.extend(check.warnings)
+        if check.passed:
+            return
+        if check.hard:
+            summary['passed'] = False
+            summary['errors'].extend(check.errors)
+            verification.passed = False
+            verification.errors.extend(check.errors)
+            flag = _KIND_FLAGS.get(check.kind)
+            if flag:
+                setattr(verification, flag, False)
+        else:
+            summary['warnings'].extend(check.errors)
+            verification.warnings.extend(check.errors)
+
+    # ========== 计划 ==========
+
+    def _plan_checks(self, level: VerificationLevel, files: List[Path]) -> List[_PlannedCheck]:
+        """按验证级别和改动文件生成检查（测试另行计划）"""
+        checks: List[_PlannedCheck] = []
+
+        # 1. 检查修改的文件
+        if files:
+            checks.append(('file_check', 'file_check', True,
+                           lambda: self._check_modified_files(files)))
+
+        # 2. 诊断（所有级别）：每个文件一项
+        existing = [f for f in files if f.is_file()]
+        if existing:
+            for file in existing:
+                checks.append((f"diagnostics:{self._display_path(file)}", 'diagnostics', True,
+                               lambda file=file: self._diagnose_file(file)))
+        else:
+            checks.append(('diagnostics', 'diagnostics', True, self._no_files_diagnostics))
+
+        if level not in (VerificationLevel.STANDARD, VerificationLevel.STRICT):
+            return checks
+
+        # 3. lint / 类型检查：每个工具对适用的文件运行一次；严格级别下失败才致命
+        for kind, checkers in EXTERNAL_CHECKERS.items():
+            for extensions, executable, args in checkers:
+                targets = [f for f in existing if f.suffix in extensions]
+                if not targets:
+                    continue
+                command = self._find_executable(executable)
+                if command is None:
+                    continue
+                checks.append((f"{kind}:{executable}", kind, level == VerificationLevel.STRICT,
+                               lambda cmd=[command, *args, *map(str, targets)], kind=kind:
+                               self._run_checker(kind, cmd)))
+
+        # 4. 构建
+        if self.build_command:
+            checks.append(('build', 'build', True, self._run_build))
+        else:
+            checks.append(('build', 'build', False,
+                           lambda: self._skipped("未配置构建命令，跳过构建验证")))
+
+        return checks
+
+    async def _plan_tests(self, files: List[Path], fail_fast: bool = False) -> List[_PlannedCheck]:
+        """选择受影响的测试并分组，每组一项检查（fail_fast 时每组出现失败立即结束）"""
+        if not self.test_command:
+            return [('tests', 'tests', False, lambda: self._skipped("未配置测试命令，跳过测试验证"))]
+
+        test_files = None
+        if files and self.select_tests and self._accepts_test_files():
+            test_files = await asyncio.to_thread(self._select_tests, files)
+
+        if test_files is None:
+            return [('tests', 'tests', True, lambda: self._run_tests(None, fail_fast))]
+        if not test_files:
+            return [('tests', 'tests', True, self._no_affected_tests)]
+
+        groups = min(self.max_workers, len(test_files))
+        chunks = [test_files[i::groups] for i in range(groups)]
+        return [
+            (f"tests[{i + 1}/{groups}]", 'tests', True, lambda chunk=chunk: self._run_tests(chunk, fail_fast))
+            for i, chunk in enumerate(chunks)
+        ]
+
+    def _select_tests(self, files: List[Path]) -> Optional[List[str]]:
+        """受影响的测试文件；无法判断时返回None（运行全部测试）"""
+        from .test_impact import TestImpactAnalyzer
+        if self._test_analyzer is None:
+            self._test_analyzer = TestImpactAnalyzer(self._root())
+        try:
+            return self._test_analyzer.affected_tests(files)
         except Exception as e:
-            logger.error(f"诊断失败: {e}")
-            return {
-                'passed': False,
-                'errors': [f"诊断失败: {str(e)}"],
-                'warnings': [],
-            }
-    
-    async def _run_build(self) -> Dict[str, Any]:
-        """运行构建命令"""
+            logger.warning(f"测试影响分析失败，运行全部测试: {e}")
+            return None
+
+    def _accepts_test_files(self) -> bool:
         try:
-            logger.info(f"运行构建命令: {self.build_command}")
-            
-            # 运行构建命令
-            process = await asyncio.create_subprocess_shell(
-                self.build_command,
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE,
-                cwd=self.project_root
-            )
-            
-            try:
-                stdout, stderr = await asyncio.wait_for(
-                    process.communicate(),
-                    timeout=self.timeout
-                )
-            except asyncio.TimeoutError:
-                process.kill()
-                return {
-                    'passed': False,
-                    'errors': [f"构建超时（{self.timeout}秒）"],
-                    'warnings': [],
-                }
-            
-            passed = process.returncode == 0
-            
-            return {
-                'passed': passed,
-                'errors': [] if passed else [stderr.decode('utf-8', errors='ignore')],
-                'warnings': [],
-                'details': {
-                    'returncode': process.returncode,
-                    'stdout': stdout.decode('utf-8', errors='ignore'),
-                }
-            }
-        
+            tokens = shlex.split(self.test_command)
+        except ValueError:
+            return False
+        names = {Path(t).name for t in tokens[:3]}
+        return any(runner in names for runner in FILE_ARG_TEST_RUNNERS)
+
+    # ========== 检查实现 ==========
+
+    async def _no_files_diagnostics(self) -> Dict[str, Any]:
+        return {
+            'passed': True,
+            'errors': [],
+            'warnings': [],
+            'details': {'files_checked': 0},
+        }
+
+    async def _no_affected_tests(self) -> Dict[str, Any]:
+        return {
+            'passed': True,
+            'errors': [],
+            'warnings': [],
+            'details': {'selected': [], 'message': '没有受改动影响的测试'},
+        }
+
+    async def _skipped(self, message: str) -> Dict[str, Any]:
+        return {'passed': True, 'errors': [], 'warnings': [message], 'details': {'skipped': True}}
+
+    async def _diagnose_file(self, file: Path) -> Dict[str, Any]:
+        """
+        诊断单个文件
+
+        Python 文件先做语法检查（不依赖外部工具），通过后再取LSP诊断
+        """
+        display = self._display_path(file)
+        details = {'file': display, 'sources': []}
+
+        if file.suffix == '.py':
+            details['sources'].append('syntax')
+            error = await asyncio.to_thread(_check_python_syntax, file)
+            if error:
+                return {'passed': False, 'errors': [f"{display}:{error}"], 'warnings': [], 'details': details}
+
+        errors: List[str] = []
+        warnings: List[str] = []
+        if self.use_lsp:
+            items = await self._lsp_diagnostics(file)
+            if items is not None:
+                details['sources'].append('lsp')
+                for item in items:
+                    start = item.get('range', {}).get('start', {})
+                    message = (f"{display}:{start.get('line', 0) + 1}:{start.get('character', 0) + 1}: "
+                               f"{item.get('message', '')}")
+                    severity = item.get('severity', 1)
+                    if severity == 1:
+                        errors.append(message)
+                    elif severity == 2:
+                        warnings.append(message)
+
+        return {'passed': not errors, 'errors': errors, 'warnings': warnings, 'details': details}
+
+    async def _lsp_diagnostics(self, file: Path) -> Optional[List[Dict[str, Any]]]:
+        """LSP诊断；没有可用的服务器时返回None"""
+        from ..tools.lsp_tools import get_lsp_manager
+
+        manager = get_lsp_manager()
+        server_config = manager.find_server_for_extension(file.suffix)
+        if server_config is None:
+            return None
+
+        root = str(self._root())
+        try:
+            client = await manager.get_client(root, server_config)
+        except Exception as e:
+            logger.debug(f"LSP服务器启动失败，跳过LSP诊断: {e}")
+            return None
+        try:
+            result = await client.diagnostics(str(file), wait_time=self.lsp_wait_time)
+            return result.get('items', [])
         except Exception as e:
-            logger.error(f"构建失败: {e}")
+            logger.debug(f"LSP诊断失败 {file}: {e}")
+            return None
+        finally:
+            manager.release_client(root, server_config.id)
+
+    async def _run_checker(self, kind: str, command: List[str]) -> Dict[str, Any]:
+        """运行 lint / 类型检查工具"""
+        logger.info(f"运行{kind}: {command[0]}")
+        run = await run_streaming(command, cwd=self._root(), timeout=self.timeout, shell=False)
+        if run.timed_out:
+            return {'passed': False, 'errors': [f"{kind} 超时（{self.timeout}秒）"], 'warnings': []}
+
+        passed = run.returncode == 0
+        return {
+            'passed': passed,
+            'errors': [] if passed else [line for line in run.output.splitlines() if line.strip()][:100],
+            'warnings': [],
+            'details': {'returncode': run.returncode, 'command': command[0]},
+        }
+
+    async def _run_build(self) -> Dict[str, Any]:
+        """运行构建命令"""
+        logger.info(f"运行构建命令: {self.build_command}")
+        run = await run_streaming(self.build_command, cwd=self._root(), timeout=self.timeout)
+        if run.timed_out:
             return {
                 'passed': False,
-                'errors': [f"构建失败: {str(e)}"],
+                'errors': [f"构建超时（{self.timeout}秒）"],
                 'warnings': [],
             }
-    
-    async def _run_tests(self) -> Dict[str, Any]:
-        """运行测试套件"""
-        try:
-            logger.info(f"运行测试命令: {self.test_command}")
-            
-            # 运行测试命令
-            process = await asyncio.create_subprocess_shell(
-                self.test_command,
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE,
-                cwd=self.project_root
-            )
-            
-            try:
-                stdout, stderr = await asyncio.wait_for(
-                    process.communicate(),
-                    timeout=self.timeout
-                )
-            except asyncio.TimeoutError:
-                process.kill()
-                return {
-                    'passed': False,
-                    'errors': [f"测试超时（{self.timeout}秒）"],
-                    'warnings': [],
-                }
-            
-            passed = process.returncode == 0
-            
-            return {
-                'passed': passed,
-                'errors': [] if passed else [stderr.decode('utf-8', errors='ignore')],
-                'warnings': [],
-                'details': {
-                    'returncode': process.returncode,
-                    'stdout': stdout.decode('utf-8', errors='ignore'),
-                }
+
+        passed = run.returncode == 0
+        return {
+            'passed': passed,
+            'errors': [] if passed else [_tail(run.stderr or run.stdout)],
+            'warnings': [],
+            'details': {
+                'returncode': run.returncode,
+                'stdout': run.stdout,
+                'output_truncated': run.truncated,
             }
-        
-        except Exception as e:
-            logger.error(f"测试失败: {e}")
+        }
+
+    async def _run_tests(
+        self,
+        test_files: Optional[List[str]] = None,
+        stop_on_failure: bool = False
+    ) -> Dict[str, Any]:
+        """
+        运行测试（流式读取输出并解析进度）
+
+        Args:
+            test_files: 只运行这些测试文件（相对项目根）；None 时运行全部测试
+            stop_on_failure: 出现第一个失败时立即结束
+        """
+        command = self.test_command
+        if test_files:
+            command = f"{command} {_join_args(test_files)}"
+        logger.info(f"运行测试命令: {command}")
+
+        framework = self._test_framework()
+        parser = TestProgressParser(framework) if framework else None
+        run = await run_streaming(
+            command, cwd=self._root(), timeout=self.timeout,
+            parser=parser, stop_on_failure=stop_on_failure and parser is not None
+        )
+        if run.timed_out:
             return {
                 'passed': False,
-                'errors': [f"测试失败: {str(e)}"],
+                'errors': [f"测试超时（{self.timeout}秒）"],
                 'warnings': [],
             }
-    
+
+        passed = run.returncode == 0 and not run.stopped_early
+        if passed:
+            errors = []
+        elif parser is not None and parser.failure_detected:
+            errors = [parser.format_summary()]
+        else:
+            # pytest 把失败信息输出到 stdout
+            errors = [_tail(run.output)]
+        return {
+            'passed': passed,
+            'errors': errors,
+            'warnings': [],
+            'details': {
+                'returncode': run.returncode,
+                'selected': test_files,
+                'stdout': run.stdout,
+                'progress': run.progress,
+                'stopped_early': run.stopped_early,
+                'output_truncated': run.truncated,
+            }
+        }
+
+    def _test_framework(self) -> Optional[str]:
+        """按测试命令推断输出格式"""
+        command = self.test_command or ''
+        if 'pytest' in command or 'py.test' in command:
+            return 'pytest'
+        if 'unittest' in command:
+            return 'unittest'
+        if 'jest' in command or 'vitest' in command:
+            return 'jest'
+        return None
+
+    # ========== 辅助方法 ==========
+
+    def _root(self) -> Path:
+        return Path(self.project_root or Path.cwd()).resolve()
+
+    def _resolve_files(self, files: Optional[List[Path]]) -> List[Path]:
+        """相对路径按项目根解析，去重并保持顺序"""
+        root = self._root()
+        resolved = []
+        for file in files or []:
+            path = Path(file)
+            path = path if path.is_absolute() else root / path
+            if path not in resolved:
+                resolved.append(path)
+        return resolved
+
+    def _display_path(self, file: Path) -> str:
+        try:
+            return file.resolve().relative_to(self._root()).as_posix()
+        except ValueError:
+            return str(file)
+
+    def _find_executable(self, name: str) -> Optional[str]:
+        """PATH 中或项目 node_modules/.bin 下的可执行文件"""
+        found = shutil.which(name)
+        if found:
+            return found
+        local = self._root() / 'node_modules' / '.bin'
+        return shutil.which(name, path=str(local)) if local.is_dir() else None
+
     async def _check_modified_files(self, files: List[Path]) -> Dict[str, Any]:
         """
         检查修改的文件
@@ -359,6 +696,32 @@ class VerificationManager:
             }
 
 
+def _check_python_syntax(file: Path) -> Optional[str]:
+    """编译检查Python语法，返回 "行号: 错误" 或 None"""
+    try:
+        source = file.read_bytes()
+    except OSError as e:
+        return f" 无法读取: {e}"
+    try:
+        compile(source, str(file), 'exec', dont_inherit=True)
+    except SyntaxError as e:
+        return f"{e.lineno or 0}: SyntaxError: {e.msg}"
+    except ValueError as e:
+        return f" {e}"
+    return None
+
+
+def _tail(text: str, limit: int = MAX_OUTPUT_CHARS) -> str:
+    text = text.strip()
+    return text if len(text) <= limit else '...' + text[-limit:]
+
+
+def _join_args(args: List[str]) -> str:
+    if os.name == 'nt':
+        return subprocess.list2cmdline(args)
+    return ' '.join(shlex.quote(a) for a in args)
+
+
 def get_verification_manager() -> VerificationManager:
     """获取验证管理器单例"""
     return VerificationManager()
@@ -16,6 +16,9 @@ from .core.timeout_handler import execute_with_timeout_handling, should_enable_t
 
 logger = logging.getLogger(__name__)
 
+# 按问检索预取的时间预算（秒）：超出后放弃预取，不阻塞本轮回答
+SEMANTIC_PREFETCH_BUDGET = 3.0
+
 
 async def execute_skill(
     skill_name: str,
@@ -241,25 +244,7 @@ async def _execute_skill_internal(
         # 按问检索（Cursor 同级）：若 Skill 含 semantic_code_search 且用户有输入，预取相关代码块并注入 context
         skill_tools = getattr(skill, "tools", None) or []
         if "semantic_code_search" in skill_tools and user_input and user_input.strip():
-            
-            import time
-            start_time = time.time()
-            
-            try:
-                sem_tool = registry.get_tool("semantic_code_search")
-                if sem_tool:
-                    # 正常执行，不设置超时（首次建立索引可能需要较长时间）
-                    res = await sem_tool.execute(query=user_input.strip()[:500], top_k=6, repo_path=".")
-                    
-                    elapsed = time.time() - start_time
-                    logger.info(f"语义代码检索完成，耗时: {elapsed:.2f}秒")
-                    
-                    if res and getattr(res, "content", None) and res.content:
-                        context["semantic_code_chunks"] = (res.content[:5000] + "…") if len(res.content) > 5000 else res.content
-                        logger.info("按问检索: 已注入 semantic_code_chunks")
-            except Exception as e:
-                elapsed = time.time() - start_time
-                logger.warning(f"按问检索预取失败（耗时{elapsed:.2f}秒）: {e}")
+            await _prefetch_semantic_chunks(registry, user_input.strip()[:500], context)
         
         # 5. 执行
         result = await orchestrator.execute(skill, user_input, context)
@@ -399,6 +384,52 @@ def get_task_stats() -> Dict[str, Any]:
     return task_manager.get_stats()
 
 
+async def _prefetch_semantic_chunks(registry, query: str, context: Dict[str, Any]):
+    """
+    按问检索预取，结果注入 context["semantic_code_chunks"]
+    
+    代码库索引在后台线程中构建（首次调用时启动）：索引已就绪时做语义检索，
+    否则直接用关键词检索；两者都受 SEMANTIC_PREFETCH_BUDGET 限制，超时即放弃。
+    """
+    import asyncio
+    import time
+    from .memory.codebase_warmup import start_index_warmup
+    
+    sem_tool = registry.get_tool("semantic_code_search")
+    if not sem_tool:
+        return
+    
+    start_time = time.time()
+    try:
+        repo_path = sem_tool.resolve_path(".")
+        warmup = start_index_warmup(repo_path)
+        if warmup.ready:
+            res = await asyncio.wait_for(
+                sem_tool.execute(query=query, top_k=6, repo_path="."),
+                timeout=SEMANTIC_PREFETCH_BUDGET
+            )
+            content = res.content if res and res.success else None
+        else:
+            logger.info(f"代码库索引未就绪（{warmup.status()['phase'] or warmup.state}），预取使用关键词检索")
+            results = await asyncio.wait_for(
+                sem_tool.keyword_search(repo_path, query, top_k=6),
+                timeout=SEMANTIC_PREFETCH_BUDGET
+            )
+            content = sem_tool.format_results(results, enable_lsp=False).content if results else None
+        
+        elapsed = time.time() - start_time
+        logger.info(f"语义代码检索完成，耗时: {elapsed:.2f}秒")
+        
+        if content:
+            context["semantic_code_chunks"] = (content[:5000] + "…") if len(content) > 5000 else content
+            logger.info("按问检索: 已注入 semantic_code_chunks")
+    except asyncio.TimeoutError:
+        logger.info(f"按问检索预取超过 {SEMANTIC_PREFETCH_BUDGET} 秒，跳过")
+    except Exception as e:
+        elapsed = time.time() - start_time
+        logger.warning(f"按问检索预取失败（耗时{elapsed:.2f}秒）: {e}")
+
+
 def _truncate_description(text: str, max_length: int = 500) -> str:
     """
     智能截断描述文本
@@ -112,3 +112,16 @@ def warmup_lsp_async():
         # 没有运行的事件循环
         logger.debug("没有运行的事件循环，跳过LSP预热")
 
+
+def warmup_embedding_model():
+    """
+    预热向量检索器（会话开始时调用）
+
+    本地模式下模型在后台线程加载，不阻塞调用方；
+    API 模式和禁用模式只是创建单例。
+    """
+    try:
+        from .memory.vector_retriever_factory import get_retriever_singleton
+        get_retriever_singleton()
+    except Exception as e:
+        logger.debug(f"向量检索器预热失败: {e}")
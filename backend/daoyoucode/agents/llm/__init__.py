@@ -14,8 +14,23 @@ from .exceptions import (
     SkillNotFoundError,
     SkillExecutionError
 )
-from .client_manager import LLMClientManager, get_client_manager
-from .clients.unified import UnifiedLLMClient
+
+# 客户端依赖 httpx，导入较慢：首次访问时再导入（PEP 562）
+_LAZY_EXPORTS = {
+    'LLMClientManager': '.client_manager',
+    'get_client_manager': '.client_manager',
+    'UnifiedLLMClient': '.clients.unified',
+}
+
+
+def __getattr__(name):
+    module = _LAZY_EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    import importlib
+    value = getattr(importlib.import_module(module, __name__), name)
+    globals()[name] = value
+    return value
 
 __all__ = [
     # 基础类
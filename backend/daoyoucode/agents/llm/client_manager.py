@@ -126,13 +126,19 @@ class LLMClientManager:
         
         return selected_key
     
-    def get_client(self, model: str, provider: Optional[str] = None) -> UnifiedLLMClient:
+    def get_client(
+        self,
+        model: str,
+        provider: Optional[str] = None,
+        http_client: Optional[httpx.AsyncClient] = None
+    ) -> UnifiedLLMClient:
         """
         获取客户端（轻量级对象）
         
         Args:
             model: 模型名称
             provider: 提供商名称（可选，自动推断）
+            http_client: 使用的 HTTP 客户端（可选，在其他事件循环上调用时传入该循环的连接池）
         
         Returns:
             UnifiedLLMClient实例
@@ -152,7 +158,7 @@ class LLMClientManager:
         
         # 创建轻量级客户端（共享HTTP客户端）
         return UnifiedLLMClient(
-            http_client=self.http_client,  # 共享连接池
+            http_client=http_client or self.http_client,  # 共享连接池
             api_key=api_key,
             base_url=config['base_url'],
             model=model
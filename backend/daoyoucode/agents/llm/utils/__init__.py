@@ -10,6 +10,15 @@ from .circuit_breaker import (
     get_circuit_breaker_manager
 )
 from .fallback import FallbackStrategy, get_fallback_strategy
+from .tokenizer import (
+    Tokenizer,
+    HeuristicTokenizer,
+    TiktokenTokenizer,
+    get_tokenizer,
+    set_tokenizer,
+    count_tokens,
+    count_value_tokens,
+)
 
 __all__ = [
     'RateLimiter',
@@ -20,4 +29,11 @@ __all__ = [
     'get_circuit_breaker_manager',
     'FallbackStrategy',
     'get_fallback_strategy',
+    'Tokenizer',
+    'HeuristicTokenizer',
+    'TiktokenTokenizer',
+    'get_tokenizer',
+    'set_tokenizer',
+    'count_tokens',
+    'count_value_tokens',
 ]
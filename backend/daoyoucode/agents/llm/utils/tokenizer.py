@@ -0,0 +1,203 @@
+"""
+Token计数
+
+可替换的分词器层，供上下文预算、RepoMap 等按 token 控制长度的地方共用：
+- TiktokenTokenizer：真实 BPE（需要 tiktoken，可选依赖：pip install daoyoucode[tokenizer]；
+  可用 DAOYOUCODE_BPE_FILE 指定本地词表文件，不联网）
+- HeuristicTokenizer：无依赖的近似计数，按 BPE 预分词规则切分，
+  中文按字计数（旧的「4 字符 ≈ 1 token」会把中文低估约 4 倍）
+
+选择方式（环境变量 DAOYOUCODE_TOKENIZER）：
+- auto（默认）：指定了本地词表，或 tiktoken 的词表已在本地缓存时用 BPE，
+  否则用近似计数（auto 模式从不联网下载词表）
+- heuristic：总是用近似计数
+- tiktoken 或 tiktoken:<encoding>：使用指定编码（默认 cl100k_base）
+"""
+
+from abc import ABC, abstractmethod
+from typing import Any, Optional
+import hashlib
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ENCODING = "cl100k_base"
+
+# cl100k_base 的预分词正则（加载本地词表时使用）
+CL100K_PATTERN = (
+    r"""(?i:'s|'t|'re|'ve|'m|'ll|'d)|[^\r\n\p{L}\p{N}]?\p{L}+|\p{N}{1,3}|"""
+    r""" ?[^\s\p{L}\p{N}]+[\r\n]*|\s*[\r\n]+|\s+(?!\S)|\s+"""
+)
+
+# 近似计数的切分规则：CJK 字符 / 拉丁字母串 / 1-3 位数字 / 空白 / 其他符号串
+_CJK = r"\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff\uff00-\uffef"
+_PIECE_RE = re.compile(
+    rf"(?P<cjk>[{_CJK}]+)|(?P<word>[A-Za-z]+)|(?P<num>\d{{1,3}})"
+    rf"|(?P<space>\s+)|(?P<other>[^\sA-Za-z\d{_CJK}]+)"
+)
+
+
+class Tokenizer(ABC):
+    """分词器接口：只需要计数"""
+
+    name = "base"
+
+    @abstractmethod
+    def count(self, text: str) -> int:
+        """计算文本的 token 数"""
+        pass
+
+
+class HeuristicTokenizer(Tokenizer):
+    """
+    近似 BPE 的 token 计数（无依赖）
+
+    规则（对照 cl100k 的实际切分）：
+    - 中日韩字符：每字 1 个
+    - 英文单词：7 个字母以内 1 个，更长的每 5 个字母 1 个
+    - 数字：每 3 位 1 个
+    - 单个空格并入后面的词，不单独计数；其他空白串 1 个
+    - 符号：每 2 个 1 个；其他非 ASCII 字符每个 1 个
+    """
+
+    name = "heuristic"
+
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+        total = 0
+        for m in _PIECE_RE.finditer(text):
+            kind = m.lastgroup
+            length = m.end() - m.start()
+            if kind == "cjk":
+                total += length
+            elif kind == "word":
+                total += 1 if length <= 7 else (length + 4) // 5
+            elif kind == "num":
+                total += 1
+            elif kind == "space":
+                total += 0 if m.group() == " " else 1
+            else:
+                piece = m.group()
+                ascii_len = sum(1 for c in piece if c.isascii())
+                total += (ascii_len + 1) // 2 + (length - ascii_len)
+        return total
+
+
+class TiktokenTokenizer(Tokenizer):
+    """tiktoken BPE 计数"""
+
+    def __init__(self, encoding_name: str = DEFAULT_ENCODING, bpe_file: Optional[str] = None):
+        """
+        Args:
+            encoding_name: tiktoken 编码名
+            bpe_file: 本地 .tiktoken 词表文件（指定后不会联网下载）
+
+        Raises:
+            ImportError: 未安装 tiktoken
+        """
+        import tiktoken
+
+        if bpe_file:
+            from tiktoken.load import load_tiktoken_bpe
+            ranks = load_tiktoken_bpe(bpe_file)
+            self._encoding = tiktoken.Encoding(
+                name=f"local:{os.path.basename(bpe_file)}",
+                pat_str=CL100K_PATTERN,
+                mergeable_ranks=ranks,
+                special_tokens={},
+            )
+        else:
+            self._encoding = tiktoken.get_encoding(encoding_name)
+        self.name = self._encoding.name
+
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+        return len(self._encoding.encode(text, disallowed_special=()))
+
+
+_tokenizer: Optional[Tokenizer] = None
+_lock = threading.Lock()
+
+# tiktoken 官方编码的词表下载地址（缓存文件名是它的 sha1）
+_BPE_URL = "https://openaipublic.blob.core.windows.net/encodings/{}.tiktoken"
+
+
+def _bpe_cached(encoding_name: str) -> bool:
+    """tiktoken 的词表是否已在本地缓存（与 tiktoken.load 的缓存目录规则一致）"""
+    if "TIKTOKEN_CACHE_DIR" in os.environ:
+        cache_dir = os.environ["TIKTOKEN_CACHE_DIR"]
+    elif "DATA_GYM_CACHE_DIR" in os.environ:
+        cache_dir = os.environ["DATA_GYM_CACHE_DIR"]
+    else:
+        cache_dir = os.path.join(tempfile.gettempdir(), "data-gym-cache")
+    if not cache_dir:
+        return False
+    key = hashlib.sha1(_BPE_URL.format(encoding_name).encode()).hexdigest()
+    return os.path.isfile(os.path.join(cache_dir, key))
+
+
+def _create_tokenizer() -> Tokenizer:
+    choice = os.getenv("DAOYOUCODE_TOKENIZER", "auto").strip().lower()
+    bpe_file = os.getenv("DAOYOUCODE_BPE_FILE") or None
+
+    if choice == "heuristic":
+        return HeuristicTokenizer()
+
+    encoding_name = DEFAULT_ENCODING
+    if choice.startswith("tiktoken:"):
+        encoding_name = choice.split(":", 1)[1] or DEFAULT_ENCODING
+    if choice == "auto" and not bpe_file and not _bpe_cached(encoding_name):
+        # 没有本地词表：tiktoken 会在首次计数时联网下载，离线时卡住，直接用近似计数
+        return HeuristicTokenizer()
+    try:
+        return TiktokenTokenizer(encoding_name, bpe_file)
+    except ImportError:
+        if choice != "auto":
+            logger.warning("未安装 tiktoken，使用近似 token 计数")
+    except Exception as e:
+        logger.warning(f"加载 BPE 词表失败，使用近似 token 计数: {e}")
+    return HeuristicTokenizer()
+
+
+def get_tokenizer() -> Tokenizer:
+    """获取当前分词器（首次调用时按环境变量创建）"""
+    global _tokenizer
+    if _tokenizer is None:
+        with _lock:
+            if _tokenizer is None:
+                _tokenizer = _create_tokenizer()
+                logger.debug(f"Token计数使用: {_tokenizer.name}")
+    return _tokenizer
+
+
+def set_tokenizer(tokenizer: Optional[Tokenizer]):
+    """替换分词器（None 表示下次按环境变量重新创建）"""
+    global _tokenizer
+    _tokenizer = tokenizer
+
+
+def count_tokens(text: str) -> int:
+    """计算文本的 token 数"""
+    return get_tokenizer().count(text)
+
+
+def value_to_text(value: Any) -> str:
+    """把变量值转成发送给模型时的文本（字符串原样，其他类型转 JSON）"""
+    if isinstance(value, str):
+        return value
+    try:
+        return json.dumps(value, ensure_ascii=False, default=str)
+    except (TypeError, ValueError):
+        return str(value)
+
+
+def count_value_tokens(value: Any) -> int:
+    """计算任意变量值的 token 数"""
+    return count_tokens(value_to_text(value))
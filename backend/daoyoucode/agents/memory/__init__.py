@@ -14,9 +14,12 @@
 
 from .manager import MemoryManager, get_memory_manager
 from .storage import MemoryStorage
+from .write_behind import WriteBehindQueue
 from .detector import FollowupDetector
 from .shared import SharedMemoryInterface
 from .long_term_memory import LongTermMemory, get_long_term_memory
+from .post_turn import PostTurnPipeline, PostTurnJob
+from .profile_aggregator import ProfileAggregator
 from .smart_loader import SmartLoader, get_smart_loader
 from .vector_retriever import VectorRetriever, get_vector_retriever
 from .user_manager import UserManager, get_user_manager, get_current_user_id
@@ -30,6 +33,7 @@ __all__ = [
     
     # 存储
     'MemoryStorage',
+    'WriteBehindQueue',
     
     # 追问判断
     'FollowupDetector',
@@ -40,6 +44,11 @@ __all__ = [
     # 长期记忆
     'LongTermMemory',
     'get_long_term_memory',
+    'ProfileAggregator',
+    
+    # 轮后任务
+    'PostTurnPipeline',
+    'PostTurnJob',
     
     # 智能加载
     'SmartLoader',
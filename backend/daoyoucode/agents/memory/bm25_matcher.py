@@ -5,6 +5,7 @@ BM25算法 - 用于话题相似度计算
 1. 时间衰减权重（越近的消息权重越高）
 2. 动态阈值（根据历史长度调整）
 3. 多粒度匹配（词级 + bigram）
+4. 增量索引（BM25Index）：每条消息只分词一次，新增消息开销与历史长度无关
 
 依赖：
 - rank-bm25（可选，如果安装则使用，否则降级到简单实现）
@@ -89,154 +90,23 @@ class BM25Matcher:
         if not history_texts:
             return 0.0, 0.0
         
-        if current_time is None:
-            current_time = datetime.now()
-        
-        # 分词
-        current_tokens = self._tokenize(current_text)
-        
-        if not current_tokens:
-            return 0.0, 0.0
-        
-        # 提取关键实体（如"猫"、"狗"等核心名词）
-        current_entities = self._extract_key_entities(current_text)
-        
-        # 如果使用rank-bm25
-        if self.rank_bm25_available:
-            avg_sim, max_sim = self._calculate_with_rank_bm25(
-                current_tokens,
-                history_texts,
-                history_timestamps,
-                current_time
-            )
-            
-            # 应用实体惩罚：如果关键实体完全不同，降低相似度
-            if current_entities:
-                entity_penalty = self._calculate_entity_penalty(
-                    current_entities,
-                    history_texts
-                )
-                avg_sim *= entity_penalty
-                max_sim *= entity_penalty
-            
-            return avg_sim, max_sim
-        else:
-            # 降级到简单实现
-            return self._calculate_simple(
-                current_tokens,
-                history_texts,
-                history_timestamps,
-                current_time
-            )
-    
-    def _calculate_with_rank_bm25(
-        self,
-        current_tokens: List[str],
-        history_texts: List[str],
-        history_timestamps: Optional[List[datetime]],
-        current_time: datetime
-    ) -> Tuple[float, float]:
-        """使用rank-bm25库计算相似度"""
-        # 分词历史文本
-        corpus_tokens = [self._tokenize(text) for text in history_texts]
-        
-        # 过滤空文档
-        valid_indices = [i for i, tokens in enumerate(corpus_tokens) if tokens]
-        if not valid_indices:
-            return 0.0, 0.0
-        
-        corpus_tokens = [corpus_tokens[i] for i in valid_indices]
-        
-        # 计算时间权重
-        time_weights = []
-        if history_timestamps:
-            for i in valid_indices:
-                if i < len(history_timestamps):
-                    time_diff = (current_time - history_timestamps[i]).total_seconds()
-                    weight = self._calculate_time_decay(time_diff)
-                else:
-                    weight = 1.0
-                time_weights.append(weight)
-        else:
-            time_weights = [1.0] * len(corpus_tokens)
-        
-        # BM25计算
-        bm25 = self.BM25Okapi(corpus_tokens)
-        bm25_scores = bm25.get_scores(current_tokens)
-        
-        # 找到最大和最小分数用于归一化
-        min_score = float(bm25_scores.min()) if len(bm25_scores) > 0 else 0
-        max_bm25_score = float(bm25_scores.max()) if len(bm25_scores) > 0 else 0
-        score_range = max_bm25_score - min_score
-        
-        # 综合分数：BM25 × 时间权重
-        max_score = 0.0
-        total_weighted_score = 0.0
-        total_weight = 0.0
-        
-        for i, bm25_score in enumerate(bm25_scores):
-            # 归一化BM25分数到[0, 1]
-            if score_range > 0:
-                normalized_bm25 = (bm25_score - min_score) / score_range
-            else:
-                normalized_bm25 = 0.5  # 所有分数相同，给个中间值
-            
-            # 加权
-            weighted_score = normalized_bm25 * time_weights[i]
-            total_weighted_score += weighted_score
-            total_weight += time_weights[i]
-            
-            if normalized_bm25 > max_score:
-                max_score = normalized_bm25
-        
-        avg_score = total_weighted_score / total_weight if total_weight > 0 else 0
-        
-        return avg_score, max_score
-    
-    def _calculate_simple(
-        self,
-        current_tokens: List[str],
-        history_texts: List[str],
-        history_timestamps: Optional[List[datetime]],
-        current_time: datetime
-    ) -> Tuple[float, float]:
-        """简单实现（Jaccard相似度 + 时间衰减）"""
-        current_set = set(current_tokens)
-        
-        max_similarity = 0.0
-        total_weighted_similarity = 0.0
-        total_weight = 0.0
-        
+        index = self.create_index()
         for i, text in enumerate(history_texts):
-            tokens = self._tokenize(text)
-            if not tokens:
-                continue
-            
-            token_set = set(tokens)
-            
-            # Jaccard相似度
-            overlap = len(current_set & token_set)
-            union = len(current_set | token_set)
-            similarity = overlap / union if union > 0 else 0
-            
-            # 时间权重
+            timestamp = None
             if history_timestamps and i < len(history_timestamps):
-                time_diff = (current_time - history_timestamps[i]).total_seconds()
-                time_weight = self._calculate_time_decay(time_diff)
-            else:
-                time_weight = 1.0
-            
-            # 加权相似度
-            weighted_similarity = similarity * time_weight
-            total_weighted_similarity += weighted_similarity
-            total_weight += time_weight
-            
-            if similarity > max_similarity:
-                max_similarity = similarity
+                timestamp = history_timestamps[i]
+            index.add(text, timestamp)
         
-        avg_similarity = total_weighted_similarity / total_weight if total_weight > 0 else 0
+        return index.similarity(current_text, current_time)
+    
+    def create_index(self) -> 'BM25Index':
+        """
+        创建增量索引
         
-        return avg_similarity, max_similarity
+        对话分支应长期持有一个索引，每轮只 add 新消息，
+        避免每次检测都重新分词、重建BM25。
+        """
+        return BM25Index(self)
     
     def _calculate_time_decay(self, time_diff_seconds: float) -> float:
         """
@@ -408,7 +278,7 @@ class BM25Matcher:
     def _calculate_entity_penalty(
         self,
         current_entities: Set[str],
-        history_texts: List[str]
+        history_entities: Set[str]
     ) -> float:
         """
         计算实体惩罚系数
@@ -421,7 +291,7 @@ class BM25Matcher:
         
         Args:
             current_entities: 当前消息的关键实体
-            history_texts: 历史文本列表
+            history_entities: 历史文本的全部关键实体
         
         Returns:
             惩罚系数（0.3-1.0）
@@ -429,11 +299,6 @@ class BM25Matcher:
         if not current_entities:
             return 1.0  # 没有关键实体，不惩罚
         
-        # 提取历史文本的所有实体
-        history_entities = set()
-        for text in history_texts:
-            history_entities.update(self._extract_key_entities(text))
-        
         if not history_entities:
             return 1.0  # 历史没有关键实体，不惩罚
         
@@ -463,6 +328,213 @@ class BM25Matcher:
         }
 
 
+class BM25Index:
+    """
+    增量BM25索引（一个对话分支一个）
+    
+    每条消息只在 add 时分词一次，缓存：
+    - 词 -> {文档: 词频} 的倒排表、文档频率、文档长度
+    - 时间戳（查询时向量化计算时间衰减）
+    - 历史消息的关键实体并集（实体惩罚）
+    
+    add 的开销只与新消息有关；similarity 的打分与 rank-bm25 的 BM25Okapi 一致，
+    但只遍历查询词的倒排表，其余为向量运算。
+    """
+    
+    # 与 rank_bm25.BM25Okapi 默认参数一致
+    K1 = 1.5
+    B = 0.75
+    EPSILON = 0.25
+    
+    def __init__(self, matcher: BM25Matcher):
+        self.matcher = matcher
+        self.use_bm25 = matcher.rank_bm25_available
+        
+        self.size = 0                               # 已处理的位置数（含跳过的）
+        self.text_count = 0                         # 已加入的消息数（含分词为空的）
+        self._term_ids: Dict[str, int] = {}
+        self._postings: List[Dict[int, int]] = []   # term_id -> {doc: 词频}
+        self._token_sets: List[Set[str]] = []       # 简化实现（Jaccard）使用
+        self._doc_len: List[int] = []
+        self._timestamps: List[float] = []          # NaN 表示无时间戳（权重1.0）
+        self._total_len = 0
+        self._entities: Set[str] = set()
+        
+        # 最近一次查询的分词结果（检测完通常紧接着 add 同一条消息）
+        self._last_query: Optional[Tuple[str, List[str], Set[str]]] = None
+        
+        if self.use_bm25:
+            import numpy as np
+            self._np = np
+    
+    @property
+    def doc_count(self) -> int:
+        """参与打分的文档数（分词非空）"""
+        return len(self._doc_len)
+    
+    def add(self, text: str, timestamp=None):
+        """
+        加入一条消息
+        
+        Args:
+            text: 消息文本
+            timestamp: datetime、时间戳（秒）或 None
+        """
+        tokens, entities = self._analyze(text, need_entities=self.use_bm25)
+        self.size += 1
+        self.text_count += 1
+        self._entities.update(entities)
+        
+        if not tokens:
+            return
+        
+        doc = len(self._doc_len)
+        freqs: Dict[str, int] = {}
+        for token in tokens:
+            freqs[token] = freqs.get(token, 0) + 1
+        for token, freq in freqs.items():
+            term_id = self._term_ids.get(token)
+            if term_id is None:
+                term_id = self._term_ids[token] = len(self._postings)
+                self._postings.append({})
+            self._postings[term_id][doc] = freq
+        
+        self._token_sets.append(set(freqs))
+        self._doc_len.append(len(tokens))
+        self._total_len += len(tokens)
+        self._timestamps.append(self._to_seconds(timestamp))
+    
+    def skip(self):
+        """跳过一个位置（对应的消息不存在）"""
+        self.size += 1
+    
+    def similarity(
+        self,
+        text: str,
+        current_time: Optional[datetime] = None
+    ) -> Tuple[float, float]:
+        """
+        计算当前消息与索引中全部消息的相似度
+        
+        Returns:
+            (平均加权相似度, 最大相似度)
+        """
+        if self.text_count == 0:
+            return 0.0, 0.0
+        
+        tokens, entities = self._analyze(text, need_entities=self.use_bm25, remember=True)
+        if not tokens:
+            return 0.0, 0.0
+        
+        now = (current_time or datetime.now()).timestamp()
+        if not self.use_bm25:
+            return self._similarity_simple(tokens, now)
+        
+        if not self._doc_len:
+            avg_sim, max_sim = 0.0, 0.0
+        else:
+            avg_sim, max_sim = self._similarity_bm25(tokens, now)
+        
+        # 实体惩罚：关键实体完全不同，降低相似度
+        if entities:
+            penalty = self.matcher._calculate_entity_penalty(entities, self._entities)
+            avg_sim *= penalty
+            max_sim *= penalty
+        
+        return avg_sim, max_sim
+    
+    def _similarity_bm25(self, query: List[str], now: float) -> Tuple[float, float]:
+        np = self._np
+        n_docs = len(self._doc_len)
+        doc_len = np.asarray(self._doc_len, dtype=float)
+        avgdl = self._total_len / n_docs
+        norm = self.K1 * (1 - self.B + self.B * doc_len / avgdl)
+        
+        # idf（负值按 BM25Okapi 的规则取 epsilon * 平均idf）
+        df = np.fromiter((len(p) for p in self._postings), dtype=float, count=len(self._postings))
+        idf = np.log(n_docs - df + 0.5) - np.log(df + 0.5)
+        average_idf = float(idf.mean()) if len(idf) else 0.0
+        idf[idf < 0] = self.EPSILON * average_idf
+        
+        scores = np.zeros(n_docs)
+        for token in query:
+            term_id = self._term_ids.get(token)
+            if term_id is None:
+                continue
+            posting = self._postings[term_id]
+            docs = np.fromiter(posting.keys(), dtype=np.intp, count=len(posting))
+            q_freq = np.fromiter(posting.values(), dtype=float, count=len(posting))
+            scores[docs] += idf[term_id] * (q_freq * (self.K1 + 1) / (q_freq + norm[docs]))
+        
+        # 归一化到 [0, 1]
+        min_score = float(scores.min())
+        score_range = float(scores.max()) - min_score
+        if score_range > 0:
+            normalized = (scores - min_score) / score_range
+        else:
+            normalized = np.full(n_docs, 0.5)  # 所有分数相同，给个中间值
+        
+        # 时间权重（无时间戳为1.0）
+        timestamps = np.asarray(self._timestamps, dtype=float)
+        weights = 0.5 ** ((now - timestamps) / self.matcher.time_decay_halflife)
+        weights = np.where(np.isnan(timestamps), 1.0, weights)
+        
+        total_weight = float(weights.sum())
+        avg_score = float((normalized * weights).sum()) / total_weight if total_weight > 0 else 0.0
+        return avg_score, max(0.0, float(normalized.max()))
+    
+    def _similarity_simple(self, query: List[str], now: float) -> Tuple[float, float]:
+        """简单实现（Jaccard相似度 + 时间衰减）"""
+        current_set = set(query)
+        
+        max_similarity = 0.0
+        total_weighted_similarity = 0.0
+        total_weight = 0.0
+        
+        for token_set, timestamp in zip(self._token_sets, self._timestamps):
+            overlap = len(current_set & token_set)
+            union = len(current_set | token_set)
+            similarity = overlap / union if union > 0 else 0
+            
+            if timestamp == timestamp:  # 非 NaN
+                time_weight = self.matcher._calculate_time_decay(now - timestamp)
+            else:
+                time_weight = 1.0
+            
+            total_weighted_similarity += similarity * time_weight
+            total_weight += time_weight
+            if similarity > max_similarity:
+                max_similarity = similarity
+        
+        avg_similarity = total_weighted_similarity / total_weight if total_weight > 0 else 0
+        return avg_similarity, max_similarity
+    
+    def _analyze(
+        self,
+        text: str,
+        need_entities: bool,
+        remember: bool = False
+    ) -> Tuple[List[str], Set[str]]:
+        """分词 + 实体提取（复用上一次查询的结果）"""
+        last = self._last_query
+        if last is not None and last[0] == text:
+            return last[1], last[2]
+        
+        tokens = self.matcher._tokenize(text)
+        entities = self.matcher._extract_key_entities(text) if need_entities else set()
+        if remember:
+            self._last_query = (text, tokens, entities)
+        return tokens, entities
+    
+    @staticmethod
+    def _to_seconds(timestamp) -> float:
+        if timestamp is None:
+            return float('nan')
+        if isinstance(timestamp, datetime):
+            return timestamp.timestamp()
+        return float(timestamp)
+
+
 # 单例
 _bm25_matcher = None
 
@@ -6,11 +6,14 @@
 """
 
 from pathlib import Path
-from typing import List, Dict, Any, Optional, Tuple
+from typing import List, Dict, Any, Iterable, Optional, Set, Tuple, Callable
 import logging
 import json
 import hashlib
 import re
+import threading
+
+from ..tools.tag_store import definition_tags, reference_names
 
 logger = logging.getLogger(__name__)
 
@@ -20,6 +23,8 @@ _index_cache: Dict[str, "CodebaseIndex"] = {}
 DEFAULT_CHUNK_LINES = 55
 # 索引目录名
 INDEX_DIR = ".daoyoucode/codebase_index"
+# 默认索引的文件类型
+DEFAULT_EXTENSIONS = (".py", ".js", ".ts", ".tsx", ".jsx", ".md", ".yaml", ".yml", ".json")
 
 
 def _repo_key(repo_path: Path) -> str:
@@ -107,6 +112,25 @@ def _chunk_file(content: str, path: Path, max_lines: int = DEFAULT_CHUNK_LINES)
     return chunks
 
 
+def _plain_chunk(rel_path: str, c: Dict[str, Any]) -> Dict[str, Any]:
+    """按行分块的 chunk，补齐 AST chunk 的元数据字段（检索和引用扩展按同一结构读取）"""
+    return {
+        "path": rel_path,
+        "start": c["start"],
+        "end": c["end"],
+        "text": c["text"][:4000],
+        "type": "block",
+        "name": "",
+        "pagerank_score": 0.0,
+        "parent_class": None,
+        "scope": "global",
+        "calls": [],
+        "called_by": [],
+        "imports": [],
+        "related_files": []
+    }
+
+
 class CodebaseIndex:
     """代码库向量索引：chunk + embed + 检索"""
 
@@ -118,6 +142,12 @@ class CodebaseIndex:
         self.chunks: List[Dict[str, Any]] = []  # [{path, start, end, text}, ...]
         self.embeddings: Optional[Any] = None   # np.ndarray (n, dim) or None
         self._retriever = None
+        # 串行化构建（后台预热与前台检索不会重复构建）
+        self._build_lock = threading.Lock()
+        self._built = False  # 已构建/加载过（空仓库也不再重复构建）
+        # 内容已变化、需要重新分块的文件（相对 repo_path），见 mark_stale
+        self._stale_lock = threading.Lock()
+        self._stale_paths: Set[str] = set()
 
     def _get_retriever(self):
         if self._retriever is None:
@@ -132,27 +162,207 @@ class CodebaseIndex:
         self,
         max_file_size: int = 200_000,
         extensions: Optional[Tuple[str, ...]] = None,
-        force: bool = False
+        force: bool = False,
+        progress: Optional[Callable[[str, int, int], None]] = None
     ) -> int:
         """
         扫描仓库、分块、编码并持久化。返回 chunk 数量。
         
         🆕 优化：复用RepoMap的tree-sitter解析结果，避免重复解析
+        
+        可在后台线程中调用：新的 chunks/embeddings 构建完成后才替换，
+        构建期间的检索看到的是旧索引（或空索引）。
+        
+        Args:
+            progress: 进度回调 (阶段, 已完成, 总数)
+        """
+        progress = progress or (lambda *a: None)
+        with self._build_lock:
+            if force or not self._built:
+                if force:
+                    with self._stale_lock:
+                        self._stale_paths.clear()
+                self._build_index(max_file_size, extensions, force, progress)
+                self._built = True
+            # 加载的旧索引或构建期间发生的变化：只重新分块变化的文件
+            self._refresh_stale(max_file_size, extensions or DEFAULT_EXTENSIONS, progress)
+            return len(self.chunks)
+
+    def mark_stale(self, paths: Iterable[str]):
         """
+        记录内容已变化的文件（相对 repo_path），下次 build_index 时重新分块和编码
+        """
+        with self._stale_lock:
+            self._stale_paths.update(paths)
+
+    @property
+    def is_stale(self) -> bool:
+        return bool(self._stale_paths)
+
+    def _refresh_stale(
+        self,
+        max_file_size: int,
+        extensions: Tuple[str, ...],
+        progress: Callable[[str, int, int], None]
+    ) -> int:
+        """
+        替换变化文件的 chunk，其余 chunk 和向量保持不变
+
+        与全量构建一样按 RepoMap 的定义分块（带类型、名称、调用关系）；
+        解析不到定义的文件按行/def 边界分块。
+        """
+        with self._stale_lock:
+            stale, self._stale_paths = self._stale_paths, set()
+        if not stale:
+            return 0
+
+        progress("更新变化的文件", 0, len(stale))
+        extra_ignore = _load_ignore_patterns(self.repo_path)
+        structure = self._load_structure()
+        new_chunks = []
+        for rel in sorted(stale):
+            path = self.repo_path / rel
+            if path.suffix.lower() not in extensions or _should_ignore(path, self.repo_path, extra_ignore):
+                continue
+            try:
+                content = path.read_text(encoding="utf-8", errors="ignore")
+            except OSError:
+                continue  # 已删除
+            if len(content) > max_file_size:
+                continue
+            file_chunks = []
+            if structure is not None and structure[0].get(rel):
+                file_chunks = self._definition_chunks(rel, structure[0][rel], *structure)
+            if not file_chunks:
+                file_chunks = [_plain_chunk(rel, c) for c in _chunk_file(content, path)]
+            new_chunks.extend(file_chunks)
+
+        keep = [i for i, c in enumerate(self.chunks) if c.get("path") not in stale]
+        chunks = [self.chunks[i] for i in keep] + new_chunks
+
+        embeddings = None
+        if self.embeddings is not None:
+            import numpy as np
+            retriever = self._get_retriever()
+            dim = self.embeddings.shape[1]
+            vecs = []
+            for c in new_chunks:
+                emb = retriever.encode(c["text"][:2000]) if retriever.enabled else None
+                vecs.append(emb if emb is not None else np.zeros(dim, dtype=np.float32))
+            parts = [self.embeddings[keep]] + ([np.array(vecs, dtype=np.float32)] if vecs else [])
+            embeddings = np.concatenate(parts).astype(np.float32)
+
+        # 一次替换，检索方不会看到 chunk 与向量不一致
+        self.chunks, self.embeddings = chunks, embeddings
+        self.__dict__.pop("_bm25_cache", None)
+        self._save_meta()
+        if embeddings is not None:
+            import numpy as np
+            np.save(self.index_dir / "embeddings.npy", embeddings)
+        logger.info(f"代码库索引已更新: {len(stale)} 个文件变化，重新生成 {len(new_chunks)} 块")
+        return len(new_chunks)
+
+    def _parse_structure(self) -> Tuple[Dict[str, List[Dict]], Dict[str, Dict[str, float]], Dict[str, float]]:
+        """RepoMap 的定义、引用图和 PageRank 分数（共享的符号存储，只重新解析变化的文件）"""
+        from ..tools.repomap_tools import RepoMapTool
+        repomap_tool = RepoMapTool()
+        
+        # 获取代码定义（已包含end_line）
+        definitions = repomap_tool.get_definitions(str(self.repo_path))
+        
+        # 获取引用图（用于PageRank）
+        reference_graph = repomap_tool.get_reference_graph(str(self.repo_path), definitions)
+        
+        # 获取PageRank分数
+        pagerank_scores = repomap_tool.get_pagerank_scores(
+            str(self.repo_path),
+            reference_graph=reference_graph,
+            definitions=definitions
+        )
+        return definitions, reference_graph, pagerank_scores
+
+    def _load_structure(self) -> Optional[Tuple[Dict[str, List[Dict]], Dict[str, Dict[str, float]], Dict[str, float]]]:
+        """增量刷新用的代码结构（解析失败时返回 None，由调用方按行分块）"""
+        try:
+            return self._parse_structure()
+        except Exception as e:
+            logger.warning(f"RepoMap解析失败，变化的文件按行分块: {e}")
+            return None
+
+    def _definition_chunks(
+        self,
+        file_path: str,
+        defs: List[Dict],
+        definitions: Dict[str, List[Dict]],
+        reference_graph: Dict[str, Dict[str, float]],
+        pagerank_scores: Dict[str, float]
+    ) -> List[Dict[str, Any]]:
+        """按定义为单个文件构建 chunk（带类型、名称、调用关系和 PageRank 分数）"""
+        full_path = self.repo_path / file_path
+        # 🆕 阶段2：文件的导入关系
+        imports = self._extract_imports(full_path) if full_path.exists() else []
+        # 🆕 阶段2：获取相关文件
+        related_files = self._get_related_files(file_path, reference_graph)
+        
+        chunks = []
+        # 只处理定义，不处理引用
+        for d in definition_tags(defs):
+            # 提取代码文本
+            code_text = self._extract_code_chunk(
+                full_path,
+                d["line"],
+                d.get("end_line", d["line"] + 50)
+            )
+            
+            if not code_text.strip():
+                continue
+            
+            # 构建增强的chunk
+            chunks.append({
+                "path": file_path,
+                "start": d["line"],
+                "end": d.get("end_line", d["line"] + len(code_text.splitlines())),
+                "text": code_text[:4000],  # 限制长度
+                
+                # 基础元数据（阶段1）
+                "type": d.get("type", "unknown"),
+                "name": d.get("name", ""),
+                "pagerank_score": pagerank_scores.get(file_path, 0.0),
+                
+                # 🆕 阶段2新增字段
+                "parent_class": d.get("parent"),
+                "scope": d.get("scope", "global"),
+                "calls": self._extract_calls(code_text),
+                "called_by": self._find_callers(d["name"], file_path, definitions),
+                "imports": imports,
+                "related_files": related_files
+            })
+        return chunks
+
+    def _build_index(
+        self,
+        max_file_size: int,
+        extensions: Optional[Tuple[str, ...]],
+        force: bool,
+        progress: Callable[[str, int, int], None]
+    ) -> int:
         if extensions is None:
-            extensions = (".py", ".js", ".ts", ".tsx", ".jsx", ".md", ".yaml", ".yml", ".json")
+            extensions = DEFAULT_EXTENSIONS
         self.index_dir.mkdir(parents=True, exist_ok=True)
         meta_file = self.index_dir / "meta.json"
         npy_file = self.index_dir / "embeddings.npy"
 
         if not force and meta_file.exists():
             try:
+                progress("加载索引", 0, 0)
                 with open(meta_file, "r", encoding="utf-8") as f:
                     data = json.load(f)
-                self.chunks = data.get("chunks", [])
+                embeddings = None
                 if npy_file.exists():
                     import numpy as np
-                    self.embeddings = np.load(npy_file)
+                    embeddings = np.load(npy_file)
+                self.embeddings = embeddings
+                self.chunks = data.get("chunks", [])
                 logger.info(f"已加载代码库索引: {len(self.chunks)} 块")
                 return len(self.chunks)
             except Exception as e:
@@ -160,95 +370,37 @@ class CodebaseIndex:
 
         # 🆕 使用RepoMap的tree-sitter解析结果
         try:
-            from ..tools.repomap_tools import RepoMapTool
-            repomap_tool = RepoMapTool()
-            
-            # 获取代码定义（已包含end_line）
             logger.info("🔍 使用RepoMap解析代码结构...")
-            definitions = repomap_tool.get_definitions(str(self.repo_path))
-            
-            # 获取引用图（用于PageRank）
-            reference_graph = repomap_tool.get_reference_graph(str(self.repo_path), definitions)
-            
-            # 获取PageRank分数
-            pagerank_scores = repomap_tool.get_pagerank_scores(
-                str(self.repo_path),
-                reference_graph=reference_graph,
-                definitions=definitions
-            )
+            progress("解析代码结构", 0, 0)
+            definitions, reference_graph, pagerank_scores = self._parse_structure()
             
             logger.info(f"✅ RepoMap解析完成: {len(definitions)} 文件, {sum(len(defs) for defs in definitions.values())} 定义")
             
-            # 🆕 阶段2：预先提取所有文件的导入关系
-            logger.info("📦 提取导入关系...")
-            file_imports = {}
-            for file_path in definitions.keys():
-                full_path = self.repo_path / file_path
-                if full_path.exists():
-                    file_imports[file_path] = self._extract_imports(full_path)
-            
             # 基于definitions构建高质量的chunks
-            self.chunks = []
-            for file_path, defs in definitions.items():
-                # 只处理定义，不处理引用
-                def_only = [d for d in defs if d.get("kind") == "def"]
-                
-                for d in def_only:
-                    # 提取代码文本
-                    code_text = self._extract_code_chunk(
-                        self.repo_path / file_path,
-                        d["line"],
-                        d.get("end_line", d["line"] + 50)
-                    )
-                    
-                    if not code_text.strip():
-                        continue
-                    
-                    # 🆕 阶段2：提取函数调用
-                    calls = self._extract_calls(code_text)
-                    
-                    # 🆕 阶段2：找到调用者
-                    called_by = self._find_callers(d["name"], file_path, definitions)
-                    
-                    # 🆕 阶段2：获取相关文件
-                    related_files = self._get_related_files(file_path, reference_graph)
-                    
-                    # 构建增强的chunk
-                    chunk = {
-                        "path": file_path,
-                        "start": d["line"],
-                        "end": d.get("end_line", d["line"] + len(code_text.splitlines())),
-                        "text": code_text[:4000],  # 限制长度
-                        
-                        # 基础元数据（阶段1）
-                        "type": d.get("type", "unknown"),
-                        "name": d.get("name", ""),
-                        "pagerank_score": pagerank_scores.get(file_path, 0.0),
-                        
-                        # 🆕 阶段2新增字段
-                        "parent_class": d.get("parent"),
-                        "scope": d.get("scope", "global"),
-                        "calls": calls,
-                        "called_by": called_by,
-                        "imports": file_imports.get(file_path, []),
-                        "related_files": related_files
-                    }
-                    
-                    self.chunks.append(chunk)
+            chunks = []
+            for done, (file_path, defs) in enumerate(definitions.items()):
+                progress("构建代码块", done, len(definitions))
+                chunks.extend(self._definition_chunks(
+                    file_path, defs, definitions, reference_graph, pagerank_scores
+                ))
             
-            logger.info(f"✅ 构建了 {len(self.chunks)} 个高质量代码块（基于AST + 引用关系）")
+            logger.info(f"✅ 构建了 {len(chunks)} 个高质量代码块（基于AST + 引用关系）")
             
         except Exception as e:
             logger.warning(f"RepoMap解析失败，回退到传统方法: {e}")
             # 回退到原有的扫描逻辑
-            self.chunks = []
+            progress("扫描文件", 0, 0)
+            chunks = []
             extra_ignore = _load_ignore_patterns(self.repo_path)
-            for path in self.repo_path.rglob("*"):
-                if not path.is_file():
+            # 共享文件清单已应用 .gitignore；这里再叠加 .cursorignore 和隐藏目录规则
+            from ..tools.file_inventory import get_file_inventory
+            for entry in get_file_inventory(self.repo_path).files():
+                path = entry.abs_path
+                if path.suffix.lower() not in extensions:
                     continue
                 if _should_ignore(path, self.repo_path, extra_ignore):
                     continue
-                if path.suffix.lower() not in extensions:
+                if entry.size > max_file_size * 4:
                     continue
                 try:
                     content = path.read_text(encoding="utf-8", errors="ignore")
@@ -257,31 +409,31 @@ class CodebaseIndex:
                     continue
                 if len(content) > max_file_size:
                     continue
-                rel_path = path.relative_to(self.repo_path)
-                rel_str = str(rel_path).replace("\\", "/")
+                rel_str = entry.path
                 for c in _chunk_file(content, path):
-                    self.chunks.append({
-                        "path": rel_str,
-                        "start": c["start"],
-                        "end": c["end"],
-                        "text": c["text"][:4000]
-                    })
+                    chunks.append(_plain_chunk(rel_str, c))
 
-        if not self.chunks:
+        if not chunks:
             logger.warning("代码库索引无 chunk")
+            self.chunks, self.embeddings = chunks, None
             self._save_meta()
             return 0
 
         retriever = self._get_retriever()
+        if hasattr(retriever, 'wait_ready'):
+            retriever.wait_ready()  # 本地模型在后台加载，构建本身也在后台线程
         if not retriever.enabled or not retriever.model:
             logger.warning("embedding 未启用，仅保存 chunk 元数据，检索将使用关键词回退")
+            self.chunks, self.embeddings = chunks, None
             self._save_meta()
             return len(self.chunks)
 
         import numpy as np
         dim = getattr(retriever.model, "get_sentence_embedding_dimension", lambda: 384)()
         vecs = []
-        for c in self.chunks:
+        for done, c in enumerate(chunks):
+            if done % 64 == 0:
+                progress("编码向量", done, len(chunks))
             text = c.get("text", "")[:2000]
             emb = retriever.encode(text)
             if emb is not None:
@@ -289,6 +441,7 @@ class CodebaseIndex:
             else:
                 vecs.append(np.zeros(dim, dtype=np.float32))
         self.embeddings = np.array(vecs, dtype=np.float32)
+        self.chunks = chunks
         self._save_meta()
         np.save(npy_file, self.embeddings)
         logger.info(f"代码库索引已构建: {len(self.chunks)} 块, 向量维度 {self.embeddings.shape[1]}")
@@ -453,11 +606,9 @@ class CodebaseIndex:
             if other_file == file_path:
                 continue  # 跳过自己
             
-            for d in defs:
-                if d.get("kind") == "ref" and d.get("name") == function_name:
-                    if other_file not in callers:
-                        callers.append(other_file)
-                        break  # 每个文件只记录一次
+            # 每个文件只记录一次
+            if function_name in reference_names(defs):
+                callers.append(other_file)
         
         return callers[:10]  # 限制数量
 
@@ -621,7 +772,7 @@ class CodebaseIndex:
             for caller_file in called_by[:max_callers]:
                 caller_chunks = [
                     c for c in self.chunks
-                    if c['path'] == caller_file
+                    if c.get('path') == caller_file
                 ]
                 
                 # 选择PageRank最高的
@@ -642,7 +793,7 @@ class CodebaseIndex:
                 # 查找该函数的定义
                 callee_chunks = [
                     c for c in self.chunks
-                    if c['name'] == callee_name and c['type'] in ('function', 'method')
+                    if c.get('name') == callee_name and c.get('type') in ('function', 'method')
                 ]
                 
                 if callee_chunks:
@@ -1056,6 +1207,41 @@ class CodebaseIndex:
         return _index_cache[key]
 
 
+def invalidate_codebase_indexes(root: Path, changed: Iterable[str]) -> List["CodebaseIndex"]:
+    """
+    把变化的文件记为过期（git 变化回调使用）
+
+    Args:
+        root: 仓库根目录
+        changed: 变化的文件（相对 root）
+
+    Returns:
+        受影响且已构建的索引（需要刷新）
+    """
+    root = Path(root).resolve()
+    changed = list(changed)
+    affected = []
+    for index in list(_index_cache.values()):
+        base = index.repo_path
+        if base == root or root in base.parents:
+            prefix = base.relative_to(root).as_posix()
+            paths = [
+                p[len(prefix) + 1:] if prefix != "." else p
+                for p in changed
+                if prefix == "." or p.startswith(prefix + "/")
+            ]
+        elif base in root.parents:
+            prefix = root.relative_to(base).as_posix()
+            paths = [f"{prefix}/{p}" for p in changed]
+        else:
+            continue
+        if paths:
+            index.mark_stale(paths)
+            if index._built:
+                affected.append(index)
+    return affected
+
+
 def search_codebase(
     repo_path: Path,
     query: str,
@@ -5,21 +5,31 @@ LSP增强的代码库索引（阶段1优化）
 """
 
 from pathlib import Path
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
+import asyncio
+import hashlib
 import logging
 import re
+import traceback
 
 from .codebase_index import CodebaseIndex
 
 logger = logging.getLogger(__name__)
 
+# 同时请求 documentSymbol 的最大文件数
+LSP_MAX_CONCURRENT_FILES = 8
+
 
 class LSPEnhancedCodebaseIndex(CodebaseIndex):
     """LSP增强的代码库索引"""
     
     def __init__(self, repo_path: Path):
         super().__init__(repo_path)
-        self._lsp_cache = {}  # 缓存LSP结果
+        # 文件符号缓存：相对路径 -> (内容哈希, 符号列表)
+        self._lsp_cache: Dict[str, Tuple[str, List[Dict]]] = {}
+        # 扩展名 -> 是否有可用的LSP服务器
+        self._lsp_servers: Dict[str, bool] = {}
+        self._lsp_stats = {'cache_hits': 0, 'requests': 0}
     
     async def search_with_lsp(
         self,
@@ -80,134 +90,122 @@ class LSPEnhancedCodebaseIndex(CodebaseIndex):
         - 类型信息
         - 符号信息
         - 引用计数
+        
+        候选按文件分组：每个文件只并发请求一次 documentSymbol，
+        结果按文件内容哈希缓存，跨查询复用。
         """
-        from ..tools.lsp_tools import with_lsp_client
+        logger.info(f"🔧 开始LSP增强: {len(candidates)} 个候选")
         
-        enhanced = []
+        # 1. 按文件分组，每个文件只获取一次符号
+        paths = list(dict.fromkeys(chunk['path'] for chunk in candidates))
+        semaphore = asyncio.Semaphore(LSP_MAX_CONCURRENT_FILES)
         
-        logger.warning(f"🔧 开始LSP增强: {len(candidates)} 个候选")
+        async def fetch(rel_path: str) -> Optional[List[Dict]]:
+            async with semaphore:
+                return await self._get_file_symbols(rel_path)
         
-        for i, chunk in enumerate(candidates):
-            file_path = str(self.repo_path / chunk['path'])
-            
-            # 检查缓存
-            cache_key = f"{chunk['path']}:{chunk['start']}"
-            if cache_key in self._lsp_cache:
-                logger.debug(f"  [{i+1}/{len(candidates)}] 使用缓存: {chunk['path']}")
-                chunk.update(self._lsp_cache[cache_key])
-                enhanced.append(chunk)
-                continue
-            
-            # 获取LSP信息
-            logger.debug(f"  [{i+1}/{len(candidates)}] 获取LSP信息: {chunk['path']}")
-            lsp_info = await self._get_lsp_info(file_path, chunk)
-            
-            # 缓存结果
-            self._lsp_cache[cache_key] = lsp_info
-            
-            # 合并到chunk
-            chunk.update(lsp_info)
-            enhanced.append(chunk)
-            
-            if lsp_info.get('has_lsp_info'):
-                logger.debug(f"    ✅ LSP信息已获取: {lsp_info.get('symbol_count', 0)} 个符号")
+        results = await asyncio.gather(*(fetch(p) for p in paths))
+        symbols_by_path = dict(zip(paths, results))
+        
+        # 2. 在内存中按chunk范围过滤符号
+        for chunk in candidates:
+            symbols = symbols_by_path.get(chunk['path'])
+            if symbols:
+                chunk.update(self._chunk_lsp_info(symbols, chunk))
             else:
-                logger.debug(f"    ⚠️  LSP信息未获取")
+                chunk.update(self._empty_lsp_info())
         
-        lsp_count = sum(1 for c in enhanced if c.get('has_lsp_info'))
-        logger.warning(f"🔧 LSP增强完成: {lsp_count}/{len(enhanced)} 个结果包含LSP信息")
+        lsp_count = sum(1 for c in candidates if c.get('has_lsp_info'))
+        logger.info(
+            f"🔧 LSP增强完成: {lsp_count}/{len(candidates)} 个结果包含LSP信息"
+            f"（{len(paths)} 个文件，缓存命中 {self._lsp_stats['cache_hits']}，"
+            f"请求 {self._lsp_stats['requests']}）"
+        )
         
-        return enhanced
+        return candidates
     
-    async def _get_lsp_info(
-        self,
-        file_path: str,
-        chunk: Dict
-    ) -> Dict[str, Any]:
+    async def _get_file_symbols(self, rel_path: str) -> Optional[List[Dict]]:
         """
-        获取LSP信息（按需启动LSP服务器）
+        获取文件的文档符号（按内容哈希缓存，按需启动LSP服务器）
         
         Returns:
-            {
-                'has_lsp_info': bool,
-                'symbol_count': int,
-                'has_type_annotations': bool,
-                'reference_count': int,
-                'lsp_symbols': List[Dict]
-            }
+            符号列表；没有LSP服务器或获取失败时返回None
         """
         from ..tools.lsp_tools import with_lsp_client, get_lsp_manager
         
+        file_path = self.repo_path / rel_path
         try:
-            logger.debug(f"    开始获取LSP信息: {file_path}")
-            
-            # 🔥 首次使用时检查并启动LSP服务器
+            digest = hashlib.sha1(file_path.read_bytes()).hexdigest()
+        except OSError as e:
+            logger.debug(f"    读取文件失败 {rel_path}: {e}")
+            return None
+        
+        cached = self._lsp_cache.get(rel_path)
+        if cached and cached[0] == digest:
+            self._lsp_stats['cache_hits'] += 1
+            return cached[1]
+        
+        # 检查对应的LSP服务器（每个扩展名只检查一次）
+        ext = file_path.suffix
+        if ext not in self._lsp_servers:
             manager = get_lsp_manager()
-            
-            # 检查文件扩展名
-            from pathlib import Path
-            ext = Path(file_path).suffix
-            logger.debug(f"    文件扩展名: {ext}")
-            
-            # 查找对应的LSP服务器
             server_config = manager.find_server_for_extension(ext)
             if not server_config:
                 logger.debug(f"    没有找到 {ext} 文件的LSP服务器")
-                return self._empty_lsp_info()
-            
-            logger.debug(f"    找到LSP服务器: {server_config.id}")
-            
-            # 检查LSP服务器是否已安装
-            if not manager.is_server_installed(server_config):
-                # 只在第一次时打印提示
-                if not hasattr(self, '_lsp_warning_shown'):
-                    logger.warning(f"⚠️  LSP服务器未安装: {server_config.id}")
-                    logger.warning(f"   安装方式: pip install {server_config.id}")
-                    logger.warning("   安装后将自动启用LSP增强功能")
-                    self._lsp_warning_shown = True
-                return self._empty_lsp_info()
-            
-            logger.debug(f"    LSP服务器已安装")
-            
+            elif not manager.is_server_installed(server_config):
+                logger.warning(f"⚠️  LSP服务器未安装: {server_config.id}")
+                logger.warning(f"   安装方式: pip install {server_config.id}")
+                logger.warning("   安装后将自动启用LSP增强功能")
+                server_config = None
+            self._lsp_servers[ext] = server_config is not None
+        if not self._lsp_servers[ext]:
+            return None
+        
+        try:
             # 🔥 使用with_lsp_client会自动启动LSP服务器
-            # 获取文档符号
-            logger.debug(f"    调用with_lsp_client获取符号...")
+            self._lsp_stats['requests'] += 1
             symbols = await with_lsp_client(
-                file_path,
-                lambda client: client.document_symbols(file_path)
-            )
-            
-            logger.debug(f"    获取到 {len(symbols) if symbols else 0} 个符号")
-            
-            if not symbols:
-                return self._empty_lsp_info()
-            
-            # 过滤出当前chunk范围内的符号
-            chunk_symbols = self._filter_symbols_in_range(
-                symbols,
-                chunk['start'],
-                chunk['end']
+                str(file_path),
+                lambda client: client.document_symbols(str(file_path))
             )
-            
-            # 分析类型注解
-            has_type_annotations = self._has_type_annotations(chunk_symbols)
-            
-            # 估算引用计数（基于符号数量和重要性）
-            reference_count = self._estimate_reference_count(chunk_symbols)
-            
-            return {
-                'has_lsp_info': True,
-                'symbol_count': len(chunk_symbols),
-                'has_type_annotations': has_type_annotations,
-                'reference_count': reference_count,
-                'lsp_symbols': chunk_symbols
-            }
-        
         except Exception as e:
-            logger.warning(f"⚠️  获取LSP信息失败 {file_path}: {e}")
-            import traceback
+            logger.warning(f"⚠️  获取LSP信息失败 {rel_path}: {e}")
             logger.debug(traceback.format_exc())
-            return self._empty_lsp_info()
+            return None
+        
+        symbols = symbols or []
+        self._lsp_cache[rel_path] = (digest, symbols)
+        return symbols
+    
+    def _chunk_lsp_info(self, symbols: List[Dict], chunk: Dict) -> Dict[str, Any]:
+        """
+        根据文件符号计算chunk的LSP信息
+        
+        Returns:
+            {
+                'has_lsp_info': bool,
+                'symbol_count': int,
+                'has_type_annotations': bool,
+                'reference_count': int,
+                'lsp_symbols': List[Dict]
+            }
+        """
+        # 过滤出当前chunk范围内的符号
+        chunk_symbols = self._filter_symbols_in_range(
+            symbols,
+            chunk['start'],
+            chunk['end']
+        )
+        
+        return {
+            'has_lsp_info': True,
+            'symbol_count': len(chunk_symbols),
+            # 分析类型注解
+            'has_type_annotations': self._has_type_annotations(chunk_symbols),
+            # 估算引用计数（基于符号数量和重要性）
+            'reference_count': self._estimate_reference_count(chunk_symbols),
+            'lsp_symbols': chunk_symbols
+        }
     
     def _empty_lsp_info(self) -> Dict[str, Any]:
         """返回空的LSP信息"""
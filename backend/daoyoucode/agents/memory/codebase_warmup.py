@@ -0,0 +1,158 @@
+"""
+代码库索引后台预热
+
+首次按问检索时，CodebaseIndex.build_index 要解析整个仓库并计算向量，
+在事件循环上同步执行会让整个进程卡住几分钟。这里把构建放到后台线程：
+- 每个仓库只预热一次（幂等），会话开始时启动
+- 记录阶段和进度，供界面/日志查询
+- 检索方可以在时间预算内等待；没有就绪时由调用方回退到关键词检索
+
+使用线程而不是进程：索引需要留在当前进程的内存里供检索使用，
+而向量编码（numpy / torch）会释放 GIL，不会长时间阻塞事件循环。
+"""
+
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Any, Dict, Optional, Set
+import asyncio
+import logging
+import threading
+import time
+
+from .codebase_index import _repo_key, invalidate_codebase_indexes
+from .daemon_executor import DaemonExecutor
+
+logger = logging.getLogger(__name__)
+
+# 所有仓库共用一个构建线程（构建本身是 CPU 密集的，并行构建没有收益；
+# 守护线程：会话退出时不等待未完成的构建）
+_executor = DaemonExecutor("codebase-index")
+_warmups: Dict[str, "IndexWarmup"] = {}
+_lock = threading.Lock()
+
+
+class IndexWarmup:
+    """
+    单个仓库的索引预热任务
+
+    状态：pending -> building -> ready / failed
+    """
+
+    def __init__(self, repo_path: Path):
+        self.repo_path = Path(repo_path).resolve()
+        self.state = "pending"
+        self.phase = ""
+        self.done = 0
+        self.total = 0
+        self.chunks = 0
+        self.error: Optional[str] = None
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.future: Optional[Future] = None
+
+    @property
+    def ready(self) -> bool:
+        return self.state == "ready"
+
+    def status(self) -> Dict[str, Any]:
+        """当前状态（阶段、进度、耗时）"""
+        end = self.finished_at or time.time()
+        return {
+            "state": self.state,
+            "phase": self.phase,
+            "done": self.done,
+            "total": self.total,
+            "chunks": self.chunks,
+            "error": self.error,
+            "elapsed": round(end - self.started_at, 2) if self.started_at else 0.0,
+        }
+
+    async def wait(self, timeout: Optional[float] = None) -> bool:
+        """
+        等待构建完成（不阻塞事件循环）
+
+        Args:
+            timeout: 最长等待秒数；None 表示一直等待
+
+        Returns:
+            索引是否已就绪
+        """
+        if self.future is None:
+            return self.ready
+        try:
+            await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(self.future)), timeout)
+        except asyncio.TimeoutError:
+            pass
+        except Exception:
+            # 构建失败已记录在 error 中
+            pass
+        return self.ready
+
+    def _run(self):
+        from .codebase_index_lsp_enhanced import LSPEnhancedCodebaseIndex
+
+        self.state = "building"
+        self.started_at = time.time()
+        try:
+            index = LSPEnhancedCodebaseIndex.get_index(self.repo_path)
+            self.chunks = index.build_index(progress=self._on_progress)
+            if index.chunks:
+                # 检索时才初始化的缓存/模型也在这里准备好
+                self._on_progress("准备检索", 0, 0)
+                index._init_bm25_cache()
+                if index.embeddings is not None:
+                    index._get_retriever()
+            self.state = "ready"
+            logger.info(f"代码库索引预热完成: {self.chunks} 块，耗时 {time.time() - self.started_at:.1f}秒")
+        except Exception as e:
+            self.state = "failed"
+            self.error = str(e)
+            logger.warning(f"代码库索引预热失败: {e}")
+            raise
+        finally:
+            self.finished_at = time.time()
+
+    def _on_progress(self, phase: str, done: int, total: int):
+        if phase != self.phase:
+            logger.info(f"代码库索引: {phase}")
+        self.phase, self.done, self.total = phase, done, total
+
+
+def start_index_warmup(repo_path: Path) -> IndexWarmup:
+    """
+    启动仓库索引的后台构建（幂等：已启动或已完成时直接返回）
+
+    失败的预热会在下次调用时重新启动。
+    """
+    key = _repo_key(Path(repo_path))
+    with _lock:
+        warmup = _warmups.get(key)
+        if warmup is None or warmup.state == "failed":
+            warmup = IndexWarmup(repo_path)
+            warmup.future = _executor.submit(warmup._run)
+            _warmups[key] = warmup
+        return warmup
+
+
+def refresh_codebase_indexes(root: Path, changed: Set[str]):
+    """
+    git 变化后在后台刷新已构建的代码库索引（只重新分块变化的文件）
+
+    刷新和构建共用一个线程；刷新期间检索看到的是刷新前的索引。
+    """
+    if not changed:
+        return
+    for index in invalidate_codebase_indexes(root, changed):
+        _executor.submit(_refresh_index, index)
+
+
+def _refresh_index(index):
+    try:
+        index.build_index()
+    except Exception as e:
+        logger.warning(f"代码库索引刷新失败: {e}")
+
+
+def get_index_warmup(repo_path: Path) -> Optional[IndexWarmup]:
+    """获取仓库的预热任务（未启动时返回None）"""
+    return _warmups.get(_repo_key(Path(repo_path)))
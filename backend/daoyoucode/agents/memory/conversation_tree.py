@@ -159,6 +159,9 @@ class ConversationTree:
         from .bm25_matcher import get_bm25_matcher
         self._bm25_matcher = get_bm25_matcher()
         
+        # 每个分支的增量BM25索引：branch_id -> BM25Index
+        self._branch_indexes: Dict[str, Any] = {}
+        
         logger.info(f"对话树已初始化（启用: {enabled}）")
     
     def add_conversation(
@@ -289,27 +292,14 @@ class ConversationTree:
             # 当前分支没有对话，不判断为切换
             return False, None
         
-        # 收集历史文本和时间戳
-        history_texts = []
-        history_timestamps = []
-        
-        for conv_id in branch_conversations:
-            if conv_id in self._nodes:
-                node = self._nodes[conv_id]
-                history_texts.append(node.user_message)
-                try:
-                    history_timestamps.append(datetime.fromisoformat(node.timestamp))
-                except:
-                    history_timestamps.append(datetime.now())
-        
-        if not history_texts:
+        # 分支的增量索引（只为新增的对话分词）
+        index = self._get_branch_index(self._current_branch_id)
+        if index.text_count == 0:
             return False, None
         
         # 使用BM25计算相似度
-        avg_similarity, max_similarity = self._bm25_matcher.calculate_similarity(
-            current_text=current_message,
-            history_texts=history_texts,
-            history_timestamps=history_timestamps,
+        avg_similarity, max_similarity = index.similarity(
+            current_message,
             current_time=datetime.now()
         )
         
@@ -337,6 +327,30 @@ class ConversationTree:
         )
         return False, None
     
+    def _get_branch_index(self, branch_id: str):
+        """
+        获取分支的BM25索引，并补齐索引之后新加入分支的对话
+        
+        分支只会追加对话，所以按已索引数量补齐即可。
+        """
+        index = self._branch_indexes.get(branch_id)
+        if index is None:
+            index = self._branch_indexes[branch_id] = self._bm25_matcher.create_index()
+        
+        branch_conversations = self._branches.get(branch_id, [])
+        for conv_id in branch_conversations[index.size:]:
+            node = self._nodes.get(conv_id)
+            if node is None:
+                index.skip()
+                continue
+            try:
+                timestamp = datetime.fromisoformat(node.timestamp)
+            except (TypeError, ValueError):
+                timestamp = datetime.now()
+            index.add(node.user_message, timestamp)
+        
+        return index
+    
     def _extract_keywords(self, text: str) -> Set[str]:
         """
         提取关键词（多粒度）
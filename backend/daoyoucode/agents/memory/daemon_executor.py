@@ -0,0 +1,71 @@
+"""
+守护线程执行器
+
+ThreadPoolExecutor 的工作线程不是守护线程，解释器退出时会等待正在执行的任务
+（例如加载模型、构建索引）结束，会话退出要卡住几十秒甚至几分钟。
+后台预热任务的结果只在进程内有用，退出时直接丢弃即可，所以改用守护线程执行。
+"""
+
+from concurrent.futures import Executor, Future
+from typing import Optional
+import queue
+import threading
+
+
+class DaemonExecutor(Executor):
+    """
+    单线程执行器（工作线程是守护线程，不阻塞解释器退出）
+
+    任务按提交顺序在同一个线程中执行，线程在第一次提交时启动。
+    """
+
+    def __init__(self, thread_name: str):
+        self.thread_name = thread_name
+        self._queue: "queue.SimpleQueue" = queue.SimpleQueue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._shutdown = False
+
+    def submit(self, fn, /, *args, **kwargs) -> Future:
+        with self._lock:
+            if self._shutdown:
+                raise RuntimeError("cannot schedule new futures after shutdown")
+            future = Future()
+            self._queue.put((future, fn, args, kwargs))
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._worker, name=self.thread_name, daemon=True
+                )
+                self._thread.start()
+            return future
+
+    def shutdown(self, wait: bool = True, *, cancel_futures: bool = False):
+        with self._lock:
+            self._shutdown = True
+            if cancel_futures:
+                while True:
+                    try:
+                        item = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is not None:
+                        item[0].cancel()
+            self._queue.put(None)
+            thread = self._thread
+        if wait and thread is not None:
+            thread.join()
+
+    def _worker(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            future, fn, args, kwargs = item
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                result = fn(*args, **kwargs)
+            except BaseException as e:
+                future.set_exception(e)
+            else:
+                future.set_result(result)
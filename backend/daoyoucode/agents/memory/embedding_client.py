@@ -0,0 +1,342 @@
+"""
+异步 Embedding 客户端
+
+VectorRetrieverAPI 原来每次 encode 都用同步 httpx.Client 发一个请求，阻塞事件循环，
+find_relevant_history 还按历史消息逐条请求，一轮对话要几十次往返。
+
+AsyncEmbeddingClient：
+- 连接池：一个 httpx.AsyncClient 复用 keep-alive 连接（按事件循环创建）
+- 微批：BATCH_WINDOW 内并发的 encode 合并成一个 /embeddings 请求，相同文本只发一次
+  （MicroBatcher 与传输无关，本地模型的 VectorRetriever 也用它合并推理）
+- 持久缓存：按 (模型, 文本 sha256) 存 float32 向量（diskcache），重启后复用，
+  对话历史在后续轮次全部命中缓存，每轮只剩新消息一次往返
+
+缓存默认在 ~/.daoyoucode/cache/embeddings（跨项目共享，同一模型同一文本的向量相同）。
+"""
+
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+import asyncio
+import hashlib
+import logging
+import threading
+
+from diskcache import Cache
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# 微批窗口（秒）：窗口内的并发请求合并发送
+BATCH_WINDOW = 0.005
+# 单个请求最多多少条文本
+MAX_BATCH_SIZE = 100
+# 连接池大小
+MAX_CONNECTIONS = 8
+MAX_KEEPALIVE_CONNECTIONS = 4
+REQUEST_TIMEOUT = 30.0
+# 内存缓存最多保留的向量数（LRU；全部向量都在磁盘缓存中）
+MAX_MEMORY_ENTRIES = 4096
+
+
+def default_cache_dir() -> Path:
+    return Path.home() / ".daoyoucode" / "cache" / "embeddings"
+
+
+def embedding_key(model: str, text: str) -> str:
+    """缓存键：模型 + 文本哈希"""
+    return f"{model}:{hashlib.sha256(text.encode('utf-8')).hexdigest()}"
+
+
+class EmbeddingCache:
+    """
+    Embedding 持久缓存
+
+    内存 LRU 在前（最多 max_memory_entries 条），diskcache 在后
+    （首次使用时打开，打不开就只用内存）。向量以 float32 字节保存。
+    """
+
+    def __init__(self, cache_dir: Optional[Path] = None, max_memory_entries: int = MAX_MEMORY_ENTRIES):
+        self.cache_dir = Path(cache_dir) if cache_dir else default_cache_dir()
+        self.max_memory_entries = max_memory_entries
+        self._memory: "OrderedDict[str, Any]" = OrderedDict()
+        self._memory_lock = threading.Lock()  # 同步接口可能在其他线程调用
+        self._disk: Optional[Cache] = None
+        self._disk_failed = False
+
+    def _open_disk(self) -> Optional[Cache]:
+        if self._disk is None and not self._disk_failed:
+            try:
+                self.cache_dir.mkdir(parents=True, exist_ok=True)
+                self._disk = Cache(str(self.cache_dir))
+            except Exception as e:
+                logger.warning(f"⚠️ 无法打开 embedding 缓存 {self.cache_dir}: {e}")
+                self._disk_failed = True
+        return self._disk
+
+    def get(self, key: str) -> Optional['numpy.ndarray']:
+        with self._memory_lock:
+            vec = self._memory.get(key)
+            if vec is not None:
+                self._memory.move_to_end(key)
+                return vec
+        disk = self._open_disk()
+        if disk is None:
+            return None
+        try:
+            data = disk.get(key)
+        except Exception as e:
+            logger.debug(f"读取 embedding 缓存失败: {e}")
+            return None
+        if data is None:
+            return None
+
+        import numpy as np
+        vec = np.frombuffer(data, dtype=np.float32)
+        self._remember(key, vec)
+        return vec
+
+    def set(self, key: str, vec: 'numpy.ndarray'):
+        import numpy as np
+        vec = np.asarray(vec, dtype=np.float32)
+        self._remember(key, vec)
+        disk = self._open_disk()
+        if disk is not None:
+            try:
+                disk.set(key, vec.tobytes())
+            except Exception as e:
+                logger.debug(f"写入 embedding 缓存失败: {e}")
+
+    def _remember(self, key: str, vec: 'numpy.ndarray'):
+        with self._memory_lock:
+            self._memory[key] = vec
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_memory_entries:
+                self._memory.popitem(last=False)
+
+    def close(self):
+        if self._disk is not None:
+            self._disk.close()
+            self._disk = None
+
+
+class EmbeddingRequestError(Exception):
+    """Embedding API 请求失败"""
+
+
+def parse_embeddings(data: Dict[str, Any], count: int) -> List['numpy.ndarray']:
+    """解析 OpenAI 格式的 /embeddings 响应（按 index 排序）"""
+    import numpy as np
+
+    items = data.get("data") or []
+    if len(items) != count:
+        raise EmbeddingRequestError(f"响应条数不符: 期望 {count}，实际 {len(items)}")
+    items = sorted(items, key=lambda item: item.get("index", 0))
+    return [np.array(item["embedding"], dtype=np.float32) for item in items]
+
+
+class MicroBatcher:
+    """
+    微批器：把并发提交的文本合并成批次交给 fetch
+
+    第一个提交开启 window 秒的收集窗口（攒满 max_batch_size 立即发送），
+    相同的键在等待发送或处理中时共用同一个 Future。
+    状态按事件循环保存（Future 不能跨循环使用）。
+    """
+
+    def __init__(
+        self,
+        fetch: Callable[[List[str]], Awaitable[List[Any]]],
+        window: Optional[float] = None,
+        max_batch_size: int = MAX_BATCH_SIZE
+    ):
+        self.fetch = fetch
+        self.window = BATCH_WINDOW if window is None else window
+        self.max_batch_size = max_batch_size
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._pending: Dict[str, Tuple[str, asyncio.Future]] = {}
+        self._inflight: Dict[str, Tuple[str, asyncio.Future]] = {}
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+
+        self.stats = {"batches": 0, "deduplicated": 0, "errors": 0}
+
+    def submit(self, key: str, text: str) -> asyncio.Future:
+        """提交一条文本，返回结果 Future"""
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            # 换了事件循环（例如每次 asyncio.run）：旧的等待者都不可用
+            self._loop = loop
+            self._pending = {}
+            self._inflight = {}
+            self._flush_handle = None
+
+        # 相同文本已在等待发送或处理中：共用同一个 Future
+        pending = self._pending.get(key) or self._inflight.get(key)
+        if pending is not None:
+            self.stats["deduplicated"] += 1
+            return pending[1]
+
+        future = loop.create_future()
+        self._pending[key] = (text, future)
+        if len(self._pending) >= self.max_batch_size:
+            self._schedule_flush(0)
+        elif self._flush_handle is None:
+            self._schedule_flush(self.window)
+        return future
+
+    def close(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+
+    def _schedule_flush(self, delay: float):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+        self._flush_handle = self._loop.call_later(delay, self._flush)
+
+    def _flush(self):
+        self._flush_handle = None
+        pending, self._pending = self._pending, {}
+        self._inflight.update(pending)
+        items = list(pending.items())
+        for i in range(0, len(items), self.max_batch_size):
+            self._loop.create_task(self._send(items[i:i + self.max_batch_size]))
+
+    async def _send(self, batch: List[Tuple[str, Tuple[str, asyncio.Future]]]):
+        self.stats["batches"] += 1
+        try:
+            results = await self.fetch([text for _, (text, _) in batch])
+        except Exception as e:
+            self.stats["errors"] += 1
+            logger.error(f"❌ Embedding 批次失败: {e}")
+            for _, (_, future) in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        finally:
+            for key, _ in batch:
+                self._inflight.pop(key, None)
+
+        for (_, (_, future)), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+
+async def gather_embeddings(futures: Sequence[asyncio.Future]) -> List[Optional['numpy.ndarray']]:
+    """等待一组 Future（失败的位置为 None）"""
+    # shield：相同文本的 Future 是共享的，一个调用方被取消不能影响其他等待者
+    results = await asyncio.gather(*(asyncio.shield(f) for f in futures), return_exceptions=True)
+    vectors = []
+    for result in results:
+        if isinstance(result, BaseException):
+            if isinstance(result, asyncio.CancelledError):
+                raise result
+            vectors.append(None)
+        else:
+            vectors.append(result)
+    return vectors
+
+
+class AsyncEmbeddingClient:
+    """
+    异步 Embedding 客户端（连接池 + 微批 + 去重 + 持久缓存）
+
+    并发调用 encode 时，第一个调用开启 BATCH_WINDOW 的收集窗口，
+    窗口结束后未命中缓存的不同文本合并成请求发送，结果分发给各个等待者。
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        model: str,
+        api_key: Optional[str] = None,
+        cache: Optional[EmbeddingCache] = None,
+        batch_window: Optional[float] = None,
+        max_batch_size: int = MAX_BATCH_SIZE,
+        transport: Optional[httpx.AsyncBaseTransport] = None
+    ):
+        self.base_url = base_url
+        self.model = model
+        self.api_key = api_key
+        self.cache = cache if cache is not None else EmbeddingCache()
+        self.batcher = MicroBatcher(self._request, batch_window, max_batch_size)
+        self._transport = transport
+
+        # 连接池按事件循环创建（AsyncClient 不能跨循环使用）
+        self._client: Optional[httpx.AsyncClient] = None
+        self._client_loop: Optional[asyncio.AbstractEventLoop] = None
+
+        self._stats = {
+            "requests": 0,
+            "texts_sent": 0,
+            "cache_hits": 0,
+        }
+
+    def headers(self) -> Dict[str, str]:
+        headers = {"Content-Type": "application/json"}
+        if self.api_key:
+            headers["Authorization"] = f"Bearer {self.api_key}"
+        return headers
+
+    # ========== 对外接口 ==========
+
+    async def encode(self, text: str) -> Optional['numpy.ndarray']:
+        """编码单条文本（失败返回 None）"""
+        return (await self.encode_many([text]))[0]
+
+    async def encode_many(self, texts: Sequence[str]) -> List[Optional['numpy.ndarray']]:
+        """编码多条文本，和其他并发调用一起微批发送（失败的位置为 None）"""
+        return await gather_embeddings([self._submit(text) for text in texts])
+
+    async def aclose(self):
+        """关闭连接池"""
+        self.batcher.close()
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def get_stats(self) -> Dict[str, int]:
+        return {**self._stats, **self.batcher.stats}
+
+    # ========== 内部方法 ==========
+
+    def _submit(self, text: str) -> asyncio.Future:
+        key = embedding_key(self.model, text)
+        cached = self.cache.get(key)
+        if cached is not None:
+            self._stats["cache_hits"] += 1
+            future = asyncio.get_running_loop().create_future()
+            future.set_result(cached)
+            return future
+        return self.batcher.submit(key, text)
+
+    def _http_client(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._client_loop is not loop:
+            self._client_loop = loop
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                headers=self.headers(),
+                timeout=REQUEST_TIMEOUT,
+                limits=httpx.Limits(
+                    max_connections=MAX_CONNECTIONS,
+                    max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS
+                ),
+                transport=self._transport
+            )
+        return self._client
+
+    async def _request(self, texts: List[str]) -> List['numpy.ndarray']:
+        self._stats["requests"] += 1
+        self._stats["texts_sent"] += len(texts)
+        response = await self._http_client().post(
+            "/embeddings",
+            json={"model": self.model, "input": texts}
+        )
+        if response.status_code != 200:
+            raise EmbeddingRequestError(f"API请求失败: {response.status_code} {response.text[:200]}")
+        vectors = parse_embeddings(response.json(), len(texts))
+        for text, vec in zip(texts, vectors):
+            self.cache.set(embedding_key(self.model, text), vec)
+        return vectors
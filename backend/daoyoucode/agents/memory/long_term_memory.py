@@ -4,7 +4,7 @@
 功能：
 1. 对话摘要（每N轮自动生成）
 2. 关键信息提取（症状、诊断、建议等）
-3. 用户画像（偏好、历史问题等）
+3. 用户画像（偏好、历史问题等，统计字段按轮增量更新）
 
 存储层次：
 - 短期记忆：最近10轮对话（内存，1小时）
@@ -48,6 +48,10 @@ class LongTermMemory:
         self.profile_cache = get_profile_cache()
         self.summary_cache = get_summary_cache()
         
+        # 用户画像增量统计
+        from .profile_aggregator import ProfileAggregator
+        self.aggregator = ProfileAggregator(storage)
+        
         logger.info("长期记忆管理器已初始化（带缓存）")
     
     async def generate_summary(
@@ -198,11 +202,14 @@ class LongTermMemory:
         
         try:
             # 调用LLM提取关键信息
-            response = await llm_client.chat(
-                messages=[{"role": "user", "content": extract_prompt}],
+            from ..llm.base import LLMRequest
+            request = LLMRequest(
+                prompt=extract_prompt,
+                model=llm_client.model,
                 temperature=0.1,
                 max_tokens=500
             )
+            response = await llm_client.chat(request)
             
             # 解析JSON
             import re
@@ -213,6 +220,11 @@ class LongTermMemory:
                 # 保存到存储
                 if self.storage:
                     self.storage.save_key_info(session_id, key_info)
+                    
+                    # 计入用户画像的话题统计
+                    user_id = self.storage.get_session_user(session_id)
+                    if user_id:
+                        self.aggregator.record_key_info(user_id, session_id, key_info)
                 
                 logger.info(f"✅ 提取关键信息: session={session_id}")
                 return key_info
@@ -238,6 +250,9 @@ class LongTermMemory:
         """
         构建用户画像（跨session）
         
+        统计类字段来自增量聚合（ProfileAggregator），不扫描全部会话；
+        只有LLM深度分析会采样最近的对话。
+        
         Args:
             user_id: 用户ID
             all_sessions: 该用户的所有session列表（可选，自动收集）
@@ -255,59 +270,33 @@ class LongTermMemory:
                 "last_updated": "2026-02-15T12:00:00"
             }
         """
-        # 1. 收集所有会话数据
         if all_sessions is None:
             all_sessions = self._collect_user_sessions(user_id)
         
-        # 2. 基础统计
+        # 1. 统计字段（O(1)）；没有统计的老用户先做一次全量重建
+        if self.aggregator.conversation_count(user_id) == 0:
+            self.rebuild_user_aggregates(user_id, all_sessions)
+        
         profile = {
             "user_id": user_id,
             "total_sessions": len(all_sessions),
-            "total_conversations": 0,
             "last_updated": datetime.now().isoformat()
         }
+        profile.update(self.aggregator.get_profile(user_id) or {})
         
-        # 3. 聚合所有session的数据
-        all_conversations = []
-        all_key_info = []
-        
-        for session_id in all_sessions:
-            # 获取对话历史
-            history = self.storage.get_conversation_history(session_id) if self.storage else []
-            all_conversations.extend(history)
-            profile['total_conversations'] += len(history)
-            
-            # 获取关键信息
-            key_info = self.get_key_info(session_id)
-            if key_info:
-                all_key_info.append(key_info)
-        
-        # 4. 提取常见话题
-        profile['common_topics'] = self._extract_common_topics(all_conversations, all_key_info)
-        
-        # 5. 分析技能水平
-        profile['skill_level'] = self._analyze_skill_level(all_conversations)
-        
-        # 6. 分析偏好风格
-        profile['preferred_style'] = self._analyze_preferred_style(all_conversations)
-        
-        # 7. 分析活动模式
-        profile['activity_pattern'] = self._analyze_activity_pattern(all_conversations)
-        
-        # 8. 提取最近项目
-        profile['recent_projects'] = self._extract_recent_projects(all_conversations)
-        
-        # 9. 如果有LLM，进行深度分析
-        if llm_client and all_conversations:
-            try:
-                deep_analysis = await self._deep_analyze_with_llm(
-                    user_id, all_conversations, llm_client
-                )
-                profile.update(deep_analysis)
-            except Exception as e:
-                logger.warning(f"LLM深度分析失败: {e}")
-        
-        # 10. 保存到存储
+        # 2. 如果有LLM，进行深度分析
+        if llm_client:
+            recent = self._recent_conversations(all_sessions, limit=20)
+            if recent:
+                try:
+                    deep_analysis = await self._deep_analyze_with_llm(
+                        user_id, recent, llm_client
+                    )
+                    profile.update(deep_analysis)
+                except Exception as e:
+                    logger.warning(f"LLM深度分析失败: {e}")
+        
+        # 3. 保存到存储
         if self.storage:
             self.storage.save_user_profile(user_id, profile)
         
@@ -317,176 +306,101 @@ class LongTermMemory:
         logger.info(
             f"✅ 构建用户画像: user_id={user_id}, "
             f"sessions={len(all_sessions)}, "
-            f"conversations={profile['total_conversations']}, "
-            f"topics={len(profile['common_topics'])}"
+            f"conversations={profile.get('total_conversations', 0)}, "
+            f"topics={len(profile.get('common_topics', []))}"
         )
         
         return profile
     
-    def _collect_user_sessions(self, user_id: str) -> List[str]:
+    def record_conversation(
+        self,
+        session_id: str,
+        user_message: str,
+        user_id: Optional[str] = None,
+        timestamp: Optional[str] = None
+    ):
         """
-        收集用户的所有会话ID
+        把一轮对话计入用户画像统计（每轮 O(1)，本轮应已保存到存储）
+        
+        Args:
+            session_id: 会话ID
+            user_message: 用户消息
+            user_id: 用户ID（为空时按会话映射查找）
+            timestamp: ISO 时间戳
+        """
+        if user_id is None and self.storage:
+            user_id = self.storage.get_session_user(session_id)
+        if not user_id:
+            return
+        
+        # 没有统计（或统计为空）的老用户：从已保存的历史全量重建一次。
+        # 调用方先保存本轮再计入，重建结果已包含本轮；历史为空时才按本轮增量计入
+        if self.aggregator.conversation_count(user_id) == 0:
+            rebuilt = self.rebuild_user_aggregates(user_id)
+            if rebuilt and rebuilt.get('total_conversations'):
+                return
+        self.aggregator.record_conversation(user_id, user_message, timestamp)
+    
+    def rebuild_user_aggregates(
+        self,
+        user_id: str,
+        all_sessions: List[str] = None
+    ) -> Dict[str, Any]:
+        """
+        全量重建用户画像统计（离线修复用，耗时随历史增长）
         
         Args:
             user_id: 用户ID
+            all_sessions: 该用户的所有session列表（可选，自动收集）
         
         Returns:
-            会话ID列表
+            重建后的统计字段
         """
-        if not self.storage:
-            return []
+        if all_sessions is None:
+            all_sessions = self._collect_user_sessions(user_id)
         
-        return self.storage.get_user_sessions(user_id)
-    
-    def _extract_common_topics(
-        self,
-        conversations: List[Dict],
-        key_info_list: List[Dict]
-    ) -> List[str]:
-        """提取常见话题"""
-        from collections import Counter
-        
-        all_topics = []
-        
-        # 从关键信息中提取
-        for info in key_info_list:
-            topics = info.get('main_topics', [])
-            all_topics.extend(topics)
-        
-        # 从对话中提取关键词
-        keywords = [
-            'python', 'javascript', 'java', 'go', 'rust',
-            'testing', 'refactoring', 'performance', 'debugging',
-            'api', 'database', 'frontend', 'backend',
-            'docker', 'kubernetes', 'ci/cd'
-        ]
-        
-        for conv in conversations:
-            user_msg = conv.get('user', '').lower()
-            for keyword in keywords:
-                if keyword in user_msg:
-                    all_topics.append(keyword)
-        
-        # 统计频率，返回前5个
-        topic_counter = Counter(all_topics)
-        return [t for t, _ in topic_counter.most_common(5)]
-    
-    def _analyze_skill_level(self, conversations: List[Dict]) -> str:
-        """分析技能水平"""
-        if not conversations:
-            return 'unknown'
-        
-        # 简单启发式规则
-        total = len(conversations)
-        
-        # 统计复杂问题的比例
-        complex_indicators = [
-            'architecture', 'design pattern', 'optimization',
-            'performance', 'scalability', 'concurrency'
-        ]
-        
-        complex_count = 0
-        for conv in conversations:
-            user_msg = conv.get('user', '').lower()
-            if any(indicator in user_msg for indicator in complex_indicators):
-                complex_count += 1
-        
-        complex_ratio = complex_count / total if total > 0 else 0
-        
-        if complex_ratio > 0.3:
-            return 'advanced'
-        elif complex_ratio > 0.1:
-            return 'intermediate'
-        else:
-            return 'beginner'
-    
-    def _analyze_preferred_style(self, conversations: List[Dict]) -> str:
-        """分析偏好风格"""
-        if not conversations:
-            return 'unknown'
-        
-        # 统计风格关键词
-        style_keywords = {
-            'functional': ['functional', 'lambda', 'map', 'filter', 'reduce'],
-            'oop': ['class', 'object', 'inheritance', 'polymorphism'],
-            'procedural': ['function', 'procedure', 'step by step']
-        }
+        conversations = []
+        key_info_by_session = {}
+        for session_id in all_sessions:
+            if self.storage:
+                conversations.extend(self.storage.get_conversation_history(session_id))
+            key_info = self.get_key_info(session_id)
+            if key_info:
+                key_info_by_session[session_id] = key_info
         
-        style_counts = {style: 0 for style in style_keywords}
+        conversations.sort(key=lambda c: c.get('timestamp') or '')
+        return self.aggregator.rebuild(user_id, conversations, key_info_by_session)
+    
+    def _recent_conversations(self, sessions: List[str], limit: int) -> List[Dict]:
+        """从最近的会话往前取最多 limit 轮对话（按时间顺序返回）"""
+        if not self.storage:
+            return []
         
-        for conv in conversations:
-            user_msg = conv.get('user', '').lower()
-            for style, keywords in style_keywords.items():
-                if any(kw in user_msg for kw in keywords):
-                    style_counts[style] += 1
+        collected: List[Dict] = []
+        for session_id in reversed(sessions):
+            history = self.storage.get_conversation_history(session_id)
+            collected.extend(reversed(history))
+            if len(collected) >= limit:
+                break
         
-        # 返回最常见的风格
-        max_style = max(style_counts, key=style_counts.get)
-        return max_style if style_counts[max_style] > 0 else 'unknown'
-    
-    def _analyze_activity_pattern(self, conversations: List[Dict]) -> str:
-        """分析活动模式"""
-        if not conversations:
-            return 'unknown'
-        
-        # 统计时间戳（如果有）
-        from collections import Counter
-        
-        hours = []
-        for conv in conversations:
-            timestamp = conv.get('timestamp')
-            if timestamp:
-                try:
-                    dt = datetime.fromisoformat(timestamp)
-                    hours.append(dt.hour)
-                except:
-                    pass
-        
-        if not hours:
-            return 'unknown'
-        
-        # 分析时段
-        hour_counter = Counter(hours)
-        avg_hour = sum(hours) / len(hours)
-        
-        if 6 <= avg_hour < 12:
-            return 'morning'
-        elif 12 <= avg_hour < 18:
-            return 'afternoon'
-        elif 18 <= avg_hour < 24:
-            return 'evening'
-        else:
-            return 'night'
+        collected = collected[:limit]
+        collected.sort(key=lambda c: c.get('timestamp') or '')
+        return collected
     
-    def _extract_recent_projects(self, conversations: List[Dict]) -> List[str]:
-        """提取最近项目"""
-        projects = []
+    def _collect_user_sessions(self, user_id: str) -> List[str]:
+        """
+        收集用户的所有会话ID
         
-        # 查找项目相关的关键词
-        project_indicators = ['project', '项目', 'working on', '在做']
+        Args:
+            user_id: 用户ID
         
-        for conv in conversations[-20:]:  # 只看最近20轮
-            user_msg = conv.get('user', '')
-            
-            # 简单提取（实际应该用NER）
-            if any(indicator in user_msg.lower() for indicator in project_indicators):
-                # 提取项目名称（简化实现）
-                words = user_msg.split()
-                for i, word in enumerate(words):
-                    if word.lower() in project_indicators and i + 1 < len(words):
-                        project_name = words[i + 1].strip(',.!?')
-                        if project_name and len(project_name) > 2:
-                            projects.append(project_name)
-        
-        # 去重并返回最近3个
-        seen = set()
-        unique_projects = []
-        for p in reversed(projects):
-            if p not in seen:
-                seen.add(p)
-                unique_projects.append(p)
-        
-        return unique_projects[:3]
+        Returns:
+            会话ID列表
+        """
+        if not self.storage:
+            return []
+        
+        return self.storage.get_user_sessions(user_id)
     
     async def _deep_analyze_with_llm(
         self,
@@ -600,8 +514,8 @@ class LongTermMemory:
         Returns:
             是否应该更新
         """
-        # 获取现有画像
-        profile = self.get_user_profile(user_id)
+        # 获取上次保存的画像（统计字段是实时的，这里只看上次构建时的对话数）
+        profile = self._get_saved_profile(user_id)
         
         if not profile:
             # 没有画像，且对话数>=10，创建画像
@@ -615,7 +529,9 @@ class LongTermMemory:
     
     def get_user_profile(self, user_id: str) -> Optional[Dict]:
         """
-        获取用户画像（带缓存）
+        获取用户画像（常数时间）
+        
+        上次构建保存的画像（含LLM深度分析结果）叠加增量统计得出的最新字段。
         
         Args:
             user_id: 用户ID
@@ -623,6 +539,17 @@ class LongTermMemory:
         Returns:
             用户画像字典
         """
+        saved = self._get_saved_profile(user_id)
+        live = self.aggregator.get_profile(user_id)
+        if live is None:
+            return saved
+        
+        profile = dict(saved) if saved else {'user_id': user_id}
+        profile.update(live)
+        return profile
+    
+    def _get_saved_profile(self, user_id: str) -> Optional[Dict]:
+        """获取上次保存的用户画像（带缓存）"""
         # 尝试从缓存获取
         cached = self.profile_cache.get(user_id)
         if cached is not None:
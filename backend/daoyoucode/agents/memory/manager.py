@@ -52,6 +52,10 @@ class MemoryManager:
         self.long_term_memory = LongTermMemory(storage=self.storage)
         self.smart_loader = SmartLoader(enable_tree=enable_tree)
         
+        # ========== 轮后任务（摘要、关键信息、画像在后台执行）==========
+        from .post_turn import PostTurnPipeline
+        self.post_turn = PostTurnPipeline(self)
+        
         # ========== 对话树（可选）==========
         self.enable_tree = enable_tree
         self._conversation_tree = None
@@ -105,6 +109,9 @@ class MemoryManager:
             user_id=user_id
         )
         
+        # 计入用户画像统计（增量，O(1)）
+        self.long_term_memory.record_conversation(session_id, user_message, user_id=user_id)
+        
         # 清除历史缓存（因为数据已更新）
         # 清除所有相关的缓存键
         for limit in [None, 1, 2, 3, 5, 10]:
@@ -368,9 +375,14 @@ class MemoryManager:
         """清除会话"""
         self.storage.clear_session(session_id)
     
+    def flush(self):
+        """立即把待写的记忆数据落盘"""
+        self.storage.flush()
+    
     def get_stats(self) -> Dict[str, Any]:
         """获取统计信息"""
         stats = self.storage.get_stats()
+        stats['post_turn'] = self.post_turn.get_stats()
         
         # 添加对话树统计
         if self.enable_tree and self._conversation_tree:
@@ -0,0 +1,401 @@
+"""
+轮后任务流水线（Post-Turn Pipeline）
+
+把每轮对话之后的记忆维护移出回答主路径：
+- 摘要（summary）：按会话
+- 用户画像（profile）：按用户
+
+特性：
+- 去重合并：同一 (类型, 会话/用户) 只保留一个待执行任务，执行中再次提交会在结束后补跑一次
+- 有界并发：同时执行的任务数有上限，避免后台 LLM 调用挤占主对话
+- 失败重试：指数退避，超过次数后放弃
+- 持久化：画像任务记录到存储中，进程重启后继续；摘要依赖内存中的对话历史，重启后无法执行，不记录
+- 可观测：队列深度、执行中数量、最大等待时间等统计
+
+任务在流水线自己的后台线程和事件循环上执行：CLI 每轮用 run_until_complete 驱动主循环，
+轮与轮之间主循环不运行，挂在主循环上的任务要等到下一轮才有进展，退出时直接丢失。
+后台循环使用自己的 HTTP 连接池（httpx.AsyncClient 不能跨事件循环使用）。
+"""
+
+from dataclasses import dataclass, field, asdict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+import asyncio
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# 任务类型
+JOB_SUMMARY = 'summary'
+JOB_PROFILE = 'profile'
+
+# 重启后仍能执行的任务类型（输入来自存储，而不是内存中的对话历史）
+DURABLE_KINDS = (JOB_PROFILE,)
+
+
+@dataclass
+class PostTurnJob:
+    """一个轮后任务（只包含可持久化的数据，执行时再读取最新的对话状态）"""
+    kind: str
+    target: str                     # session_id 或 user_id
+    model: Optional[str] = None
+    attempts: int = 0
+    enqueued_at: float = field(default_factory=time.time)
+    not_before: float = 0.0         # 重试退避：该时间之前不执行
+    last_error: Optional[str] = None
+
+    @property
+    def key(self) -> Tuple[str, str]:
+        return (self.kind, self.target)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'PostTurnJob':
+        return cls(
+            kind=data['kind'],
+            target=data['target'],
+            model=data.get('model'),
+            attempts=data.get('attempts', 0),
+            enqueued_at=data.get('enqueued_at', time.time()),
+            not_before=data.get('not_before', 0.0),
+            last_error=data.get('last_error'),
+        )
+
+
+class PostTurnPipeline:
+    """
+    轮后任务流水线
+
+    任务在后台线程的事件循环上执行（首次有任务时启动，守护线程），
+    工作协程在队列清空后退出。submit 可以在任意线程调用。
+
+    使用示例：
+        pipeline = PostTurnPipeline(memory_manager)
+        pipeline.submit('summary', session_id, model='qwen-max')
+        await pipeline.drain(timeout=30)  # 异步等待完成（测试）
+        pipeline.wait(timeout=30)         # 同步等待完成（退出前）
+    """
+
+    def __init__(
+        self,
+        memory,
+        max_concurrency: int = 2,
+        max_attempts: int = 3,
+        retry_delay: float = 2.0,
+        client_factory: Optional[Callable[[str], Any]] = None
+    ):
+        """
+        初始化流水线
+
+        Args:
+            memory: MemoryManager 实例
+            max_concurrency: 同时执行的任务数上限
+            max_attempts: 每个任务的最大尝试次数
+            retry_delay: 首次重试的等待时间（秒），之后按 2 倍递增
+            client_factory: model -> LLM 客户端（默认使用 LLMClientManager）
+        """
+        self.memory = memory
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_attempts = max(1, max_attempts)
+        self.retry_delay = retry_delay
+        self._client_factory = client_factory
+
+        self._handlers: Dict[str, Callable[[PostTurnJob], Awaitable[Any]]] = {
+            JOB_SUMMARY: self._run_summary,
+            JOB_PROFILE: self._run_profile,
+        }
+
+        # key -> job，按提交顺序执行（_lock 保护：提交方和后台线程都会访问）
+        self._lock = threading.Lock()
+        self._pending: Dict[Tuple[str, str], PostTurnJob] = {}
+        self._running: Dict[Tuple[str, str], PostTurnJob] = {}
+
+        # 后台线程和事件循环（_workers、_wakeup 只在后台循环上访问）
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._workers: set = set()
+        self._wakeup = asyncio.Event()
+        self._http_client = None
+
+        # 画像版本号（调用方据此判断自己的画像缓存是否过期）
+        self._profile_versions: Dict[str, int] = {}
+
+        self._stats = {
+            'submitted': 0, 'coalesced': 0, 'completed': 0,
+            'retried': 0, 'failed': 0, 'max_lag': 0.0,
+        }
+
+        self._restore()
+        self._ensure_workers()
+
+    # ========== 提交 ==========
+
+    def submit(self, kind: str, target: str, model: Optional[str] = None) -> bool:
+        """
+        提交任务（立即返回）
+
+        同一 (kind, target) 已在队列中时合并为一个（更新模型，保留最早的提交时间）。
+
+        Args:
+            kind: 任务类型（summary / profile）
+            target: 会话ID（summary）或用户ID（profile）
+            model: 使用的模型
+
+        Returns:
+            是否新增了任务（False 表示与已有任务合并）
+        """
+        if kind not in self._handlers:
+            raise ValueError(f"未知的轮后任务类型: {kind}")
+
+        key = (kind, target)
+        with self._lock:
+            self._stats['submitted'] += 1
+            existing = self._pending.get(key)
+            if existing is not None:
+                self._stats['coalesced'] += 1
+                if model:
+                    existing.model = model
+                # 新的提交意味着有新数据，不再等待退避
+                existing.not_before = 0.0
+                added = False
+            else:
+                self._pending[key] = PostTurnJob(kind=kind, target=target, model=model)
+                added = True
+
+        self._persist()
+        self._ensure_workers()
+        return added
+
+    def profile_version(self, user_id: str) -> int:
+        """用户画像被后台更新的次数"""
+        return self._profile_versions.get(user_id, 0)
+
+    async def drain(self, timeout: Optional[float] = None) -> bool:
+        """
+        等待队列清空（包括退避中的重试，不阻塞调用方的事件循环）
+
+        Returns:
+            是否在超时前全部完成
+        """
+        self._ensure_workers()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not self._idle():
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            await asyncio.sleep(0.01)
+        return True
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """
+        同步等待队列清空（退出前调用；超时未完成的任务已持久化，下次启动继续）
+
+        Returns:
+            是否在超时前全部完成
+        """
+        self._ensure_workers()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not self._idle():
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(0.02)
+        return True
+
+    @property
+    def depth(self) -> int:
+        """待执行任务数"""
+        return len(self._pending)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取统计信息"""
+        now = time.time()
+        with self._lock:
+            oldest = min((job.enqueued_at for job in self._pending.values()), default=None)
+            return {
+                **self._stats,
+                'pending': len(self._pending),
+                'running': len(self._running),
+                'oldest_pending_age': round(now - oldest, 3) if oldest is not None else 0.0,
+            }
+
+    def _idle(self) -> bool:
+        with self._lock:
+            return not self._pending and not self._running
+
+    # ========== 调度 ==========
+
+    def _ensure_workers(self):
+        """有待执行任务时启动后台循环（首次），并在后台循环上补足工作协程"""
+        with self._lock:
+            if not self._pending:
+                return
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(
+                    target=self._loop.run_forever, name="post-turn", daemon=True
+                )
+                self._thread.start()
+            loop = self._loop
+        loop.call_soon_threadsafe(self._spawn_workers)
+
+    def _spawn_workers(self):
+        """在后台循环上执行"""
+        self._workers = {w for w in self._workers if not w.done()}
+        with self._lock:
+            wanted = min(self.max_concurrency, len(self._pending)) - len(self._workers)
+        for _ in range(max(0, wanted)):
+            self._workers.add(self._loop.create_task(self._worker()))
+        self._wakeup.set()
+
+    def _next_job(self) -> Tuple[Optional[PostTurnJob], Optional[float]]:
+        """
+        取出下一个可执行的任务（调用方持有 _lock）
+
+        Returns:
+            (任务, None)，或者 (None, 需要等待的秒数)；队列为空时为 (None, None)
+        """
+        now = time.time()
+        wait = None
+        for key, job in self._pending.items():
+            if key in self._running:
+                # 同一会话/用户的任务串行执行
+                continue
+            if job.not_before > now:
+                delay = job.not_before - now
+                wait = delay if wait is None else min(wait, delay)
+                continue
+            del self._pending[key]
+            return job, None
+        if wait is None and self._pending:
+            # 只剩与执行中任务同 key 的，等它结束
+            wait = 0.05
+        return None, wait
+
+    async def _worker(self):
+        """工作协程：队列为空时退出"""
+        while True:
+            with self._lock:
+                job, wait = self._next_job()
+                if job is not None:
+                    self._running[job.key] = job
+            if job is None:
+                if wait is None:
+                    return
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=wait)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            lag = time.time() - job.enqueued_at
+            self._stats['max_lag'] = max(self._stats['max_lag'], round(lag, 3))
+            try:
+                job.attempts += 1
+                await self._handlers[job.kind](job)
+                self._stats['completed'] += 1
+                logger.debug(f"轮后任务完成: {job.kind}:{job.target}（等待 {lag:.2f}s）")
+            except asyncio.CancelledError:
+                # 循环关闭：放回队列，留待下次执行
+                self._requeue(job)
+                raise
+            except Exception as e:
+                job.last_error = f"{type(e).__name__}: {e}"
+                if job.attempts < self.max_attempts:
+                    job.not_before = time.time() + self.retry_delay * (2 ** (job.attempts - 1))
+                    self._stats['retried'] += 1
+                    self._requeue(job)
+                    logger.warning(f"轮后任务失败，稍后重试: {job.kind}:{job.target} ({job.last_error})")
+                else:
+                    self._stats['failed'] += 1
+                    logger.error(f"轮后任务放弃: {job.kind}:{job.target} ({job.last_error})")
+            finally:
+                with self._lock:
+                    self._running.pop(job.key, None)
+                self._persist()
+
+    def _requeue(self, job: PostTurnJob):
+        """失败的任务放回队列（期间又有新提交时，合并到新任务上）"""
+        with self._lock:
+            newer = self._pending.get(job.key)
+            if newer is not None:
+                newer.attempts = max(newer.attempts, job.attempts)
+                newer.enqueued_at = min(newer.enqueued_at, job.enqueued_at)
+                return
+            self._pending[job.key] = job
+
+    # ========== 持久化 ==========
+
+    def _persist(self):
+        """把未完成的可恢复任务记录到存储（写回队列异步落盘）"""
+        storage = getattr(self.memory, 'storage', None)
+        if storage is None or not hasattr(storage, 'save_post_turn_jobs'):
+            return
+        with self._lock:
+            jobs = [job.to_dict() for job in self._running.values() if job.kind in DURABLE_KINDS]
+            jobs.extend(
+                job.to_dict() for key, job in self._pending.items()
+                if key not in self._running and job.kind in DURABLE_KINDS
+            )
+        storage.save_post_turn_jobs(jobs)
+
+    def _restore(self):
+        """加载上次退出时未完成的任务"""
+        storage = getattr(self.memory, 'storage', None)
+        if storage is None or not hasattr(storage, 'get_post_turn_jobs'):
+            return
+        for data in storage.get_post_turn_jobs():
+            try:
+                job = PostTurnJob.from_dict(data)
+            except (KeyError, TypeError):
+                continue
+            if job.kind in DURABLE_KINDS:
+                self._pending.setdefault(job.key, job)
+        if self._pending:
+            logger.info(f"恢复了 {len(self._pending)} 个未完成的轮后任务")
+
+    # ========== 任务实现 ==========
+
+    def _get_client(self, model: Optional[str]):
+        if self._client_factory is not None:
+            return self._client_factory(model)
+        from ..llm import get_client_manager
+        if not model:
+            raise ValueError("轮后任务缺少模型")
+        if self._http_client is None:
+            # 后台循环专用的连接池（在后台循环上创建和使用）
+            import httpx
+            self._http_client = httpx.AsyncClient(
+                limits=httpx.Limits(max_connections=self.max_concurrency * 2),
+                timeout=httpx.Timeout(600.0)
+            )
+        return get_client_manager().get_client(model, http_client=self._http_client)
+
+    async def _run_summary(self, job: PostTurnJob):
+        history = self.memory.get_conversation_history(job.target)
+        if not history:
+            return
+        summary = await self.memory.long_term_memory.generate_summary(
+            job.target, history, self._get_client(job.model)
+        )
+        if not summary:
+            raise RuntimeError("摘要生成失败")
+
+    async def _run_profile(self, job: PostTurnJob):
+        sessions = self.memory.get_user_sessions(job.target)
+        if not sessions:
+            logger.warning(f"用户 {job.target} 没有会话记录，跳过画像更新")
+            return
+        profile = await self.memory.long_term_memory.build_user_profile(
+            user_id=job.target,
+            all_sessions=sessions,
+            llm_client=self._get_client(job.model)
+        )
+        self._profile_versions[job.target] = self._profile_versions.get(job.target, 0) + 1
+        logger.info(
+            f"✅ 用户画像已更新: user_id={job.target}, "
+            f"sessions={len(sessions)}, "
+            f"topics={len(profile.get('common_topics', []))}"
+        )
@@ -0,0 +1,321 @@
+"""
+用户画像增量聚合
+
+每轮对话写入时更新该用户的累计统计（O(1)），画像字段直接由统计得出，
+不再在构建画像时扫描用户的全部会话：
+- 话题计数（关键词 + 关键信息中的 main_topics）
+- 复杂问题计数（技能水平）、风格关键词计数（偏好风格）
+- 提问时段直方图（活动模式）
+- 最近N轮的项目提及（最近项目）
+
+全量重建（rebuild）只作为离线修复手段保留。
+"""
+
+from collections import Counter
+import copy
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# 话题关键词（出现在用户消息中即计数）
+TOPIC_KEYWORDS = [
+    'python', 'javascript', 'java', 'go', 'rust',
+    'testing', 'refactoring', 'performance', 'debugging',
+    'api', 'database', 'frontend', 'backend',
+    'docker', 'kubernetes', 'ci/cd'
+]
+
+# 复杂问题指示词（技能水平）
+COMPLEX_INDICATORS = [
+    'architecture', 'design pattern', 'optimization',
+    'performance', 'scalability', 'concurrency'
+]
+
+# 风格关键词（偏好风格，按此顺序决定并列时的结果）
+STYLE_KEYWORDS = {
+    'functional': ['functional', 'lambda', 'map', 'filter', 'reduce'],
+    'oop': ['class', 'object', 'inheritance', 'polymorphism'],
+    'procedural': ['function', 'procedure', 'step by step']
+}
+
+# 项目提及指示词
+PROJECT_INDICATORS = ['project', '项目', 'working on', '在做']
+
+# 最近项目：只看最近N轮
+RECENT_PROJECT_WINDOW = 20
+# 关键信息话题计数的上限（超过后丢弃出现最少的）
+MAX_KEY_TOPICS = 200
+# 记录话题的会话数上限（超过后丢弃最早的会话；其话题计数保留，只是不能再被替换）
+MAX_TRACKED_SESSIONS = 100
+
+
+def _new_aggregate() -> Dict[str, Any]:
+    return {
+        'conversations': 0,
+        'keyword_topics': {},
+        'key_topics': {},
+        'session_key_topics': {},
+        'complex': 0,
+        'styles': {style: 0 for style in STYLE_KEYWORDS},
+        'hours': [0] * 24,
+        'hour_sum': 0,
+        'hour_count': 0,
+        'recent_projects': [],      # 最近N轮，每轮一个项目名列表（可为空）
+        'updated_at': None,
+    }
+
+
+def extract_project_names(user_message: str) -> List[str]:
+    """从一条用户消息中提取项目名（简化实现，实际应该用NER）"""
+    if not any(indicator in user_message.lower() for indicator in PROJECT_INDICATORS):
+        return []
+
+    names = []
+    words = user_message.split()
+    for i, word in enumerate(words):
+        if word.lower() in PROJECT_INDICATORS and i + 1 < len(words):
+            name = words[i + 1].strip(',.!?')
+            if name and len(name) > 2:
+                names.append(name)
+    return names
+
+
+class ProfileAggregator:
+    """
+    用户画像聚合器
+
+    状态是可直接序列化为 JSON 的 dict，通过 storage 的
+    save_profile_aggregate / get_profile_aggregates 持久化（写回队列合并落盘）。
+    """
+
+    def __init__(self, storage=None):
+        self.storage = storage
+        self._lock = threading.Lock()
+        self._users: Dict[str, Dict[str, Any]] = {}
+        if storage is not None and hasattr(storage, 'get_profile_aggregates'):
+            self._users = copy.deepcopy(storage.get_profile_aggregates())
+
+    # ========== 增量更新 ==========
+
+    def record_conversation(
+        self,
+        user_id: str,
+        user_message: str,
+        timestamp: Optional[str] = None
+    ):
+        """
+        记录一轮对话（每轮 O(1)）
+
+        Args:
+            user_id: 用户ID
+            user_message: 用户消息
+            timestamp: ISO 时间戳（默认当前时间）
+        """
+        with self._lock:
+            agg = self._users.get(user_id)
+            if agg is None:
+                agg = self._users[user_id] = _new_aggregate()
+            self._apply_message(agg, user_message, timestamp)
+        self._save(user_id)
+
+    def record_key_info(self, user_id: str, session_id: str, key_info: Dict[str, Any]):
+        """
+        记录会话的关键信息（同一会话重复提取时替换之前的话题）
+
+        Args:
+            user_id: 用户ID
+            session_id: 会话ID
+            key_info: extract_key_info 的结果
+        """
+        topics = [t for t in (key_info or {}).get('main_topics', []) if isinstance(t, str) and t]
+        with self._lock:
+            agg = self._users.get(user_id)
+            if agg is None:
+                agg = self._users[user_id] = _new_aggregate()
+            self._apply_key_topics(agg, session_id, topics)
+        self._save(user_id)
+
+    def _apply_message(self, agg: Dict[str, Any], user_message: str, timestamp: Optional[str]):
+        msg = (user_message or '').lower()
+        agg['conversations'] += 1
+
+        keyword_topics = agg['keyword_topics']
+        for keyword in TOPIC_KEYWORDS:
+            if keyword in msg:
+                keyword_topics[keyword] = keyword_topics.get(keyword, 0) + 1
+
+        if any(indicator in msg for indicator in COMPLEX_INDICATORS):
+            agg['complex'] += 1
+
+        styles = agg['styles']
+        for style, keywords in STYLE_KEYWORDS.items():
+            if any(kw in msg for kw in keywords):
+                styles[style] = styles.get(style, 0) + 1
+
+        hour = None
+        try:
+            hour = (datetime.fromisoformat(timestamp) if timestamp else datetime.now()).hour
+        except (TypeError, ValueError):
+            pass
+        if hour is not None:
+            agg['hours'][hour] += 1
+            agg['hour_sum'] += hour
+            agg['hour_count'] += 1
+
+        window = agg['recent_projects']
+        window.append(extract_project_names(user_message or ''))
+        if len(window) > RECENT_PROJECT_WINDOW:
+            del window[0]
+
+        agg['updated_at'] = datetime.now().isoformat()
+
+    def _apply_key_topics(self, agg: Dict[str, Any], session_id: str, topics: List[str]):
+        key_topics = agg['key_topics']
+        sessions = agg['session_key_topics']
+        for topic in sessions.pop(session_id, []):
+            count = key_topics.get(topic, 0) - 1
+            if count > 0:
+                key_topics[topic] = count
+            else:
+                key_topics.pop(topic, None)
+        for topic in topics:
+            key_topics[topic] = key_topics.get(topic, 0) + 1
+        sessions[session_id] = topics       # 重新插入：按最近更新排序
+        while len(sessions) > MAX_TRACKED_SESSIONS:
+            del sessions[next(iter(sessions))]
+
+        if len(key_topics) > MAX_KEY_TOPICS:
+            keep = Counter(key_topics).most_common(MAX_KEY_TOPICS)
+            agg['key_topics'] = dict(keep)
+
+        agg['updated_at'] = datetime.now().isoformat()
+
+    # ========== 读取 ==========
+
+    def has_user(self, user_id: str) -> bool:
+        return user_id in self._users
+
+    def conversation_count(self, user_id: str) -> int:
+        """已计入的对话轮数（没有统计时为0）"""
+        with self._lock:
+            agg = self._users.get(user_id)
+            return agg['conversations'] if agg else 0
+
+    def get_profile(self, user_id: str) -> Optional[Dict[str, Any]]:
+        """
+        由累计统计得出画像字段（不扫描对话）
+
+        Returns:
+            {"total_conversations", "common_topics", "skill_level",
+             "preferred_style", "activity_pattern", "recent_projects"}，没有数据时返回None
+        """
+        with self._lock:
+            agg = self._users.get(user_id)
+            if agg is None:
+                return None
+            return {
+                'total_conversations': agg['conversations'],
+                'common_topics': self._common_topics(agg),
+                'skill_level': self._skill_level(agg),
+                'preferred_style': self._preferred_style(agg),
+                'activity_pattern': self._activity_pattern(agg),
+                'recent_projects': self._recent_projects(agg),
+            }
+
+    @staticmethod
+    def _common_topics(agg: Dict[str, Any]) -> List[str]:
+        counter = Counter(agg['key_topics'])
+        counter.update(agg['keyword_topics'])
+        return [t for t, _ in counter.most_common(5)]
+
+    @staticmethod
+    def _skill_level(agg: Dict[str, Any]) -> str:
+        total = agg['conversations']
+        if not total:
+            return 'unknown'
+        ratio = agg['complex'] / total
+        if ratio > 0.3:
+            return 'advanced'
+        elif ratio > 0.1:
+            return 'intermediate'
+        return 'beginner'
+
+    @staticmethod
+    def _preferred_style(agg: Dict[str, Any]) -> str:
+        if not agg['conversations']:
+            return 'unknown'
+        styles = agg['styles']
+        best = max(STYLE_KEYWORDS, key=lambda s: styles.get(s, 0))
+        return best if styles.get(best, 0) > 0 else 'unknown'
+
+    @staticmethod
+    def _activity_pattern(agg: Dict[str, Any]) -> str:
+        if not agg['hour_count']:
+            return 'unknown'
+        avg_hour = agg['hour_sum'] / agg['hour_count']
+        if 6 <= avg_hour < 12:
+            return 'morning'
+        elif 12 <= avg_hour < 18:
+            return 'afternoon'
+        elif 18 <= avg_hour < 24:
+            return 'evening'
+        return 'night'
+
+    @staticmethod
+    def _recent_projects(agg: Dict[str, Any]) -> List[str]:
+        """最近窗口内提及的项目，最近的在前，去重后取3个"""
+        seen = set()
+        projects = []
+        for names in reversed(agg['recent_projects']):
+            for name in reversed(names):
+                if name not in seen:
+                    seen.add(name)
+                    projects.append(name)
+                    if len(projects) == 3:
+                        return projects
+        return projects
+
+    # ========== 全量重建（离线修复）==========
+
+    def rebuild(
+        self,
+        user_id: str,
+        conversations: Iterable[Dict[str, Any]],
+        key_info_by_session: Optional[Dict[str, Dict[str, Any]]] = None
+    ) -> Dict[str, Any]:
+        """
+        从对话记录重新计算某个用户的统计（覆盖现有统计）
+
+        Args:
+            user_id: 用户ID
+            conversations: 按时间顺序的对话（含 user、timestamp）
+            key_info_by_session: {session_id: key_info}
+
+        Returns:
+            重建后的画像字段
+        """
+        agg = _new_aggregate()
+        for conv in conversations:
+            self._apply_message(agg, conv.get('user', ''), conv.get('timestamp'))
+        for session_id, key_info in (key_info_by_session or {}).items():
+            topics = [t for t in (key_info or {}).get('main_topics', []) if isinstance(t, str) and t]
+            self._apply_key_topics(agg, session_id, topics)
+
+        with self._lock:
+            self._users[user_id] = agg
+        self._save(user_id)
+        logger.info(f"重建用户画像统计: user_id={user_id}, conversations={agg['conversations']}")
+        return self.get_profile(user_id)
+
+    # ========== 持久化 ==========
+
+    def _save(self, user_id: str):
+        """保存一个用户的统计（只复制本次变化的用户）"""
+        if self.storage is not None and hasattr(self.storage, 'save_profile_aggregate'):
+            # 在锁内取快照，落盘序列化时不再访问正在更新的统计
+            with self._lock:
+                snapshot = copy.deepcopy(self._users[user_id])
+            self.storage.save_profile_aggregate(user_id, snapshot)
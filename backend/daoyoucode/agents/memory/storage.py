@@ -6,6 +6,11 @@
 - 项目级（[project]/.daoyoucode/）：项目上下文、对话历史（项目独立）
 - 会话级（内存）：对话历史、临时数据（临时）
 
+写入策略：
+- 所有落盘操作经写回队列（WriteBehindQueue）异步批量执行
+- 对话轮次内只做内存更新，耗时不随历史文件大小增长
+- 需要立即落盘时调用 flush()
+
 向后兼容：
 - 自动从旧位置（~/.daoyoucode/memory/）迁移数据
 - 保持原有 API 不变
@@ -17,10 +22,18 @@ from collections import defaultdict
 from pathlib import Path
 import json
 import logging
+import threading
 import yaml
 
+from .write_behind import WriteBehindQueue
+
 logger = logging.getLogger(__name__)
 
+# chat.history.md 轮转阈值
+CHAT_HISTORY_MAX_BYTES = 10 * 1024 * 1024
+# 归档时保留的天数
+CHAT_HISTORY_RETENTION_DAYS = 30
+
 
 class MemoryStorage:
     """
@@ -38,8 +51,20 @@ class MemoryStorage:
         max_tasks: int = 100,
         max_sessions: int = 1000,
         storage_dir: Optional[str] = None,
-        project_path: Optional[Path] = None
+        project_path: Optional[Path] = None,
+        flush_interval: float = 1.0
     ):
+        """
+        初始化存储
+
+        Args:
+            max_conversations: 每个会话在内存中保留的对话轮数
+            max_tasks: 每个用户保留的任务数
+            max_sessions: 最大会话数
+            storage_dir: 用户级存储目录（默认 ~/.daoyoucode）
+            project_path: 项目路径（用于项目级存储）
+            flush_interval: 写回队列刷新间隔（秒），<= 0 表示同步写入
+        """
         # 会话级存储（内存，临时）
         self._conversations: Dict[str, List[Dict]] = {}
         self._shared_contexts: Dict[str, Dict[str, Any]] = {}
@@ -65,6 +90,7 @@ class MemoryStorage:
         # 用户级文件路径
         self._preferences_file = self.user_dir / 'preferences.json'
         self._profiles_file = self.user_dir / 'user_profile.json'
+        self._profile_aggregates_file = self.user_dir / 'profile_aggregates.json'
         self._user_sessions_file = self.user_dir / 'user_sessions.json'
         self._tasks_file = self.user_dir / 'tasks.json'  # 🆕 任务历史（用户级）
         
@@ -74,21 +100,36 @@ class MemoryStorage:
             self._key_info_file = self.project_dir / 'key_info.json'
             self._project_context_file = self.project_dir / 'project_context.json'
             self._chat_history_file = self.project_dir / 'chat.history.md'
+            self._post_turn_jobs_file = self.project_dir / 'post_turn_jobs.json'
         else:
             # 回退到用户目录（向后兼容）
             self._summaries_file = self.user_dir / 'summaries.json'
             self._key_info_file = self.user_dir / 'key_info.json'
             self._project_context_file = None
             self._chat_history_file = None
+            self._post_turn_jobs_file = self.user_dir / 'post_turn_jobs.json'
         
         # 数据缓存
         self._preferences: Dict[str, Dict[str, Any]] = {}
         self._user_profiles: Dict[str, Dict[str, Any]] = {}
+        self._profile_aggregates: Dict[str, Dict[str, Any]] = {}
+        self._profile_aggregates_lock = threading.Lock()
         self._user_sessions: Dict[str, List[str]] = defaultdict(list)
         self._session_users: Dict[str, str] = {}
         self._summaries: Dict[str, str] = {}
         self._key_info: Dict[str, Dict[str, Any]] = {}
         self._tasks: Dict[str, List[Dict]] = {}  # 已废弃，仅用于迁移
+        self._post_turn_jobs: List[Dict[str, Any]] = []
+        
+        # 写回队列：持久化数据在后台批量落盘
+        self._lock = threading.RLock()
+        self._writer = WriteBehindQueue(flush_interval=flush_interval)
+        if self._chat_history_file:
+            self._writer.set_rotation(
+                self._chat_history_file,
+                CHAT_HISTORY_MAX_BYTES,
+                self._rotate_chat_history
+            )
         
         # 加载持久化数据
         self._load_persistent_data()
@@ -159,7 +200,7 @@ class MemoryStorage:
         return history[-limit:]
     
     def _append_chat_history(self, user_message: str, ai_response: str, metadata: Optional[Dict] = None):
-        """追加对话历史到 Markdown 文件"""
+        """追加对话历史到 Markdown 文件（写回队列批量写入）"""
         if not self._chat_history_file:
             return
         
@@ -174,38 +215,23 @@ class MemoryStorage:
             
             content += "---\n"
             
-            with open(self._chat_history_file, 'a', encoding='utf-8') as f:
-                f.write(content)
-            
-            # 检查文件大小
-            self._check_chat_history_size()
+            self._writer.append_text(self._chat_history_file, content)
         except Exception as e:
             logger.error(f"追加对话历史失败: {e}")
     
-    def _check_chat_history_size(self):
-        """检查对话历史文件大小"""
-        if not self._chat_history_file or not self._chat_history_file.exists():
-            return
-        
-        try:
-            size_mb = self._chat_history_file.stat().st_size / (1024 * 1024)
-            if size_mb > 10:  # 超过10MB
-                logger.warning(f"对话历史文件过大 ({size_mb:.2f} MB)，执行清理")
-                self._cleanup_chat_history()
-        except Exception as e:
-            logger.error(f"检查对话历史大小失败: {e}")
-    
-    def _cleanup_chat_history(self):
-        """清理对话历史（归档旧数据）"""
-        if not self._chat_history_file:
-            return
+    def _rotate_chat_history(self, history_file: Path):
+        """
+        轮转对话历史（在写回线程中执行）
         
+        1. 超过保留天数的对话移入归档
+        2. 仍超过上限时，把较早的一半对话移入归档
+        """
         try:
-            with open(self._chat_history_file, 'r', encoding='utf-8') as f:
+            with open(history_file, 'r', encoding='utf-8') as f:
                 content = f.read()
             
             sections = content.split('## ')
-            cutoff_date = datetime.now() - timedelta(days=30)
+            cutoff_date = datetime.now() - timedelta(days=CHAT_HISTORY_RETENTION_DAYS)
             
             recent_sections = []
             archived_sections = []
@@ -225,19 +251,33 @@ class MemoryStorage:
                 except:
                     recent_sections.append('## ' + section)
             
-            # 归档
-            if archived_sections and self.project_dir:
-                archive_dir = self.project_dir / 'archive'
+            # 全是近期对话也要降到上限的一半以下，否则每次追加都会重新轮转
+            budget = CHAT_HISTORY_MAX_BYTES // 2
+            keep_from = len(recent_sections)
+            kept_size = 0
+            while keep_from > 0:
+                section_size = len(recent_sections[keep_from - 1].encode('utf-8')) + 1
+                if kept_size + section_size > budget:
+                    break
+                kept_size += section_size
+                keep_from -= 1
+            if keep_from > 0:
+                archived_sections.extend(recent_sections[:keep_from])
+                recent_sections = recent_sections[keep_from:]
+            
+            # 归档（同一天多次轮转时追加到同一个归档文件）
+            if archived_sections:
+                archive_dir = history_file.parent / 'archive'
                 archive_dir.mkdir(exist_ok=True)
                 
                 archive_file = archive_dir / f'chat.history.{datetime.now().strftime("%Y%m%d")}.md'
-                with open(archive_file, 'w', encoding='utf-8') as f:
+                with open(archive_file, 'a', encoding='utf-8') as f:
                     f.write('\n'.join(archived_sections))
                 
                 logger.info(f"归档了 {len(archived_sections)} 条旧对话")
             
             # 保存最近的
-            with open(self._chat_history_file, 'w', encoding='utf-8') as f:
+            with open(history_file, 'w', encoding='utf-8') as f:
                 f.write('\n'.join(recent_sections))
         
         except Exception as e:
@@ -252,14 +292,15 @@ class MemoryStorage:
         value: Any
     ):
         """添加用户偏好"""
-        if user_id not in self._preferences:
-            self._preferences[user_id] = {}
-        
-        self._preferences[user_id][key] = {
-            'value': value,
-            'timestamp': datetime.now().isoformat(),
-            'count': self._preferences[user_id].get(key, {}).get('count', 0) + 1
-        }
+        with self._lock:
+            if user_id not in self._preferences:
+                self._preferences[user_id] = {}
+            
+            self._preferences[user_id][key] = {
+                'value': value,
+                'timestamp': datetime.now().isoformat(),
+                'count': self._preferences[user_id].get(key, {}).get('count', 0) + 1
+            }
         
         # 持久化
         self._save_preferences()
@@ -288,17 +329,18 @@ class MemoryStorage:
             user_id: 用户ID
             task: 任务信息
         """
-        if user_id not in self._tasks:
-            self._tasks[user_id] = []
-        
-        self._tasks[user_id].append({
-            **task,
-            'timestamp': datetime.now().isoformat()
-        })
-        
-        # 保持最近N个任务
-        if len(self._tasks[user_id]) > self.max_tasks:
-            self._tasks[user_id] = self._tasks[user_id][-self.max_tasks:]
+        with self._lock:
+            if user_id not in self._tasks:
+                self._tasks[user_id] = []
+            
+            self._tasks[user_id].append({
+                **task,
+                'timestamp': datetime.now().isoformat()
+            })
+            
+            # 保持最近N个任务
+            if len(self._tasks[user_id]) > self.max_tasks:
+                self._tasks[user_id] = self._tasks[user_id][-self.max_tasks:]
         
         # 🆕 持久化到用户级（任务历史是跨项目的）
         self._save_tasks()
@@ -417,7 +459,8 @@ class MemoryStorage:
     
     def save_summary(self, session_id: str, summary: str):
         """保存对话摘要"""
-        self._summaries[session_id] = summary
+        with self._lock:
+            self._summaries[session_id] = summary
         # 持久化
         self._save_summaries()
     
@@ -429,7 +472,8 @@ class MemoryStorage:
     
     def save_key_info(self, session_id: str, key_info: Dict[str, Any]):
         """保存关键信息"""
-        self._key_info[session_id] = key_info
+        with self._lock:
+            self._key_info[session_id] = key_info
         # 持久化
         self._save_key_info()
     
@@ -441,7 +485,8 @@ class MemoryStorage:
     
     def save_user_profile(self, user_id: str, profile: Dict[str, Any]):
         """保存用户画像"""
-        self._user_profiles[user_id] = profile
+        with self._lock:
+            self._user_profiles[user_id] = profile
         # 持久化
         self._save_profiles()
     
@@ -449,6 +494,34 @@ class MemoryStorage:
         """获取用户画像"""
         return self._user_profiles.get(user_id)
     
+    def save_profile_aggregate(self, user_id: str, aggregate: Dict[str, Any]):
+        """
+        保存一个用户的画像累计统计
+        
+        Args:
+            user_id: 用户ID
+            aggregate: 该用户统计的快照（保存后调用方不再修改）
+        """
+        with self._profile_aggregates_lock:
+            self._profile_aggregates[user_id] = aggregate
+        self._save_profile_aggregates()
+    
+    def get_profile_aggregates(self) -> Dict[str, Dict[str, Any]]:
+        """获取用户画像累计统计"""
+        return self._profile_aggregates
+    
+    # ========== 轮后任务（项目级）==========
+    
+    def save_post_turn_jobs(self, jobs: List[Dict[str, Any]]):
+        """保存未完成的轮后任务（进程重启后继续执行）"""
+        with self._lock:
+            self._post_turn_jobs = list(jobs)
+        self._save_post_turn_jobs()
+    
+    def get_post_turn_jobs(self) -> List[Dict[str, Any]]:
+        """获取未完成的轮后任务"""
+        return list(self._post_turn_jobs)
+    
     # ========== 用户会话映射 ==========
     
     def _register_session(self, user_id: str, session_id: str):
@@ -459,12 +532,17 @@ class MemoryStorage:
             user_id: 用户ID
             session_id: 会话ID
         """
-        # 添加到user_id -> sessions映射
-        if session_id not in self._user_sessions[user_id]:
-            self._user_sessions[user_id].append(session_id)
+        # 已注册过则无需重复持久化
+        if self._session_users.get(session_id) == user_id:
+            return
         
-        # 添加到session_id -> user_id映射
-        self._session_users[session_id] = user_id
+        with self._lock:
+            # 添加到user_id -> sessions映射
+            if session_id not in self._user_sessions[user_id]:
+                self._user_sessions[user_id].append(session_id)
+            
+            # 添加到session_id -> user_id映射
+            self._session_users[session_id] = user_id
         
         # 持久化
         self._save_user_sessions()
@@ -510,6 +588,7 @@ class MemoryStorage:
             'summaries': len(self._summaries),
             'key_info': len(self._key_info),
             'user_profiles': len(self._user_profiles),
+            'write_behind': self._writer.get_stats(),
             'storage': {
                 'user_dir': str(self.user_dir),
                 'project_dir': str(self.project_dir) if self.project_dir else None
@@ -533,6 +612,11 @@ class MemoryStorage:
                     self._user_profiles = json.load(f)
                 logger.info(f"加载了 {len(self._user_profiles)} 个用户画像")
             
+            # 加载用户画像累计统计
+            if self._profile_aggregates_file.exists():
+                with open(self._profile_aggregates_file, 'r', encoding='utf-8') as f:
+                    self._profile_aggregates = json.load(f)
+            
             # 加载用户会话映射
             if self._user_sessions_file.exists():
                 with open(self._user_sessions_file, 'r', encoding='utf-8') as f:
@@ -559,6 +643,11 @@ class MemoryStorage:
                 with open(self._key_info_file, 'r', encoding='utf-8') as f:
                     self._key_info = json.load(f)
                 logger.info(f"加载了 {len(self._key_info)} 个关键信息")
+            
+            # 加载未完成的轮后任务
+            if self._post_turn_jobs_file.exists():
+                with open(self._post_turn_jobs_file, 'r', encoding='utf-8') as f:
+                    self._post_turn_jobs = json.load(f)
         
         except Exception as e:
             logger.warning(f"加载持久化数据失败: {e}")
@@ -607,54 +696,68 @@ class MemoryStorage:
         except Exception as e:
             logger.error(f"数据迁移失败: {e}")
     
+    def flush(self):
+        """立即把写回队列中的数据落盘"""
+        self._writer.flush()
+    
+    def close(self):
+        """关闭存储（刷新剩余数据）"""
+        self._writer.close()
+    
+    def _schedule_save(self, path: Path, get_data, label: str):
+        """
+        登记一次 JSON 持久化（写回队列合并同一文件的多次保存）
+        
+        Args:
+            path: 目标文件
+            get_data: 返回要保存的数据（刷新时调用，取最新值）
+            label: 日志中的名称
+        """
+        def render() -> str:
+            with self._lock:
+                return json.dumps(get_data(), ensure_ascii=False, indent=2)
+        
+        self._writer.write_json(path, render, label=label)
+    
     def _save_preferences(self):
         """保存用户偏好"""
-        try:
-            with open(self._preferences_file, 'w', encoding='utf-8') as f:
-                json.dump(self._preferences, f, ensure_ascii=False, indent=2)
-        except Exception as e:
-            logger.error(f"保存用户偏好失败: {e}")
+        self._schedule_save(self._preferences_file, lambda: self._preferences, "用户偏好")
     
     def _save_tasks(self):
         """保存任务历史"""
-        try:
-            with open(self._tasks_file, 'w', encoding='utf-8') as f:
-                json.dump(self._tasks, f, ensure_ascii=False, indent=2)
-        except Exception as e:
-            logger.error(f"保存任务历史失败: {e}")
+        self._schedule_save(self._tasks_file, lambda: self._tasks, "任务历史")
     
     def _save_summaries(self):
         """保存摘要"""
-        try:
-            with open(self._summaries_file, 'w', encoding='utf-8') as f:
-                json.dump(self._summaries, f, ensure_ascii=False, indent=2)
-        except Exception as e:
-            logger.error(f"保存摘要失败: {e}")
+        self._schedule_save(self._summaries_file, lambda: self._summaries, "摘要")
     
     def _save_key_info(self):
         """保存关键信息"""
-        try:
-            with open(self._key_info_file, 'w', encoding='utf-8') as f:
-                json.dump(self._key_info, f, ensure_ascii=False, indent=2)
-        except Exception as e:
-            logger.error(f"保存关键信息失败: {e}")
+        self._schedule_save(self._key_info_file, lambda: self._key_info, "关键信息")
+    
+    def _save_post_turn_jobs(self):
+        """保存轮后任务"""
+        self._schedule_save(self._post_turn_jobs_file, lambda: self._post_turn_jobs, "轮后任务")
     
     def _save_profiles(self):
         """保存用户画像"""
-        try:
-            with open(self._profiles_file, 'w', encoding='utf-8') as f:
-                json.dump(self._user_profiles, f, ensure_ascii=False, indent=2)
-        except Exception as e:
-            logger.error(f"保存用户画像失败: {e}")
+        self._schedule_save(self._profiles_file, lambda: self._user_profiles, "用户画像")
+    
+    def _save_profile_aggregates(self):
+        """保存用户画像累计统计"""
+        def render() -> str:
+            with self._profile_aggregates_lock:
+                return json.dumps(self._profile_aggregates, ensure_ascii=False)
+        
+        self._writer.write_json(self._profile_aggregates_file, render, label="画像统计")
     
     def _save_user_sessions(self):
         """保存用户会话映射"""
-        try:
-            data = {
+        self._schedule_save(
+            self._user_sessions_file,
+            lambda: {
                 'user_sessions': dict(self._user_sessions),
                 'session_users': self._session_users
-            }
-            with open(self._user_sessions_file, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
-        except Exception as e:
-            logger.error(f"保存用户会话映射失败: {e}")
+            },
+            "用户会话映射"
+        )
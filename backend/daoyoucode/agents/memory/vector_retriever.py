@@ -11,13 +11,34 @@
 pip install sentence-transformers
 
 如果不安装，系统会自动降级到关键词匹配，不影响功能。
+
+模型加载要几秒（首次还要下载），放在后台线程中进行，ready 为就绪 Future；
+推理走专用的单线程 executor（加载也在这个线程，推理请求自然排在加载之后），
+异步调用方的并发 encode 由 MicroBatcher 合并成一次 model.encode。
+可选 ONNX 或 int8 动态量化的 CPU 推理（backend 参数）。
 """
 
+from concurrent.futures import Future
 from typing import List, Dict, Tuple, Optional
+import asyncio
 import logging
 
+from .daemon_executor import DaemonExecutor
+from .embedding_client import MicroBatcher, gather_embeddings
+
 logger = logging.getLogger(__name__)
 
+# 推理后端
+BACKEND_TORCH = "torch"
+BACKEND_ONNX = "onnx"            # sentence-transformers>=3.2 + optimum[onnxruntime]
+BACKEND_QUANTIZED = "quantized"  # torch 动态量化（Linear 层 int8，仅 CPU）
+BACKENDS = (BACKEND_TORCH, BACKEND_ONNX, BACKEND_QUANTIZED)
+
+# 异步检索等待模型就绪的最长时间（秒），超时本轮回退到关键词匹配
+READY_TIMEOUT = 3.0
+# 单次 model.encode 的批大小
+ENCODE_BATCH_SIZE = 64
+
 
 class VectorRetriever:
     """
@@ -34,12 +55,18 @@ class VectorRetriever:
     - 跨语言：支持多语言（如果使用多语言模型）
     
     注意：
-    - 默认禁用（enabled=False）
+    - 模型加载完成前 enabled=False（loading=True），调用方按未启用处理
     - 需要手动安装 sentence-transformers
     - 如果不安装，系统会自动降级到关键词匹配
     """
     
-    def __init__(self, model_name: str = "paraphrase-multilingual-MiniLM-L12-v2"):
+    def __init__(
+        self,
+        model_name: str = "paraphrase-multilingual-MiniLM-L12-v2",
+        device: Optional[str] = None,
+        backend: str = BACKEND_TORCH,
+        background: bool = True
+    ):
         """
         初始化向量检索器
         
@@ -48,33 +75,88 @@ class VectorRetriever:
                 - paraphrase-multilingual-MiniLM-L12-v2: 多语言，384维，50MB（推荐）
                 - all-MiniLM-L6-v2: 英文，384维，80MB
                 - text2vec-base-chinese: 中文，768维，400MB
+            device: 设备（"cpu" / "cuda"，None 自动选择）
+            backend: 推理后端（"torch" / "onnx" / "quantized"）
+            background: 是否在后台线程加载模型（False 时构造函数等待加载完成）
         """
         self.model_name = model_name
+        self.device = device
+        self.backend = backend if backend in BACKENDS else BACKEND_TORCH
         self.model = None
         self.enabled = False
         
-        # 🆕 默认启用（自动加载模型）
-        self._load_model()
+        # 加载和推理共用一个线程：模型只在这个线程里使用，推理请求排在加载之后
+        # （守护线程：退出时不等待正在进行的加载）
+        self._executor = DaemonExecutor("embedding-model")
+        self._batcher = MicroBatcher(self._encode_async, max_batch_size=ENCODE_BATCH_SIZE)
+        self.ready: Future = self._executor.submit(self._load_model)
+        
+        if not background:
+            self.wait_ready()
+            if self.enabled:
+                logger.info(f"✅ 向量检索已启用: {self.model_name}")
+            else:
+                logger.warning("⚠️ 向量检索未启用，将使用关键词匹配回退")
+    
+    @property
+    def loading(self) -> bool:
+        """模型是否正在后台加载"""
+        return not self.ready.done()
+    
+    def wait_ready(self, timeout: Optional[float] = None) -> bool:
+        """等待模型加载完成（同步，供后台线程调用），返回是否可用"""
+        try:
+            return self.ready.result(timeout)
+        except Exception:
+            return self.enabled
+    
+    async def wait_ready_async(self, timeout: Optional[float] = None) -> bool:
+        """等待模型加载完成（不阻塞事件循环），返回是否可用"""
+        if self.ready.done():
+            return self.enabled
+        try:
+            await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(self.ready)), timeout)
+        except asyncio.TimeoutError:
+            pass
+        return self.enabled
+    
+    def _create_model(self):
+        """按 backend 创建模型（ONNX / 量化失败时退回 torch）"""
+        from sentence_transformers import SentenceTransformer
+        
+        if self.backend == BACKEND_ONNX:
+            try:
+                return SentenceTransformer(self.model_name, device=self.device, backend="onnx")
+            except Exception as e:
+                logger.warning(f"⚠️ ONNX 推理不可用，使用 torch: {e}")
         
-        if self.enabled:
-            logger.info(f"✅ 向量检索已启用: {self.model_name}")
-        else:
-            logger.warning("⚠️ 向量检索未启用，将使用关键词匹配回退")
+        model = SentenceTransformer(self.model_name, device=self.device)
+        if self.backend == BACKEND_QUANTIZED:
+            try:
+                import torch
+                if model.device.type == "cpu":
+                    torch.quantization.quantize_dynamic(
+                        model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True
+                    )
+                else:
+                    logger.warning("⚠️ 动态量化仅支持 CPU，跳过")
+            except Exception as e:
+                logger.warning(f"⚠️ 模型量化失败，使用原始模型: {e}")
+        return model
     
-    def _load_model(self):
-        """加载embedding模型"""
+    def _load_model(self) -> bool:
+        """加载embedding模型（在模型线程中执行），返回是否可用"""
         try:
-            from sentence_transformers import SentenceTransformer
             import numpy as np
             
-            logger.info(f"🔄 加载embedding模型: {self.model_name}")
+            logger.info(f"🔄 加载embedding模型: {self.model_name}（{self.backend}）")
             logger.info("   首次加载会自动下载模型（约50MB），请稍候...")
             
-            self.model = SentenceTransformer(self.model_name)
-            self.enabled = True
+            self.model = self._create_model()
             
             # 测试模型
             test_embedding = self.model.encode("test", convert_to_numpy=True)
+            self.enabled = True
             dim = self.model.get_sentence_embedding_dimension()
             
             logger.info(f"✅ 向量检索已启用")
@@ -93,12 +175,26 @@ class VectorRetriever:
         except Exception as e:
             logger.warning(f"⚠️ 加载embedding模型失败: {e}")
             logger.warning("   将使用关键词匹配回退")
+            self.model = None
             self.enabled = False
+        
+        return self.enabled
+    
+    def enable(self) -> Future:
+        """手动启用向量检索（后台加载，不阻塞；返回就绪 Future）"""
+        if not self.enabled and not self.loading:
+            self.ready = self._executor.submit(self._load_model)
+        return self.ready
     
-    def enable(self):
-        """手动启用向量检索"""
-        if not self.enabled:
-            self._load_model()
+    def _encode_texts(self, texts: List[str]) -> List['numpy.ndarray']:
+        """批量推理（在模型线程中执行）"""
+        return list(self.model.encode(
+            texts, batch_size=ENCODE_BATCH_SIZE, convert_to_numpy=True, show_progress_bar=False
+        ))
+    
+    async def _encode_async(self, texts: List[str]) -> List['numpy.ndarray']:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._encode_texts, texts)
     
     def encode(self, text: str) -> Optional['numpy.ndarray']:
         """
@@ -110,18 +206,36 @@ class VectorRetriever:
         Returns:
             向量（numpy数组），如果失败返回None
         """
+        vectors = self.encode_batch([text])
+        return vectors[0] if vectors else None
+    
+    def encode_batch(self, texts: List[str]) -> Optional[List['numpy.ndarray']]:
+        """
+        批量编码（同步，在模型线程中推理）
+        
+        Returns:
+            向量列表，如果失败返回None
+        """
         if not self.enabled or not self.model:
             return None
         
         try:
-            # 转换为向量
-            embedding = self.model.encode(text, convert_to_numpy=True)
-            return embedding
+            return self._executor.submit(self._encode_texts, list(texts)).result()
         
         except Exception as e:
             logger.error(f"❌ 文本编码失败: {e}")
             return None
     
+    async def aencode(self, text: str) -> Optional['numpy.ndarray']:
+        """异步编码（不阻塞事件循环，并发调用合并成一次推理）"""
+        return (await self.aencode_batch([text]))[0]
+    
+    async def aencode_batch(self, texts: List[str]) -> List[Optional['numpy.ndarray']]:
+        """异步批量编码（失败的位置为 None）"""
+        if not self.enabled or not self.model:
+            return [None] * len(texts)
+        return await gather_embeddings([self._batcher.submit(text, text) for text in texts])
+    
     def cosine_similarity(self, vec1, vec2) -> float:
         """
         计算余弦相似度
@@ -167,26 +281,26 @@ class VectorRetriever:
         Returns:
             [(索引, 相似度分数), ...]
         """
-        if not self.enabled:
-            logger.debug("向量检索未启用，返回空结果")
+        if not await self.wait_ready_async(READY_TIMEOUT):
+            logger.debug("向量检索未启用（或模型仍在加载），返回空结果")
             return []
         
         try:
-            # 1. 编码当前消息
-            current_embedding = self.encode(current_message)
+            # 1. 当前消息和历史消息一起编码（一次推理）
+            indexed = [
+                (idx, item.get('user', ''))
+                for idx, item in enumerate(full_history)
+                if item.get('user', '')
+            ]
+            vectors = await self.aencode_batch([current_message] + [msg for _, msg in indexed])
+            current_embedding = vectors[0]
             if current_embedding is None:
                 return []
             
-            # 2. 编码所有历史消息并计算相似度
+            # 2. 计算相似度
             similarities = []
             
-            for idx, item in enumerate(full_history):
-                user_msg = item.get('user', '')
-                if not user_msg:
-                    continue
-                
-                # 编码历史消息
-                msg_embedding = self.encode(user_msg)
+            for (idx, user_msg), msg_embedding in zip(indexed, vectors[1:]):
                 if msg_embedding is None:
                     continue
                 
@@ -213,7 +327,10 @@ class VectorRetriever:
         """获取统计信息"""
         stats = {
             'enabled': self.enabled,
+            'loading': self.loading,
             'model_name': self.model_name if self.enabled else None,
+            'backend': self.backend,
+            'batches': self._batcher.stats['batches'],
         }
         
         if self.enabled and self.model:
@@ -228,9 +345,12 @@ class VectorRetriever:
 # 全局单例
 _vector_retriever = None
 
-def get_vector_retriever(model_name: str = "paraphrase-multilingual-MiniLM-L12-v2") -> VectorRetriever:
-    """获取向量检索器单例"""
+def get_vector_retriever(
+    model_name: str = "paraphrase-multilingual-MiniLM-L12-v2",
+    **kwargs
+) -> VectorRetriever:
+    """获取向量检索器单例（模型在后台加载）"""
     global _vector_retriever
     if _vector_retriever is None:
-        _vector_retriever = VectorRetriever(model_name)
+        _vector_retriever = VectorRetriever(model_name, **kwargs)
     return _vector_retriever
@@ -13,6 +13,9 @@
 - 更快的启动速度
 - 更好的embedding质量
 - 自动扩展，无需GPU
+
+异步检索走 AsyncEmbeddingClient（连接池 + 微批 + 持久缓存），
+同步 encode/encode_batch 共用同一个缓存。
 """
 
 from typing import List, Dict, Tuple, Optional, Any
@@ -21,6 +24,8 @@ import httpx
 import json
 import os
 
+from .embedding_client import AsyncEmbeddingClient, EmbeddingCache, embedding_key, parse_embeddings
+
 logger = logging.getLogger(__name__)
 
 
@@ -66,7 +71,9 @@ class VectorRetrieverAPI:
         provider: str = "openai",
         api_key: Optional[str] = None,
         base_url: Optional[str] = None,
-        model: Optional[str] = None
+        model: Optional[str] = None,
+        cache_dir: Optional[str] = None,
+        transport: Optional[httpx.AsyncBaseTransport] = None
     ):
         """
         初始化向量检索器（API版本）
@@ -76,6 +83,8 @@ class VectorRetrieverAPI:
             api_key: API密钥（如果为None，从环境变量读取）
             base_url: API基础URL（可选，覆盖默认值）
             model: 模型名称（可选，覆盖默认值）
+            cache_dir: embedding 缓存目录（默认 ~/.daoyoucode/cache/embeddings）
+            transport: 异步客户端的 httpx transport（测试用）
         """
         self.provider = provider
         self.enabled = False
@@ -122,6 +131,16 @@ class VectorRetrieverAPI:
             timeout=30.0
         )
         
+        # 异步客户端（连接池 + 微批），和同步接口共用缓存
+        self.cache = EmbeddingCache(cache_dir)
+        self.embedder = AsyncEmbeddingClient(
+            base_url=self.base_url,
+            model=self.model,
+            api_key=self.api_key,
+            cache=self.cache,
+            transport=transport
+        )
+        
         self.enabled = True
         logger.info(f"✅ 向量检索已启用（API模式）")
         logger.info(f"   提供商: {self.provider}")
@@ -141,38 +160,12 @@ class VectorRetrieverAPI:
         if not self.enabled:
             return None
         
-        try:
-            import numpy as np
-            
-            # 调用API
-            response = self.client.post(
-                "/embeddings",
-                json={
-                    "model": self.model,
-                    "input": text
-                }
-            )
-            
-            if response.status_code != 200:
-                logger.error(
-                    f"❌ API请求失败: {response.status_code}\n"
-                    f"   响应: {response.text}"
-                )
-                return None
-            
-            # 解析响应
-            data = response.json()
-            embedding = data["data"][0]["embedding"]
-            
-            return np.array(embedding, dtype=np.float32)
-        
-        except Exception as e:
-            logger.error(f"❌ 文本编码失败: {e}")
-            return None
+        vectors = self.encode_batch([text])
+        return vectors[0] if vectors else None
     
     def encode_batch(self, texts: List[str], batch_size: int = 100) -> Optional[List['numpy.ndarray']]:
         """
-        批量编码文本（通过API）
+        批量编码文本（通过API，命中缓存的不再请求，相同文本只请求一次）
         
         Args:
             texts: 文本列表
@@ -185,13 +178,22 @@ class VectorRetrieverAPI:
             return None
         
         try:
-            import numpy as np
-            
-            embeddings = []
+            keys = [embedding_key(self.model, text) for text in texts]
+            found = {}
+            missing = {}
+            for key, text in zip(keys, texts):
+                if key in found or key in missing:
+                    continue
+                cached = self.cache.get(key)
+                if cached is not None:
+                    found[key] = cached
+                else:
+                    missing[key] = text
             
-            # 分批处理
-            for i in range(0, len(texts), batch_size):
-                batch = texts[i:i + batch_size]
+            # 分批处理（只请求未命中的文本）
+            items = list(missing.items())
+            for i in range(0, len(items), batch_size):
+                batch = [text for _, text in items[i:i + batch_size]]
                 
                 # 调用API
                 response = self.client.post(
@@ -210,16 +212,14 @@ class VectorRetrieverAPI:
                     return None
                 
                 # 解析响应
-                data = response.json()
-                batch_embeddings = [
-                    np.array(item["embedding"], dtype=np.float32)
-                    for item in data["data"]
-                ]
-                embeddings.extend(batch_embeddings)
+                batch_embeddings = parse_embeddings(response.json(), len(batch))
+                for (key, _), vec in zip(items[i:i + batch_size], batch_embeddings):
+                    self.cache.set(key, vec)
+                    found[key] = vec
                 
-                logger.info(f"   已编码: {len(embeddings)}/{len(texts)}")
+                logger.info(f"   已编码: {min(i + batch_size, len(items))}/{len(items)}")
             
-            return embeddings
+            return [found[key] for key in keys]
         
         except Exception as e:
             logger.error(f"❌ 批量编码失败: {e}")
@@ -275,21 +275,23 @@ class VectorRetrieverAPI:
             return []
         
         try:
-            # 1. 编码当前消息
-            current_embedding = self.encode(current_message)
+            # 1. 当前消息和历史消息一起编码（历史通常已在缓存中，一轮最多一次往返）
+            indexed = [
+                (idx, item.get('user', ''))
+                for idx, item in enumerate(full_history)
+                if item.get('user', '')
+            ]
+            vectors = await self.embedder.encode_many(
+                [current_message] + [msg for _, msg in indexed]
+            )
+            current_embedding = vectors[0]
             if current_embedding is None:
                 return []
             
-            # 2. 编码所有历史消息并计算相似度
+            # 2. 计算相似度
             similarities = []
             
-            for idx, item in enumerate(full_history):
-                user_msg = item.get('user', '')
-                if not user_msg:
-                    continue
-                
-                # 编码历史消息
-                msg_embedding = self.encode(user_msg)
+            for (idx, user_msg), msg_embedding in zip(indexed, vectors[1:]):
                 if msg_embedding is None:
                     continue
                 
@@ -312,6 +314,18 @@ class VectorRetrieverAPI:
             logger.error(f"❌ 向量检索失败: {e}", exc_info=True)
             return []
     
+    async def aencode(self, text: str) -> Optional['numpy.ndarray']:
+        """异步编码（不阻塞事件循环，并发调用会合并成一个请求）"""
+        if not self.enabled:
+            return None
+        return await self.embedder.encode(text)
+    
+    async def aencode_batch(self, texts: List[str]) -> List[Optional['numpy.ndarray']]:
+        """异步批量编码（失败的位置为 None）"""
+        if not self.enabled:
+            return [None] * len(texts)
+        return await self.embedder.encode_many(texts)
+    
     def get_stats(self) -> Dict:
         """获取统计信息"""
         return {
@@ -319,13 +333,16 @@ class VectorRetrieverAPI:
             'provider': self.provider if self.enabled else None,
             'model': self.model if self.enabled else None,
             'dimensions': self.dimensions if self.enabled else None,
-            'mode': 'api'
+            'mode': 'api',
+            'embedding_client': self.embedder.get_stats() if self.enabled else None
         }
     
     def __del__(self):
         """清理资源"""
         if hasattr(self, 'client'):
             self.client.close()
+        if hasattr(self, 'cache'):
+            self.cache.close()
 
 
 # 全局单例
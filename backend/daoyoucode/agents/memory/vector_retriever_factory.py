@@ -91,9 +91,14 @@ def get_vector_retriever(config_path: Optional[str] = None):
         
         logger.info(f"🔄 使用本地模式: {model_name}")
         
-        retriever = VectorRetriever(model_name=model_name)
+        # 模型在后台线程加载，加载中的检索器先按未启用处理
+        retriever = VectorRetriever(
+            model_name=model_name,
+            device=local_config.get("device"),
+            backend=local_config.get("backend", "torch")
+        )
         
-        if not retriever.enabled:
+        if not retriever.enabled and not retriever.loading:
             logger.warning("⚠️ 本地模式初始化失败，回退到关键词匹配")
             return DisabledVectorRetriever()
         
@@ -0,0 +1,243 @@
+"""
+写回队列（Write-Behind）
+
+把记忆存储的磁盘写入移出对话主路径：
+- JSON 文件：按路径合并，同一文件多次保存只落盘最后一次
+- 文本追加：chat.history.md 的追加内容攒批后一次写入
+- 按间隔或积压阈值刷新，进程退出时自动刷新
+- 文件超过上限后在后台线程中轮转/归档
+"""
+
+from typing import Callable, Dict, List, Optional
+from pathlib import Path
+import atexit
+import logging
+import threading
+import weakref
+
+logger = logging.getLogger(__name__)
+
+
+class WriteBehindQueue:
+    """
+    写回队列
+
+    调用方只做内存操作（登记待写内容），真正的文件 I/O 在后台线程完成。
+    后台线程按需启动，队列清空后自动退出，不会常驻。
+
+    使用示例：
+        queue = WriteBehindQueue(flush_interval=1.0)
+        queue.write_json(path, lambda: json.dumps(data), label="摘要")
+        queue.append_text(history_file, "## ...")
+        queue.flush()  # 需要立即落盘时
+    """
+
+    def __init__(self, flush_interval: float = 1.0, max_pending: int = 50):
+        """
+        初始化写回队列
+
+        Args:
+            flush_interval: 刷新间隔（秒），<= 0 表示同步写入
+            max_pending: 积压条数阈值，达到后立即唤醒刷新
+        """
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+
+        self._lock = threading.Lock()          # 保护待写数据
+        self._flush_lock = threading.Lock()    # 串行化刷新（文件写入）
+        self._wakeup = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._closed = False
+
+        # path -> (render, label)，render 在刷新时调用，返回要写入的文本
+        self._pending_json: Dict[Path, tuple] = {}
+        # path -> 待追加的文本片段
+        self._pending_appends: Dict[Path, List[str]] = {}
+
+        # path -> (max_bytes, rotate)
+        self._rotations: Dict[Path, tuple] = {}
+        # 已知文件大小（只在首次 stat，之后按写入量累加）
+        self._sizes: Dict[Path, int] = {}
+
+        self._stats = {'flushes': 0, 'json_writes': 0, 'appends': 0, 'rotations': 0}
+
+        _live_queues.add(self)
+
+    # ========== 登记写入 ==========
+
+    def write_json(self, path: Path, render: Callable[[], str], label: str = ""):
+        """
+        登记整文件写入（同一路径合并，只保留最后一次）
+
+        Args:
+            path: 目标文件
+            render: 刷新时调用，返回完整文件内容
+            label: 日志中的名称
+        """
+        with self._lock:
+            self._pending_json[path] = (render, label or path.name)
+        self._schedule()
+
+    def append_text(self, path: Path, text: str):
+        """
+        登记文本追加
+
+        Args:
+            path: 目标文件
+            text: 追加的内容
+        """
+        with self._lock:
+            self._pending_appends.setdefault(path, []).append(text)
+        self._schedule()
+
+    def set_rotation(self, path: Path, max_bytes: int, rotate: Callable[[Path], None]):
+        """
+        设置文件轮转
+
+        文件超过 max_bytes 后，在刷新线程中调用 rotate(path)。
+
+        Args:
+            path: 目标文件
+            max_bytes: 大小上限（字节）
+            rotate: 轮转回调
+        """
+        with self._lock:
+            self._rotations[path] = (max_bytes, rotate)
+
+    # ========== 刷新 ==========
+
+    def flush(self):
+        """立即把所有待写内容落盘（在调用线程中执行）"""
+        with self._flush_lock:
+            with self._lock:
+                pending_json = self._pending_json
+                pending_appends = self._pending_appends
+                self._pending_json = {}
+                self._pending_appends = {}
+
+            if not pending_json and not pending_appends:
+                return
+
+            for path, (render, label) in pending_json.items():
+                try:
+                    content = render()
+                    with open(path, 'w', encoding='utf-8') as f:
+                        f.write(content)
+                    self._stats['json_writes'] += 1
+                except Exception as e:
+                    logger.error(f"保存{label}失败: {e}")
+
+            for path, chunks in pending_appends.items():
+                try:
+                    content = ''.join(chunks)
+                    with open(path, 'a', encoding='utf-8') as f:
+                        f.write(content)
+                    self._stats['appends'] += len(chunks)
+                    self._track_size(path, len(content.encode('utf-8')))
+                except Exception as e:
+                    logger.error(f"追加 {path.name} 失败: {e}")
+
+            self._stats['flushes'] += 1
+
+    def close(self):
+        """停止后台线程并刷新剩余内容"""
+        with self._lock:
+            self._closed = True
+            thread = self._thread
+        self._wakeup.set()
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout=5)
+        self.flush()
+
+    @property
+    def pending_count(self) -> int:
+        """待写条目数"""
+        with self._lock:
+            return len(self._pending_json) + sum(
+                len(chunks) for chunks in self._pending_appends.values()
+            )
+
+    def get_stats(self) -> Dict[str, int]:
+        """获取统计信息"""
+        return {**self._stats, 'pending': self.pending_count}
+
+    # ========== 内部方法 ==========
+
+    def _schedule(self):
+        """确保后台线程在运行；同步模式下直接刷新"""
+        if self.flush_interval <= 0 or self._closed:
+            self.flush()
+            return
+
+        with self._lock:
+            backlog = len(self._pending_json) + sum(
+                len(chunks) for chunks in self._pending_appends.values()
+            )
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run,
+                    name="memory-write-behind",
+                    daemon=True
+                )
+                self._thread.start()
+
+        if backlog >= self.max_pending:
+            self._wakeup.set()
+
+    def _run(self):
+        """后台刷新循环：队列清空后退出"""
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+
+            self.flush()
+
+            with self._lock:
+                if self._closed or (not self._pending_json and not self._pending_appends):
+                    self._thread = None
+                    return
+
+    def _track_size(self, path: Path, written: int):
+        """累计文件大小，超限时轮转"""
+        rotation = self._rotations.get(path)
+        if rotation is None:
+            return
+
+        if path not in self._sizes:
+            try:
+                self._sizes[path] = path.stat().st_size
+            except OSError:
+                self._sizes[path] = written
+        else:
+            self._sizes[path] += written
+
+        max_bytes, rotate = rotation
+        if self._sizes[path] <= max_bytes:
+            return
+
+        logger.warning(
+            f"{path.name} 过大 ({self._sizes[path] / (1024 * 1024):.2f} MB)，后台轮转"
+        )
+        try:
+            rotate(path)
+            self._stats['rotations'] += 1
+        except Exception as e:
+            logger.error(f"轮转 {path.name} 失败: {e}")
+        finally:
+            self._sizes.pop(path, None)
+
+
+# 存活的队列，进程退出时统一刷新
+_live_queues: "weakref.WeakSet[WriteBehindQueue]" = weakref.WeakSet()
+
+
+def flush_all():
+    """刷新所有存活的写回队列"""
+    for queue in list(_live_queues):
+        try:
+            queue.close()
+        except Exception as e:
+            logger.error(f"退出时刷新写回队列失败: {e}")
+
+
+atexit.register(flush_all)
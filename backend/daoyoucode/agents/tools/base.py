@@ -4,15 +4,59 @@
 所有工具的基础抽象
 """
 
-from typing import Dict, Any, Optional, List, AsyncGenerator
+from typing import Dict, Any, Optional, List, AsyncGenerator, Callable, Tuple
 from dataclasses import dataclass, field
 from abc import ABC, abstractmethod
+from contextvars import ContextVar, Token
 from pathlib import Path
+import importlib
 import logging
+import threading
 import time
 
+from .schema_cache import ToolSchemaCache
+
 logger = logging.getLogger(__name__)
 
+# 当前工具调用的进度回调（调用方设置，工具通过 report_tool_progress 上报）
+_tool_progress_callback: ContextVar[Optional[Callable[[Dict[str, Any]], None]]] = ContextVar(
+    'tool_progress_callback', default=None
+)
+
+
+def set_tool_progress_callback(callback: Optional[Callable[[Dict[str, Any]], None]]) -> Token:
+    """设置当前上下文的工具进度回调，返回用于恢复的 token"""
+    return _tool_progress_callback.set(callback)
+
+
+def reset_tool_progress_callback(token: Token):
+    """恢复 set_tool_progress_callback 之前的回调"""
+    _tool_progress_callback.reset(token)
+
+
+def report_tool_progress(
+    message: str,
+    completed: Optional[int] = None,
+    total: Optional[int] = None,
+    **extra
+):
+    """
+    上报工具执行进度（没有设置回调时什么都不做）
+
+    Args:
+        message: 进度描述
+        completed: 已完成数量
+        total: 总数（未知时为None）
+        **extra: 其他字段（如测试的 passed / failed 计数）
+    """
+    callback = _tool_progress_callback.get()
+    if callback is None:
+        return
+    try:
+        callback({'message': message, 'completed': completed, 'total': total, **extra})
+    except Exception as e:
+        logger.debug(f"进度回调失败: {e}")
+
 
 @dataclass
 class ToolContext:
@@ -397,10 +441,19 @@ class BaseTool(ABC):
 
 
 class ToolRegistry:
-    """工具注册表"""
+    """
+    工具注册表
+
+    工具可以直接注册实例，也可以用 register_lazy 只登记实现位置：
+    延迟注册的工具在第一次 get_tool / 执行时才导入模块并创建实例，
+    生成 schema 时优先使用 ToolSchemaCache 中的缓存
+    """
     
-    def __init__(self):
+    def __init__(self, schema_cache: Optional[ToolSchemaCache] = None):
         self._tools: Dict[str, BaseTool] = {}
+        self._lazy: Dict[str, Tuple[str, str]] = {}  # 工具名 -> (模块, 类名)
+        self._load_lock = threading.RLock()
+        self._schema_cache = schema_cache or ToolSchemaCache()
         self._working_directory = None  # 向后兼容
         self._context: Optional[ToolContext] = None  # 新的上下文对象
     
@@ -440,11 +493,53 @@ class ToolRegistry:
             tool.set_context(self._context)
         elif self._working_directory:
             tool.set_working_directory(self._working_directory)
+        self._lazy.pop(tool.name, None)
         logger.info(f"已注册工具: {tool.name}")
     
+    def register_lazy(self, name: str, module: str, class_name: str):
+        """
+        延迟注册工具（不导入实现模块）
+
+        Args:
+            name: 工具名（必须与工具实例的 name 一致）
+            module: 实现模块的完整路径
+            class_name: 工具类名
+        """
+        if name not in self._tools:
+            self._lazy[name] = (module, class_name)
+    
+    def is_loaded(self, name: str) -> bool:
+        """工具实现是否已经导入"""
+        return name in self._tools
+    
+    def _load_tool(self, name: str) -> Optional[BaseTool]:
+        """导入延迟注册的工具并创建实例"""
+        with self._load_lock:
+            if name in self._tools:
+                return self._tools[name]
+            spec = self._lazy.get(name)
+            if spec is None:
+                return None
+            module, class_name = spec
+            try:
+                start = time.perf_counter()
+                tool = getattr(importlib.import_module(module), class_name)()
+                if tool.name != name:
+                    raise ValueError(f"工具名不一致: 注册为 {name}，实际为 {tool.name}")
+            except Exception as e:
+                logger.error(f"加载工具 {name} ({module}.{class_name}) 失败: {e}")
+                self._lazy.pop(name, None)
+                return None
+            self.register(tool)
+            logger.debug(f"加载工具 {name} 用时 {(time.perf_counter() - start) * 1000:.0f}ms")
+            return tool
+    
     def get_tool(self, name: str) -> Optional[BaseTool]:
-        """获取工具"""
-        return self._tools.get(name)
+        """获取工具（延迟注册的工具在这里导入）"""
+        tool = self._tools.get(name)
+        if tool is None and name in self._lazy:
+            tool = self._load_tool(name)
+        return tool
     
     def filter_tool_names(self, tool_names: Optional[List[str]]) -> Optional[List[str]]:
         """
@@ -453,7 +548,7 @@ class ToolRegistry:
         """
         if not tool_names:
             return None
-        available = set(self._tools.keys())
+        available = set(self.list_tools())
         filtered = [n for n in tool_names if n in available]
         missing = set(tool_names) - available
         if missing:
@@ -465,8 +560,8 @@ class ToolRegistry:
         return filtered if filtered else None
 
     def list_tools(self) -> List[str]:
-        """列出所有工具名称"""
-        return list(self._tools.keys())
+        """列出所有工具名称（包括尚未导入的延迟注册工具）"""
+        return list(self._tools.keys()) + [n for n in self._lazy if n not in self._tools]
     
     def get_function_schemas(self, tool_names: Optional[List[str]] = None) -> List[Dict[str, Any]]:
         """
@@ -483,12 +578,32 @@ class ToolRegistry:
         
         schemas = []
         for name in tool_names:
-            tool = self.get_tool(name)
-            if tool:
-                schemas.append(tool.get_function_schema())
+            schema = self._get_schema(name)
+            if schema:
+                schemas.append(schema)
+        self._schema_cache.flush()
         
         return schemas
     
+    def _get_schema(self, name: str) -> Optional[Dict[str, Any]]:
+        """获取单个工具的 schema（延迟注册的工具优先用缓存，不导入实现）"""
+        tool = self._tools.get(name)
+        if tool is not None:
+            return tool.get_function_schema()
+        spec = self._lazy.get(name)
+        if spec is None:
+            return None
+        module, class_name = spec
+        schema = self._schema_cache.get(name, module, class_name)
+        if schema is not None:
+            return schema
+        tool = self._load_tool(name)
+        if tool is None:
+            return None
+        schema = tool.get_function_schema()
+        self._schema_cache.put(name, module, class_name, schema)
+        return schema
+    
     async def execute_tool(self, name: str, **kwargs) -> ToolResult:
         """执行工具"""
         tool = self.get_tool(name)
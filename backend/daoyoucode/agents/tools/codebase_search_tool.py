@@ -2,18 +2,31 @@
 语义代码检索工具（Cursor 同级按问检索）
 
 根据自然语言 query 检索最相关的代码块，使用代码库向量索引或关键词回退。
+索引在后台线程中构建；未就绪时在时间预算内等待，超时则用 grep 关键词检索。
 """
 
 from pathlib import Path
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional
+import re
 
 from .base import BaseTool, ToolResult
 
+# 关键词检索时忽略的常见英文词
+_STOPWORDS = {
+    'the', 'and', 'for', 'with', 'from', 'that', 'this', 'what', 'where', 'how',
+    'does', 'are', 'was', 'can', 'use', 'used', 'code', 'file', 'function', 'find',
+}
+
 
 class SemanticCodeSearchTool(BaseTool):
     """按问题语义检索相关代码块（类似 Cursor @codebase）"""
 
     MAX_OUTPUT_CHARS = 8000
+    # 索引未就绪时最多等待的秒数（只等待即将完成的构建，之后立即回退到关键词检索，
+    # 索引继续在后台构建，后续查询再使用）
+    INDEX_WAIT_SECONDS = 1.0
+    # 关键词检索最多收集的命中数
+    KEYWORD_MAX_MATCHES = 300
 
     def __init__(self):
         super().__init__(
@@ -64,6 +77,13 @@ class SemanticCodeSearchTool(BaseTool):
             if not path.exists() or not path.is_dir():
                 return ToolResult(success=False, content=None, error=f"目录不存在: {repo_path}")
 
+            # 索引在后台构建，不在事件循环上同步构建
+            from ..memory.codebase_warmup import start_index_warmup
+            warmup = start_index_warmup(path)
+            if not await warmup.wait(self.INDEX_WAIT_SECONDS):
+                results = await self.keyword_search(path, query, top_k)
+                return self.format_results(results, enable_lsp=False, index_status=warmup.status())
+
             # 🔥 默认使用LSP增强检索
             if enable_lsp:
                 try:
@@ -107,6 +127,64 @@ class SemanticCodeSearchTool(BaseTool):
                 from ..memory.codebase_index import search_codebase
                 results = search_codebase(path, query, top_k=top_k, strategy="hybrid")
 
+            return self.format_results(results, enable_lsp)
+        except Exception as e:
+            return ToolResult(success=False, content=None, error=str(e))
+
+    async def keyword_search(self, path: Path, query: str, top_k: int = 8) -> List[Dict[str, Any]]:
+        """
+        关键词检索（索引未就绪时的回退）
+
+        用 grep 引擎并行搜索查询中的标识符，按命中的不同关键词数排序，
+        结果格式与索引检索一致（path/start/end/text/score）。
+        """
+        from .grep_engine import GrepQuery, get_grep_engine
+
+        words = [
+            w for w in dict.fromkeys(re.findall(r"[A-Za-z_][A-Za-z0-9_]{2,}", query))
+            if w.lower() not in _STOPWORDS
+        ][:8]
+        if not words:
+            return []
+
+        engine = get_grep_engine(path)
+        pattern = GrepQuery.regex("|".join(re.escape(w) for w in words), re.IGNORECASE)
+        hits: Dict[Path, Dict[str, Any]] = {}
+        async for match in engine.search(pattern, max_results=self.KEYWORD_MAX_MATCHES):
+            entry = hits.setdefault(match.path, {"words": set(), "lines": []})
+            # 每行只返回第一个命中，同一行的其他关键词在这里补上
+            entry["words"].update(w.lower() for w in pattern.line_regex.findall(match.content))
+            entry["lines"].append(match.line)
+
+        ranked = sorted(
+            hits.items(),
+            key=lambda item: (-len(item[1]["words"]), -len(item[1]["lines"]), str(item[0]))
+        )
+        results = []
+        for file_path, entry in ranked[:top_k]:
+            first = entry["lines"][0]
+            try:
+                lines = file_path.read_text(encoding="utf-8", errors="ignore").splitlines()
+            except OSError:
+                continue
+            start = max(1, first - 5)
+            end = min(len(lines), first + 15)
+            results.append({
+                "path": file_path.relative_to(engine.root).as_posix(),
+                "start": start,
+                "end": end,
+                "text": "\n".join(lines[start - 1:end]),
+                "score": len(entry["words"]) + 0.1 * min(len(entry["lines"]), 10),
+            })
+        return results
+
+    def format_results(
+        self,
+        results: List[Dict[str, Any]],
+        enable_lsp: bool,
+        index_status: Optional[Dict[str, Any]] = None
+    ) -> ToolResult:
+        try:
             if not results:
                 return ToolResult(
                     success=True,
@@ -169,15 +247,19 @@ class SemanticCodeSearchTool(BaseTool):
             content = "\n\n".join(lines)
             if len(content) > self.MAX_OUTPUT_CHARS:
                 content = content[: self.MAX_OUTPUT_CHARS] + "\n…(已截断)"
+            if index_status is not None:
+                content = (
+                    f"（代码库索引构建中：{index_status['phase'] or '准备'}，"
+                    f"以下为关键词检索结果）\n\n{content}"
+                )
             
-            return ToolResult(
-                success=True,
-                content=content,
-                metadata={
-                    "count": len(results),
-                    "lsp_enabled": enable_lsp,
-                    "has_lsp_info": any(r.get('has_lsp_info') for r in results)
-                }
-            )
+            metadata = {
+                "count": len(results),
+                "lsp_enabled": enable_lsp,
+                "has_lsp_info": any(r.get('has_lsp_info') for r in results)
+            }
+            if index_status is not None:
+                metadata["index_status"] = index_status
+            return ToolResult(success=True, content=content, metadata=metadata)
         except Exception as e:
             return ToolResult(success=False, content=None, error=str(e))
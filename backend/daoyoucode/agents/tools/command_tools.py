@@ -1,13 +1,13 @@
 """
 命令执行工具
 
-提供shell命令执行功能
+提供shell命令执行功能。输出边执行边读取（见 process_stream），
+只保留开头和末尾的部分，测试进度实时上报。
 """
 
 from typing import Dict, Any, Optional
-import subprocess
-import asyncio
 from .base import BaseTool, ToolResult
+from .process_stream import run_streaming, TestProgressParser
 
 
 class RunCommandTool(BaseTool):
@@ -36,56 +36,38 @@ class RunCommandTool(BaseTool):
             shell: 是否使用shell
         """
         try:
-            # 使用asyncio.create_subprocess_shell实现异步执行
-            if shell:
-                process = await asyncio.create_subprocess_shell(
-                    command,
-                    stdout=asyncio.subprocess.PIPE,
-                    stderr=asyncio.subprocess.PIPE,
-                    cwd=cwd
-                )
-            else:
-                process = await asyncio.create_subprocess_exec(
-                    *command.split(),
-                    stdout=asyncio.subprocess.PIPE,
-                    stderr=asyncio.subprocess.PIPE,
-                    cwd=cwd
-                )
+            run = await run_streaming(command, cwd=cwd, timeout=timeout, shell=shell)
             
-            # 等待完成（带超时）
-            try:
-                stdout, stderr = await asyncio.wait_for(
-                    process.communicate(),
-                    timeout=timeout
-                )
-            except asyncio.TimeoutError:
-                process.kill()
-                await process.wait()
+            content = {
+                'stdout': run.stdout,
+                'stderr': run.stderr,
+                'returncode': run.returncode
+            }
+            metadata = {
+                'command': command,
+                'cwd': cwd,
+                'returncode': run.returncode,
+                'duration': run.duration,
+                'output_truncated': run.truncated,
+                'stdout_lines': run.stdout_lines,
+                'stderr_lines': run.stderr_lines
+            }
+            
+            if run.timed_out:
                 return ToolResult(
                     success=False,
-                    content=None,
-                    error=f"Command timed out after {timeout} seconds"
+                    content=content,
+                    error=f"Command timed out after {timeout} seconds",
+                    metadata=metadata
                 )
             
-            # 解码输出
-            stdout_str = stdout.decode('utf-8', errors='ignore')
-            stderr_str = stderr.decode('utf-8', errors='ignore')
-            
-            success = process.returncode == 0
+            success = run.returncode == 0
             
             return ToolResult(
                 success=success,
-                content={
-                    'stdout': stdout_str,
-                    'stderr': stderr_str,
-                    'returncode': process.returncode
-                },
-                error=stderr_str if not success else None,
-                metadata={
-                    'command': command,
-                    'cwd': cwd,
-                    'returncode': process.returncode
-                }
+                content=content,
+                error=run.stderr if not success else None,
+                metadata=metadata
             )
         except Exception as e:
             return ToolResult(
@@ -139,7 +121,8 @@ class RunTestTool(BaseTool):
         test_path: Optional[str] = None,
         test_framework: str = "pytest",
         cwd: Optional[str] = None,
-        timeout: int = 60
+        timeout: int = 60,
+        fail_fast: bool = False
     ) -> ToolResult:
         """
         运行测试
@@ -149,6 +132,7 @@ class RunTestTool(BaseTool):
             test_framework: 测试框架（pytest/unittest/jest等）
             cwd: 工作目录
             timeout: 超时时间（秒）
+            fail_fast: 第一个失败后停止（pytest -x / unittest -f / jest --bail）
         """
         try:
             # 构建命令
@@ -157,14 +141,20 @@ class RunTestTool(BaseTool):
                 if test_path:
                     command += f" {test_path}"
                 command += " -v"
+                if fail_fast:
+                    command += " -x"
             elif test_framework == "unittest":
                 command = "python -m unittest"
+                if fail_fast:
+                    command += " -f"
                 if test_path:
                     command += f" {test_path}"
             elif test_framework == "jest":
-                command = "npm test"
+                command = "npm test --"
+                if fail_fast:
+                    command += " --bail"
                 if test_path:
-                    command += f" -- {test_path}"
+                    command += f" {test_path}"
             else:
                 return ToolResult(
                     success=False,
@@ -172,54 +162,41 @@ class RunTestTool(BaseTool):
                     error=f"Unsupported test framework: {test_framework}"
                 )
             
-            # 执行命令
-            process = await asyncio.create_subprocess_shell(
-                command,
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE,
-                cwd=cwd
-            )
+            # 执行命令（边运行边解析进度）
+            parser = TestProgressParser(test_framework)
+            run = await run_streaming(command, cwd=cwd, timeout=timeout, parser=parser)
             
-            try:
-                stdout, stderr = await asyncio.wait_for(
-                    process.communicate(),
-                    timeout=timeout
-                )
-            except asyncio.TimeoutError:
-                process.kill()
-                await process.wait()
+            content = {
+                'stdout': run.stdout,
+                'stderr': run.stderr,
+                'returncode': run.returncode,
+                **parser.counts(),
+                'failures': parser.failures,
+                'summary': parser.format_summary()
+            }
+            metadata = {
+                'test_path': test_path,
+                'test_framework': test_framework,
+                'cwd': cwd,
+                'duration': run.duration,
+                'output_truncated': run.truncated
+            }
+            
+            if run.timed_out:
                 return ToolResult(
                     success=False,
-                    content=None,
-                    error=f"Test timed out after {timeout} seconds"
+                    content=content,
+                    error=f"Test timed out after {timeout} seconds\n{parser.format_summary()}",
+                    metadata=metadata
                 )
             
-            stdout_str = stdout.decode('utf-8', errors='ignore')
-            stderr_str = stderr.decode('utf-8', errors='ignore')
-            
-            success = process.returncode == 0
-            
-            # 解析测试结果
-            result_info = self._parse_test_output(
-                stdout_str,
-                stderr_str,
-                test_framework
-            )
+            success = run.returncode == 0
             
             return ToolResult(
                 success=success,
-                content={
-                    'stdout': stdout_str,
-                    'stderr': stderr_str,
-                    'returncode': process.returncode,
-                    **result_info
-                },
-                error=stderr_str if not success else None,
-                metadata={
-                    'test_path': test_path,
-                    'test_framework': test_framework,
-                    'cwd': cwd
-                }
+                content=content,
+                error=None if success else (parser.format_summary() if parser.failure_detected else run.stderr or run.stdout),
+                metadata=metadata
             )
         except Exception as e:
             return ToolResult(
@@ -228,36 +205,6 @@ class RunTestTool(BaseTool):
                 error=str(e)
             )
     
-    def _parse_test_output(
-        self,
-        stdout: str,
-        stderr: str,
-        framework: str
-    ) -> Dict[str, Any]:
-        """解析测试输出"""
-        result = {
-            'passed': 0,
-            'failed': 0,
-            'skipped': 0,
-            'total': 0
-        }
-        
-        if framework == "pytest":
-            # 解析pytest输出
-            import re
-            match = re.search(r'(\d+) passed', stdout)
-            if match:
-                result['passed'] = int(match.group(1))
-            match = re.search(r'(\d+) failed', stdout)
-            if match:
-                result['failed'] = int(match.group(1))
-            match = re.search(r'(\d+) skipped', stdout)
-            if match:
-                result['skipped'] = int(match.group(1))
-            result['total'] = result['passed'] + result['failed'] + result['skipped']
-        
-        return result
-    
     def get_function_schema(self) -> Dict[str, Any]:
         return {
             "name": self.name,
@@ -282,6 +229,11 @@ class RunTestTool(BaseTool):
                         "type": "integer",
                         "description": "超时时间（秒）",
                         "default": 60
+                    },
+                    "fail_fast": {
+                        "type": "boolean",
+                        "description": "第一个失败后停止，尽快返回失败摘要",
+                        "default": False
                     }
                 },
                 "required": []
@@ -330,30 +282,19 @@ class RunLintTool(BaseTool):
                     cmd = "ruff check . 2>/dev/null || true"
                 else:
                     cmd = "echo 'No default lint for this project'"
-            process = await asyncio.create_subprocess_shell(
-                cmd,
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE,
-                cwd=str(work_dir)
-            )
-            try:
-                stdout, stderr = await asyncio.wait_for(process.communicate(), timeout=timeout)
-            except asyncio.TimeoutError:
-                process.kill()
-                await process.wait()
+            run = await run_streaming(cmd, cwd=str(work_dir), timeout=timeout)
+            if run.timed_out:
                 return ToolResult(
                     success=False,
                     content=None,
                     error=f"Lint 超时（{timeout}秒）"
                 )
-            out = stdout.decode("utf-8", errors="ignore")
-            err = stderr.decode("utf-8", errors="ignore")
-            combined = (out + "\n" + err).strip()
+            combined = run.output.strip()
             return ToolResult(
-                success=process.returncode == 0,
+                success=run.returncode == 0,
                 content=combined or "Lint 通过，无输出",
-                error=None if process.returncode == 0 else combined,
-                metadata={"command": cmd, "returncode": process.returncode}
+                error=None if run.returncode == 0 else combined,
+                metadata={"command": cmd, "returncode": run.returncode, "output_truncated": run.truncated}
             )
         except Exception as e:
             return ToolResult(success=False, content=None, error=str(e))
@@ -3,7 +3,7 @@ Diff工具 - 智能替换策略
 
 采用先进的 Diff 系统实现，支持：
 - 9种智能替换策略
-- Levenshtein距离算法
+- Levenshtein距离算法（位并行实现，见 fuzzy_match）
 - BlockAnchorReplacer（首尾行锚定）
 - 模糊匹配和容错
 """
@@ -13,39 +13,15 @@ from pathlib import Path
 import re
 import asyncio
 from .base import BaseTool, ToolResult, StreamingEditTool, EditEvent
-
-
-# ========== Levenshtein距离算法 ==========
-
-def levenshtein(a: str, b: str) -> int:
-    """
-    计算两个字符串的Levenshtein编辑距离
-    
-    用于衡量字符串相似度，距离越小越相似
-    """
-    if a == "" or b == "":
-        return max(len(a), len(b))
-    
-    # 创建距离矩阵
-    matrix = [[0] * (len(b) + 1) for _ in range(len(a) + 1)]
-    
-    # 初始化第一行和第一列
-    for i in range(len(a) + 1):
-        matrix[i][0] = i
-    for j in range(len(b) + 1):
-        matrix[0][j] = j
-    
-    # 动态规划计算距离
-    for i in range(1, len(a) + 1):
-        for j in range(1, len(b) + 1):
-            cost = 0 if a[i - 1] == b[j - 1] else 1
-            matrix[i][j] = min(
-                matrix[i - 1][j] + 1,      # 删除
-                matrix[i][j - 1] + 1,      # 插入
-                matrix[i - 1][j - 1] + cost  # 替换
-            )
-    
-    return matrix[len(a)][len(b)]
+from .file_io import read_text, run_file_io, write_text
+from .fuzzy_match import (
+    line_offsets,
+    line_span,
+    best_window_match,
+    normalize_whitespace,
+    DistanceCache,
+    AnchorIndex,
+)
 
 
 # ========== 9种Replacer策略 ==========
@@ -80,22 +56,17 @@ class LineTrimmedReplacer(Replacer):
         if search_lines and search_lines[-1] == "":
             search_lines.pop()
         
+        stripped_lines = [line.strip() for line in original_lines]
+        stripped_search = [line.strip() for line in search_lines]
+        offsets = line_offsets(original_lines)
+        block_size = len(search_lines)
+        
         # 滑动窗口匹配
-        for i in range(len(original_lines) - len(search_lines) + 1):
-            matches = True
-            
-            for j in range(len(search_lines)):
-                if original_lines[i + j].strip() != search_lines[j].strip():
-                    matches = False
-                    break
-            
-            if matches:
+        for i in range(len(original_lines) - block_size + 1):
+            if stripped_lines[i:i + block_size] == stripped_search:
                 # 计算匹配的起止位置
-                match_start = sum(len(original_lines[k]) + 1 for k in range(i))
-                match_end = match_start + sum(
-                    len(original_lines[i + k]) + (1 if k < len(search_lines) - 1 else 0)
-                    for k in range(len(search_lines))
-                )
+                match_start = offsets[i]
+                match_end = offsets[i + block_size] - 1 if block_size else match_start
                 yield content[match_start:match_end]
 
 
@@ -127,21 +98,22 @@ class BlockAnchorReplacer(Replacer):
         last_line = search_lines[-1].strip()
         search_block_size = len(search_lines)
         
-        # 收集所有候选位置
+        stripped_lines = [line.strip() for line in original_lines]
+        anchors = AnchorIndex(stripped_lines)
+        cache = DistanceCache()
+        
+        # 收集所有候选位置（每个首行锚点取其后第一个末行锚点）
         candidates: List[Tuple[int, int]] = []
-        for i in range(len(original_lines)):
-            if original_lines[i].strip() != first_line:
-                continue
-            
-            # 查找匹配的末尾行
-            for j in range(i + 2, len(original_lines)):
-                if original_lines[j].strip() == last_line:
-                    candidates.append((i, j))
-                    break
+        for i in anchors.positions(first_line):
+            j = anchors.first_at_or_after(last_line, i + 2)
+            if j is not None:
+                candidates.append((i, j))
         
         if not candidates:
             return
         
+        offsets = line_offsets(original_lines)
+        
         # 单候选情况（使用宽松阈值）
         if len(candidates) == 1:
             start_line, end_line = candidates[0]
@@ -152,14 +124,14 @@ class BlockAnchorReplacer(Replacer):
             
             if lines_to_check > 0:
                 for j in range(1, min(search_block_size - 1, actual_block_size - 1)):
-                    original_line = original_lines[start_line + j].strip()
+                    original_line = stripped_lines[start_line + j]
                     search_line = search_lines[j].strip()
                     max_len = max(len(original_line), len(search_line))
                     
                     if max_len == 0:
                         continue
                     
-                    distance = levenshtein(original_line, search_line)
+                    distance = cache.distance(original_line, search_line)
                     similarity += (1 - distance / max_len) / lines_to_check
                     
                     if similarity >= BlockAnchorReplacer.SINGLE_CANDIDATE_THRESHOLD:
@@ -168,11 +140,7 @@ class BlockAnchorReplacer(Replacer):
                 similarity = 1.0
             
             if similarity >= BlockAnchorReplacer.SINGLE_CANDIDATE_THRESHOLD:
-                match_start = sum(len(original_lines[k]) + 1 for k in range(start_line))
-                match_end = match_start + sum(
-                    len(original_lines[k]) + (1 if k < end_line else 0)
-                    for k in range(start_line, end_line + 1)
-                )
+                match_start, match_end = line_span(offsets, start_line, end_line)
                 yield content[match_start:match_end]
             return
         
@@ -188,14 +156,14 @@ class BlockAnchorReplacer(Replacer):
             
             if lines_to_check > 0:
                 for j in range(1, min(search_block_size - 1, actual_block_size - 1)):
-                    original_line = original_lines[start_line + j].strip()
+                    original_line = stripped_lines[start_line + j]
                     search_line = search_lines[j].strip()
                     max_len = max(len(original_line), len(search_line))
                     
                     if max_len == 0:
                         continue
                     
-                    distance = levenshtein(original_line, search_line)
+                    distance = cache.distance(original_line, search_line)
                     similarity += 1 - distance / max_len
                 
                 similarity /= lines_to_check
@@ -208,11 +176,7 @@ class BlockAnchorReplacer(Replacer):
         
         if max_similarity >= BlockAnchorReplacer.MULTIPLE_CANDIDATES_THRESHOLD and best_match:
             start_line, end_line = best_match
-            match_start = sum(len(original_lines[k]) + 1 for k in range(start_line))
-            match_end = match_start + sum(
-                len(original_lines[k]) + (1 if k < end_line else 0)
-                for k in range(start_line, end_line + 1)
-            )
+            match_start, match_end = line_span(offsets, start_line, end_line)
             yield content[match_start:match_end]
 
 
@@ -495,7 +459,7 @@ class SearchReplaceTool(BaseTool):
                 )
             
             # 读取原始文件内容
-            old_content = path.read_text(encoding='utf-8', errors='ignore')
+            old_content = await run_file_io(path.read_text, encoding='utf-8', errors='ignore')
             
             # 执行替换（使用模块级函数）
             from . import diff_tools
@@ -514,7 +478,7 @@ class SearchReplaceTool(BaseTool):
             diff_text = ''.join(diff_lines) if diff_lines else "No changes"
             
             # 写入文件
-            path.write_text(new_content, encoding='utf-8')
+            await write_text(path, new_content)
             
             # 构建结果消息
             result_message = f"✅ Successfully modified {file_path}\n\n"
@@ -691,16 +655,16 @@ class ApplyPatchTool(BaseTool):
                     continue
                 try:
                     if full_path.exists():
-                        content = full_path.read_text(encoding="utf-8", errors="ignore")
+                        content = await run_file_io(full_path.read_text, encoding="utf-8", errors="ignore")
                         old_lines = content.splitlines(keepends=True)
                         if not content.endswith("\n") and old_lines:
                             old_lines[-1] = old_lines[-1].rstrip("\n") + "\n"
                     else:
-                        full_path.parent.mkdir(parents=True, exist_ok=True)
+                        await run_file_io(full_path.parent.mkdir, parents=True, exist_ok=True)
                         old_lines = []
                     for (old_start, old_count, new_start, new_count, hunk_lines) in file_info["hunks"]:
                         old_lines = _apply_hunk(old_lines, old_start, old_count, new_start, new_count, hunk_lines)
-                    full_path.write_text("".join(old_lines), encoding="utf-8")
+                    await write_text(full_path, "".join(old_lines))
                     applied.append(rel_path)
                 except Exception as e:
                     errors.append(f"{rel_path}: {e}")
@@ -796,8 +760,7 @@ class IntelligentDiffEditTool(StreamingEditTool):
                 )
             
             # 读取文件
-            with open(path, 'r', encoding='utf-8') as f:
-                content = f.read()
+            content = await read_text(path)
             
             # 查找最佳匹配
             match_result = self._find_best_match(
@@ -837,8 +800,7 @@ class IntelligentDiffEditTool(StreamingEditTool):
             diff_text = ''.join(diff_lines) if diff_lines else "No changes"
             
             # 写入文件
-            with open(path, 'w', encoding='utf-8') as f:
-                f.write(new_content)
+            await write_text(path, new_content)
             
             # LSP 验证
             diagnostics = []
@@ -850,8 +812,7 @@ class IntelligentDiffEditTool(StreamingEditTool):
                     
                     if error_count > 0:
                         # 有错误，回退
-                        with open(path, 'w', encoding='utf-8') as f:
-                            f.write(content)
+                        await write_text(path, content)
                         
                         error_messages = [
                             f"Line {d.get('range', {}).get('start', {}).get('line', '?') + 1}: {d.get('message', 'Unknown')}"
@@ -955,8 +916,7 @@ class IntelligentDiffEditTool(StreamingEditTool):
             await asyncio.sleep(0.01)
             
             # 读取文件
-            with open(path, 'r', encoding='utf-8') as f:
-                content = f.read()
+            content = await read_text(path)
             
             file_size = len(content)
             line_count = content.count('\n') + 1
@@ -1070,8 +1030,7 @@ class IntelligentDiffEditTool(StreamingEditTool):
             await asyncio.sleep(0.01)
             
             # 写入文件
-            with open(path, 'w', encoding='utf-8') as f:
-                f.write(new_content)
+            await write_text(path, new_content)
             
             yield EditEvent(
                 type=EditEvent.EDIT_APPLYING,
@@ -1112,8 +1071,7 @@ class IntelligentDiffEditTool(StreamingEditTool):
                     
                     if error_count > 0:
                         # 有错误，回退
-                        with open(path, 'w', encoding='utf-8') as f:
-                            f.write(content)
+                        await write_text(path, content)
                         
                         error_messages = [
                             f"Line {d.get('range', {}).get('start', {}).get('line', '?') + 1}: {d.get('message', 'Unknown')}"
@@ -1183,33 +1141,18 @@ class IntelligentDiffEditTool(StreamingEditTool):
         if not fuzzy_match:
             return None
         
-        # 2. 模糊匹配
+        # 2. 模糊匹配（滑动窗口，见 fuzzy_match.best_window_match）
         content_lines = content.split('\n')
         search_lines = search_block.split('\n')
         
-        best_match = None
-        best_similarity = 0.0
-        
-        # 滑动窗口
-        for i in range(len(content_lines) - len(search_lines) + 1):
-            window = content_lines[i:i + len(search_lines)]
-            
-            # 计算相似度
-            similarity = self._calculate_similarity(
-                window,
-                search_lines
-            )
-            
-            if similarity > best_similarity and similarity >= similarity_threshold:
-                best_similarity = similarity
-                
-                # 计算字符位置
-                start = sum(len(content_lines[j]) + 1 for j in range(i))
-                end = start + sum(len(window[j]) + 1 for j in range(len(window))) - 1
-                
-                best_match = (start, end, similarity)
+        result = best_window_match(content_lines, search_lines, similarity_threshold)
+        if result is None:
+            return None
         
-        return best_match
+        # 计算字符位置
+        i, similarity = result
+        start, end = line_span(line_offsets(content_lines), i, i + len(search_lines) - 1)
+        return (start, end, similarity)
     
     def _calculate_similarity(
         self,
@@ -1224,23 +1167,18 @@ class IntelligentDiffEditTool(StreamingEditTool):
         if len(lines1) != len(lines2):
             return 0.0
         
+        cache = DistanceCache()
         total_similarity = 0.0
         
         for line1, line2 in zip(lines1, lines2):
             # 归一化空白
-            line1_norm = ' '.join(line1.split())
-            line2_norm = ' '.join(line2.split())
+            line1_norm = normalize_whitespace(line1)
+            line2_norm = normalize_whitespace(line2)
             
             if line1_norm == line2_norm:
                 total_similarity += 1.0
             else:
-                # Levenshtein 距离
-                max_len = max(len(line1_norm), len(line2_norm))
-                if max_len == 0:
-                    total_similarity += 1.0
-                else:
-                    distance = levenshtein(line1_norm, line2_norm)
-                    total_similarity += 1.0 - (distance / max_len)
+                total_similarity += cache.similarity(line1_norm, line2_norm)
         
         return total_similarity / len(lines1)
     
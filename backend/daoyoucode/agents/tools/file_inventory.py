@@ -0,0 +1,475 @@
+"""
+仓库文件清单（共享服务）
+
+所有遍历仓库的工具共用一份按仓库根缓存的文件清单：
+- os.scandir 构建，记录路径、大小、mtime、语言
+- 完整的 .gitignore / .daoyoucodeignore 语义（嵌套文件、否定规则，依赖 pathspec）
+- 增量更新：只重新列出 mtime 变化的目录，文件只做 stat
+- 同一轮对话内多个工具共享同一份快照，不再重复遍历
+"""
+
+from dataclasses import dataclass, field
+from pathlib import Path, PurePosixPath
+from typing import Dict, List, Optional, Tuple, Iterable, Union
+import logging
+import os
+import threading
+import time
+
+try:
+    import pathspec
+    PATHSPEC_AVAILABLE = True
+except ImportError:
+    PATHSPEC_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# 始终忽略的目录（构建产物、依赖、缓存）
+DEFAULT_IGNORE_DIRS = {
+    ".git", "node_modules", "__pycache__", ".venv", "venv",
+    "dist", "build", ".next", ".nuxt", "target",
+    ".pytest_cache", ".mypy_cache", ".tox",
+}
+
+# 参与忽略规则的文件（按顺序生效，后者优先）
+IGNORE_FILES = (".gitignore", ".daoyoucodeignore")
+
+# 两次自动刷新的最小间隔（秒）
+REFRESH_INTERVAL = 1.0
+
+# 扩展名 -> 语言
+EXTENSION_LANGUAGES = {
+    ".py": "python", ".pyi": "python",
+    ".js": "javascript", ".jsx": "javascript", ".mjs": "javascript", ".cjs": "javascript",
+    ".ts": "typescript", ".tsx": "typescript",
+    ".java": "java", ".kt": "kotlin", ".scala": "scala",
+    ".go": "go", ".rs": "rust",
+    ".c": "c", ".h": "c", ".cc": "cpp", ".cpp": "cpp", ".hpp": "cpp", ".cxx": "cpp",
+    ".cs": "csharp", ".rb": "ruby", ".php": "php", ".swift": "swift",
+    ".lua": "lua", ".dart": "dart", ".ex": "elixir", ".exs": "elixir",
+    ".sh": "bash", ".sql": "sql",
+    ".md": "markdown", ".json": "json", ".yaml": "yaml", ".yml": "yaml", ".toml": "toml",
+    ".html": "html", ".css": "css", ".scss": "scss", ".vue": "vue",
+}
+
+
+@dataclass
+class FileEntry:
+    """清单中的文件"""
+    path: str              # 相对仓库根，POSIX 分隔符
+    abs_path: Path
+    size: int
+    mtime: float
+    mtime_ns: int
+    language: Optional[str] = None
+
+    @property
+    def name(self) -> str:
+        return self.abs_path.name
+
+    @property
+    def suffix(self) -> str:
+        return self.abs_path.suffix
+
+
+@dataclass
+class _DirState:
+    """已扫描目录的状态"""
+    mtime_ns: int
+    spec: "_IgnoreRules"
+    subdirs: List[str] = field(default_factory=list)
+    files: List[str] = field(default_factory=list)
+    ignore_files: Dict[str, int] = field(default_factory=dict)  # 忽略规则文件 -> mtime_ns
+
+
+class _IgnoreRules:
+    """
+    某个目录生效的忽略规则
+
+    嵌套的 .gitignore 会被改写成相对仓库根的模式后追加到父目录规则之后，
+    与 git 一致：越深的文件优先级越高，同一文件内后面的规则优先。
+    """
+
+    def __init__(self, lines: Tuple[str, ...] = ()):
+        self.lines = lines
+        self._spec = None
+        if lines and PATHSPEC_AVAILABLE:
+            if hasattr(pathspec, "GitIgnoreSpec"):
+                self._spec = pathspec.GitIgnoreSpec.from_lines(lines)
+            else:
+                self._spec = pathspec.PathSpec.from_lines("gitwildmatch", lines)
+
+    def extend(self, base: str, lines: Iterable[str]) -> "_IgnoreRules":
+        rebased = tuple(
+            p for p in (_rebase_pattern(line, base) for line in lines) if p
+        )
+        if not rebased:
+            return self
+        return _IgnoreRules(self.lines + rebased)
+
+    def match(self, rel_path: str, is_dir: bool = False) -> bool:
+        if self._spec is None:
+            return False
+        return self._spec.match_file(rel_path + "/" if is_dir else rel_path)
+
+
+def _rebase_pattern(line: str, base: str) -> Optional[str]:
+    """把 base 目录下 .gitignore 中的一行改写为相对仓库根的模式"""
+    line = line.rstrip("\n").rstrip("\r")
+    if not line.strip() or line.startswith("#"):
+        return None
+    if not base:
+        return line
+
+    negate = line.startswith("!")
+    pattern = line[1:] if negate else line
+    core = pattern.rstrip("/")
+    if "/" in core:
+        # 含斜杠：相对该目录锚定
+        rebased = f"{base}/{pattern.lstrip('/')}"
+    else:
+        # 不含斜杠：该目录下任意深度
+        rebased = f"{base}/**/{pattern}"
+    return ("!" if negate else "") + rebased
+
+
+class FileInventory:
+    """
+    仓库文件清单
+
+    使用示例：
+        inventory = get_file_inventory(Path("/project"))
+        for entry in inventory.files(extensions={".py"}):
+            print(entry.path, entry.size, entry.language)
+        dirs, files = inventory.list_dir("backend")
+    """
+
+    def __init__(
+        self,
+        root: Path,
+        extra_ignore_dirs: Optional[Iterable[str]] = None,
+        refresh_interval: float = REFRESH_INTERVAL
+    ):
+        """
+        初始化清单（首次访问时才构建）
+
+        Args:
+            root: 仓库根目录
+            extra_ignore_dirs: 额外忽略的目录名
+            refresh_interval: 自动刷新的最小间隔（秒）
+        """
+        self.root = Path(root).resolve()
+        self.ignore_dirs = set(DEFAULT_IGNORE_DIRS) | set(extra_ignore_dirs or ())
+        self.refresh_interval = refresh_interval
+
+        self._lock = threading.RLock()
+        self._dirs: Dict[str, _DirState] = {}
+        self._files: Dict[str, FileEntry] = {}
+        self._sorted: Optional[List[FileEntry]] = None
+        self._built = False
+        self._last_refresh = 0.0
+        self._stats = {'builds': 0, 'refreshes': 0, 'rescanned_dirs': 0}
+
+    # ========== 查询 ==========
+
+    def files(
+        self,
+        subdir: Optional[Union[str, Path]] = None,
+        extensions: Optional[Iterable[str]] = None,
+        pattern: Optional[str] = None
+    ) -> List[FileEntry]:
+        """
+        列出文件（按路径排序）
+
+        Args:
+            subdir: 限定子目录（相对仓库根或绝对路径）
+            extensions: 只保留这些扩展名（如 {".py"}）
+            pattern: 文件名模式（语义同 rglob，相对 subdir 匹配）
+        """
+        with self._lock:
+            self._ensure_fresh()
+            if self._sorted is None:
+                self._sorted = sorted(self._files.values(), key=lambda e: e.path)
+            entries = self._sorted
+
+        prefix = self._rel_dir(subdir) if subdir is not None else ""
+        if prefix:
+            entries = [e for e in entries if e.path.startswith(prefix + "/")]
+
+        if extensions is not None:
+            exts = set(extensions)
+            entries = [e for e in entries if e.suffix in exts]
+
+        if pattern and pattern != "*":
+            offset = len(prefix) + 1 if prefix else 0
+            entries = [e for e in entries if PurePosixPath(e.path[offset:]).match(pattern)]
+
+        return entries
+
+    def list_dir(
+        self,
+        subdir: Optional[Union[str, Path]] = None
+    ) -> Optional[Tuple[List[str], List[FileEntry]]]:
+        """
+        列出目录的直接子项（忽略规则已生效，按名称排序）
+
+        Returns:
+            (子目录名列表, 文件列表)；目录不在清单中（被忽略或在仓库外）时返回 None
+        """
+        rel = self._rel_dir(subdir) if subdir is not None else ""
+        with self._lock:
+            self._ensure_fresh()
+            state = self._dirs.get(rel)
+            if state is None:
+                return None
+            files = [self._files[_join(rel, name)] for name in sorted(state.files)]
+            return sorted(state.subdirs), files
+
+    def get(self, path: Union[str, Path]) -> Optional[FileEntry]:
+        """获取单个文件条目"""
+        rel = self._rel_dir(path)
+        with self._lock:
+            self._ensure_fresh()
+            return self._files.get(rel)
+
+    def contains_dir(self, path: Union[str, Path]) -> bool:
+        """目录是否在清单中（未被忽略）"""
+        rel = self._rel_dir(path)
+        with self._lock:
+            self._ensure_fresh()
+            return rel in self._dirs
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._ensure_fresh()
+            return len(self._files)
+
+    # ========== 刷新 ==========
+
+    def refresh(self, force: bool = False):
+        """
+        增量刷新
+
+        Args:
+            force: True 时丢弃现有清单完全重建
+        """
+        with self._lock:
+            if force or not self._built:
+                self._build()
+            else:
+                self._refresh_incremental()
+            self._last_refresh = time.time()
+
+    def invalidate(self):
+        """标记清单过期，下次访问时立即刷新"""
+        with self._lock:
+            self._last_refresh = 0.0
+
+    def get_stats(self) -> Dict[str, int]:
+        """获取统计信息"""
+        with self._lock:
+            return {**self._stats, 'files': len(self._files), 'dirs': len(self._dirs)}
+
+    # ========== 内部方法 ==========
+
+    def _ensure_fresh(self):
+        if not self._built or time.time() - self._last_refresh >= self.refresh_interval:
+            self.refresh()
+
+    def _build(self):
+        self._dirs.clear()
+        self._files.clear()
+        self._sorted = None
+        self._scan_tree("", _IgnoreRules())
+        self._built = True
+        self._stats['builds'] += 1
+        logger.debug(f"文件清单已构建: {self.root} ({len(self._files)} 文件)")
+
+    def _refresh_incremental(self):
+        self._stats['refreshes'] += 1
+
+        # 1. 目录：mtime 变化的重新列出；忽略规则文件变化则整体重建
+        for rel_dir in list(self._dirs.keys()):
+            state = self._dirs.get(rel_dir)
+            if state is None:
+                continue  # 已随父目录移除
+
+            abs_dir = self.root / rel_dir if rel_dir else self.root
+            try:
+                mtime_ns = os.stat(abs_dir).st_mtime_ns
+            except OSError:
+                self._remove_subtree(rel_dir)
+                continue
+
+            for name, old_mtime in state.ignore_files.items():
+                try:
+                    changed = os.stat(abs_dir / name).st_mtime_ns != old_mtime
+                except OSError:
+                    changed = True
+                if changed:
+                    logger.debug(f"忽略规则变化 ({_join(rel_dir, name)})，重建文件清单")
+                    self._build()
+                    return
+
+            if mtime_ns != state.mtime_ns:
+                parent_spec = self._parent_spec(rel_dir)
+                self._scan_tree(rel_dir, parent_spec)
+
+        # 2. 文件：更新大小和 mtime
+        for rel, entry in list(self._files.items()):
+            try:
+                st = os.stat(entry.abs_path)
+            except OSError:
+                self._files.pop(rel, None)
+                self._sorted = None
+                continue
+            if st.st_mtime_ns != entry.mtime_ns or st.st_size != entry.size:
+                entry.mtime_ns = st.st_mtime_ns
+                entry.mtime = st.st_mtime
+                entry.size = st.st_size
+
+    def _parent_spec(self, rel_dir: str) -> _IgnoreRules:
+        if not rel_dir:
+            return _IgnoreRules()
+        parent = rel_dir.rsplit("/", 1)[0] if "/" in rel_dir else ""
+        state = self._dirs.get(parent)
+        return state.spec if state else _IgnoreRules()
+
+    def _scan_tree(self, rel_dir: str, parent_spec: _IgnoreRules):
+        """扫描目录；新出现的子目录递归扫描"""
+        stack = [(rel_dir, parent_spec)]
+        while stack:
+            current, spec = stack.pop()
+            state = self._scan_dir(current, spec)
+            if state is None:
+                continue
+            for name in state.subdirs:
+                sub = _join(current, name)
+                if sub not in self._dirs:
+                    stack.append((sub, state.spec))
+
+    def _scan_dir(self, rel_dir: str, parent_spec: _IgnoreRules) -> Optional[_DirState]:
+        """重新列出单个目录的直接子项"""
+        abs_dir = self.root / rel_dir if rel_dir else self.root
+        try:
+            mtime_ns = os.stat(abs_dir).st_mtime_ns
+        except OSError:
+            self._remove_subtree(rel_dir)
+            return None
+
+        spec = parent_spec
+        ignore_files: Dict[str, int] = {}
+        for name in IGNORE_FILES:
+            ignore_path = abs_dir / name
+            try:
+                st = os.stat(ignore_path)
+                lines = ignore_path.read_text(encoding="utf-8", errors="ignore").splitlines()
+            except OSError:
+                continue
+            ignore_files[name] = st.st_mtime_ns
+            spec = spec.extend(rel_dir, lines)
+
+        state = _DirState(mtime_ns=mtime_ns, spec=spec, ignore_files=ignore_files)
+        try:
+            with os.scandir(abs_dir) as it:
+                for entry in it:
+                    rel = _join(rel_dir, entry.name)
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            if entry.name in self.ignore_dirs or spec.match(rel, is_dir=True):
+                                continue
+                            state.subdirs.append(entry.name)
+                        elif entry.is_file():
+                            if spec.match(rel):
+                                continue
+                            st = entry.stat()
+                            state.files.append(entry.name)
+                            existing = self._files.get(rel)
+                            if existing and existing.mtime_ns == st.st_mtime_ns and existing.size == st.st_size:
+                                continue
+                            self._files[rel] = FileEntry(
+                                path=rel,
+                                abs_path=Path(entry.path),
+                                size=st.st_size,
+                                mtime=st.st_mtime,
+                                mtime_ns=st.st_mtime_ns,
+                                language=EXTENSION_LANGUAGES.get(os.path.splitext(entry.name)[1].lower())
+                            )
+                    except OSError:
+                        continue
+        except OSError as e:
+            logger.debug(f"无法列出目录 {abs_dir}: {e}")
+
+        old = self._dirs.get(rel_dir)
+        self._dirs[rel_dir] = state
+        self._sorted = None
+        self._stats['rescanned_dirs'] += 1
+
+        if old is not None:
+            for name in set(old.files) - set(state.files):
+                self._files.pop(_join(rel_dir, name), None)
+            for name in set(old.subdirs) - set(state.subdirs):
+                self._remove_subtree(_join(rel_dir, name))
+
+        return state
+
+    def _remove_subtree(self, rel_dir: str):
+        prefix = rel_dir + "/" if rel_dir else ""
+        for key in [k for k in self._dirs if k == rel_dir or k.startswith(prefix)]:
+            del self._dirs[key]
+        for key in [k for k in self._files if k.startswith(prefix)]:
+            del self._files[key]
+        self._sorted = None
+
+    def _rel_dir(self, path: Union[str, Path]) -> str:
+        """转换为相对仓库根的 POSIX 路径（根目录为空字符串）"""
+        p = Path(path)
+        if p.is_absolute():
+            try:
+                p = p.resolve().relative_to(self.root)
+            except ValueError:
+                return str(p).replace("\\", "/")
+        rel = p.as_posix()
+        return "" if rel == "." else rel.strip("/")
+
+
+def _join(rel_dir: str, name: str) -> str:
+    return f"{rel_dir}/{name}" if rel_dir else name
+
+
+# 单例：按仓库根缓存清单
+_inventories: Dict[str, FileInventory] = {}
+_inventories_lock = threading.Lock()
+
+
+def get_file_inventory(repo_path: Union[str, Path]) -> FileInventory:
+    """获取仓库根对应的文件清单（单例）"""
+    key = str(Path(repo_path).resolve())
+    with _inventories_lock:
+        inventory = _inventories.get(key)
+        if inventory is None:
+            inventory = FileInventory(Path(key))
+            _inventories[key] = inventory
+        return inventory
+
+
+def invalidate_file_inventories(root: Union[str, Path]):
+    """使 root 及其子目录下的所有文件清单在下次访问时立即刷新"""
+    root = Path(root).resolve()
+    with _inventories_lock:
+        inventories = [inv for inv in _inventories.values() if inv.root == root or root in inv.root.parents]
+    for inventory in inventories:
+        inventory.invalidate()
+
+
+def notify_path_changed(path: Union[str, Path]):
+    """
+    文件工具写入、创建或删除 path 后调用：包含 path 的文件清单在下次访问时立即刷新
+
+    不等 REFRESH_INTERVAL 到期，list/glob/grep 和符号存储马上看到变化。
+    """
+    path = Path(path).resolve()
+    with _inventories_lock:
+        inventories = [inv for inv in _inventories.values() if inv.root == path or inv.root in path.parents]
+    for inventory in inventories:
+        inventory.invalidate()
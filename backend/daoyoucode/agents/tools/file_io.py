@@ -0,0 +1,109 @@
+"""
+异步文件I/O
+
+文件工具共用的有界线程池：阻塞的 open/read/write/unlink 都放到线程池执行，
+批量操作可以真正重叠，事件循环在大批量读写时仍能及时处理流式输出和 LSP 消息。
+
+标准库没有 io_uring 接口，这里用线程池实现；文件系统调用会释放 GIL，
+线程数按 CPU 核数放大，同时设上限避免打开过多文件句柄。
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Optional, TypeVar
+import asyncio
+import functools
+import os
+import shutil
+import threading
+
+from .file_inventory import notify_path_changed
+
+T = TypeVar("T")
+
+# 线程池大小（可用环境变量 DAOYOUCODE_FILE_IO_WORKERS 覆盖）
+MAX_FILE_IO_WORKERS = 32
+
+_executor: Optional[ThreadPoolExecutor] = None
+_lock = threading.Lock()
+
+
+def _worker_count() -> int:
+    env = os.getenv("DAOYOUCODE_FILE_IO_WORKERS")
+    if env and env.isdigit() and int(env) > 0:
+        return int(env)
+    return min(MAX_FILE_IO_WORKERS, (os.cpu_count() or 4) * 4)
+
+
+def get_file_io_executor() -> ThreadPoolExecutor:
+    """获取文件I/O线程池（首次调用时创建）"""
+    global _executor
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=_worker_count(),
+                    thread_name_prefix="file-io"
+                )
+    return _executor
+
+
+async def run_file_io(func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """在文件I/O线程池中执行阻塞函数"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        get_file_io_executor(), functools.partial(func, *args, **kwargs)
+    )
+
+
+def _read_text(path: Path, encoding: str) -> str:
+    with open(path, 'r', encoding=encoding) as f:
+        return f.read()
+
+
+def _write_text(path: Path, content: str, encoding: str, create_dirs: bool) -> None:
+    if create_dirs:
+        path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'w', encoding=encoding) as f:
+        f.write(content)
+    notify_path_changed(path)
+
+
+def _delete_path(path: Path, recursive: bool) -> None:
+    if path.is_dir() and not path.is_symlink():
+        if recursive:
+            shutil.rmtree(path)
+        else:
+            path.rmdir()
+    else:
+        path.unlink()
+    notify_path_changed(path)
+
+
+async def read_text(path: Path, encoding: str = "utf-8") -> str:
+    """异步读取整个文本文件"""
+    return await run_file_io(_read_text, path, encoding)
+
+
+async def write_text(
+    path: Path,
+    content: str,
+    encoding: str = "utf-8",
+    create_dirs: bool = False
+) -> None:
+    """异步写入文本文件"""
+    await run_file_io(_write_text, path, content, encoding, create_dirs)
+
+
+async def delete_path(path: Path, recursive: bool = False) -> None:
+    """异步删除文件（或目录）"""
+    await run_file_io(_delete_path, path, recursive)
+
+
+def shutdown_file_io():
+    """关闭线程池（下次使用时重新创建）"""
+    global _executor
+    with _lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False)
+            _executor = None
@@ -5,11 +5,14 @@
 """
 
 from pathlib import Path
-from typing import Dict, Any, Optional, List, AsyncGenerator
+from typing import Dict, Any, Optional, List, AsyncGenerator, Tuple
 import os
 import shutil
 import asyncio
 from .base import BaseTool, ToolResult, EditEvent, StreamingEditTool
+from .file_inventory import FileInventory, get_file_inventory, notify_path_changed
+from .line_index import LineRange, fit_line_range, read_line_range, supports_ranges
+from .file_io import delete_path, read_text, run_file_io, write_text
 
 
 class ReadFileTool(BaseTool):
@@ -18,21 +21,41 @@ class ReadFileTool(BaseTool):
     # 单个文件不要太长
     MAX_OUTPUT_CHARS = 5000
     MAX_OUTPUT_LINES = 200
+    # 超过这个大小且未指定区间时，只读取开头一页
+    WHOLE_FILE_BYTES = 256 * 1024
+    # 分页提示占用的字符数和行数（一页连同提示不超过输出上限，不会被中间截断）
+    FOOTER_CHARS = 200
+    FOOTER_LINES = 2
     
     def __init__(self):
         super().__init__(
             name="read_file",
-            description="读取文件内容"
+            description="读取文件内容（大文件可用 offset/limit 按行分页读取）"
         )
     
-    async def execute(self, file_path: str, encoding: str = "utf-8") -> ToolResult:
+    async def execute(
+        self,
+        file_path: str,
+        encoding: str = "utf-8",
+        offset: Optional[int] = None,
+        limit: Optional[int] = None
+    ) -> ToolResult:
         """
         读取文件
         
         Args:
             file_path: 文件路径
             encoding: 编码格式
+            offset: 起始行号（从1开始）
+            limit: 最多读取的行数
         """
+        if limit is not None and limit < 1:
+            return ToolResult(
+                success=False,
+                content=None,
+                error=f"limit must be >= 1, got {limit}"
+            )
+        
         try:
             # 使用 resolve_path 解析路径
             path = self.resolve_path(file_path)
@@ -44,16 +67,49 @@ class ReadFileTool(BaseTool):
                     error=f"File not found: {file_path} (resolved to {path})"
                 )
             
-            with open(path, 'r', encoding=encoding) as f:
-                content = f.read()
+            ranged = offset is not None or limit is not None
+            if not ranged and path.stat().st_size <= self.WHOLE_FILE_BYTES:
+                content = await read_text(path, encoding)
+                
+                return ToolResult(
+                    success=True,
+                    content=content,
+                    metadata={
+                        'file_path': str(path),
+                        'size': len(content),
+                        'lines': content.count('\n') + 1
+                    }
+                )
+            
+            if limit is None:
+                limit = self.MAX_OUTPUT_LINES  # 一页最多这么多行，不必读到文件末尾
+            chunk = await run_file_io(read_file_range, path, offset or 1, limit, encoding)
+            chunk = fit_line_range(
+                chunk,
+                self.MAX_OUTPUT_CHARS - self.FOOTER_CHARS,
+                self.MAX_OUTPUT_LINES - self.FOOTER_LINES
+            )
+            
+            content = chunk.text
+            if chunk.has_more and chunk.end_line >= chunk.start_line:
+                total = chunk.total_lines if chunk.total_lines is not None else "未知"
+                content += (
+                    f"\n\n... [已显示第 {chunk.start_line}-{chunk.end_line} 行，共 {total} 行"
+                    f"（{chunk.size} 字节）；使用 offset={chunk.end_line + 1} 继续读取] ..."
+                )
             
             return ToolResult(
                 success=True,
                 content=content,
                 metadata={
                     'file_path': str(path),
-                    'size': len(content),
-                    'lines': content.count('\n') + 1
+                    'size': len(chunk.text),
+                    'file_size': chunk.size,
+                    'lines': chunk.total_lines if chunk.total_lines is not None else chunk.end_line,
+                    'start_line': chunk.start_line,
+                    'end_line': chunk.end_line,
+                    'total_lines': chunk.total_lines,
+                    'has_more': chunk.has_more
                 }
             )
         except Exception as e:
@@ -78,6 +134,14 @@ class ReadFileTool(BaseTool):
                         "type": "string",
                         "description": "编码格式",
                         "default": "utf-8"
+                    },
+                    "offset": {
+                        "type": "integer",
+                        "description": "起始行号（从1开始）。只读取文件的一部分时使用"
+                    },
+                    "limit": {
+                        "type": "integer",
+                        "description": "最多读取的行数。大文件请分页读取，例如 offset=201, limit=200"
                     }
                 },
                 "required": ["file_path"]
@@ -85,6 +149,35 @@ class ReadFileTool(BaseTool):
         }
 
 
+def read_file_range(
+    path: Path,
+    offset: int = 1,
+    limit: Optional[int] = None,
+    encoding: str = "utf-8"
+) -> LineRange:
+    """
+    按行区间读取文件
+
+    兼容 ASCII 的编码走 mmap + 缓存的行索引；UTF-16/32 等编码退回整文件读取后切片
+    """
+    if supports_ranges(encoding):
+        return read_line_range(path, offset, limit, encoding)
+    if limit is not None and limit < 1:
+        raise ValueError(f"limit 必须大于等于1: {limit}")
+    
+    with open(path, 'r', encoding=encoding) as f:
+        lines = f.read().splitlines()
+    offset = max(1, offset)
+    selected = lines[offset - 1:] if limit is None else lines[offset - 1:offset - 1 + limit]
+    return LineRange(
+        text='\n'.join(selected),
+        start_line=offset,
+        end_line=min(offset + len(selected) - 1, len(lines)),
+        total_lines=len(lines),
+        size=path.stat().st_size
+    )
+
+
 class WriteFileTool(StreamingEditTool):
     """写入文件工具（支持LSP验证和流式显示）"""
     
@@ -115,13 +208,8 @@ class WriteFileTool(StreamingEditTool):
         try:
             path = self.resolve_path(file_path)
             
-            # 创建目录
-            if create_dirs and not path.parent.exists():
-                path.parent.mkdir(parents=True, exist_ok=True)
-            
-            # 写入文件
-            with open(path, 'w', encoding=encoding) as f:
-                f.write(content)
+            # 写入文件（按需创建目录）
+            await write_text(path, content, encoding, create_dirs=create_dirs)
             
             result_metadata = {
                 'file_path': str(path),
@@ -338,8 +426,7 @@ class WriteFileTool(StreamingEditTool):
                     await asyncio.sleep(0.005)  # 小文件也要有延迟
             
             # 5. 实际写入文件
-            with open(path, 'w', encoding=encoding) as f:
-                f.write(content)
+            await write_text(path, content, encoding)
             
             # 6. LSP验证
             if verify and self._should_verify(path):
@@ -455,20 +542,21 @@ class ListFilesTool(BaseTool):
                 )
             
             files = []
+            inventory = get_file_inventory(self.context.repo_path)
             
             if recursive:
                 # 🆕 如果 max_depth 是 None，使用一个很大的数字
                 effective_max_depth = max_depth if max_depth is not None else 999
-                files = self._list_recursive(path, pattern, effective_max_depth, 0)
+                files = self._list_recursive(inventory, path, pattern, effective_max_depth, 0)
             else:
-                for item in path.iterdir():
+                for item, is_dir, size in self._list_dir(inventory, path):
                     if pattern and not item.match(pattern):
                         continue
                     files.append({
                         'path': self.normalize_path(str(item)),  # 标准化路径
                         'name': item.name,
-                        'type': 'dir' if item.is_dir() else 'file',
-                        'size': item.stat().st_size if item.is_file() else 0
+                        'type': 'dir' if is_dir else 'file',
+                        'size': size
                     })
             
             return ToolResult(
@@ -487,8 +575,33 @@ class ListFilesTool(BaseTool):
                 error=str(e)
             )
     
+    def _list_dir(self, inventory: FileInventory, path: Path) -> List[Tuple[Path, bool, int]]:
+        """
+        列出直接子项：[(路径, 是否目录, 大小), ...]
+        
+        优先使用共享文件清单（忽略规则已生效）；
+        仓库外或被忽略的目录（用户显式指定时）直接读取磁盘。
+        """
+        listing = inventory.list_dir(path)
+        if listing is not None:
+            subdirs, entries = listing
+            return (
+                [(path / name, True, 0) for name in subdirs] +
+                [(path / entry.name, False, entry.size) for entry in entries]
+            )
+        
+        items = []
+        try:
+            for item in path.iterdir():
+                is_dir = item.is_dir()
+                items.append((item, is_dir, item.stat().st_size if item.is_file() else 0))
+        except PermissionError:
+            pass
+        return items
+    
     def _list_recursive(
         self,
+        inventory: FileInventory,
         path: Path,
         pattern: Optional[str],
         max_depth: int,
@@ -499,26 +612,23 @@ class ListFilesTool(BaseTool):
             return []
         
         files = []
-        try:
-            for item in path.iterdir():
-                if pattern and not item.match(pattern):
-                    if not item.is_dir():
-                        continue
-                
-                files.append({
-                    'path': self.normalize_path(str(item)),  # 标准化路径
-                    'name': item.name,
-                    'type': 'dir' if item.is_dir() else 'file',
-                    'size': item.stat().st_size if item.is_file() else 0,
-                    'depth': current_depth
-                })
-                
-                if item.is_dir():
-                    files.extend(self._list_recursive(
-                        item, pattern, max_depth, current_depth + 1
-                    ))
-        except PermissionError:
-            pass
+        for item, is_dir, size in self._list_dir(inventory, path):
+            if pattern and not item.match(pattern):
+                if not is_dir:
+                    continue
+            
+            files.append({
+                'path': self.normalize_path(str(item)),  # 标准化路径
+                'name': item.name,
+                'type': 'dir' if is_dir else 'file',
+                'size': size,
+                'depth': current_depth
+            })
+            
+            if is_dir:
+                files.extend(self._list_recursive(
+                    inventory, item, pattern, max_depth, current_depth + 1
+                ))
         
         return files
     
@@ -641,6 +751,7 @@ class CreateDirectoryTool(BaseTool):
         try:
             path = Path(directory)
             path.mkdir(parents=parents, exist_ok=True)
+            notify_path_changed(path)
             
             return ToolResult(
                 success=True,
@@ -759,7 +870,9 @@ class BatchReadFilesTool(BaseTool):
     async def execute(
         self,
         file_paths: List[str],
-        encoding: str = "utf-8"
+        encoding: str = "utf-8",
+        offset: Optional[int] = None,
+        limit: Optional[int] = None
     ) -> ToolResult:
         """
         批量读取文件
@@ -767,30 +880,53 @@ class BatchReadFilesTool(BaseTool):
         Args:
             file_paths: 文件路径列表
             encoding: 编码格式
+            offset: 每个文件的起始行号（从1开始）
+            limit: 每个文件最多读取的行数
         
         Returns:
             ToolResult，content 为字典 {file_path: content}
         """
+        if limit is not None and limit < 1:
+            return ToolResult(
+                success=False,
+                content=None,
+                error=f"limit must be >= 1, got {limit}"
+            )
+        
         try:
             results = {}
             errors = {}
+            ranges = {}
+            ranged = offset is not None or limit is not None
+            
+            def load(path: Path) -> Tuple[Optional[str], Optional[LineRange]]:
+                """在文件I/O线程池中执行"""
+                if not path.exists():
+                    return None, None
+                if not ranged and path.stat().st_size <= ReadFileTool.WHOLE_FILE_BYTES:
+                    with open(path, 'r', encoding=encoding) as f:
+                        return f.read(), None
+                # 大文件或指定了区间：只读取需要的行
+                chunk = read_file_range(
+                    path, offset or 1,
+                    limit if ranged else ReadFileTool.MAX_OUTPUT_LINES,
+                    encoding
+                )
+                return chunk.text, chunk
             
-            # 并行读取所有文件
             async def read_one_file(file_path: str):
                 try:
                     path = self.resolve_path(file_path)
-                    
-                    if not path.exists():
+                    content, chunk = await run_file_io(load, path)
+                    if content is None:
                         return file_path, None, f"File not found: {file_path}"
-                    
-                    with open(path, 'r', encoding=encoding) as f:
-                        content = f.read()
-                    
+                    if chunk is not None:
+                        ranges[file_path] = chunk
                     return file_path, content, None
                 except Exception as e:
                     return file_path, None, str(e)
             
-            # 并行执行
+            # 并行执行（线程池限制同时进行的读取数）
             tasks = [read_one_file(fp) for fp in file_paths]
             read_results = await asyncio.gather(*tasks)
             
@@ -805,35 +941,49 @@ class BatchReadFilesTool(BaseTool):
             success_count = len(results)
             error_count = len(errors)
             
-            message = f"✅ 成功读取 {success_count} 个文件"
+            summary = f"✅ 成功读取 {success_count} 个文件"
             if error_count > 0:
-                message += f"，{error_count} 个失败"
-            
-            message += "\n\n"
+                summary += f"，{error_count} 个失败"
+            parts = [summary, "\n\n"]
             
             # 显示每个文件的内容
             for file_path, content in results.items():
-                lines = content.count('\n') + 1
-                size = len(content)
-                message += f"📄 {file_path} ({lines} 行, {size} 字节)\n"
-                message += "```\n"
-                message += content
-                message += "\n```\n\n"
+                chunk = ranges.get(file_path)
+                if chunk is None:
+                    lines = content.count('\n') + 1
+                    size = len(content)
+                    parts.append(f"📄 {file_path} ({lines} 行, {size} 字节)\n")
+                else:
+                    total = chunk.total_lines if chunk.total_lines is not None else "未知"
+                    parts.append(
+                        f"📄 {file_path} (第 {chunk.start_line}-{chunk.end_line} 行，"
+                        f"共 {total} 行, {chunk.size} 字节)\n"
+                    )
+                parts.extend(("```\n", content, "\n```\n\n"))
             
             # 显示错误
             if errors:
-                message += "❌ 失败的文件:\n"
+                parts.append("❌ 失败的文件:\n")
                 for file_path, error in errors.items():
-                    message += f"  • {file_path}: {error}\n"
+                    parts.append(f"  • {file_path}: {error}\n")
             
             return ToolResult(
                 success=error_count == 0,  # 只有全部成功才算成功
-                content=message,
+                content="".join(parts),
                 metadata={
                     'success_count': success_count,
                     'error_count': error_count,
                     'results': results,
-                    'errors': errors
+                    'errors': errors,
+                    'ranges': {
+                        fp: {
+                            'start_line': c.start_line,
+                            'end_line': c.end_line,
+                            'total_lines': c.total_lines,
+                            'has_more': c.has_more
+                        }
+                        for fp, c in ranges.items()
+                    }
                 }
             )
         except Exception as e:
@@ -859,6 +1009,14 @@ class BatchReadFilesTool(BaseTool):
                         "type": "string",
                         "description": "编码格式",
                         "default": "utf-8"
+                    },
+                    "offset": {
+                        "type": "integer",
+                        "description": "每个文件的起始行号（从1开始）"
+                    },
+                    "limit": {
+                        "type": "integer",
+                        "description": "每个文件最多读取的行数"
                     }
                 },
                 "required": ["file_paths"]
@@ -904,12 +1062,8 @@ class BatchWriteFilesTool(StreamingEditTool):
                 try:
                     path = self.resolve_path(file_path)
                     
-                    # 创建目录
-                    path.parent.mkdir(parents=True, exist_ok=True)
-                    
-                    # 写入文件
-                    with open(path, 'w', encoding=encoding) as f:
-                        f.write(content)
+                    # 写入文件（自动创建目录）
+                    await write_text(path, content, encoding, create_dirs=True)
                     
                     # LSP 验证（如果需要）
                     diagnostics = []
@@ -941,27 +1095,24 @@ class BatchWriteFilesTool(StreamingEditTool):
             success_count = len(results)
             error_count = len(errors)
             
-            message = f"✅ 成功写入 {success_count} 个文件"
+            summary = f"✅ 成功写入 {success_count} 个文件"
             if error_count > 0:
-                message += f"，{error_count} 个失败"
-            
-            message += "\n\n"
+                summary += f"，{error_count} 个失败"
+            parts = [summary, "\n\n"]
             
             # 显示成功的文件
             if results:
-                message += "📝 成功写入:\n"
-                for file_path in results:
-                    message += f"  • {file_path}\n"
+                parts.append("📝 成功写入:\n")
+                parts.extend(f"  • {file_path}\n" for file_path in results)
             
             # 显示错误
             if errors:
-                message += "\n❌ 失败的文件:\n"
-                for file_path, error in errors.items():
-                    message += f"  • {file_path}: {error}\n"
+                parts.append("\n❌ 失败的文件:\n")
+                parts.extend(f"  • {file_path}: {error}\n" for file_path, error in errors.items())
             
             return ToolResult(
                 success=error_count == 0,
-                content=message,
+                content="".join(parts),
                 metadata={
                     'success_count': success_count,
                     'error_count': error_count,
@@ -1026,12 +1177,8 @@ class BatchWriteFilesTool(StreamingEditTool):
                 try:
                     path = self.resolve_path(file_path)
                     
-                    # 创建目录
-                    path.parent.mkdir(parents=True, exist_ok=True)
-                    
-                    # 写入文件
-                    with open(path, 'w', encoding=encoding) as f:
-                        f.write(content)
+                    # 写入文件（自动创建目录）
+                    await write_text(path, content, encoding, create_dirs=True)
                     
                     success_count += 1
                     
@@ -1172,7 +1319,7 @@ class DeleteFileTool(BaseTool):
             
             # 删除文件
             if path.is_file():
-                path.unlink()
+                await delete_path(path)
                 return ToolResult(
                     success=True,
                     content=f"File deleted: {file_path}",
@@ -1191,7 +1338,7 @@ class DeleteFileTool(BaseTool):
                         error=f"Cannot delete directory without recursive=True: {file_path}"
                     )
                 
-                shutil.rmtree(path)
+                await delete_path(path, recursive=True)
                 return ToolResult(
                     success=True,
                     content=f"Directory deleted: {file_path}",
@@ -1263,22 +1410,33 @@ class BatchDeleteFilesTool(BaseTool):
             results = []
             errors = []
             
-            for file_path in file_paths:
+            def delete_one(path: Path) -> Optional[str]:
+                """在文件I/O线程池中执行，返回错误类型"""
+                if not path.exists():
+                    return "Not found"
+                if not path.is_file():
+                    return "Not a file"
+                path.unlink()
+                notify_path_changed(path)
+                return None
+            
+            async def delete_one_file(file_path: str) -> Tuple[str, Optional[str]]:
                 try:
-                    path = self.resolve_path(file_path)
-                    
-                    if not path.exists():
-                        errors.append(f"Not found: {file_path}")
-                        continue
-                    
-                    if path.is_file():
-                        path.unlink()
-                        results.append(f"Deleted: {file_path}")
-                    else:
-                        errors.append(f"Not a file: {file_path}")
-                
+                    error = await run_file_io(delete_one, self.resolve_path(file_path))
+                    if error:
+                        return file_path, f"{error}: {file_path}"
+                    return file_path, None
                 except Exception as e:
-                    errors.append(f"Failed to delete {file_path}: {str(e)}")
+                    return file_path, f"Failed to delete {file_path}: {str(e)}"
+            
+            # 并行删除，结果保持输入顺序
+            for file_path, error in await asyncio.gather(
+                *(delete_one_file(fp) for fp in file_paths)
+            ):
+                if error:
+                    errors.append(error)
+                else:
+                    results.append(f"Deleted: {file_path}")
             
             # 构建结果消息
             message_parts = []
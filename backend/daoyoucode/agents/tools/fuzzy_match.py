@@ -0,0 +1,284 @@
+"""
+模糊匹配引擎
+
+search_replace / intelligent_diff_edit 的行级模糊匹配后端：
+- 位并行 Levenshtein（Myers/Hyyrö），支持超过阈值提前终止
+- 行前缀偏移量预计算，O(1) 得到行区间的字符位置
+- 按行哈希缓存距离，并用长度差上界预先排除不可能达标的窗口
+
+所有结果与逐格 DP 的 Levenshtein 和逐窗口计算完全一致。
+"""
+
+from bisect import bisect_left
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# 浮点比较容差：剪枝只在确定不可能达标时才发生
+_EPSILON = 1e-9
+# 哈希预选时预先计算的窗口数
+SEED_WINDOWS = 4
+
+
+def levenshtein(a: str, b: str, max_distance: Optional[int] = None) -> int:
+    """
+    计算两个字符串的 Levenshtein 编辑距离（位并行算法）
+
+    Args:
+        a: 字符串 a
+        b: 字符串 b
+        max_distance: 距离上限。确定超过上限时提前返回 max_distance + 1
+
+    Returns:
+        编辑距离；超过 max_distance 时返回 max_distance + 1
+    """
+    if a == b:
+        return 0
+    # 较短的串作为模式串（位向量更短）
+    if len(a) > len(b):
+        a, b = b, a
+    m, n = len(a), len(b)
+
+    if max_distance is not None and n - m > max_distance:
+        return max_distance + 1
+    if m == 0:
+        return n
+
+    peq: Dict[str, int] = {}
+    for i, c in enumerate(a):
+        peq[c] = peq.get(c, 0) | (1 << i)
+
+    mask = (1 << m) - 1
+    high = 1 << (m - 1)
+    pv = mask
+    mv = 0
+    score = m
+
+    for j, c in enumerate(b):
+        eq = peq.get(c, 0)
+        xv = eq | mv
+        xh = (((eq & pv) + pv) ^ pv) | eq
+        ph = mv | ~(xh | pv)
+        mh = pv & xh
+        if ph & high:
+            score += 1
+        elif mh & high:
+            score -= 1
+        # 全局距离：第 0 行的水平差恒为 +1
+        ph = (ph << 1) | 1
+        mh = mh << 1
+        pv = (mh | ~(xv | ph)) & mask
+        mv = ph & xv & mask
+
+        # 剩余每列最多让距离减 1
+        if max_distance is not None and score - (n - j - 1) > max_distance:
+            return max_distance + 1
+
+    return score
+
+
+def line_offsets(lines: Sequence[str]) -> List[int]:
+    """
+    行前缀偏移量
+
+    offsets[i] 为第 i 行（按 '\\n' 切分）在原文中的起始位置，
+    offsets[len(lines)] 为原文长度 + 1。
+    """
+    offsets = [0] * (len(lines) + 1)
+    pos = 0
+    for i, line in enumerate(lines):
+        pos += len(line) + 1
+        offsets[i + 1] = pos
+    return offsets
+
+
+def line_span(offsets: Sequence[int], start_line: int, end_line: int) -> Tuple[int, int]:
+    """
+    行区间 [start_line, end_line]（闭区间）对应的字符区间（不含末尾换行）
+    """
+    return offsets[start_line], offsets[end_line + 1] - 1
+
+
+class DistanceCache:
+    """
+    按 (行, 行) 缓存编辑距离
+
+    代码里重复的行很多（空行、括号、return 等），滑动窗口会反复比较同一对行。
+    带上限的计算若被提前终止，只记录下界，之后上限更低的查询可直接判定超限。
+    """
+
+    def __init__(self):
+        self._exact: Dict[Tuple[str, str], int] = {}
+        self._lower: Dict[Tuple[str, str], int] = {}
+
+    def distance(self, a: str, b: str, max_distance: Optional[int] = None) -> int:
+        key = (a, b)
+        exact = self._exact.get(key)
+        if exact is not None:
+            if max_distance is not None and exact > max_distance:
+                return max_distance + 1
+            return exact
+
+        if max_distance is not None:
+            lower = self._lower.get(key)
+            if lower is not None and lower > max_distance:
+                return max_distance + 1
+
+        d = levenshtein(a, b, max_distance)
+        if max_distance is not None and d > max_distance:
+            self._lower[key] = max(self._lower.get(key, 0), d)
+        else:
+            self._exact[key] = d
+        return d
+
+    def similarity(self, a: str, b: str) -> float:
+        """1 - 距离 / 较长长度（两者都为空时为 1.0）"""
+        max_len = max(len(a), len(b))
+        if max_len == 0:
+            return 1.0
+        return 1 - self.distance(a, b) / max_len
+
+
+def normalize_whitespace(line: str) -> str:
+    """把连续空白压缩为单个空格并去掉首尾空白"""
+    return ' '.join(line.split())
+
+
+def best_window_match(
+    content_lines: Sequence[str],
+    search_lines: Sequence[str],
+    threshold: float,
+    cache: Optional[DistanceCache] = None
+) -> Optional[Tuple[int, float]]:
+    """
+    在 content_lines 中滑动与 search_lines 等长的窗口，找相似度最高的窗口
+
+    窗口相似度 = 各行（空白归一化后）相似度的平均值；
+    取第一个严格超过当前最佳且不低于 threshold 的窗口。
+
+    加速方式（不改变结果）：
+    - 行相同（哈希比较）直接记 1.0；相同行最多的窗口先算，作为剪枝的起始门槛
+    - 长度差给出每行相似度上界，窗口上界不够时跳过
+    - 逐行累加时把剩余预算换算成距离上限，Levenshtein 超限即放弃该窗口
+
+    Returns:
+        (起始行号, 相似度) 或 None
+    """
+    m = len(search_lines)
+    n = len(content_lines)
+    if m == 0 or n < m:
+        return None
+
+    cache = cache or DistanceCache()
+    search_norm = [normalize_whitespace(line) for line in search_lines]
+    content_norm = [normalize_whitespace(line) for line in content_lines]
+    search_lens = [len(line) for line in search_norm]
+    content_lens = [len(line) for line in content_norm]
+
+    def score(i: int, need: Optional[float]) -> Optional[float]:
+        """窗口 i 的行相似度之和；确定达不到 need 时返回 None（need 为 None 时不剪枝）"""
+        # 长度差上界
+        bounds = []
+        upper = 0.0
+        for k in range(m):
+            if content_norm[i + k] == search_norm[k]:
+                bound = 1.0
+            else:
+                la, lb = content_lens[i + k], search_lens[k]
+                bound = 1.0 - abs(la - lb) / max(la, lb)
+            bounds.append(bound)
+            upper += bound
+        if need is not None and upper < need:
+            return None
+
+        # 精确计算（带提前终止）
+        total = 0.0
+        remaining = upper
+        for k in range(m):
+            remaining -= bounds[k]
+            a = content_norm[i + k]
+            b = search_norm[k]
+            if a == b:
+                total += 1.0
+                continue
+            max_len = max(content_lens[i + k], search_lens[k])
+            limit = None
+            if need is not None:
+                budget = (total + 1.0 + remaining - need) * max_len
+                if budget < 0:
+                    return None
+                limit = int(budget)
+            d = cache.distance(a, b, limit)
+            if limit is not None and d > limit:
+                return None
+            total += 1.0 - (d / max_len)
+        return total
+
+    # 哈希预选：与搜索块有完全相同行的窗口先算，得到一个较高的起始门槛。
+    # 之后的顺序扫描只剪掉低于门槛的窗口，达到最高分的第一个窗口一定会被完整计算。
+    seed_bar = 0.0
+    for i in _voted_windows(content_norm, search_norm, SEED_WINDOWS):
+        total = score(i, None)
+        seed_bar = max(seed_bar, total / m)
+
+    best_index: Optional[int] = None
+    best_similarity = 0.0
+
+    for i in range(n - m + 1):
+        need = max(best_similarity, threshold, seed_bar) * m - _EPSILON
+        total = score(i, need)
+        if total is None:
+            continue
+
+        similarity = total / m
+        if similarity > best_similarity and similarity >= threshold:
+            best_similarity = similarity
+            best_index = i
+
+    if best_index is None:
+        return None
+    return best_index, best_similarity
+
+
+def _voted_windows(content_norm: Sequence[str], search_norm: Sequence[str], limit: int) -> List[int]:
+    """按"与搜索块相同的行数"投票，返回得票最多的若干窗口起点"""
+    m = len(search_norm)
+    last_start = len(content_norm) - m
+    wanted: Dict[str, List[int]] = {}
+    for k, line in enumerate(search_norm):
+        wanted.setdefault(line, []).append(k)
+
+    votes: Dict[int, int] = {}
+    for p, line in enumerate(content_norm):
+        ks = wanted.get(line)
+        if ks is None:
+            continue
+        for k in ks:
+            i = p - k
+            if 0 <= i <= last_start:
+                votes[i] = votes.get(i, 0) + 1
+
+    ranked = sorted(votes.items(), key=lambda item: (-item[1], item[0]))
+    return [i for i, _ in ranked[:limit]]
+
+
+class AnchorIndex:
+    """
+    去首尾空白后的行 -> 行号列表
+
+    BlockAnchorReplacer 查找首尾锚点行时用它代替逐行扫描。
+    """
+
+    def __init__(self, stripped_lines: Sequence[str]):
+        self._positions: Dict[str, List[int]] = {}
+        for i, line in enumerate(stripped_lines):
+            self._positions.setdefault(line, []).append(i)
+
+    def positions(self, line: str) -> List[int]:
+        return self._positions.get(line, [])
+
+    def first_at_or_after(self, line: str, start: int) -> Optional[int]:
+        """line 在 start 及之后第一次出现的行号"""
+        positions = self._positions.get(line)
+        if not positions:
+            return None
+        idx = bisect_left(positions, start)
+        return positions[idx] if idx < len(positions) else None
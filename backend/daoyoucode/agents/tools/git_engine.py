@@ -0,0 +1,451 @@
+"""
+Git 状态引擎
+
+git_status / git_diff / git_log 的共享后端：
+- git 命令用 asyncio 子进程在事件循环之外执行，status 和 log 并发运行
+- 按 porcelain v2 / -z 格式流式解析输出（按 NUL 切分记录，不等整个输出缓存完）
+- 状态结果按 (.git/index, HEAD) 的状态缓存：暂存或切换分支后立即失效，
+  只改工作区的修改在 STATUS_TTL 秒后重新检查
+- 变化的文件集合同步通知文件清单和符号索引（RepoMap / 代码索引的增量刷新依赖它们）
+"""
+
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import AsyncIterator, Callable, Dict, List, Optional, Sequence, Set, Tuple, Union
+import asyncio
+import logging
+import os
+import shutil
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# 工作区状态的缓存时间（秒）；index/HEAD 变化时立即失效
+STATUS_TTL = 2.0
+# 每次从管道读取的字节数
+READ_CHUNK_SIZE = 64 * 1024
+# 缓存的 diff 结果数量
+MAX_CACHED_DIFFS = 32
+# git 命令超时（秒）
+GIT_TIMEOUT = 30.0
+
+# log 字段分隔符（-z 时提交之间用 NUL 分隔）
+_FIELD_SEP = "\x1f"
+_LOG_FORMAT = _FIELD_SEP.join(["%H", "%an", "%cI", "%s"])
+
+
+def git_available() -> bool:
+    """系统中是否有 git 可执行文件"""
+    return shutil.which("git") is not None
+
+
+class GitError(Exception):
+    """git 命令执行失败"""
+
+
+@dataclass
+class GitFileChange:
+    """一个文件的变更"""
+    path: str                          # 相对仓库根的路径（posix）
+    change_type: str                   # M/A/D/R/C/T/U
+    orig_path: Optional[str] = None    # 重命名/复制前的路径
+
+
+@dataclass
+class GitCommitInfo:
+    """一条提交记录"""
+    hexsha: str
+    author: str
+    date: str
+    message: str
+
+
+@dataclass
+class GitStatus:
+    """一次 git status 的结果"""
+    branch: str
+    head: Optional[str]
+    modified: List[GitFileChange] = field(default_factory=list)   # 未暂存
+    staged: List[GitFileChange] = field(default_factory=list)     # 已暂存
+    untracked: List[str] = field(default_factory=list)
+    recent_commits: List[GitCommitInfo] = field(default_factory=list)
+
+    @property
+    def is_dirty(self) -> bool:
+        """有未提交的修改（不含未跟踪文件）"""
+        return bool(self.modified or self.staged)
+
+    def changed_paths(self) -> Set[str]:
+        """有变化的文件（相对路径）"""
+        paths = {c.path for c in self.modified}
+        paths.update(c.path for c in self.staged)
+        paths.update(self.untracked)
+        return paths
+
+
+def find_repo_root(path: Union[str, Path]) -> Optional[Path]:
+    """向上查找包含 .git 的目录（不启动 git 进程）"""
+    current = Path(path).resolve()
+    if current.is_file():
+        current = current.parent
+    for candidate in (current, *current.parents):
+        if (candidate / ".git").exists():
+            return candidate
+    return None
+
+
+def _resolve_git_dir(root: Path) -> Path:
+    """.git 可能是工作树/子模块的 gitdir 指针文件"""
+    dot_git = root / ".git"
+    if dot_git.is_file():
+        try:
+            content = dot_git.read_text(encoding="utf-8").strip()
+        except OSError:
+            return dot_git
+        if content.startswith("gitdir:"):
+            git_dir = Path(content[len("gitdir:"):].strip())
+            return git_dir if git_dir.is_absolute() else (root / git_dir).resolve()
+    return dot_git
+
+
+def _stat_key(path: Path) -> Tuple[int, int]:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return (0, -1)
+    return (st.st_mtime_ns, st.st_size)
+
+
+async def _iter_records(
+    stream: asyncio.StreamReader,
+    sep: bytes,
+    errors: str,
+    deadline: float
+) -> AsyncIterator[str]:
+    """按分隔符流式切分输出（超过 deadline 时抛出 asyncio.TimeoutError）"""
+    loop = asyncio.get_running_loop()
+    pending = b""
+    while True:
+        chunk = await asyncio.wait_for(stream.read(READ_CHUNK_SIZE), max(0.0, deadline - loop.time()))
+        if not chunk:
+            break
+        pending += chunk
+        *records, pending = pending.split(sep)
+        for record in records:
+            yield record.decode("utf-8", errors)
+    if pending:
+        yield pending.decode("utf-8", errors)
+
+
+class GitEngine:
+    """单个仓库的 git 状态引擎"""
+
+    def __init__(self, root: Path):
+        self.root = root
+        self.git_dir = _resolve_git_dir(root)
+        self._lock = threading.Lock()
+        self._status: Optional[GitStatus] = None
+        self._status_key: Optional[tuple] = None
+        self._status_time = 0.0
+        self._status_log_count = 0
+        self._pending: Optional[asyncio.Future] = None
+        self._diffs: "OrderedDict[tuple, Tuple[tuple, float, str]]" = OrderedDict()
+        self._listeners: List[Callable[[Path, Set[str]], None]] = []
+        self._stats = {'status_runs': 0, 'status_hits': 0, 'diff_runs': 0, 'diff_hits': 0}
+
+    # ========== 公共接口 ==========
+
+    async def status(self, log_count: int = 5) -> GitStatus:
+        """
+        获取仓库状态（带缓存）
+
+        Args:
+            log_count: 附带的最近提交数量
+        """
+        loop = asyncio.get_running_loop()
+        key = self.state_key()
+        with self._lock:
+            if self._is_fresh(key) and self._status_log_count >= log_count:
+                self._stats['status_hits'] += 1
+                return self._status
+            pending = self._pending
+            if pending is None or pending.get_loop() is not loop:
+                pending = loop.create_future()
+                self._pending = pending
+                owner = True
+            else:
+                owner = False
+
+        if not owner:
+            return await asyncio.shield(pending)
+
+        try:
+            status = await self._run_status(log_count)
+        except BaseException as e:
+            with self._lock:
+                self._pending = None
+            if isinstance(e, Exception):
+                pending.set_exception(e)
+                pending.exception()  # 没有其他等待者时不报 "exception was never retrieved"
+            else:
+                pending.cancel()
+            raise
+
+        with self._lock:
+            previous = self._status
+            self._status = status
+            self._status_key = key
+            self._status_time = time.monotonic()
+            self._status_log_count = log_count
+            self._pending = None
+            self._stats['status_runs'] += 1
+        pending.set_result(status)
+        await self._notify(previous, status)
+        return status
+
+    async def diff(self, path: Optional[str] = None, staged: bool = False) -> str:
+        """
+        获取差异（带缓存）
+
+        Args:
+            path: 相对仓库根的文件路径（None 表示全部）
+            staged: 只显示已暂存的修改
+        """
+        key = self.state_key()
+        cache_key = (path, staged)
+        with self._lock:
+            cached = self._diffs.get(cache_key)
+            if cached and cached[0] == key and time.monotonic() - cached[1] < STATUS_TTL:
+                self._diffs.move_to_end(cache_key)
+                self._stats['diff_hits'] += 1
+                return cached[2]
+
+        args = ["diff", "--no-color", "--no-ext-diff"]
+        if staged:
+            args.append("--staged")
+        if path:
+            args += ["--", path]
+        output = await self._run_text(args)
+
+        with self._lock:
+            self._diffs[cache_key] = (key, time.monotonic(), output)
+            self._diffs.move_to_end(cache_key)
+            while len(self._diffs) > MAX_CACHED_DIFFS:
+                self._diffs.popitem(last=False)
+            self._stats['diff_runs'] += 1
+        return output
+
+    async def log(self, max_count: int = 10, path: Optional[str] = None) -> List[GitCommitInfo]:
+        """
+        获取提交历史
+
+        Args:
+            max_count: 最多返回的提交数
+            path: 只显示涉及该文件的提交
+        """
+        args = ["log", "-z", f"--max-count={max_count}", f"--format={_LOG_FORMAT}"]
+        if path:
+            args += ["--", path]
+        commits = []
+        try:
+            async for record in self._stream(args):
+                fields = record.lstrip("\n").split(_FIELD_SEP)
+                if len(fields) == 4:
+                    commits.append(GitCommitInfo(*fields))
+        except GitError as e:
+            # 还没有任何提交的仓库
+            if "does not have any commits" in str(e) or "bad default revision" in str(e):
+                return []
+            raise
+        return commits
+
+    def state_key(self) -> tuple:
+        """(.git/index, HEAD, HEAD 指向的引用) 的状态"""
+        head_file = self.git_dir / "HEAD"
+        try:
+            head = head_file.read_text(encoding="utf-8").strip()
+        except OSError:
+            head = ""
+        ref_key: Tuple[int, int] = (0, -1)
+        if head.startswith("ref:"):
+            ref_key = _stat_key(self.git_dir / head[4:].strip())
+            if ref_key[1] < 0:
+                ref_key = _stat_key(self.git_dir / "packed-refs")
+        return (_stat_key(self.git_dir / "index"), head, ref_key)
+
+    def add_change_listener(self, callback: Callable[[Path, Set[str]], None]):
+        """注册变化回调: callback(仓库根, 变化的相对路径集合)"""
+        with self._lock:
+            self._listeners.append(callback)
+
+    def invalidate(self):
+        """丢弃缓存的状态和 diff"""
+        with self._lock:
+            self._status_time = 0.0
+            self._diffs.clear()
+
+    def get_stats(self) -> Dict[str, int]:
+        """获取统计信息"""
+        with self._lock:
+            return dict(self._stats)
+
+    # ========== 内部方法 ==========
+
+    def _is_fresh(self, key: tuple) -> bool:
+        return (
+            self._status is not None
+            and self._status_key == key
+            and time.monotonic() - self._status_time < STATUS_TTL
+        )
+
+    async def _run_status(self, log_count: int) -> GitStatus:
+        status_task = asyncio.ensure_future(self._parse_status())
+        try:
+            commits = await self.log(log_count) if log_count > 0 else []
+        except GitError as e:
+            logger.warning(f"无法获取提交历史: {e}")
+            commits = []
+        status = await status_task
+        status.recent_commits = commits
+        return status
+
+    async def _parse_status(self) -> GitStatus:
+        status = GitStatus(branch="", head=None)
+        args = ["status", "--porcelain=v2", "-z", "--branch", "--untracked-files=all"]
+        expect_orig: Optional[GitFileChange] = None
+        async for record in self._stream(args):
+            if expect_orig is not None:
+                # 重命名/复制记录后紧跟原路径
+                expect_orig.orig_path = record
+                expect_orig = None
+                continue
+            if not record:
+                continue
+            kind = record[0]
+            if kind == "#":
+                header = record[2:].split(" ", 1)
+                if header[0] == "branch.head":
+                    status.branch = "(detached HEAD)" if header[1] == "(detached)" else header[1]
+                elif header[0] == "branch.oid" and header[1] != "(initial)":
+                    status.head = header[1]
+            elif kind == "?":
+                status.untracked.append(record[2:])
+            elif kind in "12":
+                parts = record.split(" ", 8 if kind == "1" else 9)
+                xy, path = parts[1], parts[-1]
+                if xy[0] != ".":
+                    change = GitFileChange(path, xy[0])
+                    status.staged.append(change)
+                    if kind == "2":
+                        expect_orig = change
+                if xy[1] != ".":
+                    change = GitFileChange(path, xy[1])
+                    status.modified.append(change)
+                    if kind == "2" and expect_orig is None:
+                        expect_orig = change
+            elif kind == "u":
+                status.modified.append(GitFileChange(record.split(" ", 10)[-1], "U"))
+        return status
+
+    async def _stream(
+        self,
+        args: Sequence[str],
+        sep: bytes = b"\0",
+        errors: str = "surrogateescape"
+    ) -> AsyncIterator[str]:
+        """执行 git 命令并按分隔符流式产出记录"""
+        # --no-optional-locks: status 不回写 index，既不和用户的 git 操作抢锁，也不让缓存键失效
+        process = await asyncio.create_subprocess_exec(
+            "git", "--no-optional-locks", *args,
+            cwd=str(self.root),
+            stdin=asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        stderr_task = asyncio.ensure_future(process.stderr.read())
+        deadline = asyncio.get_running_loop().time() + GIT_TIMEOUT
+        try:
+            async for record in _iter_records(process.stdout, sep, errors, deadline):
+                yield record
+            returncode = await process.wait()
+        except BaseException:
+            if process.returncode is None:
+                process.kill()
+                await process.wait()
+            raise
+        finally:
+            stderr = await stderr_task
+        if returncode != 0:
+            raise GitError(f"git {args[0]} 失败: {stderr.decode('utf-8', 'replace').strip()}")
+
+    async def _run_text(self, args: Sequence[str]) -> str:
+        lines = []
+        async for line in self._stream(args, sep=b"\n", errors="replace"):
+            lines.append(line)
+        return "\n".join(lines)
+
+    async def _notify(self, previous: Optional[GitStatus], current: GitStatus):
+        """变化集合与上次不同时通知索引（首次获取状态时索引本身就是新建的）"""
+        if previous is None:
+            return
+        before, after = _fingerprint(previous), _fingerprint(current)
+        if previous.head == current.head and before == after:
+            return
+        changed = {path for path, _ in before ^ after}
+        if previous.head != current.head:
+            # 提交/切换分支：之前和现在的所有变化文件都可能不同，再加上两个提交之间的差异
+            changed |= previous.changed_paths() | current.changed_paths()
+            if previous.head and current.head:
+                try:
+                    async for path in self._stream(
+                        ["diff", "--name-only", "-z", previous.head, current.head], sep=b"\0"
+                    ):
+                        if path:
+                            changed.add(path)
+                except GitError as e:
+                    logger.debug(f"比较提交失败: {e}")
+        with self._lock:
+            listeners = list(self._listeners)
+        for callback in [_invalidate_indexes, *listeners]:
+            try:
+                callback(self.root, changed)
+            except Exception as e:
+                logger.debug(f"git 变化回调失败: {e}")
+
+
+def _fingerprint(status: GitStatus) -> Set[Tuple[str, str]]:
+    items = {(c.path, "S" + c.change_type) for c in status.staged}
+    items.update((c.path, "W" + c.change_type) for c in status.modified)
+    items.update((path, "?") for path in status.untracked)
+    return items
+
+
+def _invalidate_indexes(root: Path, changed: Set[str]):
+    """让仓库内的文件清单和符号索引在下次访问时立即刷新，代码库索引在后台重新分块变化的文件"""
+    from .file_inventory import invalidate_file_inventories
+    from .symbol_index import invalidate_symbol_indexes
+    from ..memory.codebase_warmup import refresh_codebase_indexes
+
+    invalidate_file_inventories(root)
+    invalidate_symbol_indexes(root)
+    refresh_codebase_indexes(root, changed)
+
+
+# 单例：按仓库根缓存引擎
+_engines: Dict[Path, GitEngine] = {}
+_engines_lock = threading.Lock()
+
+
+def get_git_engine(path: Union[str, Path]) -> Optional[GitEngine]:
+    """获取路径所在仓库的 git 引擎（不在仓库中时返回 None）"""
+    root = find_repo_root(path)
+    if root is None:
+        return None
+    with _engines_lock:
+        engine = _engines.get(root)
+        if engine is None:
+            engine = GitEngine(root)
+            _engines[root] = engine
+        return engine
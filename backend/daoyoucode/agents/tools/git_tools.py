@@ -9,15 +9,13 @@ from typing import Dict, List, Optional, Any
 import logging
 
 from .base import BaseTool, ToolResult
+from .git_engine import GitEngine, GitError, get_git_engine, git_available
 
 logger = logging.getLogger(__name__)
 
-try:
-    import git
-    GIT_AVAILABLE = True
-except ImportError:
-    GIT_AVAILABLE = False
-    logger.warning("GitPython 未安装，Git 功能不可用")
+GIT_AVAILABLE = git_available()
+if not GIT_AVAILABLE:
+    logger.warning("未找到 git 可执行文件，Git 功能不可用")
 
 
 class GitStatusTool(BaseTool):
@@ -80,17 +78,16 @@ class GitStatusTool(BaseTool):
             return ToolResult(
                 success=False,
                 content=None,
-                error="GitPython 未安装，请运行: pip install gitpython"
+                error="未找到 git 可执行文件，请先安装 Git"
             )
         
         try:
             # 解析路径
             repo_path_resolved = self.resolve_path(repo_path)
             
-            # 打开 Git 仓库
-            try:
-                repo = git.Repo(repo_path_resolved, search_parent_directories=True)
-            except git.InvalidGitRepositoryError:
+            # 打开 Git 仓库（不启动 git 进程）
+            engine = get_git_engine(repo_path_resolved)
+            if engine is None:
                 return ToolResult(
                     success=False,
                     content=None,
@@ -98,18 +95,16 @@ class GitStatusTool(BaseTool):
                 )
             
             # 获取仓库根目录
-            repo_root = Path(repo.working_tree_dir)
+            repo_root = engine.root
             
-            # 获取当前分支
-            try:
-                current_branch = repo.active_branch.name
-            except TypeError:
-                current_branch = "(detached HEAD)"
+            # status 和 log 并发执行，结果按 index/HEAD 缓存
+            git_status = await engine.status(log_count=5)
+            current_branch = git_status.branch
             
             # 获取已修改的文件（未暂存）
             modified_files = []
-            for item in repo.index.diff(None):
-                file_path = self.normalize_path(str(repo_root / item.a_path))
+            for item in git_status.modified:
+                file_path = self.normalize_path(str(repo_root / item.path))
                 modified_files.append({
                     "path": file_path,
                     "change_type": item.change_type
@@ -117,8 +112,8 @@ class GitStatusTool(BaseTool):
             
             # 获取已暂存的文件
             staged_files = []
-            for item in repo.index.diff("HEAD"):
-                file_path = self.normalize_path(str(repo_root / item.a_path))
+            for item in git_status.staged:
+                file_path = self.normalize_path(str(repo_root / item.path))
                 staged_files.append({
                     "path": file_path,
                     "change_type": item.change_type
@@ -126,24 +121,22 @@ class GitStatusTool(BaseTool):
             
             # 获取未跟踪的文件
             untracked_files = []
-            for file_path in repo.untracked_files:
+            for file_path in git_status.untracked:
                 normalized = self.normalize_path(str(repo_root / file_path))
                 # 应用 subtree_only 过滤
                 if self.context.should_include_path(normalized):
                     untracked_files.append(normalized)
             
             # 获取最近的提交
-            recent_commits = []
-            try:
-                for commit in repo.iter_commits(max_count=5):
-                    recent_commits.append({
-                        "hash": commit.hexsha[:7],
-                        "message": commit.message.strip().split('\n')[0],
-                        "author": commit.author.name,
-                        "date": commit.committed_datetime.isoformat()
-                    })
-            except Exception as e:
-                logger.warning(f"无法获取提交历史: {e}")
+            recent_commits = [
+                {
+                    "hash": commit.hexsha[:7],
+                    "message": commit.message,
+                    "author": commit.author,
+                    "date": commit.date
+                }
+                for commit in git_status.recent_commits[:5]
+            ]
             
             # 构建结果
             status = {
@@ -153,7 +146,7 @@ class GitStatusTool(BaseTool):
                 "staged_files": staged_files,
                 "untracked_files": untracked_files,
                 "recent_commits": recent_commits,
-                "is_dirty": repo.is_dirty()
+                "is_dirty": git_status.is_dirty
             }
             
             # 生成可读的文本输出
@@ -255,38 +248,37 @@ class GitDiffTool(BaseTool):
             file_path: 文件路径（可选）
             staged: 是否只显示已暂存的修改
         """
+        if not GIT_AVAILABLE:
+            return ToolResult(
+                success=False,
+                content=None,
+                error="未找到 git 可执行文件，请先安装 Git"
+            )
+        
         try:
-            import subprocess
-            
-            # 构建 git diff 命令
-            cmd = ["git", "diff"]
-            
-            if staged:
-                cmd.append("--staged")
+            engine = get_git_engine(self.context.repo_path)
+            if engine is None:
+                return ToolResult(
+                    success=False,
+                    content=None,
+                    error=f"不是有效的 Git 仓库: {self.context.repo_path}"
+                )
             
+            rel_path = None
             if file_path:
-                # 解析路径
+                # 解析路径（git 路径相对仓库根）
                 path = self.resolve_path(file_path)
-                cmd.append(str(path))
+                rel_path = _repo_relative(engine, path)
             
-            # 执行命令
-            result = subprocess.run(
-                cmd,
-                capture_output=True,
-                text=True,
-                encoding='utf-8',
-                errors='replace'
-            )
-            
-            if result.returncode != 0:
+            try:
+                diff_output = await engine.diff(rel_path, staged=staged)
+            except GitError as e:
                 return ToolResult(
                     success=False,
                     content=None,
-                    error=f"Git diff failed: {result.stderr}"
+                    error=f"Git diff failed: {e}"
                 )
             
-            diff_output = result.stdout
-            
             if not diff_output.strip():
                 return ToolResult(
                     success=True,
@@ -341,7 +333,7 @@ class GitCommitTool(BaseTool):
 
 
 class GitLogTool(BaseTool):
-    """Git 日志工具（占位符，待实现）"""
+    """Git 日志工具"""
     
     def __init__(self):
         super().__init__(
@@ -355,14 +347,82 @@ class GitLogTool(BaseTool):
             "description": self.description,
             "parameters": {
                 "type": "object",
-                "properties": {},
+                "properties": {
+                    "max_count": {
+                        "type": "integer",
+                        "description": "最多显示的提交数（默认 10）",
+                        "default": 10
+                    },
+                    "file_path": {
+                        "type": "string",
+                        "description": "文件路径（可选，只显示涉及该文件的提交）"
+                    }
+                },
                 "required": []
             }
         }
     
-    async def execute(self, **kwargs) -> ToolResult:
-        return ToolResult(
-            success=False,
-            content=None,
-            error="GitLogTool 尚未实现"
-        )
+    async def execute(self, max_count: int = 10, file_path: Optional[str] = None) -> ToolResult:
+        """
+        获取提交历史
+        
+        Args:
+            max_count: 最多显示的提交数
+            file_path: 文件路径（可选）
+        """
+        if not GIT_AVAILABLE:
+            return ToolResult(
+                success=False,
+                content=None,
+                error="未找到 git 可执行文件，请先安装 Git"
+            )
+        
+        try:
+            engine = get_git_engine(self.context.repo_path)
+            if engine is None:
+                return ToolResult(
+                    success=False,
+                    content=None,
+                    error=f"不是有效的 Git 仓库: {self.context.repo_path}"
+                )
+            
+            rel_path = _repo_relative(engine, self.resolve_path(file_path)) if file_path else None
+            commits = await engine.log(max(1, int(max_count)), rel_path)
+            
+            if not commits:
+                return ToolResult(
+                    success=True,
+                    content="No commits",
+                    metadata={'commits': []}
+                )
+            
+            lines = [
+                f"{c.hexsha[:7]} {c.date[:10]} {c.message} ({c.author})"
+                for c in commits
+            ]
+            return ToolResult(
+                success=True,
+                content="\n".join(lines),
+                metadata={
+                    'commits': [
+                        {"hash": c.hexsha, "message": c.message, "author": c.author, "date": c.date}
+                        for c in commits
+                    ],
+                    'file_path': file_path
+                }
+            )
+        
+        except Exception as e:
+            return ToolResult(
+                success=False,
+                content=None,
+                error=str(e)
+            )
+
+
+def _repo_relative(engine: GitEngine, path: Path) -> str:
+    """绝对路径 → 相对仓库根的 posix 路径（仓库外的路径原样传给 git）"""
+    try:
+        return Path(path).resolve().relative_to(engine.root).as_posix()
+    except ValueError:
+        return str(path)
@@ -0,0 +1,412 @@
+"""
+并行 grep 引擎
+
+text_search / regex_search 的共享搜索后端：
+- 文件清单来自共享的 FileInventory（遵循 .gitignore），嗅探前 8KB 跳过二进制文件
+- 共享线程池并行扫描，mmap 读取，整块正则搜索（不再逐行匹配）
+- 字面量查询可选 trigram 索引，预先排除不可能命中的文件
+- 结果按文件顺序流式产出，达到上限立即停止
+"""
+
+from concurrent.futures import ThreadPoolExecutor, Future
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Iterator, AsyncIterator, Set, Pattern
+import asyncio
+import logging
+import mmap
+import os
+import re
+import threading
+
+from .file_inventory import FileInventory, get_file_inventory
+
+logger = logging.getLogger(__name__)
+
+# 二进制嗅探字节数
+BINARY_SNIFF_BYTES = 8192
+# 超过此大小的文件不扫描
+MAX_FILE_SIZE = 20 * 1024 * 1024
+# 不搜索的扩展名（编译产物）
+DEFAULT_IGNORE_EXTS = {'.pyc', '.pyo', '.so', '.dll', '.exe', '.bin'}
+# 缓存的引擎数量（按根目录）
+MAX_CACHED_ENGINES = 16
+
+# 所有引擎共用的扫描线程池（引擎被淘汰时不需要关闭线程）
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def get_grep_executor() -> ThreadPoolExecutor:
+    """获取共享的扫描线程池（首次调用时创建）"""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=min(8, os.cpu_count() or 4),
+                    thread_name_prefix="grep"
+                )
+    return _executor
+
+
+@dataclass
+class GrepMatch:
+    """单条命中"""
+    path: Path
+    line: int
+    content: str
+    match: str
+    groups: Tuple = ()
+
+
+@dataclass
+class GrepQuery:
+    """
+    编译后的查询
+
+    Attributes:
+        buffer_regex: 整块搜索用的正则（MULTILINE）
+        line_regex: 行内校验用的正则，保证与逐行搜索语义一致
+        literal: 字面量查询的原文（用于 mmap 预过滤和 trigram 剪枝）
+        case_sensitive: 字面量是否区分大小写
+    """
+    buffer_regex: Pattern
+    line_regex: Pattern
+    literal: Optional[str] = None
+    case_sensitive: bool = True
+    _prefilter: Optional[Pattern] = field(default=None, repr=False)
+
+    def __post_init__(self):
+        # bytes 正则的 IGNORECASE 只折叠 ASCII，非 ASCII 的忽略大小写查询不做预过滤
+        if self.literal and (self.case_sensitive or self.literal.isascii()):
+            self._prefilter = re.compile(
+                re.escape(self.literal.encode('utf-8')),
+                0 if self.case_sensitive else re.IGNORECASE
+            )
+
+    @classmethod
+    def text(cls, query: str, case_sensitive: bool = False) -> "GrepQuery":
+        """字面量查询"""
+        flags = 0 if case_sensitive else re.IGNORECASE
+        escaped = re.escape(query)
+        return cls(
+            buffer_regex=re.compile(escaped, flags | re.MULTILINE),
+            line_regex=re.compile(escaped, flags),
+            literal=query,
+            case_sensitive=case_sensitive
+        )
+
+    @classmethod
+    def regex(cls, pattern: str, flags: int = 0) -> "GrepQuery":
+        """正则查询（编译失败抛 re.error）"""
+        return cls(
+            buffer_regex=re.compile(pattern, flags | re.MULTILINE),
+            line_regex=re.compile(pattern, flags)
+        )
+
+
+class TrigramIndex:
+    """
+    trigram 索引（可选）
+
+    记录每个文件（按 mtime/size 校验）包含的小写 trigram，
+    字面量查询时只扫描包含全部查询 trigram 的文件。
+    索引在扫描时顺带构建，文件变化后自动失效。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._files: Dict[Path, Tuple[int, int, frozenset]] = {}
+
+    @staticmethod
+    def grams(data: bytes) -> Set[bytes]:
+        """提取小写 trigram"""
+        lowered = data.lower()
+        return {lowered[i:i + 3] for i in range(len(lowered) - 2)}
+
+    def update(self, path: Path, mtime_ns: int, size: int, data: bytes):
+        grams = frozenset(self.grams(data))
+        with self._lock:
+            self._files[path] = (mtime_ns, size, grams)
+
+    def may_contain(self, path: Path, mtime_ns: int, size: int, literal: str) -> bool:
+        """文件是否可能包含字面量（未索引或已过期时返回 True）"""
+        needle = literal.encode('utf-8')
+        if len(needle) < 3:
+            return True
+        with self._lock:
+            entry = self._files.get(path)
+        if entry is None or entry[0] != mtime_ns or entry[1] != size:
+            return True
+        return self.grams(needle) <= entry[2]
+
+    def is_fresh(self, path: Path, mtime_ns: int, size: int) -> bool:
+        with self._lock:
+            entry = self._files.get(path)
+        return entry is not None and entry[0] == mtime_ns and entry[1] == size
+
+    def __len__(self) -> int:
+        return len(self._files)
+
+
+class GrepEngine:
+    """
+    并行 grep 引擎
+
+    使用示例：
+        engine = get_grep_engine(Path("/project"))
+        for m in engine.iter_matches(GrepQuery.text("TODO"), Path("/project/src"), "*.py", 100):
+            print(m.path, m.line, m.content)
+    """
+
+    def __init__(
+        self,
+        root: Path,
+        max_workers: Optional[int] = None,
+        use_trigram_index: Optional[bool] = None,
+        inventory: Optional[FileInventory] = None
+    ):
+        """
+        初始化引擎
+
+        Args:
+            root: 搜索根目录
+            max_workers: 单次搜索的并发扫描数，决定预取窗口（默认 min(8, CPU数)）
+            use_trigram_index: 是否启用 trigram 索引（默认读取环境变量 DAOYOUCODE_GREP_INDEX=1）
+            inventory: 文件清单（默认使用 root 对应的共享清单）
+        """
+        self.root = Path(root).resolve()
+        self.inventory = inventory or get_file_inventory(self.root)
+        self.max_workers = max_workers or min(8, os.cpu_count() or 4)
+
+        if use_trigram_index is None:
+            use_trigram_index = os.getenv('DAOYOUCODE_GREP_INDEX') == '1'
+        self.trigram_index = TrigramIndex() if use_trigram_index else None
+
+        self._executor = get_grep_executor()
+        self._binary: Dict[Path, Tuple[int, int]] = {}      # 已知二进制文件 -> (mtime_ns, size)
+
+    # ========== 文件清单 ==========
+
+    def list_files(
+        self,
+        directory: Optional[Path] = None,
+        file_pattern: Optional[str] = None
+    ) -> List[Tuple[Path, int, int]]:
+        """
+        列出候选文件
+
+        Args:
+            directory: 限定子目录（默认根目录）
+            file_pattern: 文件名模式（如 *.py，语义同 rglob）
+
+        Returns:
+            [(path, mtime_ns, size), ...]，按路径排序
+        """
+        entries = self.inventory.files(subdir=directory, pattern=file_pattern)
+        return [
+            (entry.abs_path, entry.mtime_ns, entry.size)
+            for entry in entries
+            if entry.suffix not in DEFAULT_IGNORE_EXTS
+        ]
+
+    def invalidate(self):
+        """使文件清单缓存失效"""
+        self.inventory.invalidate()
+
+    # ========== 搜索 ==========
+
+    def iter_matches(
+        self,
+        query: GrepQuery,
+        directory: Optional[Path] = None,
+        file_pattern: Optional[str] = None,
+        max_results: int = 100
+    ) -> Iterator[GrepMatch]:
+        """
+        并行扫描并按文件顺序产出命中
+
+        提交的扫描任务保持有限的预取窗口，消费方停止迭代时取消剩余任务。
+        """
+        candidates = self._prune(self.list_files(directory, file_pattern), query)
+        if not candidates or max_results <= 0:
+            return
+
+        window = self.max_workers * 4
+        pending: List[Future] = []
+        produced = 0
+        next_index = 0
+
+        try:
+            while next_index < len(candidates) or pending:
+                while next_index < len(candidates) and len(pending) < window:
+                    path, mtime_ns, size = candidates[next_index]
+                    pending.append(self._executor.submit(
+                        self._scan_file, path, mtime_ns, size, query, max_results
+                    ))
+                    next_index += 1
+
+                future = pending.pop(0)
+                for match in future.result():
+                    yield match
+                    produced += 1
+                    if produced >= max_results:
+                        return
+        finally:
+            for future in pending:
+                future.cancel()
+
+    async def search(
+        self,
+        query: GrepQuery,
+        directory: Optional[Path] = None,
+        file_pattern: Optional[str] = None,
+        max_results: int = 100
+    ) -> AsyncIterator[GrepMatch]:
+        """
+        异步流式搜索（扫描在线程中进行，不阻塞事件循环）
+        """
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        done = object()
+        stop = threading.Event()
+
+        def produce():
+            try:
+                for match in self.iter_matches(query, directory, file_pattern, max_results):
+                    if stop.is_set():
+                        break
+                    loop.call_soon_threadsafe(queue.put_nowait, match)
+            except Exception as e:
+                loop.call_soon_threadsafe(queue.put_nowait, e)
+            finally:
+                loop.call_soon_threadsafe(queue.put_nowait, done)
+
+        producer = loop.run_in_executor(None, produce)
+        try:
+            while True:
+                item = await queue.get()
+                if item is done:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            stop.set()
+            await asyncio.shield(producer)
+
+    def _prune(
+        self,
+        candidates: List[Tuple[Path, int, int]],
+        query: GrepQuery
+    ) -> List[Tuple[Path, int, int]]:
+        """排除已知二进制、超大文件，以及 trigram 索引判定不可能命中的文件"""
+        result = []
+        for path, mtime_ns, size in candidates:
+            if size == 0 or size > MAX_FILE_SIZE:
+                continue
+            if self._binary.get(path) == (mtime_ns, size):
+                continue
+            if (
+                self.trigram_index is not None
+                and query.literal
+                and not self.trigram_index.may_contain(path, mtime_ns, size, query.literal)
+            ):
+                continue
+            result.append((path, mtime_ns, size))
+        return result
+
+    def _scan_file(
+        self,
+        path: Path,
+        mtime_ns: int,
+        size: int,
+        query: GrepQuery,
+        limit: int
+    ) -> List[GrepMatch]:
+        """扫描单个文件（工作线程中执行）"""
+        try:
+            with open(path, 'rb') as f:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    if b'\0' in mm[:BINARY_SNIFF_BYTES]:
+                        self._binary[path] = (mtime_ns, size)
+                        return []
+
+                    if self.trigram_index is not None and not self.trigram_index.is_fresh(path, mtime_ns, size):
+                        data = mm[:]
+                        self.trigram_index.update(path, mtime_ns, size, data)
+                        if query._prefilter is not None and query._prefilter.search(data) is None:
+                            return []
+                    else:
+                        if query._prefilter is not None and query._prefilter.search(mm) is None:
+                            return []
+                        data = mm[:]
+        except (OSError, ValueError):
+            return []
+
+        return find_in_text(path, data.decode('utf-8', errors='ignore'), query, limit)
+
+
+def find_in_text(path: Path, text: str, query: GrepQuery, limit: int) -> List[GrepMatch]:
+    """
+    整块搜索文本，每行最多一条命中
+
+    先用 buffer_regex 在整块文本中定位候选行，再用 line_regex 在该行内校验，
+    结果与逐行搜索一致（包括不会跨行匹配）。
+    """
+    results: List[GrepMatch] = []
+    n = len(text)
+    pos = 0
+    line_no = 1
+    counted_upto = 0
+
+    while len(results) < limit and pos <= n:
+        m = query.buffer_regex.search(text, pos)
+        if m is None:
+            break
+
+        start = m.start()
+        line_start = text.rfind('\n', 0, start) + 1
+        line_end = text.find('\n', start)
+        line_end = n if line_end == -1 else line_end + 1
+
+        line_no += text.count('\n', counted_upto, line_start)
+        counted_upto = line_start
+
+        line = text[line_start:line_end]
+        line_match = query.line_regex.search(line)
+        if line_match is not None:
+            results.append(GrepMatch(
+                path=path,
+                line=line_no,
+                content=line.rstrip(),
+                match=line_match.group(0),
+                groups=line_match.groups()
+            ))
+
+        if line_end >= n:
+            break
+        pos = line_end
+
+    return results
+
+
+# 单例：按根目录缓存引擎（LRU，最多 MAX_CACHED_ENGINES 个）
+_engines: "OrderedDict[str, GrepEngine]" = OrderedDict()
+_engines_lock = threading.Lock()
+
+
+def get_grep_engine(root: Path) -> GrepEngine:
+    """获取根目录对应的 grep 引擎（单例）"""
+    key = str(Path(root).resolve())
+    with _engines_lock:
+        engine = _engines.get(key)
+        if engine is None:
+            engine = GrepEngine(Path(key))
+            _engines[key] = engine
+        _engines.move_to_end(key)
+        while len(_engines) > MAX_CACHED_ENGINES:
+            _engines.popitem(last=False)
+        return engine
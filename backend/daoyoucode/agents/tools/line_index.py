@@ -0,0 +1,212 @@
+"""
+按行区间读取文件
+
+read_file / batch_read_files 的共享后端：
+- mmap 读取，只解码请求的字节区间
+- 换行偏移索引按 (路径, 大小, mtime) 缓存，按需向后扩展：
+  读第 N 页只需要扫描到第 N 页末尾，翻页的代价与请求的字节数成正比
+"""
+
+from array import array
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional, Tuple
+import codecs
+import mmap
+import os
+import threading
+
+# 缓存的行索引数量
+MAX_CACHED_INDEXES = 64
+# 每次扩展索引时至少扫描的字节数
+SCAN_CHUNK_BYTES = 1024 * 1024
+
+
+@dataclass
+class LineRange:
+    """一次区间读取的结果"""
+    text: str
+    start_line: int                # 第一行的行号（从1开始）
+    end_line: int                  # 最后一行的行号（不超过文件总行数；没有读到内容时小于 start_line）
+    total_lines: Optional[int]     # 文件总行数（索引尚未扫描到文件末尾时为 None）
+    size: int                      # 文件字节数
+
+    @property
+    def has_more(self) -> bool:
+        return self.total_lines is None or self.end_line < self.total_lines
+
+
+class LineIndex:
+    """
+    单个文件的换行偏移索引
+
+    starts[i] 是第 i+1 行的起始字节偏移。索引只覆盖已扫描的部分，
+    scanned 之后的内容在需要时再扫描。
+    """
+
+    def __init__(self, path: Path, size: int, mtime_ns: int):
+        self.path = path
+        self.size = size
+        self.mtime_ns = mtime_ns
+        self.starts = array('Q', [0])
+        self.scanned = 0          # 已扫描到的字节位置
+        self.lock = threading.Lock()
+
+    @property
+    def complete(self) -> bool:
+        return self.scanned >= self.size
+
+    @property
+    def total_lines(self) -> Optional[int]:
+        """总行数（最后一行没有换行符时也算一行；空文件为0）"""
+        if not self.complete:
+            return None
+        if self.size == 0:
+            return 0
+        # 以换行结尾时，最后一个起始偏移指向文件末尾，不是新的一行
+        return len(self.starts) - (1 if self.starts[-1] == self.size else 0)
+
+    def ensure_lines(self, mm: mmap.mmap, line_count: int):
+        """扫描直到索引至少覆盖 line_count 行的起始位置（或到达文件末尾）"""
+        while len(self.starts) <= line_count and not self.complete:
+            end = min(self.size, self.scanned + SCAN_CHUNK_BYTES)
+            pos = self.scanned
+            while True:
+                nl = mm.find(b'\n', pos, end)
+                if nl < 0:
+                    break
+                self.starts.append(nl + 1)
+                pos = nl + 1
+            self.scanned = end
+
+    def line_span(self, start_line: int, count: int) -> Tuple[int, int, int]:
+        """
+        行区间对应的字节区间
+
+        Returns:
+            (起始字节, 结束字节, 实际行数)
+        """
+        first = start_line - 1
+        if first >= len(self.starts) or self.starts[first] >= self.size:
+            return self.size, self.size, 0
+        last = min(first + count, len(self.starts) - 1)
+        if first + count < len(self.starts):
+            end = self.starts[first + count]
+            lines = count
+        else:
+            # 区间延伸到文件末尾
+            end = self.size
+            lines = last - first + (1 if self.starts[last] < self.size else 0)
+        return self.starts[first], end, lines
+
+
+_indexes: "OrderedDict[Path, LineIndex]" = OrderedDict()
+_lock = threading.Lock()
+
+
+def _get_index(path: Path, size: int, mtime_ns: int) -> LineIndex:
+    with _lock:
+        index = _indexes.get(path)
+        if index is None or index.size != size or index.mtime_ns != mtime_ns:
+            index = LineIndex(path, size, mtime_ns)
+            _indexes[path] = index
+        _indexes.move_to_end(path)
+        while len(_indexes) > MAX_CACHED_INDEXES:
+            _indexes.popitem(last=False)
+        return index
+
+
+def supports_ranges(encoding: str) -> bool:
+    """按 b'\\n' 切分只适用于兼容 ASCII 的编码"""
+    try:
+        name = codecs.lookup(encoding).name
+    except LookupError:
+        return False
+    return not name.startswith(('utf-16', 'utf-32'))
+
+
+def read_line_range(
+    path: Path,
+    start_line: int = 1,
+    limit: Optional[int] = None,
+    encoding: str = "utf-8",
+    errors: str = "strict"
+) -> LineRange:
+    """
+    读取文件的行区间
+
+    Args:
+        path: 文件路径
+        start_line: 起始行号（从1开始）
+        limit: 最多读取的行数（None 表示读到文件末尾，否则至少为1）
+        encoding: 编码（必须兼容 ASCII，见 supports_ranges）
+        errors: 解码错误处理方式
+
+    Returns:
+        LineRange（换行统一为 \\n，与整文件读取一致）
+    """
+    if limit is not None and limit < 1:
+        raise ValueError(f"limit 必须大于等于1: {limit}")
+    path = Path(path).resolve()
+    start_line = max(1, start_line)
+    st = os.stat(path)
+    index = _get_index(path, st.st_size, st.st_mtime_ns)
+
+    if st.st_size == 0:
+        return LineRange("", start_line, 0, 0, 0)
+
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        with index.lock:
+            if limit is None:
+                index.ensure_lines(mm, 1 << 62)
+                count = len(index.starts)
+            else:
+                index.ensure_lines(mm, start_line + limit)
+                count = limit
+            begin, end, lines = index.line_span(start_line, count)
+            total_lines = index.total_lines
+        text = mm[begin:end].decode(encoding, errors)
+
+    if text.endswith('\n'):
+        text = text[:-1]
+        if text.endswith('\r'):
+            text = text[:-1]
+    text = text.replace('\r\n', '\n')
+    end_line = start_line + lines - 1
+    if total_lines is not None:
+        end_line = min(end_line, total_lines)
+    return LineRange(text, start_line, end_line, total_lines, st.st_size)
+
+
+def fit_line_range(chunk: LineRange, max_chars: int, max_lines: int) -> LineRange:
+    """
+    按整行裁剪区间，使文本不超过 max_chars 字符、max_lines 行
+
+    至少保留第一行（单行超长时由调用方的输出截断处理）；
+    裁剪后 end_line 是实际保留的最后一行，调用方据此提示从哪里继续读取。
+    """
+    lines = chunk.end_line - chunk.start_line + 1
+    if lines <= 0 or (len(chunk.text) <= max_chars and lines <= max_lines):
+        return chunk
+    text = chunk.text
+    kept = 0
+    end = 0
+    pos = 0
+    while kept < max(1, max_lines):
+        nl = text.find('\n', pos)
+        line_end = len(text) if nl < 0 else nl
+        if kept and line_end > max_chars:
+            break
+        end = line_end
+        kept += 1
+        if nl < 0:
+            break
+        pos = nl + 1
+    return LineRange(text[:end], chunk.start_line, chunk.start_line + kept - 1, chunk.total_lines, chunk.size)
+
+
+def clear_line_indexes():
+    """清空缓存的行索引"""
+    with _lock:
+        _indexes.clear()
@@ -0,0 +1,479 @@
+"""
+子进程流式输出
+
+命令执行时边读边处理输出，不再用 communicate() 把全部输出缓存到进程结束：
+- 头尾缓冲：只保留前 N 行和最后 M 行（超长行截断），内存占用固定
+- 测试进度解析：逐行识别 pytest / unittest / jest 的进度、失败用例和失败详情
+- 进度上报：通过 report_tool_progress 实时报告给界面
+- stop_on_failure：出现失败信号时立即结束进程，尽早给出失败摘要
+"""
+
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Callable, Deque, Dict, List, Optional, Sequence, Union
+import asyncio
+import logging
+import os
+import re
+import shlex
+import signal
+import time
+
+from .base import report_tool_progress
+
+logger = logging.getLogger(__name__)
+
+# 默认保留的行数
+DEFAULT_HEAD_LINES = 200
+DEFAULT_TAIL_LINES = 300
+# 单行最大字符数（超出截断）
+MAX_LINE_CHARS = 2000
+# 每次从管道读取的字节数
+READ_CHUNK_SIZE = 64 * 1024
+# 两次进度上报的最小间隔（秒）
+PROGRESS_INTERVAL = 0.2
+# 失败详情最多保留的行数
+MAX_EXCERPT_LINES = 40
+
+
+class HeadTailBuffer:
+    """只保留前 N 行和最后 M 行的输出缓冲"""
+
+    def __init__(
+        self,
+        head_lines: int = DEFAULT_HEAD_LINES,
+        tail_lines: int = DEFAULT_TAIL_LINES,
+        max_line_chars: int = MAX_LINE_CHARS
+    ):
+        self.head_lines = head_lines
+        self.max_line_chars = max_line_chars
+        self.head: List[str] = []
+        self.tail: Deque[str] = deque(maxlen=tail_lines)
+        self.total_lines = 0
+
+    def append(self, line: str):
+        if len(line) > self.max_line_chars:
+            line = f"{line[:self.max_line_chars]}...（截断 {len(line) - self.max_line_chars} 字符）"
+        self.total_lines += 1
+        if len(self.head) < self.head_lines:
+            self.head.append(line)
+        else:
+            self.tail.append(line)
+
+    @property
+    def dropped(self) -> int:
+        """被丢弃的行数"""
+        return self.total_lines - len(self.head) - len(self.tail)
+
+    def text(self) -> str:
+        lines = list(self.head)
+        if self.dropped:
+            lines.append(f"... 省略 {self.dropped} 行 ...")
+        lines.extend(self.tail)
+        return "\n".join(lines)
+
+    def last_lines(self, n: int) -> List[str]:
+        lines = list(self.head) + list(self.tail)
+        return lines[-n:]
+
+
+# ========== 测试进度解析 ==========
+
+_COUNT_RE = re.compile(r"(\d+) (passed|failed|skipped|errors?|xfailed|xpassed|deselected|total)")
+_PYTEST_COLLECTED_RE = re.compile(r"^collected (\d+) items?")
+_PYTEST_VERBOSE_RE = re.compile(r"^(\S+::\S+)\s+(PASSED|FAILED|SKIPPED|ERROR|XFAIL|XPASS)\b")
+_PYTEST_PROGRESS_RE = re.compile(r"^(?:(\S+\.py) )?([.FEsxX]+)\s*(?:\[\s*\d+%\])?$")
+_PYTEST_SHORT_RE = re.compile(r"^(FAILED|ERROR) (\S+)")
+_PYTEST_SECTION_RE = re.compile(r"^_{3,} (.+?) _{3,}$")
+_PYTEST_SUMMARY_RE = re.compile(r"^=+ (.*\d+ (?:passed|failed|skipped|errors?|xfailed|xpassed).*) =+$")
+_UNITTEST_FAIL_RE = re.compile(r"^(FAIL|ERROR): (\S+)(?: \((.+)\))?")
+_UNITTEST_VERBOSE_RE = re.compile(r"\.\.\. (ok|FAIL|ERROR|skipped)")
+_UNITTEST_RAN_RE = re.compile(r"^Ran (\d+) tests?")
+_UNITTEST_RESULT_RE = re.compile(r"^(OK|FAILED)\b(?: \((.*)\))?")
+_JEST_RESULT_RE = re.compile(r"^\s+(✓|√|✕|×|○)\s+(.+?)(?: \(\d+ ?m?s\))?$")
+_JEST_FAILURE_RE = re.compile(r"^\s*●\s+(.+)")
+_JEST_SUMMARY_RE = re.compile(r"^Tests:\s+(.*)")
+
+_PYTEST_CHARS = {'.': 'passed', 'F': 'failed', 'E': 'errors', 's': 'skipped', 'x': 'skipped', 'X': 'passed'}
+_PYTEST_WORDS = {'PASSED': 'passed', 'FAILED': 'failed', 'SKIPPED': 'skipped',
+                 'ERROR': 'errors', 'XFAIL': 'skipped', 'XPASS': 'passed'}
+
+
+class TestProgressParser:
+    """
+    逐行解析测试运行器输出
+
+    使用示例：
+        parser = TestProgressParser("pytest")
+        for line in lines:
+            parser.feed(line)
+        print(parser.counts(), parser.failures, parser.format_summary())
+    """
+
+    __test__ = False  # 不是 pytest 测试类
+
+    def __init__(self, framework: str = "pytest"):
+        self.framework = framework
+        self.passed = 0
+        self.failed = 0
+        self.skipped = 0
+        self.errors = 0
+        self.total: Optional[int] = None
+        self.failures: List[str] = []            # 失败的用例
+        self.excerpt: List[str] = []             # 第一个失败的详情
+        self.summary_line: Optional[str] = None  # 运行器的总结行
+        self._excerpt_open = False
+
+    @property
+    def failure_detected(self) -> bool:
+        return bool(self.failed or self.errors or self.failures)
+
+    @property
+    def completed(self) -> int:
+        return self.passed + self.failed + self.skipped + self.errors
+
+    def counts(self) -> Dict[str, Any]:
+        return {
+            'passed': self.passed,
+            'failed': self.failed,
+            'skipped': self.skipped,
+            'errors': self.errors,
+            'total': self.total if self.total is not None else self.completed,
+        }
+
+    def feed(self, line: str) -> bool:
+        """
+        解析一行输出
+
+        Returns:
+            进度或失败信息是否有变化
+        """
+        line = line.rstrip()
+        if self._excerpt_open:
+            self._collect_excerpt(line)
+
+        handler = {
+            'pytest': self._feed_pytest,
+            'unittest': self._feed_unittest,
+            'jest': self._feed_jest,
+        }.get(self.framework)
+        return handler(line) if handler else False
+
+    def _feed_pytest(self, line: str) -> bool:
+        m = _PYTEST_COLLECTED_RE.match(line)
+        if m:
+            self.total = int(m.group(1))
+            return True
+        m = _PYTEST_VERBOSE_RE.match(line)
+        if m:
+            self._bump(_PYTEST_WORDS[m.group(2)], m.group(1))
+            return True
+        m = _PYTEST_SUMMARY_RE.match(line)
+        if m:
+            self._apply_summary(m.group(1))
+            return True
+        m = _PYTEST_SHORT_RE.match(line)
+        if m:
+            self._add_failure(m.group(2).split(" - ")[0])
+            return True
+        m = _PYTEST_SECTION_RE.match(line)
+        if m and not self.excerpt:
+            self._start_excerpt(line)
+            return False
+        m = _PYTEST_PROGRESS_RE.match(line)
+        if m and line.strip():
+            for char in m.group(2):
+                self._bump(_PYTEST_CHARS[char], None)
+            return True
+        if self.summary_line is None and not line.startswith(" ") and _COUNT_RE.search(line) and " in " in line:
+            # -q 模式的总结行没有 "=" 包围
+            self._apply_summary(line)
+            return True
+        return False
+
+    def _feed_unittest(self, line: str) -> bool:
+        m = _UNITTEST_FAIL_RE.match(line)
+        if m:
+            name = f"{m.group(3)}.{m.group(2)}" if m.group(3) else m.group(2)
+            self._add_failure(name)
+            if not self.excerpt:
+                self._start_excerpt(line)
+            return True
+        m = _UNITTEST_VERBOSE_RE.search(line)
+        if m:
+            self._bump({'ok': 'passed', 'FAIL': 'failed', 'ERROR': 'errors', 'skipped': 'skipped'}[m.group(1)], None)
+            return True
+        m = _UNITTEST_RAN_RE.match(line)
+        if m:
+            self.total = int(m.group(1))
+            return True
+        m = _UNITTEST_RESULT_RE.match(line)
+        if m and self.total is not None:
+            self.summary_line = line
+            stats = dict(
+                (k.strip(), int(v)) for k, v in re.findall(r"(\w+)=(\d+)", m.group(2) or "")
+            )
+            self.failed = stats.get('failures', 0)
+            self.errors = stats.get('errors', 0)
+            self.skipped = stats.get('skipped', 0)
+            self.passed = max(0, self.total - self.failed - self.errors - self.skipped)
+            return True
+        return False
+
+    def _feed_jest(self, line: str) -> bool:
+        m = _JEST_SUMMARY_RE.match(line)
+        if m:
+            self._apply_summary(m.group(1))
+            return True
+        m = _JEST_RESULT_RE.match(line)
+        if m:
+            kind = {'✓': 'passed', '√': 'passed', '✕': 'failed', '×': 'failed', '○': 'skipped'}[m.group(1)]
+            self._bump(kind, m.group(2))
+            return True
+        m = _JEST_FAILURE_RE.match(line)
+        if m:
+            self._add_failure(m.group(1))
+            if not self.excerpt:
+                self._start_excerpt(line)
+            return True
+        return False
+
+    def _bump(self, kind: str, name: Optional[str]):
+        setattr(self, kind, getattr(self, kind) + 1)
+        if name and kind in ('failed', 'errors'):
+            self._add_failure(name)
+
+    def _add_failure(self, name: str):
+        if name not in self.failures:
+            self.failures.append(name)
+
+    def _apply_summary(self, text: str):
+        """总结行的计数为准（覆盖逐行累计的结果）"""
+        self.summary_line = text.strip()
+        counts = {'passed': 0, 'failed': 0, 'skipped': 0, 'errors': 0}
+        total = None
+        for number, word in _COUNT_RE.findall(text):
+            number = int(number)
+            if word in ('error', 'errors'):
+                counts['errors'] += number
+            elif word == 'xfailed':
+                counts['skipped'] += number
+            elif word == 'xpassed':
+                counts['passed'] += number
+            elif word == 'total':
+                total = number
+            elif word in counts:
+                counts[word] += number
+        self.passed, self.failed = counts['passed'], counts['failed']
+        self.skipped, self.errors = counts['skipped'], counts['errors']
+        self.total = total if total is not None else self.completed
+
+    def _start_excerpt(self, line: str):
+        self.excerpt = [line]
+        self._excerpt_open = True
+
+    def _collect_excerpt(self, line: str):
+        # 下一个用例的详情或下一个分节开始时结束
+        if (_PYTEST_SECTION_RE.match(line) or line.startswith("====")
+                or _UNITTEST_FAIL_RE.match(line) or _JEST_FAILURE_RE.match(line)
+                or len(self.excerpt) >= MAX_EXCERPT_LINES):
+            self._excerpt_open = False
+            return
+        self.excerpt.append(line)
+
+    def format_summary(self, max_failures: int = 10) -> str:
+        """紧凑的结果摘要（计数、失败用例、第一个失败的详情）"""
+        c = self.counts()
+        parts = [f"{c['passed']} passed", f"{c['failed']} failed"]
+        if c['errors']:
+            parts.append(f"{c['errors']} errors")
+        if c['skipped']:
+            parts.append(f"{c['skipped']} skipped")
+        lines = [f"测试结果: {', '.join(parts)}（共 {c['total']}）"]
+        if self.failures:
+            shown = self.failures[:max_failures]
+            more = len(self.failures) - len(shown)
+            lines.append("失败用例: " + ", ".join(shown) + (f" 等 {more} 个" if more > 0 else ""))
+        if self.excerpt:
+            lines.append("首个失败详情:")
+            lines.extend(self.excerpt)
+        return "\n".join(lines)
+
+
+# ========== 流式执行 ==========
+
+@dataclass
+class StreamResult:
+    """流式执行结果（输出为头尾缓冲后的文本）"""
+    returncode: Optional[int]
+    stdout: str
+    stderr: str
+    timed_out: bool = False
+    stopped_early: bool = False        # 出现失败信号后提前结束
+    duration: float = 0.0
+    stdout_lines: int = 0
+    stderr_lines: int = 0
+    truncated: bool = False
+    progress: Dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def output(self) -> str:
+        return "\n".join(part for part in (self.stdout, self.stderr) if part)
+
+
+def kill_process_tree(process):
+    """结束子进程（POSIX 下结束整个进程组，包括 shell 派生的进程）"""
+    try:
+        if os.name != 'nt':
+            os.killpg(process.pid, signal.SIGKILL)
+        else:
+            process.kill()
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+async def run_streaming(
+    command: Union[str, Sequence[str]],
+    cwd: Optional[Union[str, os.PathLike]] = None,
+    timeout: Optional[float] = None,
+    shell: bool = True,
+    parser: Optional[TestProgressParser] = None,
+    on_line: Optional[Callable[[str, str], None]] = None,
+    stop_on_failure: bool = False,
+    head_lines: int = DEFAULT_HEAD_LINES,
+    tail_lines: int = DEFAULT_TAIL_LINES,
+    env: Optional[Dict[str, str]] = None
+) -> StreamResult:
+    """
+    运行命令并流式读取输出
+
+    Args:
+        command: 命令（shell=True 时为字符串；否则为参数列表或按 shell 规则拆分的字符串）
+        cwd: 工作目录
+        timeout: 超时时间（秒），超时后结束进程并返回已有的输出
+        shell: 是否使用shell
+        parser: 测试进度解析器（逐行解析 stdout 和 stderr）
+        on_line: 每行输出的回调 (stream, line)，stream 为 "stdout" / "stderr"
+        stop_on_failure: 解析器发现失败时立即结束进程
+        head_lines: 每个流保留的开头行数
+        tail_lines: 每个流保留的末尾行数
+        env: 环境变量
+
+    Returns:
+        StreamResult
+    """
+    kwargs: Dict[str, Any] = dict(
+        stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE,
+        cwd=str(cwd) if cwd else None, env=env
+    )
+    if os.name != 'nt':
+        # 独立进程组，结束时连同派生的子进程一起结束
+        kwargs['start_new_session'] = True
+
+    if shell:
+        if not isinstance(command, str):
+            command = " ".join(shlex.quote(str(c)) for c in command)
+        creating = asyncio.ensure_future(asyncio.create_subprocess_shell(command, **kwargs))
+    else:
+        args = shlex.split(command) if isinstance(command, str) else [str(c) for c in command]
+        creating = asyncio.ensure_future(asyncio.create_subprocess_exec(*args, **kwargs))
+
+    try:
+        process = await asyncio.shield(creating)
+    except asyncio.CancelledError:
+        # 创建过程中被取消会一直等到子进程自然结束，所以等创建完成后直接结束它
+        process = await creating
+        kill_process_tree(process)
+        await process.wait()
+        raise
+
+    start = time.monotonic()
+    buffers = {'stdout': HeadTailBuffer(head_lines, tail_lines), 'stderr': HeadTailBuffer(head_lines, tail_lines)}
+    stop = asyncio.Event()
+    last_report = 0.0
+
+    def handle_line(stream: str, line: str):
+        nonlocal last_report
+        buffers[stream].append(line)
+        if on_line is not None:
+            on_line(stream, line)
+        if parser is None or not parser.feed(line):
+            return
+        if stop_on_failure and parser.failure_detected:
+            stop.set()
+        now = time.monotonic()
+        if now - last_report >= PROGRESS_INTERVAL:
+            last_report = now
+            counts = parser.counts()
+            report_tool_progress(
+                f"{counts['passed']} passed, {counts['failed'] + counts['errors']} failed",
+                completed=parser.completed,
+                total=parser.total,
+                **_progress_extra(counts)
+            )
+
+    reader = asyncio.ensure_future(asyncio.gather(
+        _pump(process.stdout, 'stdout', handle_line),
+        _pump(process.stderr, 'stderr', handle_line),
+    ))
+    stopper = asyncio.ensure_future(stop.wait())
+    timed_out = stopped_early = False
+    try:
+        done, _ = await asyncio.wait({reader, stopper}, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+        if reader not in done:
+            stopped_early = stopper in done
+            timed_out = not stopped_early
+            kill_process_tree(process)
+            try:
+                await asyncio.wait_for(asyncio.shield(reader), timeout=5)
+            except asyncio.TimeoutError:
+                reader.cancel()
+        returncode = await process.wait()
+    except asyncio.CancelledError:
+        kill_process_tree(process)
+        reader.cancel()
+        await process.wait()
+        raise
+    finally:
+        stopper.cancel()
+
+    result = StreamResult(
+        returncode=None if timed_out else returncode,
+        stdout=buffers['stdout'].text(),
+        stderr=buffers['stderr'].text(),
+        timed_out=timed_out,
+        stopped_early=stopped_early,
+        duration=round(time.monotonic() - start, 3),
+        stdout_lines=buffers['stdout'].total_lines,
+        stderr_lines=buffers['stderr'].total_lines,
+        truncated=bool(buffers['stdout'].dropped or buffers['stderr'].dropped),
+        progress=parser.counts() if parser is not None else {},
+    )
+    if parser is not None:
+        report_tool_progress(
+            "完成", completed=parser.completed, total=parser.total, **_progress_extra(result.progress)
+        )
+    return result
+
+
+async def _pump(stream: asyncio.StreamReader, name: str, handle_line: Callable[[str, str], None]):
+    """按行读取管道（超长的行分段处理，不会因为 readline 的长度限制出错）"""
+    partial = b""
+    while True:
+        chunk = await stream.read(READ_CHUNK_SIZE)
+        if not chunk:
+            break
+        lines = (partial + chunk).split(b"\n")
+        partial = lines.pop()
+        if len(partial) > READ_CHUNK_SIZE:
+            lines.append(partial)
+            partial = b""
+        for raw in lines:
+            handle_line(name, raw.decode("utf-8", errors="replace").rstrip("\r"))
+    if partial:
+        handle_line(name, partial.decode("utf-8", errors="replace").rstrip("\r"))
+
+
+def _progress_extra(counts: Dict[str, Any]) -> Dict[str, Any]:
+    """进度计数中除 total 外的字段（total 单独作为参数上报）"""
+    return {k: v for k, v in counts.items() if k != 'total'}
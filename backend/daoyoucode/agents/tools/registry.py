@@ -1,10 +1,12 @@
 """
 全局工具注册表
 
-单例模式，避免重复加载
+单例模式，避免重复加载。内置工具延迟注册：创建注册表时只登记工具名和实现位置，
+实现模块（lsp_tools、repomap_tools、git_tools 等依赖较重）在第一次使用时才导入
 """
 
 from .base import ToolRegistry
+from .schema_cache import ToolSchemaCache, default_schema_cache_path
 import logging
 
 logger = logging.getLogger(__name__)
@@ -13,13 +15,62 @@ logger = logging.getLogger(__name__)
 _tool_registry = None
 _registry_id = None  # 用于调试
 
+# 内置工具: (工具名, 模块, 类名)
+BUILTIN_TOOLS = [
+    # 文件操作工具（9个）
+    ("read_file", "file_tools", "ReadFileTool"),
+    ("write_file", "file_tools", "WriteFileTool"),
+    ("list_files", "file_tools", "ListFilesTool"),
+    ("get_file_info", "file_tools", "GetFileInfoTool"),
+    ("create_directory", "file_tools", "CreateDirectoryTool"),
+    ("delete_file", "file_tools", "DeleteFileTool"),
+    ("batch_read_files", "file_tools", "BatchReadFilesTool"),
+    ("batch_write_files", "file_tools", "BatchWriteFilesTool"),
+    ("batch_delete_files", "file_tools", "BatchDeleteFilesTool"),
+    # 搜索工具（2个）
+    ("text_search", "search_tools", "TextSearchTool"),
+    ("regex_search", "search_tools", "RegexSearchTool"),
+    # Git工具（4个）
+    ("git_status", "git_tools", "GitStatusTool"),
+    ("git_diff", "git_tools", "GitDiffTool"),
+    ("git_commit", "git_tools", "GitCommitTool"),
+    ("git_log", "git_tools", "GitLogTool"),
+    # 命令执行工具（3个）
+    ("run_command", "command_tools", "RunCommandTool"),
+    ("run_test", "command_tools", "RunTestTool"),
+    ("run_lint", "command_tools", "RunLintTool"),
+    # Diff工具（3个）
+    ("search_replace", "diff_tools", "SearchReplaceTool"),
+    ("apply_patch", "diff_tools", "ApplyPatchTool"),
+    ("intelligent_diff_edit", "diff_tools", "IntelligentDiffEditTool"),
+    # RepoMap工具（3个）
+    ("repo_map", "repomap_tools", "RepoMapTool"),
+    ("get_repo_structure", "repomap_tools", "GetRepoStructureTool"),
+    ("get_file_symbols", "repomap_tools", "GetFileSymbolsTool"),
+    ("discover_project_docs", "project_docs_tools", "DiscoverProjectDocsTool"),
+    # 语义代码检索（Cursor 同级按问检索）
+    ("semantic_code_search", "codebase_search_tool", "SemanticCodeSearchTool"),
+    # LSP工具（6个）
+    ("lsp_diagnostics", "lsp_tools", "LSPDiagnosticsTool"),
+    ("lsp_goto_definition", "lsp_tools", "LSPGotoDefinitionTool"),
+    ("lsp_find_references", "lsp_tools", "LSPFindReferencesTool"),
+    ("lsp_symbols", "lsp_tools", "LSPSymbolsTool"),
+    ("lsp_rename", "lsp_tools", "LSPRenameTool"),
+    ("lsp_code_actions", "lsp_tools", "LSPCodeActionsTool"),
+    # AST工具（2个）
+    ("ast_grep_search", "ast_tools", "AstGrepSearchTool"),
+    ("ast_grep_replace", "ast_tools", "AstGrepReplaceTool"),
+    # 代码验证工具（1个）
+    ("validate_code_snippet", "code_validation_tool", "CodeSnippetValidationTool"),
+]
+
 
 def get_tool_registry() -> ToolRegistry:
     """获取工具注册表单例"""
     global _tool_registry, _registry_id
     if _tool_registry is None:
         logger.info("创建新的工具注册表实例")
-        _tool_registry = ToolRegistry()
+        _tool_registry = ToolRegistry(ToolSchemaCache(default_schema_cache_path()))
         _registry_id = id(_tool_registry)
         _register_builtin_tools()
         logger.info(f"工具注册表ID: {_registry_id}")
@@ -29,161 +80,9 @@ def get_tool_registry() -> ToolRegistry:
 
 
 def _register_builtin_tools():
-    """注册内置工具"""
-    from .file_tools import (
-        ReadFileTool,
-        WriteFileTool,
-        ListFilesTool,
-        GetFileInfoTool,
-        CreateDirectoryTool,
-        DeleteFileTool,
-        BatchReadFilesTool,
-        BatchWriteFilesTool,
-        BatchDeleteFilesTool
-    )
-    from .search_tools import (
-        TextSearchTool,
-        RegexSearchTool
-    )
-    from .git_tools import (
-        GitStatusTool,
-        GitDiffTool,
-        GitCommitTool,
-        GitLogTool
-    )
-    from .command_tools import (
-        RunCommandTool,
-        RunTestTool,
-        RunLintTool
-    )
-    from .diff_tools import (
-        SearchReplaceTool,
-        ApplyPatchTool,
-        IntelligentDiffEditTool
-    )
-    from .repomap_tools import (
-        RepoMapTool,
-        GetRepoStructureTool,
-        GetFileSymbolsTool
-    )
-    from .project_docs_tools import (
-        DiscoverProjectDocsTool
-    )
-    from .lsp_tools import (
-        LSPDiagnosticsTool,
-        LSPGotoDefinitionTool,
-        LSPFindReferencesTool,
-        LSPSymbolsTool,
-        LSPRenameTool,
-        LSPCodeActionsTool
-    )
-    from .ast_tools import (
-        AstGrepSearchTool,
-        AstGrepReplaceTool
-    )
-    from .codebase_search_tool import SemanticCodeSearchTool
-    from .code_validation_tool import CodeSnippetValidationTool
-
-    # 文件操作工具（9个）
-    _tool_registry.register(ReadFileTool())
-    _tool_registry.register(WriteFileTool())
-    _tool_registry.register(ListFilesTool())
-    _tool_registry.register(GetFileInfoTool())
-    _tool_registry.register(CreateDirectoryTool())
-    _tool_registry.register(DeleteFileTool())
-    _tool_registry.register(BatchReadFilesTool())
-    _tool_registry.register(BatchWriteFilesTool())
-    _tool_registry.register(BatchDeleteFilesTool())
-    
-    # 搜索工具（2个）
-    _tool_registry.register(TextSearchTool())
-    _tool_registry.register(RegexSearchTool())
-    
-    # Git工具（4个）
-    _tool_registry.register(GitStatusTool())
-    _tool_registry.register(GitDiffTool())
-    _tool_registry.register(GitCommitTool())
-    _tool_registry.register(GitLogTool())
-    
-    # 命令执行工具（3个）
-    _tool_registry.register(RunCommandTool())
-    _tool_registry.register(RunTestTool())
-    _tool_registry.register(RunLintTool())
-    
-    # Diff工具（3个）
-    try:
-        _tool_registry.register(SearchReplaceTool())
-    except Exception as e:
-        logger.error(f"注册SearchReplaceTool失败: {e}")
-    try:
-        _tool_registry.register(ApplyPatchTool())
-    except Exception as e:
-        logger.error(f"注册ApplyPatchTool失败: {e}")
-    try:
-        _tool_registry.register(IntelligentDiffEditTool())
-        logger.info("✓ IntelligentDiffEditTool注册成功")
-    except Exception as e:
-        logger.error(f"注册IntelligentDiffEditTool失败: {e}")
-    
-    # RepoMap工具（3个）
-    try:
-        _tool_registry.register(RepoMapTool())
-        logger.info("✓ RepoMapTool注册成功")
-    except Exception as e:
-        logger.error(f"注册RepoMapTool失败: {e}")
-        import traceback
-        traceback.print_exc()
-    
-    try:
-        _tool_registry.register(GetRepoStructureTool())
-        logger.info("✓ GetRepoStructureTool注册成功")
-    except Exception as e:
-        logger.error(f"注册GetRepoStructureTool失败: {e}")
-    try:
-        _tool_registry.register(GetFileSymbolsTool())
-    except Exception as e:
-        logger.error(f"注册GetFileSymbolsTool失败: {e}")
-    
-    try:
-        _tool_registry.register(DiscoverProjectDocsTool())
-        logger.info("✓ DiscoverProjectDocsTool注册成功")
-    except Exception as e:
-        logger.error(f"注册DiscoverProjectDocsTool失败: {e}")
-
-    # 语义代码检索（Cursor 同级按问检索）
-    try:
-        _tool_registry.register(SemanticCodeSearchTool())
-        logger.info("✓ SemanticCodeSearchTool注册成功")
-    except Exception as e:
-        logger.error(f"注册SemanticCodeSearchTool失败: {e}")
-    
-    # LSP工具（6个）
-    try:
-        _tool_registry.register(LSPDiagnosticsTool())
-        _tool_registry.register(LSPGotoDefinitionTool())
-        _tool_registry.register(LSPFindReferencesTool())
-        _tool_registry.register(LSPSymbolsTool())
-        _tool_registry.register(LSPRenameTool())
-        _tool_registry.register(LSPCodeActionsTool())
-    except Exception as e:
-        logger.error(f"注册LSP工具失败: {e}")
-    
-    # AST工具（2个）
-    try:
-        _tool_registry.register(AstGrepSearchTool())
-        _tool_registry.register(AstGrepReplaceTool())
-    except Exception as e:
-        logger.error(f"注册AST工具失败: {e}")
-    
-    # 代码验证工具（1个）
-    try:
-        _tool_registry.register(CodeSnippetValidationTool())
-        logger.info("✓ CodeSnippetValidationTool注册成功")
-    except Exception as e:
-        logger.error(f"注册CodeSnippetValidationTool失败: {e}")
-    
-    logger.info(f"已注册 {len(_tool_registry.list_tools())} 个内置工具")
+    """延迟注册内置工具"""
+    package = __name__.rsplit(".", 1)[0]
+    for name, module, class_name in BUILTIN_TOOLS:
+        _tool_registry.register_lazy(name, f"{package}.{module}", class_name)
     
-    # 列出所有已注册的工具
-    tools = _tool_registry.list_tools()
-    logger.info(f"工具列表: {', '.join(sorted(tools))}")
+    logger.info(f"已注册 {len(_tool_registry.list_tools())} 个内置工具（首次使用时加载）")
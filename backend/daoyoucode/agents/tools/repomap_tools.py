@@ -10,16 +10,24 @@ RepoMap工具 - 代码地图生成
 """
 
 from pathlib import Path
-from typing import Dict, List, Optional, Set, Tuple, Any
+from typing import Dict, List, Optional, Sequence, Set, Tuple, Any
 import logging
 import json
+import threading
 import time
-from collections import defaultdict, namedtuple
+from bisect import bisect_right
+from collections import OrderedDict, defaultdict, namedtuple
+from dataclasses import dataclass
+from itertools import accumulate
 import warnings
 
 from diskcache import Cache
 
+from ..llm.utils.tokenizer import count_tokens
 from .base import BaseTool, ToolResult
+from .file_inventory import get_file_inventory
+from .symbol_index import SYMBOL_EXTENSIONS, peek_symbol_index
+from .tag_store import FileTags, compact_tags, definition_names, definition_tags, reference_names
 
 # 忽略 tree_sitter 的 FutureWarning
 warnings.simplefilter("ignore", category=FutureWarning)
@@ -36,10 +44,747 @@ except ImportError:
 
 logger = logging.getLogger(__name__)
 
+# 排序结果缓存（RepoSymbolStore，按个性化）和地图结果缓存（RepoMapTool）的字节上限
+MAX_RANKED_CACHE_BYTES = 16 * 1024 * 1024
+MAX_MAP_CACHE_BYTES = 8 * 1024 * 1024
+# 共享存储中 PageRank 的最大迭代次数和收敛阈值（L1）
+RANK_MAX_ITERATIONS = 100
+RANK_TOLERANCE = 1e-6
+
 # Tag 数据结构
 Tag = namedtuple("Tag", "rel_fname fname line name kind".split())
 
 
+def parse_file_tags(file_path: Path) -> List[Dict]:
+    """
+    解析文件，提取定义和引用
+    
+    使用 Tree-sitter 解析（完整实现）
+    """
+    if not TREE_SITTER_AVAILABLE:
+        logger.warning("Tree-sitter 不可用，跳过文件解析")
+        return []
+    
+    # 获取语言
+    lang = filename_to_lang(str(file_path))
+    if not lang:
+        return []
+    
+    try:
+        language = get_language(lang)
+        parser = get_parser(lang)
+    except Exception as err:
+        logger.warning(f"跳过文件 {file_path}: {err}")
+        return []
+    
+    # 获取查询文件
+    query_scm = get_scm_fname(lang)
+    if not query_scm or not query_scm.exists():
+        return []
+    
+    query_scm_content = query_scm.read_text()
+    
+    # 读取代码
+    try:
+        code = file_path.read_text(encoding="utf-8", errors="ignore")
+    except Exception as e:
+        logger.warning(f"读取文件失败 {file_path}: {e}")
+        return []
+    
+    if not code:
+        return []
+    
+    # 解析代码
+    tree = parser.parse(bytes(code, "utf-8"))
+    
+    # 运行标签查询
+    try:
+        from tree_sitter import Query, QueryCursor
+        query = Query(language, query_scm_content)
+        cursor = QueryCursor(query)
+        matches = cursor.matches(tree.root_node)
+    except Exception as e:
+        logger.warning(f"查询执行失败 {file_path}: {e}")
+        return []
+    
+    definitions = []
+    saw = set()
+    parent_stack = []  # 🆕 跟踪父级（用于确定方法所属的类）
+    
+    # 处理匹配结果: [(pattern_index, {capture_name: [nodes]})]
+    for pattern_index, captures_dict in matches:
+        for tag, nodes in captures_dict.items():
+            for node in nodes:
+                if tag.startswith("name.definition."):
+                    kind = "def"
+                elif tag.startswith("name.reference."):
+                    kind = "ref"
+                else:
+                    continue
+                
+                saw.add(kind)
+                
+                # 提取类型（class、function、method等）
+                type_name = tag.split(".")[-1]
+                name = node.text.decode("utf-8")
+                
+                # 🆕 确定父级和作用域（仅对定义）
+                parent = None
+                scope = "global"
+                
+                if kind == "def":
+                    # 确定父级
+                    parent = parent_stack[-1] if parent_stack else None
+                    
+                    # 确定作用域
+                    if type_name == "class":
+                        scope = "global"
+                        # 将类名压入栈（用于后续方法）
+                        parent_stack.append(name)
+                    elif type_name in ("function", "method"):
+                        scope = "class" if parent else "global"
+                    else:
+                        scope = "global"
+                
+                definitions.append({
+                    "type": type_name,
+                    "name": name,
+                    "line": node.start_point[0] + 1,
+                    "kind": kind,
+                    # 🆕 阶段2新增字段
+                    "parent": parent,
+                    "scope": scope
+                })
+    
+    # 如果只有定义没有引用，使用 Pygments 补充引用
+    if "ref" not in saw and "def" in saw:
+        try:
+            lexer = guess_lexer_for_filename(str(file_path), code)
+            tokens = list(lexer.get_tokens(code))
+            tokens = [token[1] for token in tokens if token[0] in Token.Name]
+            
+            for token in tokens:
+                definitions.append({
+                    "type": "reference",
+                    "name": token,
+                    "line": -1,
+                    "kind": "ref"
+                })
+        except Exception:
+            pass
+    
+    return definitions
+
+
+def get_scm_fname(lang: str) -> Optional[Path]:
+    """获取 Tree-sitter 查询文件路径"""
+    # 查询文件目录
+    queries_dir = Path(__file__).parent / "queries"
+    
+    # 优先使用 tree-sitter-language-pack
+    if USING_TSL_PACK:
+        subdir = "tree-sitter-language-pack"
+        path = queries_dir / subdir / f"{lang}-tags.scm"
+        if path.exists():
+            return path
+    
+    # 回退到 tree-sitter-languages
+    subdir = "tree-sitter-languages"
+    path = queries_dir / subdir / f"{lang}-tags.scm"
+    if path.exists():
+        return path
+    
+    return None
+
+
+def build_reference_graph(definitions: Dict[str, List[Dict]]) -> Dict[str, Dict[str, float]]:
+    """
+    构建引用图
+    
+    Returns:
+        {node: {referenced_node: weight, ...}}
+    """
+    graph = defaultdict(lambda: defaultdict(float))
+    
+    # 构建标识符到文件的映射（只包含定义）
+    ident_to_files = defaultdict(set)
+    for file_path, defs in definitions.items():
+        for name in definition_names(defs):
+            ident_to_files[name].add(file_path)
+    
+    # 扫描引用关系
+    for file_path, defs in definitions.items():
+        # 收集文件中的所有引用
+        references_in_file = reference_names(defs)
+        
+        # 为每个引用添加边
+        for ident in references_in_file:
+            if ident in ident_to_files:
+                # 文件引用了这个标识符
+                for ref_file in ident_to_files[ident]:
+                    if ref_file != file_path:
+                        # 添加边：file_path -> ref_file
+                        graph[file_path][ref_file] += 1.0
+    
+    return dict(graph)
+
+
+def update_reference_graph(
+    old_graph: Dict[str, Dict[str, float]],
+    definitions: Dict[str, List[Dict]],
+    changed_files: List[str]
+) -> Dict[str, Dict[str, float]]:
+    """
+    增量更新引用图（只重新计算改动文件的引用关系）
+    
+    Args:
+        old_graph: 旧的引用图
+        definitions: 所有文件的定义
+        changed_files: 改动的文件列表（包括删除的文件）
+    
+    Returns:
+        更新后的引用图
+    """
+    # 复制旧图
+    graph = defaultdict(lambda: defaultdict(float))
+    for source, targets in old_graph.items():
+        graph[source] = defaultdict(float, targets)
+    
+    # 🔥 步骤1：删除改动文件的旧引用关系
+    for file in changed_files:
+        # 删除该文件作为源的引用
+        if file in graph:
+            del graph[file]
+        
+        # 删除指向该文件的引用
+        for source in list(graph.keys()):
+            if file in graph[source]:
+                del graph[source][file]
+                # 如果源文件没有其他引用，删除该源
+                if not graph[source]:
+                    del graph[source]
+    
+    # 🔥 步骤2：重新构建标识符映射（只包含改动文件的定义）
+    ident_to_files = defaultdict(set)
+    
+    # 添加所有文件的定义（用于查找引用目标）
+    for file_path, defs in definitions.items():
+        for name in definition_names(defs):
+            ident_to_files[name].add(file_path)
+    
+    # 🔥 步骤3：重新计算改动文件的引用关系
+    for file_path in changed_files:
+        if file_path not in definitions:
+            continue
+        
+        # 收集文件中的所有引用
+        references_in_file = reference_names(definitions[file_path])
+        
+        # 为每个引用添加边
+        for ident in references_in_file:
+            if ident in ident_to_files:
+                for ref_file in ident_to_files[ident]:
+                    if ref_file != file_path:
+                        graph[file_path][ref_file] += 1.0
+    
+    # 🔥 步骤4：重新计算指向改动文件的引用
+    # 其他文件可能引用了改动文件中的定义
+    changed_idents = set()
+    for file_path in changed_files:
+        if file_path in definitions:
+            changed_idents.update(definition_names(definitions[file_path]))
+    
+    # 扫描所有文件，找到引用了改动标识符的文件
+    for file_path, defs in definitions.items():
+        if file_path in changed_files:
+            continue  # 跳过改动文件（已处理）
+        
+        # 收集文件中的引用
+        references_in_file = reference_names(defs)
+        
+        # 检查是否引用了改动的标识符
+        referenced_changed = references_in_file.intersection(changed_idents)
+        if referenced_changed:
+            # 重新计算该文件指向改动文件的引用
+            for ident in referenced_changed:
+                if ident in ident_to_files:
+                    for ref_file in ident_to_files[ident]:
+                        if ref_file != file_path and ref_file in changed_files:
+                            graph[file_path][ref_file] += 1.0
+    
+    return dict(graph)
+
+
+def rank_files(
+    graph: Dict[str, Dict[str, float]],
+    definitions: Dict[str, List[Dict]],  # 添加 definitions 参数
+    chat_files: List[str],
+    mentioned_idents: List[str],
+    damping: float = 0.85,
+    iterations: int = 20,
+    initial: Optional[Dict[str, float]] = None,
+    tol: float = 0.0,
+    stats: Optional[Dict[str, int]] = None
+) -> List[Tuple[str, float]]:
+    """
+    PageRank算法排序
+    
+    Args:
+        graph: 引用图
+        chat_files: 对话中的文件（权重×50）
+        mentioned_idents: 提到的标识符（权重×10）
+        damping: 阻尼系数
+        iterations: 最大迭代次数
+        initial: 初始分数（热启动：个性化变化不大时用相近的分数向量，几轮就能收敛）
+        tol: 两轮分数的 L1 差小于该值时提前结束（0 表示总是迭代 iterations 轮）
+        stats: 统计字典（累加实际迭代次数到 rank_iterations）
+        
+    Returns:
+        [(file_path, score), ...] 按分数降序
+    """
+    # 所有节点
+    nodes = set(graph.keys())
+    for targets in graph.values():
+        nodes.update(targets.keys())
+    
+    if not nodes:
+        return []
+    
+    # 初始化分数
+    uniform = 1.0 / len(nodes)
+    if initial:
+        scores = {node: initial.get(node, uniform) for node in nodes}
+        norm = sum(scores.values()) or 1.0
+        scores = {node: v / norm for node, v in scores.items()}
+    else:
+        scores = {node: uniform for node in nodes}
+    
+    # 个性化权重
+    personalization = {}
+    for node in nodes:
+        weight = 1.0
+        
+        # 对话文件权重×50
+        if node in chat_files:
+            weight *= 50
+        
+        # 提到的标识符权重×10
+        # 检查：1) 路径组件  2) 文件中的定义名称
+        if mentioned_idents:
+            # 检查路径组件（如 agents/llm/timeout）
+            path_components = set(Path(node).parts)
+            basename_with_ext = Path(node).name
+            basename_without_ext = Path(node).stem
+            components_to_check = path_components.union({basename_with_ext, basename_without_ext})
+            
+            # 检查路径是否包含提到的标识符
+            matched_path = components_to_check.intersection(set(ident.lower() for ident in mentioned_idents))
+            if matched_path:
+                weight *= 10
+            
+            # 检查文件中的定义是否包含提到的标识符
+            if node in definitions:
+                file_defs = definitions.get(node, [])
+                def_names = {name.lower() for name in definition_names(file_defs)}
+                mentioned_lower = {ident.lower() for ident in mentioned_idents}
+                
+                # 精确匹配或部分匹配
+                if def_names.intersection(mentioned_lower):
+                    weight *= 10
+                else:
+                    # 部分匹配（如 'timeout' 匹配 'TimeoutError'）
+                    for def_name in def_names:
+                        for ident in mentioned_lower:
+                            if ident in def_name or def_name in ident:
+                                weight *= 5  # 部分匹配权重较低
+                                break
+        
+        personalization[node] = weight
+    
+    # 归一化
+    total = sum(personalization.values())
+    personalization = {k: v / total for k, v in personalization.items()}
+    
+    # 出边总权重（每轮复用）
+    out_edges = [
+        (source, targets, sum(targets.values()))
+        for source, targets in graph.items()
+    ]
+    
+    # PageRank迭代：每个节点把分数按边权分给它引用的节点
+    for _ in range(iterations):
+        # 基础分数（随机跳转）
+        new_scores = {
+            node: (1 - damping) * personalization.get(node, uniform)
+            for node in nodes
+        }
+        
+        # 来自其他节点的分数
+        for source, targets, out_weight in out_edges:
+            if out_weight <= 0:
+                continue
+            share = damping * scores[source] / out_weight
+            for target, weight in targets.items():
+                new_scores[target] += share * weight
+        
+        if stats is not None:
+            stats['rank_iterations'] = stats.get('rank_iterations', 0) + 1
+        delta = sum(abs(new_scores[node] - scores[node]) for node in nodes) if tol else 1.0
+        scores = new_scores
+        if delta < tol:
+            break
+    
+    # 排序
+    ranked = sorted(scores.items(), key=lambda x: x[1], reverse=True)
+    return ranked
+
+
+# LSP 增强写入定义的字段（带这些字段的定义按 LSP 格式渲染）
+LSP_FIELDS = ('lsp_signature', 'lsp_ref_count', 'lsp_verified')
+
+
+def render_definition(d: Dict, enable_lsp: bool = False) -> str:
+    """渲染代码地图中的一行定义"""
+    kind = d.get('type', 'unknown')
+    # 🔥 LSP增强输出：显示类型签名和引用计数
+    has_signature = enable_lsp and d.get('lsp_signature')
+    has_ref_count = enable_lsp and d.get('lsp_ref_count', 0) > 0
+    
+    if has_signature and has_ref_count:
+        # 完整LSP信息：类型签名 + 引用计数
+        return f"  {kind} {d['name']}: {d['lsp_signature']}  # {d['lsp_ref_count']}次引用"
+    if has_signature:
+        # 只有类型签名
+        return f"  {kind} {d['name']}: {d['lsp_signature']}"
+    if has_ref_count:
+        # 只有引用计数
+        return f"  {kind} {d['name']} (line {d['line']})  # {d['lsp_ref_count']}次引用"
+    if enable_lsp and d.get('lsp_verified'):
+        # LSP验证通过但无额外信息
+        return f"  {kind} {d['name']} (line {d['line']}) ✓"
+    # 标准格式
+    return f"  {kind} {d['name']} (line {d['line']})"
+
+
+def line_tokens(line: str) -> int:
+    """
+    一行的 token 数（连同前面拼接用的换行符）
+
+    每行都以空白开头、非空白结尾，换行符和行首空白会合并成一个 token，
+    按拼接后的形式计数时各行的 token 数可以直接相加
+    """
+    return count_tokens("\n" + line)
+
+
+@dataclass
+class RenderedFile:
+    """一个文件在代码地图中的预渲染行"""
+    lines: List[str]         # [文件头, 定义行, ...]
+    cumulative: List[int]    # cumulative[i] = 前 i+1 行的 token 数
+
+    @property
+    def tokens(self) -> int:
+        return self.cumulative[-1]
+
+
+def render_file(rel: str, defs: List[Dict], enable_lsp: bool = False) -> Optional[RenderedFile]:
+    """渲染一个文件的文件头和定义行（没有定义时返回 None）"""
+    file_defs = definition_tags(defs)
+    if not file_defs:
+        return None
+    lines = [f"\n{rel}:"] + [render_definition(d, enable_lsp) for d in file_defs]
+    return RenderedFile(lines, list(accumulate(line_tokens(line) for line in lines)))
+
+
+class ByteBoundedLRU:
+    """按估算字节数限制总量的 LRU 缓存（线程安全）"""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Any, Tuple[Any, int]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def put(self, key, value, size: int):
+        """保存条目（size 为估算的字节数，超过上限时淘汰最久未用的条目）"""
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            if size > self.max_bytes:
+                return
+            self._entries[key] = (value, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._bytes -= evicted
+
+    def items(self) -> List[Tuple[Any, Any]]:
+        """(键, 值) 列表（从最久未用到最近使用）"""
+        with self._lock:
+            return [(key, entry[0]) for key, entry in self._entries.items()]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    @property
+    def size_bytes(self) -> int:
+        return self._bytes
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key) -> bool:
+        return key in self._entries
+
+
+def personalization_key(
+    chat_files: Optional[List[str]],
+    mentioned_idents: Optional[List[str]]
+) -> Tuple[Tuple[str, ...], Tuple[str, ...]]:
+    """
+    个性化参数的规范形式（与顺序、重复和标识符大小写无关）
+
+    rank_files 只按集合成员判断对话文件、按小写比较标识符，规范化后结果不变
+    """
+    return (
+        tuple(sorted(set(chat_files or []))),
+        tuple(sorted({ident.lower() for ident in mentioned_idents or []}))
+    )
+
+
+def _ranked_size(ranked: Sequence[Tuple[str, float]]) -> int:
+    """排序结果的估算字节数（列表 + 分数字典）"""
+    return sum(len(path) * 2 + 160 for path, _ in ranked)
+
+
+class RepoSymbolStore:
+    """
+    进程内共享的仓库符号存储（每个仓库根一个，线程安全）
+
+    保存标签（定义/引用）、引用图和按个性化缓存的 PageRank 排序，
+    repo_map、get_file_symbols、semantic_code_search（CodebaseIndex）共用：
+    - 文件按 mtime 增量刷新，每次文件改动只解析一次
+    - 解析结果写入 .daoyoucode/cache/repomap（diskcache，只打开一次），重启后复用
+    - 刷新时替换而不是原地修改字典，读到的快照不会被并发刷新改掉
+    - 每个文件的标签按列保存为 FileTags（见 tag_store），只在调用方需要时创建字典视图
+    """
+
+    def __init__(self, root: Path):
+        self.root = Path(root).resolve()
+        self._lock = threading.RLock()
+        self._file_cache = None
+        self._tags: Dict[str, FileTags] = {}
+        self._mtimes: Dict[str, float] = {}
+        self._graph: Optional[Dict[str, Dict[str, float]]] = None
+        # 个性化 → 排序结果；版本变化时清空
+        self._ranked = ByteBoundedLRU(MAX_RANKED_CACHE_BYTES)
+        self._last_scores: Optional[Dict[str, float]] = None  # 最近一次的分数（热启动用）
+        self._rendered: Dict[str, Optional[RenderedFile]] = {}
+        self.version = 0  # 每次内容变化加1，供结果级缓存校验
+        self.stats = {
+            'refreshes': 0, 'parsed': 0, 'file_hits': 0, 'file_misses': 0,
+            'rank_hits': 0, 'rank_misses': 0, 'rank_iterations': 0
+        }
+
+    @property
+    def file_cache(self) -> Cache:
+        """解析结果的 diskcache（首次使用时打开）"""
+        if self._file_cache is None:
+            with self._lock:
+                if self._file_cache is None:
+                    cache_dir = self.root / ".daoyoucode" / "cache" / "repomap"
+                    cache_dir.mkdir(parents=True, exist_ok=True)
+                    self._file_cache = Cache(str(cache_dir))
+        return self._file_cache
+
+    def refresh(self) -> List[str]:
+        """
+        按文件清单增量刷新
+
+        Returns:
+            改动（新增、修改、删除）的文件列表
+        """
+        with self._lock:
+            self.stats['refreshes'] += 1
+            symbol_index = peek_symbol_index(self.root)
+            tags = None
+            mtimes = None
+            changed = []
+            seen = set()
+
+            for entry in get_file_inventory(self.root).files(extensions=SYMBOL_EXTENSIONS):
+                rel = str(Path(entry.path))
+                seen.add(rel)
+                if self._mtimes.get(rel) == entry.mtime:
+                    continue
+                if tags is None:
+                    tags, mtimes = dict(self._tags), dict(self._mtimes)
+                tags[rel] = self._load_tags(rel, entry, symbol_index)
+                mtimes[rel] = entry.mtime
+                changed.append(rel)
+
+            removed = [rel for rel in self._tags if rel not in seen]
+            if removed:
+                if tags is None:
+                    tags, mtimes = dict(self._tags), dict(self._mtimes)
+                for rel in removed:
+                    del tags[rel]
+                    del mtimes[rel]
+                changed.extend(removed)
+
+            if not changed:
+                return []
+
+            if self._graph is None:
+                graph = build_reference_graph(tags)
+            else:
+                graph = update_reference_graph(self._graph, tags, changed)
+            self._tags, self._mtimes, self._graph = tags, mtimes, graph
+            self._ranked.clear()
+            changed_set = set(changed)
+            self._rendered = {k: v for k, v in self._rendered.items() if k not in changed_set}
+            self.version += 1
+            logger.info(
+                f"🔄 符号存储刷新: {len(changed)} 个文件改动, 共 {len(tags)} 个文件 "
+                f"(解析 {self.stats['parsed']}, 缓存命中 {self.stats['file_hits']})"
+            )
+            return changed
+
+    def snapshot(self) -> Tuple[Dict[str, List[Dict]], Dict[str, Dict[str, float]], int]:
+        """当前的 (标签, 引用图, 版本号)，调用方不要修改"""
+        with self._lock:
+            return self._tags, self._graph or {}, self.version
+
+    def pagerank(self) -> Dict[str, float]:
+        """无个性化的 PageRank 分数（内容不变时复用）"""
+        return dict(self.ranked())
+
+    def ranked(
+        self,
+        chat_files: Optional[List[str]] = None,
+        mentioned_idents: Optional[List[str]] = None
+    ) -> Tuple[Tuple[str, float], ...]:
+        """
+        个性化 PageRank 排序（按个性化参数缓存，存储版本变化时失效）
+
+        未命中时从个性化最接近的已缓存分数向量热启动，迭代到收敛。
+        返回的元组是缓存本身，调用方不能修改。
+        """
+        key = personalization_key(chat_files, mentioned_idents)
+        with self._lock:
+            cached = self._ranked.get(key)
+            if cached is not None:
+                self.stats['rank_hits'] += 1
+                return cached
+            self.stats['rank_misses'] += 1
+            ranked = tuple(rank_files(
+                self._graph or {}, self._tags, list(key[0]), list(key[1]),
+                iterations=RANK_MAX_ITERATIONS,
+                initial=self._warm_start(key),
+                tol=RANK_TOLERANCE,
+                stats=self.stats
+            ))
+            self._ranked.put(key, ranked, _ranked_size(ranked))
+            self._last_scores = dict(ranked)
+            return ranked
+
+    def _warm_start(self, key) -> Optional[Dict[str, float]]:
+        """个性化差异最小的已缓存结果；没有时用最近一次的分数"""
+        wanted = set(key[0]) | {"#" + ident for ident in key[1]}
+        best, best_distance = None, None
+        for cached_key, ranked in self._ranked.items():
+            distance = len(wanted ^ (set(cached_key[0]) | {"#" + ident for ident in cached_key[1]}))
+            if best_distance is None or distance < best_distance:
+                best, best_distance = ranked, distance
+        if best is not None:
+            return dict(best)
+        return self._last_scores
+
+    def rendered(self, rel: str) -> Optional[RenderedFile]:
+        """
+        文件在代码地图中的预渲染行和 token 前缀和（文件不变时复用）
+
+        个性化排序只改变文件的顺序，不需要重新渲染和计数
+        """
+        with self._lock:
+            if rel in self._rendered:
+                return self._rendered[rel]
+            defs = self._tags.get(rel)
+            rendered = render_file(rel, defs) if defs else None
+            if defs is not None:
+                self._rendered[rel] = rendered
+            return rendered
+
+    def file_tags(self, path: Path) -> FileTags:
+        """
+        单个文件的标签（未改动时直接复用，改动时解析一次并写入缓存）
+
+        Args:
+            path: 文件绝对路径
+        """
+        path = Path(path).resolve()
+        try:
+            rel = str(path.relative_to(self.root))
+        except ValueError:
+            return compact_tags(parse_file_tags(path))
+        mtime = path.stat().st_mtime
+        with self._lock:
+            if self._mtimes.get(rel) == mtime:
+                return self._tags[rel]
+            val = self.file_cache.get(rel)
+            if val is not None and val.get("mtime") == mtime:
+                self.stats['file_hits'] += 1
+                return compact_tags(val["data"])
+            # 只写入文件缓存，下次 refresh 时再并入引用图
+            self.stats['file_misses'] += 1
+            self.stats['parsed'] += 1
+            data = compact_tags(parse_file_tags(path))
+            self.file_cache[rel] = {"mtime": mtime, "data": data}
+            return data
+
+    def _load_tags(self, rel: str, entry, symbol_index) -> FileTags:
+        val = self.file_cache.get(rel)
+        if val is not None and val.get("mtime") == entry.mtime:
+            self.stats['file_hits'] += 1
+            # 旧版本缓存中是字典列表
+            return compact_tags(val["data"])
+
+        self.stats['file_misses'] += 1
+        self.stats['parsed'] += 1
+        data = compact_tags(parse_file_tags(entry.abs_path))
+        self.file_cache[rel] = {"mtime": entry.mtime, "data": data}
+        # 符号索引已在使用时，顺带用标签更新（比正则准确）
+        if symbol_index is not None and data:
+            symbol_index.update_from_tags(entry.path, entry.mtime_ns, data)
+        return data
+
+
+_stores: Dict[Path, RepoSymbolStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_repo_symbol_store(root: Path) -> RepoSymbolStore:
+    """获取仓库的共享符号存储"""
+    root = Path(root).resolve()
+    with _stores_lock:
+        store = _stores.get(root)
+        if store is None:
+            store = RepoSymbolStore(root)
+            _stores[root] = store
+        return store
+
+
 class RepoMapTool(BaseTool):
     """
     生成代码仓库地图
@@ -48,7 +793,8 @@ class RepoMapTool(BaseTool):
     - 提取函数、类定义和引用关系
     - PageRank排序（基于引用关系）
     - 个性化权重（对话文件、提到的标识符）
-    - 缓存机制（避免重复解析）
+    - 缓存机制（避免重复解析）：标签、引用图和 PageRank 保存在进程内共享的
+      RepoSymbolStore 中，所有 RepoMapTool 实例及其他使用者共用同一份
     - Token预算控制
     
     🆕 公开API（供codebase_index等外部模块使用）：
@@ -66,20 +812,12 @@ class RepoMapTool(BaseTool):
             name="repo_map",
             description="生成代码仓库地图，智能排序最相关的代码定义"
         )
-        # 🔥 第3层：文件级缓存（diskcache）
-        self.file_cache = None
-        
-        # 🔥 第2层：内存级缓存（definitions + graph）
-        self.definitions_cache = None
-        self.graph_cache = None
-        self.cache_timestamp = None
-        self.cached_repo_path = None
+        # 🔥 第2、3层：共享符号存储（内存中的标签/引用图 + diskcache），见 RepoSymbolStore
         
         # 🔥 第1层：结果级缓存（map结果）
-        self.map_cache = {}  # {cache_key: (result, timestamp)}
-        self.map_cache_ttl = 300  # 5分钟过期
+        # 键包含存储版本（文件改动后自然失效），按字节数做 LRU 淘汰
+        self.map_cache = ByteBoundedLRU(MAX_MAP_CACHE_BYTES)
         
-        self.graph = None
         self._last_definitions = None  # 🆕 保存最后一次的definitions
         
         # 缓存统计
@@ -170,9 +908,6 @@ class RepoMapTool(BaseTool):
             logger.warning(f"仓库路径不存在: {repo_path}")
             return {}
         
-        if use_cache:
-            self._init_cache(repo_path_resolved)
-        
         definitions = self._scan_repository(repo_path_resolved)
         
         # 🆕 计算end_line（如果没有）
@@ -203,12 +938,15 @@ class RepoMapTool(BaseTool):
                 }
             }
         """
-        repo_path_resolved = self.resolve_path(repo_path)
-        
         if definitions is None:
             definitions = self.get_definitions(repo_path)
         
-        return self._build_reference_graph(definitions, repo_path_resolved)
+        # 共享存储中的定义直接复用已维护的引用图
+        store = get_repo_symbol_store(self.resolve_path(repo_path))
+        store_defs, graph, _ = store.snapshot()
+        if definitions is store_defs:
+            return graph
+        return build_reference_graph(definitions)
     
     def get_pagerank_scores(
         self,
@@ -238,6 +976,15 @@ class RepoMapTool(BaseTool):
         if definitions is None:
             definitions = self.get_definitions(repo_path)
         
+        # 共享存储的数据复用按个性化缓存的 PageRank 分数
+        store = get_repo_symbol_store(self.resolve_path(repo_path))
+        store_defs, store_graph, _ = store.snapshot()
+        if (
+            definitions is store_defs
+            and (reference_graph is None or reference_graph is store_graph)
+        ):
+            return dict(store.ranked(chat_files, mentioned_idents))
+        
         if reference_graph is None:
             reference_graph = self.get_reference_graph(repo_path, definitions)
         
@@ -306,80 +1053,50 @@ class RepoMapTool(BaseTool):
                         f"使用标准token预算 {max_tokens}"
                     )
             
-            # 🔥 第1层：检查结果级缓存
-            cache_key = self._make_cache_key(chat_files, mentioned_idents, max_tokens)
-            
-            if cache_key in self.map_cache:
-                cached_result, timestamp = self.map_cache[cache_key]
-                if time.time() - timestamp < self.map_cache_ttl:
-                    self.cache_stats['result_hits'] += 1
-                    logger.info(f"✅ 命中结果级缓存 (0.001秒) | 统计: {self._format_cache_stats()}")
-                    return cached_result
-            
-            self.cache_stats['result_misses'] += 1
+            # 🔥 第2、3层：刷新共享符号存储（只解析改动的文件）
+            scan_start = time.time()
+            store = get_repo_symbol_store(repo_path_resolved)
+            changed_files = store.refresh()
+            definitions, graph, version = self._snapshot(store)
+            self._sync_file_stats(store)
             
-            # 初始化文件级缓存
-            self._init_cache(repo_path_resolved)
-            
-            # 🔥 第2层：检查内存级缓存
-            files_changed = self._check_files_changed(repo_path_resolved)
-            
-            if not files_changed and self.definitions_cache and self.cached_repo_path == str(repo_path_resolved):
-                self.cache_stats['memory_hits'] += 1
-                logger.info(f"✅ 命中内存级缓存，跳过扫描 (0.1秒) | 统计: {self._format_cache_stats()}")
-                definitions = self.definitions_cache
-                graph = self.graph_cache
-            else:
+            if changed_files:
                 self.cache_stats['memory_misses'] += 1
-                
-                # 🔥 第3层：扫描仓库（使用文件级缓存 + 增量更新）
-                scan_start = time.time()
-                definitions, changed_files = self._scan_repository_incremental(repo_path_resolved)
-                scan_time = time.time() - scan_start
-                
-                # 🔥 增量更新引用图
-                graph_start = time.time()
-                if changed_files and self.graph_cache:
-                    # 有改动且有缓存，增量更新
-                    graph = self._update_reference_graph_incremental(
-                        self.graph_cache,
-                        definitions,
-                        changed_files,
-                        repo_path_resolved
-                    )
-                    logger.info(f"🔄 增量更新引用图: {len(changed_files)} 个文件")
-                    
-                    # 🔥 清除结果级缓存（因为 RepoMap 已改变）
-                    if self.map_cache:
-                        old_cache_size = len(self.map_cache)
-                        self.map_cache.clear()
-                        logger.info(f"🗑️  清除结果级缓存: {old_cache_size} 个条目（因为文件改动）")
-                else:
-                    # 首次运行或全量更新
-                    graph = self._build_reference_graph(definitions, repo_path_resolved)
-                
-                graph_time = time.time() - graph_start
-                
                 logger.info(
-                    f"🔍 扫描完成: {len(definitions)} 个文件 "
-                    f"(扫描 {scan_time:.2f}秒, 构图 {graph_time:.2f}秒) | "
-                    f"统计: {self._format_cache_stats()}"
+                    f"🔍 扫描完成: {len(definitions)} 个文件, {len(changed_files)} 个改动 "
+                    f"({time.time() - scan_start:.2f}秒) | 统计: {self._format_cache_stats()}"
                 )
-                
-                # 保存到内存缓存
-                self.definitions_cache = definitions
-                self.graph_cache = graph
-                self.cache_timestamp = time.time()
-                self.cached_repo_path = str(repo_path_resolved)
+            else:
+                self.cache_stats['memory_hits'] += 1
+                logger.info(f"✅ 命中内存级缓存，跳过解析 | 统计: {self._format_cache_stats()}")
             
-            # PageRank排序
-            ranked = self._pagerank(
-                graph,
-                definitions,
-                chat_files=chat_files,
-                mentioned_idents=mentioned_idents
+            # 🔥 第1层：检查结果级缓存（键包含存储版本，文件改动后自动失效）
+            cache_key = self._make_cache_key(chat_files, mentioned_idents, max_tokens) + (
+                str(repo_path_resolved), version, enable_lsp
             )
             
+            cached_result = self.map_cache.get(cache_key)
+            if cached_result is not None:
+                self.cache_stats['result_hits'] += 1
+                logger.info(f"✅ 命中结果级缓存 | 统计: {self._format_cache_stats()}")
+                return cached_result
+            
+            self.cache_stats['result_misses'] += 1
+            if changed_files:
+                # 旧版本的结果不会再命中
+                self.map_cache.clear()
+            
+            # PageRank排序（完整仓库时使用共享存储的排序缓存，未命中时热启动）
+            if self.context.subtree_only:
+                ranked = self._pagerank(
+                    graph,
+                    definitions,
+                    chat_files=chat_files,
+                    mentioned_idents=mentioned_idents
+                )
+            else:
+                ranked = store.ranked(chat_files, mentioned_idents)
+            
             # 🔥 LSP增强：为top-k定义添加类型信息
             if enable_lsp:
                 await self._enhance_with_lsp(ranked, definitions, repo_path_resolved)
@@ -389,7 +1106,8 @@ class RepoMapTool(BaseTool):
                 ranked,
                 definitions,
                 max_tokens=max_tokens,
-                enable_lsp=enable_lsp
+                enable_lsp=enable_lsp,
+                store=store
             )
             
             # 构建结果
@@ -410,7 +1128,7 @@ class RepoMapTool(BaseTool):
             )
             
             # 🔥 保存到结果级缓存
-            self.map_cache[cache_key] = (result, time.time())
+            self.map_cache.put(cache_key, result, len(repo_map.encode('utf-8')) + 1024)
             
             return result
             
@@ -422,59 +1140,44 @@ class RepoMapTool(BaseTool):
                 error=str(e)
             )
     
-    def _init_cache(self, repo_path: Path):
-        """初始化 diskcache 缓存"""
-        cache_dir = repo_path / ".daoyoucode" / "cache" / "repomap"
-        cache_dir.mkdir(parents=True, exist_ok=True)
-        
-        # 使用 diskcache（自动管理 SQLite）
-        self.file_cache = Cache(str(cache_dir))
-    
     def _make_cache_key(
         self,
         chat_files: List[str],
         mentioned_idents: List[str],
         max_tokens: int
     ) -> Tuple:
-        """生成结果级缓存键"""
-        return (
-            tuple(sorted(chat_files or [])),
-            tuple(sorted(mentioned_idents or [])),
-            max_tokens
-        )
+        """生成结果级缓存键（个性化参数规范化，顺序和大小写不同也能命中）"""
+        return personalization_key(chat_files, mentioned_idents) + (max_tokens,)
     
-    def _check_files_changed(self, repo_path: Path) -> bool:
+    def _snapshot(
+        self,
+        store: RepoSymbolStore
+    ) -> Tuple[Dict[str, List[Dict]], Dict[str, Dict[str, float]], int]:
         """
-        检查文件是否改动（快速检查）
+        共享存储的快照（subtree_only 时只保留当前目录下的文件）
         
-        策略：
-        1. 检查 .git/index 的 mtime（最快）
-        2. 采样检查缓存文件的 mtime（较快）
+        Returns:
+            (definitions, graph, version)
         """
-        if not self.cache_timestamp:
-            return True
+        definitions, graph, version = store.snapshot()
+        if not self.context.subtree_only:
+            return definitions, graph, version
         
-        # 方法1：检查 .git/index 的 mtime（最快）
-        git_index = repo_path / ".git" / "index"
-        if git_index.exists():
-            index_mtime = git_index.stat().st_mtime
-            if index_mtime > self.cache_timestamp:
-                logger.info("🔄 检测到 Git 改动，清除内存缓存")
-                return True
-        
-        # 方法2：采样检查缓存文件的 mtime（较快）
-        if self.definitions_cache:
-            # 采样检查前10个文件
-            sample_files = list(self.definitions_cache.keys())[:10]
-            for file_path in sample_files:
-                full_path = repo_path / file_path
-                if full_path.exists():
-                    file_mtime = full_path.stat().st_mtime
-                    if file_mtime > self.cache_timestamp:
-                        logger.info(f"🔄 检测到文件改动: {file_path}")
-                        return True
-        
-        return False
+        definitions = {
+            path: defs for path, defs in definitions.items()
+            if self.context.should_include_path(path)
+        }
+        graph = {
+            source: {t: w for t, w in targets.items() if t in definitions}
+            for source, targets in graph.items()
+            if source in definitions
+        }
+        return definitions, graph, version
+    
+    def _sync_file_stats(self, store: RepoSymbolStore):
+        """文件级缓存统计来自共享存储"""
+        self.cache_stats['file_hits'] = store.stats['file_hits']
+        self.cache_stats['file_misses'] = store.stats['file_misses']
     
     def _format_cache_stats(self) -> str:
         """格式化缓存统计信息"""
@@ -512,255 +1215,17 @@ class RepoMapTool(BaseTool):
     
     def _scan_repository(self, repo_path: Path) -> Dict[str, List[Dict]]:
         """
-        扫描仓库，提取定义（支持增量更新）
+        扫描仓库，提取定义（通过共享符号存储增量更新）
         
         Returns:
             {file_path: [definition, ...]}
         """
-        definitions, _ = self._scan_repository_incremental(repo_path)
-        return definitions
-    
-    def _scan_repository_incremental(self, repo_path: Path) -> Tuple[Dict[str, List[Dict]], List[str]]:
-        """
-        增量扫描仓库，提取定义
-        
-        Returns:
-            (definitions, changed_files)
-            - definitions: {file_path: [definition, ...]}
-            - changed_files: [改动的文件列表]
-        """
-        definitions = {}
-        changed_files = []
-        unchanged_files = []
-        
-        # 支持的文件扩展名
-        extensions = {".py", ".js", ".ts", ".jsx", ".tsx", ".java", ".go", ".rs"}
-        
-        for file_path in repo_path.rglob("*"):
-            if not file_path.is_file():
-                continue
-            if file_path.suffix not in extensions:
-                continue
-            if self._should_ignore(file_path):
-                continue
-            
-            # 🆕 subtree_only 过滤
-            rel_path_str = str(file_path.relative_to(repo_path))
-            if not self.context.should_include_path(rel_path_str):
-                logger.debug(f"跳过文件（subtree_only）: {rel_path_str}")
-                continue
-            
-            # 检查缓存
-            rel_path = rel_path_str
-            mtime = file_path.stat().st_mtime
-            
-            cached = self._get_cached_definitions(rel_path, mtime)
-            if cached is not None:
-                # 🔥 命中缓存，直接使用
-                definitions[rel_path] = cached
-                unchanged_files.append(rel_path)
-                continue
-            
-            # 🔥 未命中缓存，需要重新解析
-            changed_files.append(rel_path)
-            file_defs = self._parse_file(file_path)
-            definitions[rel_path] = file_defs
-            
-            # 缓存结果
-            self._cache_definitions(rel_path, mtime, file_defs)
-        
-        # 🔥 增量更新日志
-        if changed_files:
-            logger.info(
-                f"🔄 增量更新: {len(changed_files)} 个文件改动, "
-                f"{len(unchanged_files)} 个文件复用缓存"
-            )
-        else:
-            logger.info(f"✅ 全部命中缓存: {len(unchanged_files)} 个文件")
-        
-        return definitions, changed_files
-    
-    def _should_ignore(self, file_path: Path) -> bool:
-        """
-        检查是否应该忽略文件
-        
-        忽略规则：
-        1. 常见的构建和依赖目录
-        2. 读取 .daoyoucodeignore 文件（如果存在）
-        """
-        # 常见的构建和依赖目录
-        common_ignore = {
-            ".git", "node_modules", "__pycache__", ".venv", "venv",
-            "dist", "build", ".next", ".nuxt", "target"
-        }
-        
-        for part in file_path.parts:
-            if part in common_ignore:
-                return True
-        
-        # TODO: 读取 .daoyoucodeignore 文件
-        # 这样用户可以自定义忽略规则，不需要硬编码
-        
-        return False
-    
-    def _get_cached_definitions(self, file_path: str, mtime: float) -> Optional[List[Dict]]:
-        """从缓存获取定义（使用 diskcache）"""
-        val = self.file_cache.get(file_path)
-        
-        if val is not None and val.get("mtime") == mtime:
-            self.cache_stats['file_hits'] += 1
-            return val["data"]
-        
-        self.cache_stats['file_misses'] += 1
-        return None
-    
-    def _cache_definitions(self, file_path: str, mtime: float, definitions: List[Dict]):
-        """缓存定义（使用 diskcache）"""
-        self.file_cache[file_path] = {
-            "mtime": mtime,
-            "data": definitions
-        }
-    
-    def _parse_file(self, file_path: Path) -> List[Dict]:
-        """
-        解析文件，提取定义和引用
-        
-        使用 Tree-sitter 解析（完整实现）
-        """
-        if not TREE_SITTER_AVAILABLE:
-            logger.warning("Tree-sitter 不可用，跳过文件解析")
-            return []
-        
-        # 获取语言
-        lang = filename_to_lang(str(file_path))
-        if not lang:
-            return []
-        
-        try:
-            language = get_language(lang)
-            parser = get_parser(lang)
-        except Exception as err:
-            logger.warning(f"跳过文件 {file_path}: {err}")
-            return []
-        
-        # 获取查询文件
-        query_scm = self._get_scm_fname(lang)
-        if not query_scm or not query_scm.exists():
-            return []
-        
-        query_scm_content = query_scm.read_text()
-        
-        # 读取代码
-        try:
-            code = file_path.read_text(encoding="utf-8", errors="ignore")
-        except Exception as e:
-            logger.warning(f"读取文件失败 {file_path}: {e}")
-            return []
-        
-        if not code:
-            return []
-        
-        # 解析代码
-        tree = parser.parse(bytes(code, "utf-8"))
-        
-        # 运行标签查询
-        try:
-            from tree_sitter import Query, QueryCursor
-            query = Query(language, query_scm_content)
-            cursor = QueryCursor(query)
-            matches = cursor.matches(tree.root_node)
-        except Exception as e:
-            logger.warning(f"查询执行失败 {file_path}: {e}")
-            return []
-        
-        definitions = []
-        saw = set()
-        parent_stack = []  # 🆕 跟踪父级（用于确定方法所属的类）
-        
-        # 处理匹配结果: [(pattern_index, {capture_name: [nodes]})]
-        for pattern_index, captures_dict in matches:
-            for tag, nodes in captures_dict.items():
-                for node in nodes:
-                    if tag.startswith("name.definition."):
-                        kind = "def"
-                    elif tag.startswith("name.reference."):
-                        kind = "ref"
-                    else:
-                        continue
-                    
-                    saw.add(kind)
-                    
-                    # 提取类型（class、function、method等）
-                    type_name = tag.split(".")[-1]
-                    name = node.text.decode("utf-8")
-                    
-                    # 🆕 确定父级和作用域（仅对定义）
-                    parent = None
-                    scope = "global"
-                    
-                    if kind == "def":
-                        # 确定父级
-                        parent = parent_stack[-1] if parent_stack else None
-                        
-                        # 确定作用域
-                        if type_name == "class":
-                            scope = "global"
-                            # 将类名压入栈（用于后续方法）
-                            parent_stack.append(name)
-                        elif type_name in ("function", "method"):
-                            scope = "class" if parent else "global"
-                        else:
-                            scope = "global"
-                    
-                    definitions.append({
-                        "type": type_name,
-                        "name": name,
-                        "line": node.start_point[0] + 1,
-                        "kind": kind,
-                        # 🆕 阶段2新增字段
-                        "parent": parent,
-                        "scope": scope
-                    })
-        
-        # 如果只有定义没有引用，使用 Pygments 补充引用
-        if "ref" not in saw and "def" in saw:
-            try:
-                lexer = guess_lexer_for_filename(str(file_path), code)
-                tokens = list(lexer.get_tokens(code))
-                tokens = [token[1] for token in tokens if token[0] in Token.Name]
-                
-                for token in tokens:
-                    definitions.append({
-                        "type": "reference",
-                        "name": token,
-                        "line": -1,
-                        "kind": "ref"
-                    })
-            except Exception:
-                pass
-        
+        store = get_repo_symbol_store(repo_path)
+        store.refresh()
+        self._sync_file_stats(store)
+        definitions, _, _ = self._snapshot(store)
         return definitions
     
-    def _get_scm_fname(self, lang: str) -> Optional[Path]:
-        """获取 Tree-sitter 查询文件路径"""
-        # 查询文件目录
-        queries_dir = Path(__file__).parent / "queries"
-        
-        # 优先使用 tree-sitter-language-pack
-        if USING_TSL_PACK:
-            subdir = "tree-sitter-language-pack"
-            path = queries_dir / subdir / f"{lang}-tags.scm"
-            if path.exists():
-                return path
-        
-        # 回退到 tree-sitter-languages
-        subdir = "tree-sitter-languages"
-        path = queries_dir / subdir / f"{lang}-tags.scm"
-        if path.exists():
-            return path
-        
-        return None
-    
     def _compute_end_lines(
         self,
         definitions: Dict[str, List[Dict]],
@@ -776,7 +1241,7 @@ class RepoMapTool(BaseTool):
         """
         for file_path, defs in definitions.items():
             # 只处理定义，不处理引用
-            def_only = [d for d in defs if d.get("kind") == "def"]
+            def_only = definition_tags(defs)
             
             if not def_only:
                 continue
@@ -806,331 +1271,113 @@ class RepoMapTool(BaseTool):
         return definitions
 
     
-    def _build_reference_graph(self, definitions: Dict[str, List[Dict]], repo_path: Path) -> Dict[str, Dict[str, float]]:
-        """
-        构建引用图
-        
-        Returns:
-            {node: {referenced_node: weight, ...}}
-        """
-        graph = defaultdict(lambda: defaultdict(float))
-        
-        # 构建标识符到文件的映射（只包含定义）
-        ident_to_files = defaultdict(set)
-        for file_path, defs in definitions.items():
-            for d in defs:
-                # 只添加定义，不添加引用
-                if d.get("kind") == "def":
-                    ident_to_files[d["name"]].add(file_path)
-        
-        # 扫描引用关系
-        for file_path, defs in definitions.items():
-            # 收集文件中的所有引用
-            references_in_file = set()
-            for d in defs:
-                if d.get("kind") == "ref":
-                    references_in_file.add(d["name"])
-            
-            # 为每个引用添加边
-            for ident in references_in_file:
-                if ident in ident_to_files:
-                    # 文件引用了这个标识符
-                    for ref_file in ident_to_files[ident]:
-                        if ref_file != file_path:
-                            # 添加边：file_path -> ref_file
-                            graph[file_path][ref_file] += 1.0
-        
-        return dict(graph)
+    def _parse_file(self, file_path: Path) -> List[Dict]:
+        """解析文件，提取定义和引用（见 parse_file_tags）"""
+        return parse_file_tags(file_path)
     
-    def _update_reference_graph_incremental(
-        self,
-        old_graph: Dict[str, Dict[str, float]],
-        definitions: Dict[str, List[Dict]],
-        changed_files: List[str],
-        repo_path: Path
-    ) -> Dict[str, Dict[str, float]]:
-        """
-        增量更新引用图（只重新计算改动文件的引用关系）
-        
-        Args:
-            old_graph: 旧的引用图
-            definitions: 所有文件的定义
-            changed_files: 改动的文件列表
-            repo_path: 仓库路径
-        
-        Returns:
-            更新后的引用图
-        """
-        # 复制旧图
-        graph = defaultdict(lambda: defaultdict(float))
-        for source, targets in old_graph.items():
-            graph[source] = defaultdict(float, targets)
-        
-        # 🔥 步骤1：删除改动文件的旧引用关系
-        for file in changed_files:
-            # 删除该文件作为源的引用
-            if file in graph:
-                del graph[file]
-            
-            # 删除指向该文件的引用
-            for source in list(graph.keys()):
-                if file in graph[source]:
-                    del graph[source][file]
-                    # 如果源文件没有其他引用，删除该源
-                    if not graph[source]:
-                        del graph[source]
-        
-        # 🔥 步骤2：重新构建标识符映射（只包含改动文件的定义）
-        ident_to_files = defaultdict(set)
-        
-        # 添加所有文件的定义（用于查找引用目标）
-        for file_path, defs in definitions.items():
-            for d in defs:
-                if d.get("kind") == "def":
-                    ident_to_files[d["name"]].add(file_path)
-        
-        # 🔥 步骤3：重新计算改动文件的引用关系
-        for file_path in changed_files:
-            if file_path not in definitions:
-                continue
-            
-            defs = definitions[file_path]
-            
-            # 收集文件中的所有引用
-            references_in_file = set()
-            for d in defs:
-                if d.get("kind") == "ref":
-                    references_in_file.add(d["name"])
-            
-            # 为每个引用添加边
-            for ident in references_in_file:
-                if ident in ident_to_files:
-                    for ref_file in ident_to_files[ident]:
-                        if ref_file != file_path:
-                            graph[file_path][ref_file] += 1.0
-        
-        # 🔥 步骤4：重新计算指向改动文件的引用
-        # 其他文件可能引用了改动文件中的定义
-        changed_idents = set()
-        for file_path in changed_files:
-            if file_path in definitions:
-                for d in definitions[file_path]:
-                    if d.get("kind") == "def":
-                        changed_idents.add(d["name"])
-        
-        # 扫描所有文件，找到引用了改动标识符的文件
-        for file_path, defs in definitions.items():
-            if file_path in changed_files:
-                continue  # 跳过改动文件（已处理）
-            
-            # 收集文件中的引用
-            references_in_file = set()
-            for d in defs:
-                if d.get("kind") == "ref":
-                    references_in_file.add(d["name"])
-            
-            # 检查是否引用了改动的标识符
-            referenced_changed = references_in_file.intersection(changed_idents)
-            if referenced_changed:
-                # 重新计算该文件指向改动文件的引用
-                for ident in referenced_changed:
-                    if ident in ident_to_files:
-                        for ref_file in ident_to_files[ident]:
-                            if ref_file != file_path and ref_file in changed_files:
-                                graph[file_path][ref_file] += 1.0
-        
-        return dict(graph)
+    def _build_reference_graph(self, definitions: Dict[str, List[Dict]], repo_path: Path) -> Dict[str, Dict[str, float]]:
+        """构建引用图（见 build_reference_graph）"""
+        return build_reference_graph(definitions)
     
     def _pagerank(
         self,
         graph: Dict[str, Dict[str, float]],
-        definitions: Dict[str, List[Dict]],  # 添加 definitions 参数
+        definitions: Dict[str, List[Dict]],
         chat_files: List[str],
         mentioned_idents: List[str],
         damping: float = 0.85,
         iterations: int = 20
     ) -> List[Tuple[str, float]]:
-        """
-        PageRank算法排序
-        
-        Args:
-            graph: 引用图
-            chat_files: 对话中的文件（权重×50）
-            mentioned_idents: 提到的标识符（权重×10）
-            damping: 阻尼系数
-            iterations: 迭代次数
-            
-        Returns:
-            [(file_path, score), ...] 按分数降序
-        """
-        # 所有节点
-        nodes = set(graph.keys())
-        for targets in graph.values():
-            nodes.update(targets.keys())
-        
-        if not nodes:
-            return []
-        
-        # 初始化分数
-        scores = {node: 1.0 / len(nodes) for node in nodes}
-        
-        # 个性化权重
-        personalization = {}
-        for node in nodes:
-            weight = 1.0
-            
-            # 对话文件权重×50
-            if node in chat_files:
-                weight *= 50
-            
-            # 提到的标识符权重×10
-            # 检查：1) 路径组件  2) 文件中的定义名称
-            if mentioned_idents:
-                # 检查路径组件（如 agents/llm/timeout）
-                path_components = set(Path(node).parts)
-                basename_with_ext = Path(node).name
-                basename_without_ext = Path(node).stem
-                components_to_check = path_components.union({basename_with_ext, basename_without_ext})
-                
-                # 检查路径是否包含提到的标识符
-                matched_path = components_to_check.intersection(set(ident.lower() for ident in mentioned_idents))
-                if matched_path:
-                    weight *= 10
-                
-                # 检查文件中的定义是否包含提到的标识符
-                if node in definitions:
-                    file_defs = definitions.get(node, [])
-                    def_names = {d['name'].lower() for d in file_defs if d.get('kind') == 'def'}
-                    mentioned_lower = {ident.lower() for ident in mentioned_idents}
-                    
-                    # 精确匹配或部分匹配
-                    if def_names.intersection(mentioned_lower):
-                        weight *= 10
-                    else:
-                        # 部分匹配（如 'timeout' 匹配 'TimeoutError'）
-                        for def_name in def_names:
-                            for ident in mentioned_lower:
-                                if ident in def_name or def_name in ident:
-                                    weight *= 5  # 部分匹配权重较低
-                                    break
-            
-            personalization[node] = weight
-        
-        # 归一化
-        total = sum(personalization.values())
-        personalization = {k: v / total for k, v in personalization.items()}
-        
-        # PageRank迭代
-        for _ in range(iterations):
-            new_scores = {}
-            
-            for node in nodes:
-                # 基础分数（随机跳转）
-                score = (1 - damping) * personalization.get(node, 1.0 / len(nodes))
-                
-                # 来自其他节点的分数
-                for source, targets in graph.items():
-                    if node in targets:
-                        # source -> node
-                        weight = targets[node]
-                        out_weight = sum(targets.values())
-                        score += damping * scores[source] * (weight / out_weight)
-                
-                new_scores[node] = score
-            
-            scores = new_scores
-        
-        # 排序
-        ranked = sorted(scores.items(), key=lambda x: x[1], reverse=True)
-        return ranked
+        """PageRank排序（见 rank_files）"""
+        return rank_files(graph, definitions, chat_files, mentioned_idents, damping, iterations)
     
     def _generate_map(
         self,
-        ranked: List[Tuple[str, float]],
+        ranked: Sequence[Tuple[str, float]],
         definitions: Dict[str, List[Dict]],
         max_tokens: int,
-        enable_lsp: bool = False  # 🔥 新增参数
+        enable_lsp: bool = False,  # 🔥 新增参数
+        store: Optional[RepoSymbolStore] = None
     ) -> str:
         """
         生成代码地图（控制token数量）
         
-        使用二分查找找到最优token数量
+        按排序依次取文件的预渲染行（共享存储中缓存，含 token 前缀和），
+        用前缀和二分选出不超过预算的最长前缀，再按实际 token 数校正
         """
-        lines = []
-        current_tokens = 0
+        header = "# 代码地图 (Top {} 文件)\n"
+        if enable_lsp:
+            header += "# (LSP增强: 包含类型签名和引用计数)\n"
+        budget = max_tokens - count_tokens(header.format(len(ranked)))
         
+        # 1. 按排序收集渲染结果，累计 token 超出预算后不再渲染
+        files: List[RenderedFile] = []
+        totals: List[int] = []
+        running = 0
         for file_path, score in ranked:
-            if file_path not in definitions:
-                continue
-            
-            file_defs = definitions[file_path]
-            if not file_defs:
+            rendered = self._rendered_file(file_path, definitions, enable_lsp, store)
+            if rendered is None:
                 continue
-            
-            # 只包含定义，不包含引用
-            file_defs = [d for d in file_defs if d.get("kind") == "def"]
-            if not file_defs:
-                continue
-            
-            # 标准化路径（确保返回相对于 repo_path 的路径）
-            normalized_path = self.normalize_path(file_path)
-            
-            # 文件头
-            file_line = f"\n{normalized_path}:"
-            file_tokens = len(file_line.split())
-            
-            if current_tokens + file_tokens > max_tokens:
+            files.append(rendered)
+            running += rendered.tokens
+            totals.append(running)
+            if running > budget:
                 break
-            
-            lines.append(file_line)
-            current_tokens += file_tokens
-            
-            # 定义列表
-            for d in file_defs:
-                # 🔥 LSP增强输出：显示类型签名和引用计数
-                has_signature = enable_lsp and d.get('lsp_signature')
-                has_ref_count = enable_lsp and d.get('lsp_ref_count', 0) > 0
-                
-                if has_signature and has_ref_count:
-                    # 完整LSP信息：类型签名 + 引用计数
-                    def_line = f"  {d.get('type', 'unknown')} {d['name']}: {d['lsp_signature']}  # {d['lsp_ref_count']}次引用"
-                elif has_signature:
-                    # 只有类型签名
-                    def_line = f"  {d.get('type', 'unknown')} {d['name']}: {d['lsp_signature']}"
-                elif has_ref_count:
-                    # 只有引用计数
-                    def_line = f"  {d.get('type', 'unknown')} {d['name']} (line {d['line']})  # {d['lsp_ref_count']}次引用"
-                elif enable_lsp and d.get('lsp_verified'):
-                    # LSP验证通过但无额外信息
-                    def_line = f"  {d.get('type', 'unknown')} {d['name']} (line {d['line']}) ✓"
+        
+        # 2. 前缀和二分：完整放入的文件数 + 下一个文件能放入的行数
+        full = bisect_right(totals, budget)
+        lines = [line for rendered in files[:full] for line in rendered.lines]
+        if full < len(files):
+            remaining = budget - (totals[full - 1] if full else 0)
+            partial = bisect_right(files[full].cumulative, remaining)
+            if partial > 1:  # 至少要有一个定义
+                lines.extend(files[full].lines[:partial])
+        
+        # 3. 按实际 token 数校正（计数对拼接不完全可加时二分收缩）
+        result = self._assemble_map(header, lines)
+        if lines and count_tokens(result) > max_tokens:
+            lo, hi = 0, len(lines) - 1
+            while lo < hi:
+                mid = (lo + hi + 1) // 2
+                if count_tokens(self._assemble_map(header, lines[:mid])) <= max_tokens:
+                    lo = mid
                 else:
-                    # 标准格式
-                    def_line = f"  {d.get('type', 'unknown')} {d['name']} (line {d['line']})"
-                
-                def_tokens = len(def_line.split())
-                
-                if current_tokens + def_tokens > max_tokens:
-                    break
-                
-                lines.append(def_line)
-                current_tokens += def_tokens
-            
-            if current_tokens >= max_tokens:
-                break
+                    hi = mid - 1
+            lines = lines[:lo]
+            while lines and lines[-1].startswith("\n"):
+                lines.pop()  # 去掉末尾没有定义的文件头
+            result = self._assemble_map(header, lines)
         
         if not lines:
             return "代码地图为空"
-        
-        # 添加头部
-        file_count = len([l for l in lines if l.startswith('\n')])
-        header = f"# 代码地图 (Top {file_count} 文件)\n"
-        if enable_lsp:
-            header += "# (LSP增强: 包含类型签名和引用计数)\n"
-        return header + "\n".join(lines)
+        return result
+    
+    def _rendered_file(
+        self,
+        file_path: str,
+        definitions: Dict[str, List[Dict]],
+        enable_lsp: bool,
+        store: Optional[RepoSymbolStore]
+    ) -> Optional[RenderedFile]:
+        """文件的渲染结果（带 LSP 信息的文件实时渲染，其余复用共享存储）"""
+        defs = definitions.get(file_path)
+        if not defs:
+            return None
+        if enable_lsp and any(f in d for d in definition_tags(defs) for f in LSP_FIELDS):
+            return render_file(file_path, defs, enable_lsp)
+        if store is not None and store.snapshot()[0].get(file_path) is defs:
+            return store.rendered(file_path)
+        return render_file(file_path, defs)
+    
+    @staticmethod
+    def _assemble_map(header: str, lines: List[str]) -> str:
+        """拼接地图"""
+        file_count = sum(1 for line in lines if line.startswith("\n"))
+        return header.format(file_count) + "\n".join(lines)
     
     async def _enhance_with_lsp(
         self,
-        ranked: List[Tuple[str, float]],
+        ranked: Sequence[Tuple[str, float]],
         definitions: Dict[str, List[Dict]],
         repo_path: Path,
         top_k: int = 50
@@ -1159,7 +1406,7 @@ class RepoMapTool(BaseTool):
                 if file_path not in definitions:
                     continue
                 
-                file_defs = [d for d in definitions[file_path] if d.get("kind") == "def"]
+                file_defs = definition_tags(definitions[file_path])
                 
                 if file_defs:
                     files_to_enhance[file_path] = file_defs
@@ -1488,7 +1735,8 @@ class GetRepoStructureTool(BaseTool):
                 )
             
             lines = [f"{repo_path.name}/"]
-            self._build_tree(repo_path, lines, "", max_depth, show_files, annotate)
+            inventory = get_file_inventory(repo_path)
+            self._build_tree(inventory, "", lines, "", max_depth, show_files, annotate)
             
             return ToolResult(
                 success=True,
@@ -1511,7 +1759,8 @@ class GetRepoStructureTool(BaseTool):
     
     def _build_tree(
         self,
-        path: Path,
+        inventory,
+        rel_dir: str,
         lines: List[str],
         prefix: str,
         max_depth: int,
@@ -1519,38 +1768,40 @@ class GetRepoStructureTool(BaseTool):
         annotate: bool,
         current_depth: int = 0
     ):
-        """递归构建树"""
+        """递归构建树（基于共享文件清单，忽略规则已生效）"""
         if current_depth >= max_depth:
             return
         
-        # 忽略的目录
-        ignore = {".git", "node_modules", "__pycache__", ".venv", "venv", "dist", "build"}
-        
-        try:
-            items = sorted(path.iterdir(), key=lambda x: (not x.is_dir(), x.name))
-        except PermissionError:
+        listing = inventory.list_dir(rel_dir)
+        if listing is None:
             return
+        subdirs, files = listing
         
-        for i, item in enumerate(items):
-            if item.name in ignore:
-                continue
-            
+        items = [(name, True) for name in subdirs]
+        if show_files:
+            items.extend((entry.name, False) for entry in files)
+        
+        for i, (name, is_dir) in enumerate(items):
             is_last = i == len(items) - 1
             current_prefix = "└── " if is_last else "├── "
             next_prefix = prefix + ("    " if is_last else "│   ")
             
-            if item.is_dir():
+            if is_dir:
                 # 添加注释
-                dir_display = f"{item.name}/"
+                dir_display = f"{name}/"
                 if annotate:
-                    annotation = self._get_annotation(item.name)
+                    annotation = self._get_annotation(name)
                     if annotation:
-                        dir_display = f"{item.name}/  # {annotation}"
+                        dir_display = f"{name}/  # {annotation}"
                 
                 lines.append(f"{prefix}{current_prefix}{dir_display}")
-                self._build_tree(item, lines, next_prefix, max_depth, show_files, annotate, current_depth + 1)
-            elif show_files:
-                lines.append(f"{prefix}{current_prefix}{item.name}")
+                child = f"{rel_dir}/{name}" if rel_dir else name
+                self._build_tree(
+                    inventory, child, lines, next_prefix,
+                    max_depth, show_files, annotate, current_depth + 1
+                )
+            else:
+                lines.append(f"{prefix}{current_prefix}{name}")
     
     def _get_annotation(self, dir_name: str) -> Optional[str]:
         """获取目录注释"""
@@ -1591,11 +1842,9 @@ class GetFileSymbolsTool(BaseTool):
                     content=None,
                     error=f"文件不存在或不是文件: {file_path}"
                 )
-            # 复用 RepoMapTool 的解析逻辑
-            repomap = RepoMapTool()
-            repomap._context = self.context
-            defs = repomap._parse_file(path)
-            defs = [d for d in defs if d.get("kind") == "def"]
+            # 复用共享符号存储（文件未改动时不重新解析）
+            defs = get_repo_symbol_store(self.context.repo_path).file_tags(path)
+            defs = definition_tags(defs)
             if not defs:
                 return ToolResult(
                     success=True,
@@ -0,0 +1,96 @@
+"""
+工具 schema 缓存
+
+延迟注册的工具在第一次执行前不导入实现模块。生成 Function Calling schema 时
+优先使用这里缓存的 schema（按实现模块源文件的 mtime/大小校验），
+只有源文件变化或没有缓存时才导入模块重新生成。
+"""
+
+from pathlib import Path
+from typing import Any, Dict, Optional
+import importlib.util
+import json
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+def default_schema_cache_path() -> Path:
+    """默认缓存位置（可用环境变量 DAOYOUCODE_TOOL_SCHEMA_CACHE 覆盖）"""
+    env = os.getenv("DAOYOUCODE_TOOL_SCHEMA_CACHE")
+    if env:
+        return Path(env)
+    return Path.home() / ".daoyoucode" / "cache" / "tool_schemas.json"
+
+
+def module_source_key(module: str) -> Optional[str]:
+    """模块源文件的校验键（不执行模块）"""
+    try:
+        spec = importlib.util.find_spec(module)
+        if spec is None or not spec.origin:
+            return None
+        st = os.stat(spec.origin)
+    except (ImportError, ValueError, OSError):
+        return None
+    return f"{st.st_mtime_ns}:{st.st_size}"
+
+
+class ToolSchemaCache:
+    """工具名 → schema 的持久化缓存"""
+
+    def __init__(self, path: Optional[Path] = None):
+        """
+        Args:
+            path: 缓存文件（None 表示只缓存在内存中）
+        """
+        self.path = path
+        self._entries: Optional[Dict[str, Dict[str, Any]]] = None
+        self._dirty = False
+        self._lock = threading.Lock()
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        if self._entries is None:
+            self._entries = {}
+            if self.path and self.path.exists():
+                try:
+                    data = json.loads(self.path.read_text(encoding="utf-8"))
+                    if isinstance(data, dict):
+                        self._entries = data
+                except (OSError, ValueError) as e:
+                    logger.debug(f"读取工具 schema 缓存失败: {e}")
+        return self._entries
+
+    def get(self, name: str, module: str, class_name: str) -> Optional[Dict[str, Any]]:
+        """获取缓存的 schema（实现模块变化后失效）"""
+        with self._lock:
+            entry = self._load().get(name)
+        if not entry or entry.get("module") != module or entry.get("class") != class_name:
+            return None
+        if entry.get("key") != module_source_key(module):
+            return None
+        return entry.get("schema")
+
+    def put(self, name: str, module: str, class_name: str, schema: Dict[str, Any]):
+        """保存 schema（调用 flush 后写入文件）"""
+        key = module_source_key(module)
+        if key is None:
+            return
+        with self._lock:
+            self._load()[name] = {"module": module, "class": class_name, "key": key, "schema": schema}
+            self._dirty = True
+
+    def flush(self):
+        """把新增的 schema 写入缓存文件"""
+        with self._lock:
+            if not self._dirty or not self.path:
+                return
+            try:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                tmp = self.path.with_suffix(f".{os.getpid()}.tmp")
+                tmp.write_text(json.dumps(self._entries, ensure_ascii=False), encoding="utf-8")
+                os.replace(tmp, self.path)
+                self._dirty = False
+            except OSError as e:
+                logger.debug(f"写入工具 schema 缓存失败: {e}")
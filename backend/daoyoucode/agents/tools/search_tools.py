@@ -1,13 +1,25 @@
 """
 代码搜索工具
 
-提供文本搜索、正则搜索等功能
+提供文本搜索、正则搜索等功能（共享 grep_engine 并行搜索后端）
 """
 
+from contextlib import aclosing
 from pathlib import Path
 from typing import Dict, Any, Optional, List
 import re
 from .base import BaseTool, ToolResult
+from .grep_engine import GrepEngine, GrepQuery, get_grep_engine
+
+
+def _engine_for(tool: BaseTool, path: Path) -> GrepEngine:
+    """仓库内的目录共用仓库根的引擎（共享文件清单缓存），仓库外的目录单独建引擎"""
+    repo_path = tool.context.repo_path
+    try:
+        path.resolve().relative_to(repo_path)
+        return get_grep_engine(repo_path)
+    except ValueError:
+        return get_grep_engine(path)
 
 
 class TextSearchTool(BaseTool):
@@ -53,44 +65,22 @@ class TextSearchTool(BaseTool):
                 )
             
             results = []
-            count = 0
-            
-            # 准备搜索
-            if not case_sensitive:
-                query_lower = query.lower()
-            
-            # 遍历文件
-            for file_path in self._iter_files(path, file_pattern):
-                if count >= max_results:
-                    break
-                
-                try:
-                    with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                        for line_num, line in enumerate(f, 1):
-                            if count >= max_results:
-                                break
-                            
-                            # 搜索
-                            if case_sensitive:
-                                if query in line:
-                                    results.append({
-                                        'file': self.normalize_path(str(file_path)),  # 标准化路径
-                                        'line': line_num,
-                                        'content': line.rstrip(),
-                                        'match': query
-                                    })
-                                    count += 1
-                            else:
-                                if query_lower in line.lower():
-                                    results.append({
-                                        'file': self.normalize_path(str(file_path)),  # 标准化路径
-                                        'line': line_num,
-                                        'content': line.rstrip(),
-                                        'match': query
-                                    })
-                                    count += 1
-                except Exception:
-                    continue
+            engine = _engine_for(self, path)
+            search = engine.search(
+                GrepQuery.text(query, case_sensitive),
+                directory=path,
+                file_pattern=file_pattern,
+                max_results=max_results
+            )
+            async with aclosing(search) as matches:
+                async for m in matches:
+                    results.append({
+                        'file': self.normalize_path(str(m.path)),  # 标准化路径
+                        'line': m.line,
+                        'content': m.content,
+                        'match': query
+                    })
+            count = len(results)
             
             return ToolResult(
                 success=True,
@@ -109,31 +99,6 @@ class TextSearchTool(BaseTool):
                 error=str(e)
             )
     
-    def _iter_files(self, path: Path, pattern: Optional[str]):
-        """迭代文件"""
-        try:
-            for item in path.rglob(pattern or '*'):
-                if item.is_file() and not self._should_ignore(item):
-                    yield item
-        except Exception:
-            pass
-    
-    def _should_ignore(self, path: Path) -> bool:
-        """是否应该忽略"""
-        ignore_dirs = {'.git', '__pycache__', 'node_modules', '.venv', 'venv', 'dist', 'build'}
-        ignore_exts = {'.pyc', '.pyo', '.so', '.dll', '.exe', '.bin'}
-        
-        # 检查路径中是否包含忽略的目录
-        for part in path.parts:
-            if part in ignore_dirs:
-                return True
-        
-        # 检查扩展名
-        if path.suffix in ignore_exts:
-            return True
-        
-        return False
-    
     def get_function_schema(self) -> Dict[str, Any]:
         return {
             "name": self.name,
@@ -202,7 +167,7 @@ class RegexSearchTool(BaseTool):
             max_results: 最大结果数
         """
         try:
-            path = Path(directory)
+            path = self.resolve_path(directory)
             if not path.exists():
                 return ToolResult(
                     success=False,
@@ -212,7 +177,7 @@ class RegexSearchTool(BaseTool):
             
             # 编译正则
             try:
-                regex = re.compile(pattern, flags)
+                grep_query = GrepQuery.regex(pattern, flags)
             except re.error as e:
                 return ToolResult(
                     success=False,
@@ -221,32 +186,23 @@ class RegexSearchTool(BaseTool):
                 )
             
             results = []
-            count = 0
-            
-            # 遍历文件
-            for file_path in self._iter_files(path, file_pattern):
-                if count >= max_results:
-                    break
-                
-                try:
-                    with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                        for line_num, line in enumerate(f, 1):
-                            if count >= max_results:
-                                break
-                            
-                            # 搜索
-                            match = regex.search(line)
-                            if match:
-                                results.append({
-                                    'file': self.normalize_path(str(file_path)),  # 标准化路径
-                                    'line': line_num,
-                                    'content': line.rstrip(),
-                                    'match': match.group(0),
-                                    'groups': match.groups()
-                                })
-                                count += 1
-                except Exception:
-                    continue
+            engine = _engine_for(self, path)
+            search = engine.search(
+                grep_query,
+                directory=path,
+                file_pattern=file_pattern,
+                max_results=max_results
+            )
+            async with aclosing(search) as matches:
+                async for m in matches:
+                    results.append({
+                        'file': self.normalize_path(str(m.path)),  # 标准化路径
+                        'line': m.line,
+                        'content': m.content,
+                        'match': m.match,
+                        'groups': m.groups
+                    })
+            count = len(results)
             
             return ToolResult(
                 success=True,
@@ -265,29 +221,6 @@ class RegexSearchTool(BaseTool):
                 error=str(e)
             )
     
-    def _iter_files(self, path: Path, pattern: Optional[str]):
-        """迭代文件"""
-        try:
-            for item in path.rglob(pattern or '*'):
-                if item.is_file() and not self._should_ignore(item):
-                    yield item
-        except Exception:
-            pass
-    
-    def _should_ignore(self, path: Path) -> bool:
-        """是否应该忽略"""
-        ignore_dirs = {'.git', '__pycache__', 'node_modules', '.venv', 'venv', 'dist', 'build'}
-        ignore_exts = {'.pyc', '.pyo', '.so', '.dll', '.exe', '.bin'}
-        
-        for part in path.parts:
-            if part in ignore_dirs:
-                return True
-        
-        if path.suffix in ignore_exts:
-            return True
-        
-        return False
-    
     def get_function_schema(self) -> Dict[str, Any]:
         return {
             "name": self.name,
@@ -0,0 +1,368 @@
+"""
+符号定义索引（共享服务）
+
+名称 -> 定义位置的持久化索引，供 ContextSelector 等按名称找定义文件，
+不再为每个名称遍历整个仓库、逐个读取文件跑正则：
+- 文件列表和 mtime 来自共享文件清单（FileInventory）
+- 定义优先取 RepoMapTool 已提取的 tree-sitter 标签（同一份 diskcache），
+  没有时用轻量正则提取
+- 增量更新：只重新提取 mtime 变化的文件，删除的文件移出索引
+- 持久化到 .daoyoucode/cache/symbol_index.json，重启后不必重新提取
+"""
+
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+import json
+import logging
+import os
+import re
+import threading
+import time
+
+from .file_inventory import get_file_inventory, REFRESH_INTERVAL
+from .tag_store import TagList, definition_tags
+
+try:
+    from diskcache import Cache
+    DISKCACHE_AVAILABLE = True
+except ImportError:
+    DISKCACHE_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# 与 RepoMapTool 解析的扩展名一致
+SYMBOL_EXTENSIONS = {".py", ".js", ".ts", ".jsx", ".tsx", ".java", ".go", ".rs"}
+
+# 定义类型分组（tree-sitter 标签的 name.definition.<type>）
+FUNCTION_TYPES = {"function", "method"}
+CLASS_TYPES = {"class", "interface"}
+
+INDEX_VERSION = 1
+
+# 正则回退：扩展名 -> [(类型, 模式)]
+_PY_PATTERNS = [
+    ("function", re.compile(r"^[ \t]*(?:async[ \t]+)?def[ \t]+(\w+)[ \t]*\(", re.MULTILINE)),
+    ("class", re.compile(r"^[ \t]*class[ \t]+(\w+)[ \t]*[:(]", re.MULTILINE)),
+]
+_JS_PATTERNS = [
+    ("function", re.compile(r"\bfunction\s*\*?\s*(\w+)\s*\(")),
+    ("class", re.compile(r"\bclass\s+(\w+)\b")),
+]
+_TS_PATTERNS = _JS_PATTERNS + [
+    ("interface", re.compile(r"\binterface\s+(\w+)\b")),
+]
+_REGEX_PATTERNS = {
+    ".py": _PY_PATTERNS,
+    ".js": _JS_PATTERNS,
+    ".jsx": _JS_PATTERNS,
+    ".ts": _TS_PATTERNS,
+    ".tsx": _TS_PATTERNS,
+    ".java": [
+        ("class", re.compile(r"\b(?:class|enum|record)\s+(\w+)\b")),
+        ("interface", re.compile(r"\binterface\s+(\w+)\b")),
+    ],
+    ".go": [
+        ("function", re.compile(r"^func\s+(?:\([^)]*\)\s*)?(\w+)\s*[\[(]", re.MULTILINE)),
+        ("class", re.compile(r"^type\s+(\w+)\s+struct\b", re.MULTILINE)),
+        ("interface", re.compile(r"^type\s+(\w+)\s+interface\b", re.MULTILINE)),
+    ],
+    ".rs": [
+        ("function", re.compile(r"\bfn\s+(\w+)")),
+        ("class", re.compile(r"\b(?:struct|enum)\s+(\w+)")),
+        ("interface", re.compile(r"\btrait\s+(\w+)")),
+    ],
+}
+
+
+@dataclass(frozen=True)
+class SymbolLocation:
+    """一个定义的位置"""
+    path: str       # 相对仓库根，POSIX 分隔符
+    line: int
+    type: str       # function / method / class / interface ...
+
+
+def extract_definitions_regex(path: Union[str, Path], content: str) -> List[Tuple[str, str, int]]:
+    """
+    用正则提取定义（tree-sitter 标签不可用时的回退）
+
+    Returns:
+        [(名称, 类型, 行号), ...]，按出现顺序
+    """
+    patterns = _REGEX_PATTERNS.get(os.path.splitext(str(path))[1].lower())
+    if not patterns:
+        return []
+
+    found = []
+    for type_name, pattern in patterns:
+        for m in pattern.finditer(content):
+            found.append((m.start(1), m.group(1), type_name))
+    found.sort()
+
+    defs = []
+    line, pos = 1, 0
+    for start, name, type_name in found:
+        line += content.count("\n", pos, start)
+        pos = start
+        defs.append((name, type_name, line))
+    return defs
+
+
+class SymbolIndex:
+    """
+    符号定义索引
+
+    使用示例：
+        index = get_symbol_index(Path("/project"))
+        for loc in index.find_definitions("BaseAgent", types=CLASS_TYPES):
+            print(loc.path, loc.line)
+    """
+
+    def __init__(
+        self,
+        root: Path,
+        persist: bool = True,
+        refresh_interval: float = REFRESH_INTERVAL
+    ):
+        """
+        初始化索引（首次查询时才构建）
+
+        Args:
+            root: 仓库根目录
+            persist: 是否持久化到 .daoyoucode/cache/symbol_index.json
+            refresh_interval: 自动刷新的最小间隔（秒）
+        """
+        self.root = Path(root).resolve()
+        self.persist = persist
+        self.refresh_interval = refresh_interval
+        self.index_file = self.root / ".daoyoucode" / "cache" / "symbol_index.json"
+
+        self._lock = threading.RLock()
+        # 相对路径 -> {"mtime_ns", "source", "defs": [[名称, 类型, 行号], ...]}
+        self._files: Dict[str, Dict] = {}
+        # 名称 -> [SymbolLocation]
+        self._by_name: Dict[str, List[SymbolLocation]] = {}
+        self._loaded = False
+        self._dirty = False
+        self._last_refresh = 0.0
+        self._tag_cache = None
+        self._stats = {'refreshes': 0, 'tag_hits': 0, 'regex_parses': 0, 'removed': 0}
+
+    # ========== 查询 ==========
+
+    def find_definitions(
+        self,
+        name: str,
+        types: Optional[Iterable[str]] = None
+    ) -> List[SymbolLocation]:
+        """
+        查找名称的定义位置（按路径排序）
+
+        Args:
+            name: 符号名
+            types: 只保留这些定义类型（如 FUNCTION_TYPES）
+        """
+        with self._lock:
+            self._ensure_fresh()
+            locations = self._by_name.get(name, [])
+            if types is not None:
+                wanted = set(types)
+                locations = [loc for loc in locations if loc.type in wanted]
+            return sorted(locations, key=lambda loc: (loc.path, loc.line))
+
+    def get_file_symbols(self, path: Union[str, Path]) -> List[SymbolLocation]:
+        """获取单个文件中的定义"""
+        rel = Path(path).as_posix()
+        with self._lock:
+            self._ensure_fresh()
+            record = self._files.get(rel)
+            if record is None:
+                return []
+            return [SymbolLocation(rel, line, type_name) for _, type_name, line in record['defs']]
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._ensure_fresh()
+            return len(self._by_name)
+
+    # ========== 更新 ==========
+
+    def refresh(self):
+        """按文件清单增量刷新：只重新提取 mtime 变化的文件"""
+        with self._lock:
+            if not self._loaded:
+                self._load()
+            self._stats['refreshes'] += 1
+
+            seen = set()
+            for entry in get_file_inventory(self.root).files(extensions=SYMBOL_EXTENSIONS):
+                seen.add(entry.path)
+                record = self._files.get(entry.path)
+                if record is not None and record['mtime_ns'] == entry.mtime_ns:
+                    continue
+                self._set_file(entry.path, entry.mtime_ns, *self._extract(entry))
+
+            for rel in [rel for rel in self._files if rel not in seen]:
+                self._remove_file(rel)
+                self._stats['removed'] += 1
+
+            self._last_refresh = time.time()
+            if self._dirty:
+                self._save()
+
+    def update_from_tags(self, path: Union[str, Path], mtime_ns: int, tags: TagList):
+        """
+        用 RepoMapTool 刚解析出的 tree-sitter 标签更新某个文件
+
+        Args:
+            path: 相对仓库根的路径
+            mtime_ns: 解析时文件的 mtime（纳秒）
+            tags: RepoMapTool._parse_file 的结果
+        """
+        rel = Path(path).as_posix()
+        with self._lock:
+            if not self._loaded:
+                self._load()
+            self._set_file(rel, mtime_ns, 'tags', self._defs_from_tags(tags))
+
+    def invalidate(self):
+        """标记索引过期，下次查询时立即刷新"""
+        with self._lock:
+            self._last_refresh = 0.0
+
+    def get_stats(self) -> Dict[str, int]:
+        """获取统计信息"""
+        with self._lock:
+            return {**self._stats, 'files': len(self._files), 'names': len(self._by_name)}
+
+    # ========== 内部方法 ==========
+
+    def _ensure_fresh(self):
+        if not self._loaded or time.time() - self._last_refresh >= self.refresh_interval:
+            self.refresh()
+
+    def _extract(self, entry) -> Tuple[str, List[List]]:
+        """提取单个文件的定义：优先 RepoMap 标签缓存，否则正则"""
+        tags = self._get_cached_tags(entry)
+        if tags is not None:
+            self._stats['tag_hits'] += 1
+            return 'tags', self._defs_from_tags(tags)
+
+        self._stats['regex_parses'] += 1
+        try:
+            content = entry.abs_path.read_text(encoding='utf-8', errors='ignore')
+        except OSError as e:
+            logger.debug(f"无法读取文件 {entry.path}: {e}")
+            return 'regex', []
+        return 'regex', [list(d) for d in extract_definitions_regex(entry.path, content)]
+
+    def _get_cached_tags(self, entry) -> Optional[TagList]:
+        """读取 RepoMapTool 的 diskcache 条目（mtime 一致时才使用）"""
+        if self._tag_cache is None:
+            cache_dir = self.root / ".daoyoucode" / "cache" / "repomap"
+            if not DISKCACHE_AVAILABLE or not cache_dir.is_dir():
+                return None
+            try:
+                self._tag_cache = Cache(str(cache_dir))
+            except Exception as e:
+                logger.debug(f"无法打开 RepoMap 缓存: {e}")
+                return None
+        try:
+            val = self._tag_cache.get(str(Path(entry.path)))
+        except Exception:
+            return None
+        if isinstance(val, dict) and val.get("mtime") == entry.mtime and val.get("data"):
+            return val["data"]
+        return None
+
+    @staticmethod
+    def _defs_from_tags(tags: TagList) -> List[List]:
+        return [
+            [tag["name"], tag.get("type", ""), tag.get("line", 0)]
+            for tag in definition_tags(tags)
+            if tag.get("name")
+        ]
+
+    def _set_file(self, rel: str, mtime_ns: int, source: str, defs: List[List]):
+        if rel in self._files:
+            self._unindex(rel)
+        self._files[rel] = {'mtime_ns': mtime_ns, 'source': source, 'defs': defs}
+        for name, type_name, line in defs:
+            self._by_name.setdefault(name, []).append(SymbolLocation(rel, line, type_name))
+        self._dirty = True
+
+    def _remove_file(self, rel: str):
+        self._unindex(rel)
+        del self._files[rel]
+        self._dirty = True
+
+    def _unindex(self, rel: str):
+        for name in {d[0] for d in self._files[rel]['defs']}:
+            locations = [loc for loc in self._by_name.get(name, []) if loc.path != rel]
+            if locations:
+                self._by_name[name] = locations
+            else:
+                self._by_name.pop(name, None)
+
+    def _load(self):
+        self._loaded = True
+        if not self.persist or not self.index_file.exists():
+            return
+        try:
+            data = json.loads(self.index_file.read_text(encoding='utf-8'))
+        except (OSError, ValueError) as e:
+            logger.debug(f"符号索引文件无效，重新构建: {e}")
+            return
+        if data.get('version') != INDEX_VERSION:
+            return
+        for rel, record in data.get('files', {}).items():
+            self._set_file(rel, record['mtime_ns'], record.get('source', 'regex'), record['defs'])
+        self._dirty = False
+        logger.debug(f"已加载符号索引: {len(self._files)} 文件")
+
+    def _save(self):
+        self._dirty = False
+        if not self.persist:
+            return
+        try:
+            self.index_file.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.index_file.with_suffix('.tmp')
+            tmp.write_text(
+                json.dumps({'version': INDEX_VERSION, 'files': self._files}, ensure_ascii=False),
+                encoding='utf-8'
+            )
+            os.replace(tmp, self.index_file)
+        except OSError as e:
+            logger.debug(f"保存符号索引失败: {e}")
+
+
+# 单例：按仓库根缓存索引
+_indexes: Dict[str, SymbolIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_symbol_index(repo_path: Union[str, Path]) -> SymbolIndex:
+    """获取仓库根对应的符号索引（单例）"""
+    key = str(Path(repo_path).resolve())
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is None:
+            index = SymbolIndex(Path(key))
+            _indexes[key] = index
+        return index
+
+
+def peek_symbol_index(repo_path: Union[str, Path]) -> Optional[SymbolIndex]:
+    """获取已创建的符号索引（没有时不创建）"""
+    with _indexes_lock:
+        return _indexes.get(str(Path(repo_path).resolve()))
+
+
+def invalidate_symbol_indexes(root: Union[str, Path]):
+    """使 root 及其子目录下的所有符号索引在下次查询时立即刷新"""
+    root = Path(root).resolve()
+    with _indexes_lock:
+        indexes = [idx for idx in _indexes.values() if idx.root == root or root in idx.root.parents]
+    for index in indexes:
+        index.invalidate()
@@ -0,0 +1,218 @@
+"""
+紧凑的标签存储
+
+RepoMap 的标签（定义/引用）原来是每个标签一个字典，大仓库里有数百万个，
+Pygments 补充的引用更是每个标识符一个字典，内存动辄上 GB，写入 diskcache 时 pickle 也慢。
+
+FileTags 按列保存单个文件的标签：
+- 字符串表：名称、类型、父级名称去重并 intern，列里只存下标
+- array 列：名称/类型/父级下标、行号、kind 代码
+- 字典视图按需创建并缓存（调用方对视图的修改，如 end_line、lsp_* 字段会保留）；
+  构建引用图、排序、渲染等热路径直接读列，不创建字典
+
+FileTags 实现了只读序列接口，按 List[Dict] 使用的旧代码不用修改。
+"""
+
+from array import array
+from typing import Any, Dict, FrozenSet, Iterable, Iterator, List, Optional, Sequence, Union
+import sys
+
+# kind 代码
+KIND_DEF = 0
+KIND_REF = 1
+_KIND_NAMES = ("def", "ref")
+_KIND_CODES = {"def": KIND_DEF, "ref": KIND_REF}
+
+# parent 列的特殊值
+_NO_PARENT = -1     # parent 为 None
+_NO_FIELDS = -2     # 没有 parent/scope 字段（Pygments 补充的引用）
+
+
+class FileTags(Sequence):
+    """单个文件的标签（列式存储，只读序列，元素是按需创建的字典视图）"""
+
+    __slots__ = (
+        "strings", "names", "types", "lines", "kinds", "parents", "scopes",
+        "_views", "_ref_names"
+    )
+
+    def __init__(
+        self,
+        strings: Sequence[str],
+        names: array,
+        types: array,
+        lines: array,
+        kinds: array,
+        parents: array,
+        scopes: array
+    ):
+        self.strings = tuple(sys.intern(s) for s in strings)
+        self.names = names
+        self.types = types
+        self.lines = lines
+        self.kinds = kinds
+        self.parents = parents
+        self.scopes = scopes
+        self._views: Optional[Dict[int, Dict[str, Any]]] = None
+        self._ref_names: Optional[FrozenSet[str]] = None
+
+    @classmethod
+    def from_dicts(cls, tags: Iterable[Dict[str, Any]]) -> "FileTags":
+        """从 parse_file_tags 产出的字典列表构建"""
+        strings: List[str] = []
+        ids: Dict[str, int] = {}
+
+        def sid(value: str) -> int:
+            index = ids.get(value)
+            if index is None:
+                index = ids[value] = len(strings)
+                strings.append(value)
+            return index
+
+        names, types, parents, scopes = array("l"), array("l"), array("l"), array("l")
+        lines, kinds = array("l"), array("b")
+        for tag in tags:
+            names.append(sid(tag["name"]))
+            types.append(sid(tag.get("type", "unknown")))
+            lines.append(tag.get("line", -1))
+            kinds.append(_KIND_CODES.get(tag.get("kind"), KIND_REF))
+            if "parent" in tag or "scope" in tag:
+                parent = tag.get("parent")
+                parents.append(_NO_PARENT if parent is None else sid(parent))
+                scopes.append(sid(tag.get("scope", "global")))
+            else:
+                parents.append(_NO_FIELDS)
+                scopes.append(_NO_PARENT)
+        return cls(
+            strings, _narrow(names), _narrow(types), _narrow(lines), kinds,
+            _narrow(parents), _narrow(scopes)
+        )
+
+    # ========== 序列接口（字典视图）==========
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._view(i) for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        return self._view(index)
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        for i in range(len(self)):
+            yield self._view(i)
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, FileTags):
+            return self.to_dicts() == other.to_dicts()
+        if isinstance(other, list):
+            return self.to_dicts() == other
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return f"FileTags({len(self)} tags, {len(self.strings)} strings)"
+
+    def _view(self, i: int) -> Dict[str, Any]:
+        views = self._views
+        if views is None:
+            views = self._views = {}
+        view = views.get(i)
+        if view is None:
+            view = views[i] = self._make_dict(i)
+        return view
+
+    def _make_dict(self, i: int) -> Dict[str, Any]:
+        strings = self.strings
+        tag = {
+            "type": strings[self.types[i]],
+            "name": strings[self.names[i]],
+            "line": self.lines[i],
+            "kind": _KIND_NAMES[self.kinds[i]],
+        }
+        parent = self.parents[i]
+        if parent != _NO_FIELDS:
+            tag["parent"] = None if parent == _NO_PARENT else strings[parent]
+            tag["scope"] = strings[self.scopes[i]]
+        return tag
+
+    def to_dicts(self) -> List[Dict[str, Any]]:
+        """新建的字典列表（不含视图上的修改）"""
+        return [self._make_dict(i) for i in range(len(self))]
+
+    # ========== 列访问（不创建字典）==========
+
+    def definitions(self) -> List[Dict[str, Any]]:
+        """定义的字典视图（不为引用创建字典）"""
+        kinds = self.kinds
+        return [self._view(i) for i in range(len(self)) if kinds[i] == KIND_DEF]
+
+    def definition_names(self) -> List[str]:
+        strings, names, kinds = self.strings, self.names, self.kinds
+        return [strings[names[i]] for i in range(len(self)) if kinds[i] == KIND_DEF]
+
+    def reference_names(self) -> FrozenSet[str]:
+        """引用的标识符集合（缓存）"""
+        if self._ref_names is None:
+            strings, names, kinds = self.strings, self.names, self.kinds
+            self._ref_names = frozenset(strings[names[i]] for i in range(len(self)) if kinds[i] == KIND_REF)
+        return self._ref_names
+
+    # ========== pickle（只保存列）==========
+
+    def __reduce__(self):
+        return (
+            FileTags,
+            (self.strings, self.names, self.types, self.lines, self.kinds, self.parents, self.scopes)
+        )
+
+
+# 整数列可用的类型（从小到大）：(typecode, 最小值, 最大值)
+_INT_TYPES = [
+    (code, -(1 << (8 * size - 1)) if code.islower() else 0,
+     (1 << (8 * size - (1 if code.islower() else 0))) - 1)
+    for code, size in (("b", 1), ("B", 1), ("h", 2), ("H", 2), ("i", 4), ("I", 4))
+]
+
+
+def _narrow(column: array) -> array:
+    """换成能容纳所有值的最小整数类型"""
+    if not column:
+        return array("b")
+    low, high = min(column), max(column)
+    for typecode, lo, hi in _INT_TYPES:
+        if lo <= low and high <= hi:
+            return array(typecode, column)
+    return column
+
+
+TagList = Union[FileTags, List[Dict[str, Any]]]
+
+
+def compact_tags(tags: TagList) -> FileTags:
+    """字典列表（或旧缓存格式）转成 FileTags"""
+    return tags if isinstance(tags, FileTags) else FileTags.from_dicts(tags)
+
+
+def definition_tags(tags: TagList) -> List[Dict[str, Any]]:
+    """只取定义（FileTags 不为引用创建字典）"""
+    if isinstance(tags, FileTags):
+        return tags.definitions()
+    return [d for d in tags if d.get("kind") == "def"]
+
+
+def definition_names(tags: TagList) -> List[str]:
+    """定义的名称"""
+    if isinstance(tags, FileTags):
+        return tags.definition_names()
+    return [d["name"] for d in tags if d.get("kind") == "def"]
+
+
+def reference_names(tags: TagList) -> FrozenSet[str]:
+    """引用的标识符集合"""
+    if isinstance(tags, FileTags):
+        return tags.reference_names()
+    return frozenset(d["name"] for d in tags if d.get("kind") == "ref")
@@ -184,7 +184,7 @@ TOOL_METADATA: Dict[str, Dict[str, Any]] = {
         "best_practices": [
             "先用搜索工具找到文件位置",
             "使用相对路径",
-            "大文件会自动截断"
+            "大文件用 offset/limit 按行分页读取"
         ]
     },
     
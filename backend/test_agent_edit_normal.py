@@ -0,0 +1,7 @@
+# 简单测试文件
+
+def hello():
+    print("Hello from Agent!")
+
+if __name__ == "__main__":
+    hello()
@@ -0,0 +1,17 @@
+"""
+测试共用的 fixture
+"""
+
+import pytest
+
+from daoyoucode.agents.tools.base import ToolContext
+
+
+@pytest.fixture
+def make_tool():
+    """创建以 root 为仓库根目录的工具实例：make_tool(ToolClass, root)"""
+    def factory(cls, root):
+        tool = cls()
+        tool.set_context(ToolContext(repo_path=root))
+        return tool
+    return factory
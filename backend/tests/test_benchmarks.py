@@ -0,0 +1,120 @@
+"""
+测试基准框架
+
+验证 LLM/LSP 桩服务回放、计时汇总与结果对比，并用小规模合成仓库跑通部分场景
+"""
+
+import asyncio
+import json
+import sys
+
+import httpx
+
+from benchmarks.cases import BenchEnv, build_benchmarks, STUB_LSP_SCRIPT, DEFAULT_LSP_FIXTURE
+from benchmarks.harness import Benchmark, compare_results, make_report, run_benchmark
+from benchmarks.stub_llm import LLMFixture, StubLLMServer
+from benchmarks.synthetic_repo import generate_repo
+
+
+def test_stub_llm_replays_in_order():
+    fixture = LLMFixture({
+        "default": {"content": "fallback"},
+        "responses": [
+            {"match": {"contains": "intent"}, "repeat": True,
+             "response": {"choices": [{"message": {"content": "{\"intents\": []}"}}]}},
+            {"match": {"functions": True, "last_role": "user"},
+             "response": {"choices": [{"message": {"function_call": {"name": "read_file", "arguments": "{}"}}}]}},
+            {"match": {"functions": True},
+             "response": {"choices": [{"message": {"content": "done"}}]}},
+        ]
+    })
+    with StubLLMServer(fixture) as server:
+        def chat(messages, functions=None):
+            payload = {"model": "qwen-max", "messages": messages}
+            if functions:
+                payload["functions"] = functions
+            resp = httpx.post(f"{server.base_url}/chat/completions", json=payload)
+            resp.raise_for_status()
+            return resp.json()
+
+        funcs = [{"name": "read_file"}]
+        first = chat([{"role": "user", "content": "hi"}], funcs)
+        assert first["choices"][0]["message"]["function_call"]["name"] == "read_file"
+        assert first["usage"]["total_tokens"] > 0
+        second = chat([{"role": "function", "content": "file"}], funcs)
+        assert second["choices"][0]["message"]["content"] == "done"
+        assert chat([{"role": "user", "content": "intent?"}])["choices"][0]["message"]["content"] == "{\"intents\": []}"
+        assert chat([{"role": "user", "content": "intent?"}])["choices"][0]["message"]["content"] == "{\"intents\": []}"
+        assert chat([{"role": "user", "content": "other"}])["choices"][0]["message"]["content"] == "fallback"
+
+        emb = httpx.post(f"{server.base_url}/embeddings", json={"input": ["a b", "a b"]}).json()
+        assert emb["data"][0]["embedding"] == emb["data"][1]["embedding"]
+
+    fixture.reset()
+    assert fixture.requests == []
+
+
+def test_stub_lsp_serves_symbols(tmp_path):
+    """LSPClient 通过 stdio 与桩服务器通信"""
+    from daoyoucode.agents.tools.lsp_tools import LSPClient, LSPServerConfig
+
+    repo = generate_repo(tmp_path / "repo", num_files=2, functions_per_file=2)
+    config = LSPServerConfig(
+        id="stub",
+        command=[sys.executable, str(STUB_LSP_SCRIPT), str(DEFAULT_LSP_FIXTURE)],
+        extensions=[".py"]
+    )
+
+    async def run():
+        client = LSPClient(str(repo.root), config)
+        await client.start()
+        try:
+            await client.initialize()
+            symbols = await client.document_symbols(str(repo.modules[0]))
+            refs = await client.references(str(repo.modules[0]), 10, 4)
+        finally:
+            await client.stop()
+        return symbols, refs
+
+    symbols, refs = asyncio.run(run())
+    service = next(s for s in symbols if s["name"] == "Service0")
+    assert [c["name"] for c in service["children"]] == ["__init__", "handle_0_0", "handle_0_1"]
+    assert refs == []
+
+
+def test_harness_and_compare():
+    calls = []
+    bench = Benchmark("unit.sleepless", "unit", lambda: calls.append(1) or {"n": len(calls)}, repeat=3)
+    loop = asyncio.new_event_loop()
+    try:
+        result = run_benchmark(bench, loop)
+    finally:
+        loop.close()
+    assert result.error is None
+    assert result.repeat == 3 and len(result.times_ms) == 3
+    assert result.peak_alloc_kb is not None
+    assert len(calls) == 5      # 预热 1 + 计时 3 + 内存 1
+
+    report = make_report([result], {"files": 0})
+    json.dumps(report)
+    slower = json.loads(json.dumps(report))
+    slower["results"][0]["median_ms"] = report["results"][0]["median_ms"] * 2 + 1
+    rows = compare_results(report, slower, threshold=0.2)
+    assert rows[0]["status"] == "regression"
+
+
+def test_benchmarks_run_on_small_repo(tmp_path):
+    with BenchEnv(tmp_path, num_files=6, functions_per_file=4, use_lsp=False) as env:
+        benches = build_benchmarks(env, ["search", "diff", "conversation_tree"], repeat=1)
+        results = [run_benchmark(b, env.loop, measure_memory=False) for b in benches]
+
+    assert {r.name for r in results} >= {"search.text", "search.regex", "diff.replace_fuzzy", "conversation_tree.add"}
+    for r in results:
+        assert r.error is None, r.error
+    regex = next(r for r in results if r.name == "search.regex")
+    assert regex.extra["matches"] == 6
+
+
+if __name__ == "__main__":
+    import pytest
+    raise SystemExit(pytest.main([__file__, "-v", "-s"]))
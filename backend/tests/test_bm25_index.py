@@ -0,0 +1,96 @@
+"""
+测试增量BM25索引
+
+验证打分与 rank-bm25 一致，以及对话树每条消息只分词一次
+"""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from daoyoucode.agents.memory.bm25_matcher import BM25Matcher
+from daoyoucode.agents.memory.conversation_tree import ConversationTree
+
+
+HISTORY = [
+    "我家的猫最近不爱吃饭",
+    "猫粮应该怎么选",
+    "",
+    "猫咪需要打疫苗吗",
+    "python 性能优化有什么建议",
+]
+
+
+def test_index_scores_match_rank_bm25():
+    rank_bm25 = pytest.importorskip("rank_bm25")
+    matcher = BM25Matcher()
+    index = matcher.create_index()
+    for text in HISTORY:
+        index.add(text)
+
+    query = matcher._tokenize("猫不吃猫粮怎么办")
+    corpus = [matcher._tokenize(t) for t in HISTORY]
+    corpus = [tokens for tokens in corpus if tokens]
+    expected = rank_bm25.BM25Okapi(corpus).get_scores(query)
+
+    # 无时间戳时权重都为1：平均值/最大值即归一化分数的均值/最大值，再乘实体惩罚
+    lo, hi = expected.min(), expected.max()
+    normalized = (expected - lo) / (hi - lo)
+    history_entities = set()
+    for text in HISTORY:
+        history_entities |= matcher._extract_key_entities(text)
+    penalty = matcher._calculate_entity_penalty(
+        matcher._extract_key_entities("猫不吃猫粮怎么办"), history_entities
+    )
+
+    avg, best = index.similarity("猫不吃猫粮怎么办")
+    assert avg == pytest.approx(normalized.mean() * penalty)
+    assert best == pytest.approx(normalized.max() * penalty)
+
+
+def test_index_matches_calculate_similarity_with_time_decay():
+    matcher = BM25Matcher()
+    now = datetime.now()
+    timestamps = [now - timedelta(seconds=60 * i) for i in range(len(HISTORY))]
+
+    index = matcher.create_index()
+    for text, ts in zip(HISTORY, timestamps):
+        index.add(text, ts)
+
+    for query in ["猫粮推荐", "python 优化", "完全无关的天气话题"]:
+        assert index.similarity(query, now) == pytest.approx(
+            matcher.calculate_similarity(query, HISTORY, timestamps, now)
+        )
+
+
+def test_empty_history_and_query():
+    index = BM25Matcher().create_index()
+    assert index.similarity("猫") == (0.0, 0.0)
+    index.add("猫粮")
+    assert index.similarity("") == (0.0, 0.0)
+
+
+def test_tree_tokenizes_each_message_once(monkeypatch):
+    tree = ConversationTree(enabled=True)
+    calls = []
+    original = tree._bm25_matcher._tokenize
+
+    def counting(text):
+        calls.append(text)
+        return original(text)
+
+    monkeypatch.setattr(tree._bm25_matcher, "_tokenize", counting)
+
+    messages = ["猫粮怎么选", "猫粮怎么选比较好", "猫粮怎么选才健康", "猫粮怎么选最省钱"]
+    for msg in messages:
+        tree.add_conversation(msg, "好的")
+    assert len(tree._branches) == 1
+
+    # 每条消息只分词一次：检测时分词，加入索引时复用
+    assert calls == messages
+    index = tree._branch_indexes[tree._current_branch_id]
+    assert index.size == len(messages) - 1     # 最后一条在下次检测时补入
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-v"]))
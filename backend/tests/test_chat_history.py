@@ -58,7 +58,8 @@ def test_chat_history():
     print(f"✓ 添加对话")
     print()
     
-    # 4. 检查对话历史文件
+    # 4. 检查对话历史文件（先刷新写回队列）
+    memory_manager.flush()
     chat_history_file = memory_manager.storage._chat_history_file
     
     if chat_history_file and chat_history_file.exists():
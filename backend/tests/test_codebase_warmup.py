@@ -0,0 +1,84 @@
+"""
+测试代码库索引后台预热
+
+验证构建在后台线程进行、未就绪时检索回退到关键词且不阻塞事件循环、预取受时间预算限制
+"""
+
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from daoyoucode.agents.executor import _prefetch_semantic_chunks
+from daoyoucode.agents.memory import codebase_index
+from daoyoucode.agents.memory.codebase_warmup import get_index_warmup, start_index_warmup
+from daoyoucode.agents.tools.codebase_search_tool import SemanticCodeSearchTool
+
+
+@pytest.fixture
+def repo(tmp_path):
+    (tmp_path / "pkg").mkdir()
+    (tmp_path / "pkg" / "net.py").write_text(
+        "def retry_request(url, timeout):\n    return url\n"
+    )
+    (tmp_path / "pkg" / "cache.py").write_text("class Cache:\n    timeout = 3\n")
+    (tmp_path / "README.md").write_text("nothing relevant\n")
+    return tmp_path
+
+
+@pytest.fixture
+def gate(monkeypatch):
+    """让索引构建一直停在后台，直到测试放行"""
+    release = threading.Event()
+
+    def slow_build(self, max_file_size, extensions, force, progress):
+        progress("编码向量", 1, 10)
+        release.wait(10)
+        self.chunks = [{"path": "pkg/net.py", "start": 1, "end": 2, "text": "def retry_request"}]
+        return 1
+
+    monkeypatch.setattr(codebase_index.CodebaseIndex, "_build_index", slow_build)
+    yield release
+    release.set()
+
+
+async def test_keyword_search_ranks_by_distinct_words(repo, make_tool):
+    results = await make_tool(SemanticCodeSearchTool, repo).keyword_search(repo, "where is retry_request timeout handled")
+
+    assert [r["path"] for r in results] == ["pkg/net.py", "pkg/cache.py"]
+    assert results[0]["text"].startswith("def retry_request")
+
+
+async def test_search_falls_back_while_index_builds(repo, gate, make_tool):
+    tool = make_tool(SemanticCodeSearchTool, repo)
+
+    start = time.monotonic()
+    result = await tool.execute(query="retry_request", enable_lsp=False)
+
+    # 只短暂等待索引，随后立即回退
+    assert time.monotonic() - start < tool.INDEX_WAIT_SECONDS + 1
+    assert result.success and "关键词检索结果" in result.content
+    assert "pkg/net.py" in result.content
+    assert result.metadata["index_status"]["state"] == "building"
+    assert result.metadata["index_status"]["phase"] == "编码向量"
+
+    # 同一仓库只预热一次
+    warmup = get_index_warmup(repo)
+    assert start_index_warmup(repo) is warmup
+
+    gate.set()
+    assert await warmup.wait(5)
+    assert warmup.status()["chunks"] == 1
+
+
+async def test_prefetch_uses_keywords_until_index_is_ready(repo, gate, make_tool):
+    registry = SimpleNamespace(get_tool=lambda name: make_tool(SemanticCodeSearchTool, repo))
+    context = {}
+
+    start = time.monotonic()
+    await _prefetch_semantic_chunks(registry, "retry_request timeout", context)
+
+    assert time.monotonic() - start < 3
+    assert "pkg/net.py" in context["semantic_code_chunks"]
+    assert get_index_warmup(repo).state in ("pending", "building")
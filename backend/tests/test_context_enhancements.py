@@ -310,21 +310,21 @@ class TestPriorityCalculation:
         assert keys[-1] == '_internal_key'
 
 
-class TestBinarySearch:
-    """测试二分查找"""
+class TestPacking:
+    """测试预算内装箱"""
     
-    def test_binary_search_optimal_vars(self):
-        """测试二分查找最优变量数量"""
+    def test_pack_vars(self):
+        """测试按预算选择变量"""
         manager = ContextManager()
         
         sorted_vars = [
-            ('key1', 'x' * 100, 100),
-            ('key2', 'y' * 100, 50),
-            ('key3', 'z' * 100, 50),
-            ('key4', 'w' * 100, 10)
+            ('key1', 'x' * 300, 100),
+            ('key2', 'y' * 300, 50),
+            ('key3', 'z' * 300, 50),
+            ('key4', 'w' * 300, 10)
         ]
         
-        result = manager._binary_search_optimal_vars(
+        result = manager._pack_vars(
             sorted_vars,
             token_budget=100,
             priority_keys=[]
@@ -0,0 +1,55 @@
+"""
+测试上下文快照的结构共享和变更历史大小限制
+"""
+
+from daoyoucode.agents.core.context import Context, ContextManager
+
+
+def test_snapshots_share_unchanged_values():
+    ctx = Context("s")
+    repo_map = "def main(): ...\n" * 10_000
+    ctx.set("repo_map", repo_map)
+    ctx.set("result", {"files": ["a.py"], "ok": True})
+
+    first = ctx.get_snapshot(ctx.create_snapshot("1"))
+    ctx.set("step", 1)
+    second = ctx.get_snapshot(ctx.create_snapshot("2"))
+
+    # 字符串不复制，未变化的字典在快照之间共享同一份副本
+    assert first.variables["repo_map"] is repo_map
+    assert second.variables["result"] is first.variables["result"]
+    assert first.variables["result"] is not ctx.get("result")
+
+
+def test_rollback_is_exact_after_in_place_mutation():
+    ctx = Context("s")
+    ctx.set("result", {"files": ["a.py"]})
+    snapshot_id = ctx.create_snapshot()
+
+    ctx.get("result")["files"].append("b.py")
+    changed = ctx.get_snapshot(ctx.create_snapshot())
+    assert changed.variables["result"] == {"files": ["a.py", "b.py"]}
+
+    assert ctx.rollback_to_snapshot(snapshot_id)
+    assert ctx.get("result") == {"files": ["a.py"]}
+
+    # 回滚后的修改不影响快照，可以再次回滚
+    ctx.get("result")["files"].append("c.py")
+    assert ctx.rollback_to_snapshot(snapshot_id)
+    assert ctx.get("result") == {"files": ["a.py"]}
+
+
+def test_history_is_bounded_in_bytes():
+    ctx = Context("s", max_history=1000, max_history_bytes=64 * 1024)
+    for i in range(200):
+        ctx.set("file_content", f"{i}" + "x" * 50_000)
+
+    # 大值只保存预览，总大小不超过上限
+    assert ctx._history_bytes <= 64 * 1024
+    assert len(ctx.history) < 200
+    last = ctx.history[-1]
+    assert last.new_value.startswith("199xxx") and "未保存完整值" in last.new_value
+    assert ctx.get("file_content").startswith("199")
+
+    stats = ContextManager().get_stats()
+    assert stats["history_bytes"] == 0
@@ -10,7 +10,6 @@ import tempfile
 import shutil
 
 from daoyoucode.agents.tools.diff_tools import (
-    levenshtein,
     SimpleReplacer,
     LineTrimmedReplacer,
     BlockAnchorReplacer,
@@ -19,6 +18,7 @@ from daoyoucode.agents.tools.diff_tools import (
     replace,
     SearchReplaceTool
 )
+from daoyoucode.agents.tools.fuzzy_match import levenshtein
 
 
 # ========== Levenshtein距离测试 ==========
@@ -0,0 +1,148 @@
+"""
+测试异步 Embedding 客户端
+
+用本地的 OpenAI 格式 /embeddings 桩服务验证：并发 encode 微批合并、相同文本去重、
+持久缓存，以及 find_relevant_history 每轮只发一次请求
+"""
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import asyncio
+import json
+import threading
+
+import pytest
+
+from daoyoucode.agents.memory.embedding_client import AsyncEmbeddingClient, EmbeddingCache
+from daoyoucode.agents.memory.vector_retriever_api import VectorRetrieverAPI
+
+
+def fake_embedding(text):
+    """按关键词出现次数生成的向量，含相同关键词的文本相似"""
+    words = ["python", "bug", "测试", "部署"]
+    return [float(text.count(w)) + 0.01 for w in words]
+
+
+class StubServer:
+    """本地 /embeddings 桩服务（记录每次请求的输入）"""
+
+    def __init__(self):
+        self.requests = []
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                inputs = body["input"] if isinstance(body["input"], list) else [body["input"]]
+                stub.requests.append(inputs)
+                data = json.dumps({
+                    "data": [
+                        {"index": i, "embedding": fake_embedding(text)}
+                        for i, text in reversed(list(enumerate(inputs)))
+                    ]
+                }).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}/v1"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def stub():
+    server = StubServer()
+    yield server
+    server.close()
+
+
+async def test_concurrent_encodes_are_batched_and_deduplicated(stub, tmp_path):
+    client = AsyncEmbeddingClient(stub.url, "stub-model", cache=EmbeddingCache(tmp_path))
+    texts = ["python bug", "部署", "python bug", "测试 测试"]
+
+    vectors = await asyncio.gather(*(client.encode(t) for t in texts))
+
+    assert stub.requests == [["python bug", "部署", "测试 测试"]]
+    assert [list(v) for v in vectors] == [
+        pytest.approx(fake_embedding(t)) for t in texts
+    ]
+    assert client.get_stats()["deduplicated"] == 1
+
+    # 第二次全部命中缓存
+    assert (await client.encode_many(texts))[3] is not None
+    assert len(stub.requests) == 1
+    await client.aclose()
+
+    # 新客户端从磁盘缓存读取
+    client.cache.close()
+    fresh = AsyncEmbeddingClient(stub.url, "stub-model", cache=EmbeddingCache(tmp_path))
+    assert list(await fresh.encode("部署")) == pytest.approx(fake_embedding("部署"))
+    assert len(stub.requests) == 1
+    # 换模型不复用缓存
+    other = AsyncEmbeddingClient(stub.url, "other-model", cache=fresh.cache)
+    await other.encode("部署")
+    assert stub.requests[-1] == ["部署"]
+    await fresh.aclose()
+    await other.aclose()
+    fresh.cache.close()
+
+
+def test_memory_cache_is_bounded(tmp_path):
+    cache = EmbeddingCache(tmp_path, max_memory_entries=2)
+    for key in ("a", "b", "c"):
+        cache.set(key, [1.0, 2.0])
+    cache.get("b")
+    cache.set("d", [3.0])
+
+    assert list(cache._memory) == ["b", "d"]
+    # 淘汰的向量仍从磁盘读取
+    assert list(cache.get("a")) == [1.0, 2.0]
+    assert list(cache._memory) == ["d", "a"]
+    cache.close()
+
+
+async def test_failed_request_returns_none(tmp_path):
+    client = AsyncEmbeddingClient(
+        "http://127.0.0.1:1/v1", "stub-model", cache=EmbeddingCache(tmp_path)
+    )
+    assert await client.encode_many(["a", "b"]) == [None, None]
+    assert client.get_stats()["errors"] == 1
+    await client.aclose()
+    client.cache.close()
+
+
+async def test_find_relevant_history_one_round_trip_per_turn(stub, tmp_path):
+    retriever = VectorRetrieverAPI(
+        provider="custom", base_url=stub.url, model="stub-model",
+        api_key="test", cache_dir=str(tmp_path)
+    )
+    history = [
+        {"user": "python bug 怎么修"},
+        {"user": "部署到服务器"},
+        {"user": ""},
+        {"user": "再看看 python bug"},
+    ]
+
+    first = await retriever.find_relevant_history("python bug 又出现了", history, threshold=0.9)
+    assert [idx for idx, _ in first] == [0, 3]
+    assert len(stub.requests) == 1
+
+    await retriever.find_relevant_history("部署失败", history + [{"user": "python bug 又出现了"}])
+    assert stub.requests[-1] == ["部署失败"]  # 历史全部命中缓存
+
+    # 同步接口共用缓存
+    assert retriever.encode("部署到服务器") is not None
+    assert retriever.encode_batch(["新的 测试", "部署失败"])[1] is not None
+    assert stub.requests[-1] == ["新的 测试"]
+    assert len(stub.requests) == 3
+    await retriever.embedder.aclose()
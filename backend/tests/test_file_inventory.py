@@ -0,0 +1,155 @@
+"""
+测试共享文件清单
+
+验证 .gitignore / .daoyoucodeignore 语义、增量刷新和各工具共用清单
+"""
+
+import asyncio
+import os
+import time
+from pathlib import Path
+
+from daoyoucode.agents.tools import file_io
+from daoyoucode.agents.tools.base import ToolContext
+from daoyoucode.agents.tools.file_inventory import FileInventory, get_file_inventory
+from daoyoucode.agents.tools.file_tools import ListFilesTool
+from daoyoucode.agents.tools.repomap_tools import GetRepoStructureTool
+
+
+def _write(path: Path, content: str = "x\n"):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(content, encoding='utf-8')
+
+
+def _make_repo(root: Path):
+    _write(root / ".gitignore", "*.log\n/secret/\n!keep.log\n")
+    _write(root / "app.py", "print('hi')\n")
+    _write(root / "debug.log")
+    _write(root / "keep.log")
+    _write(root / "secret" / "key.txt")
+    _write(root / "src" / "main.ts")
+    _write(root / "src" / "secret" / "not_root.txt")
+    _write(root / "src" / ".gitignore", "gen/\n*.tmp\n")
+    _write(root / "src" / "gen" / "out.ts")
+    _write(root / "src" / "a.tmp")
+    _write(root / "node_modules" / "lib" / "index.js")
+    _write(root / ".daoyoucodeignore", "docs/drafts/\n")
+    _write(root / "docs" / "drafts" / "wip.md")
+    _write(root / "docs" / "guide.md")
+
+
+def test_ignore_semantics(tmp_path):
+    """根/嵌套 gitignore、否定、锚定、.daoyoucodeignore、默认忽略目录"""
+    _make_repo(tmp_path)
+    inventory = FileInventory(tmp_path)
+
+    paths = {e.path for e in inventory.files()}
+    assert "app.py" in paths
+    assert "keep.log" in paths                  # 否定规则
+    assert "debug.log" not in paths
+    assert "secret/key.txt" not in paths        # /secret/ 只锚定根目录
+    assert "src/secret/not_root.txt" in paths
+    assert "src/main.ts" in paths
+    assert "src/gen/out.ts" not in paths        # 嵌套 .gitignore
+    assert "src/a.tmp" not in paths
+    assert "node_modules/lib/index.js" not in paths
+    assert "docs/drafts/wip.md" not in paths    # .daoyoucodeignore
+    assert "docs/guide.md" in paths
+
+    entry = inventory.get("app.py")
+    assert entry.language == "python"
+    assert entry.size == len("print('hi')\n")
+
+    assert [e.path for e in inventory.files(extensions={".ts"})] == ["src/main.ts"]
+    assert [e.path for e in inventory.files(subdir="docs", pattern="*.md")] == ["docs/guide.md"]
+
+    dirs, files = inventory.list_dir("src")
+    assert dirs == ["secret"]
+    assert [e.name for e in files] == [".gitignore", "main.ts"]
+    assert inventory.list_dir("node_modules") is None
+
+
+def test_incremental_refresh(tmp_path):
+    """新增/删除/修改文件和修改忽略规则后增量刷新"""
+    _make_repo(tmp_path)
+    inventory = FileInventory(tmp_path, refresh_interval=0)
+    assert inventory.get("app.py") is not None
+    builds = inventory.get_stats()['builds']
+
+    # 新文件、删除文件
+    _write(tmp_path / "src" / "new.py")
+    (tmp_path / "docs" / "guide.md").unlink()
+    # 修改文件（目录 mtime 不变）
+    app = tmp_path / "app.py"
+    app.write_text("print('hello world')\n", encoding='utf-8')
+    os.utime(app, ns=(time.time_ns(), time.time_ns() + 10_000_000))
+
+    paths = {e.path for e in inventory.files()}
+    assert "src/new.py" in paths
+    assert "docs/guide.md" not in paths
+    assert inventory.get("app.py").size == len("print('hello world')\n")
+    assert inventory.get_stats()['builds'] == builds
+
+    # 删除整个子目录
+    for p in sorted((tmp_path / "src").rglob("*"), reverse=True):
+        p.unlink() if p.is_file() else p.rmdir()
+    (tmp_path / "src").rmdir()
+    assert not any(e.path.startswith("src/") for e in inventory.files())
+
+    # 忽略规则变化触发重建
+    gitignore = tmp_path / ".gitignore"
+    gitignore.write_text("*.py\n", encoding='utf-8')
+    os.utime(gitignore, ns=(time.time_ns(), time.time_ns() + 20_000_000))
+    paths = {e.path for e in inventory.files()}
+    assert "app.py" not in paths
+    assert "debug.log" in paths
+
+
+def test_tools_share_inventory(tmp_path):
+    """list_files / get_repo_structure 使用共享清单"""
+    _make_repo(tmp_path)
+    context = ToolContext(repo_path=tmp_path)
+
+    async def run():
+        list_tool = ListFilesTool()
+        list_tool.set_context(context)
+        result = await list_tool.execute(directory=".", recursive=True, max_depth=None)
+        assert result.success
+        names = {item['path'].replace("\\", "/") for item in result.content}
+        assert "src/main.ts" in names
+        assert not any("node_modules" in n for n in names)
+        assert "debug.log" not in names
+
+        structure_tool = GetRepoStructureTool()
+        structure_tool.set_context(context)
+        result = await structure_tool.execute(repo_path=str(tmp_path), annotate=False)
+        assert result.success
+        assert "node_modules" not in result.content
+        assert "main.ts" in result.content
+        assert result.content.splitlines()[-1].startswith("└── ")
+
+    asyncio.run(run())
+
+    assert get_file_inventory(tmp_path) is get_file_inventory(str(tmp_path))
+
+
+def test_file_tool_writes_refresh_inventory(tmp_path):
+    """文件工具写入/删除后清单立即可见，不等刷新间隔"""
+    _make_repo(tmp_path)
+    inventory = get_file_inventory(tmp_path)
+    inventory.refresh_interval = 3600
+    assert "src/new.py" not in {e.path for e in inventory.files()}
+
+    async def run():
+        await file_io.write_text(tmp_path / "src" / "new.py", "x = 1\n")
+        assert "src/new.py" in {e.path for e in inventory.files()}
+
+        await file_io.delete_path(tmp_path / "app.py")
+        assert "app.py" not in {e.path for e in inventory.files()}
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    import pytest
+    raise SystemExit(pytest.main([__file__, "-v", "-s"]))
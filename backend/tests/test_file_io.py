@@ -0,0 +1,66 @@
+"""
+测试异步文件I/O
+
+验证批量读写删除在线程池中执行、不阻塞事件循环，结果顺序和消息格式不变
+"""
+
+import asyncio
+import threading
+
+from daoyoucode.agents.tools import file_io
+from daoyoucode.agents.tools.file_tools import (
+    BatchDeleteFilesTool,
+    BatchReadFilesTool,
+    BatchWriteFilesTool,
+)
+
+
+async def test_run_file_io_uses_bounded_pool():
+    name = await file_io.run_file_io(lambda: threading.current_thread().name)
+
+    assert name.startswith("file-io")
+    assert file_io.get_file_io_executor()._max_workers <= file_io.MAX_FILE_IO_WORKERS
+
+
+async def test_batch_read_keeps_event_loop_responsive(tmp_path, make_tool):
+    paths = []
+    for i in range(300):
+        (tmp_path / f"f{i}.txt").write_text(f"content {i}\n")
+        paths.append(f"f{i}.txt")
+
+    ticks = 0
+    done = asyncio.Event()
+
+    async def ticker():
+        nonlocal ticks
+        while not done.is_set():
+            ticks += 1
+            await asyncio.sleep(0)
+
+    task = asyncio.create_task(ticker())
+    result = await make_tool(BatchReadFilesTool, tmp_path).execute(paths + ["missing.txt"])
+    done.set()
+    await task
+
+    assert ticks > 1
+    assert result.metadata["success_count"] == 300
+    assert result.metadata["results"]["f7.txt"] == "content 7\n"
+    assert list(result.metadata["results"]) == paths
+    assert result.content.startswith("✅ 成功读取 300 个文件，1 个失败\n\n📄 f0.txt")
+    assert "  • missing.txt: File not found: missing.txt" in result.content
+
+
+async def test_batch_write_then_delete(tmp_path, make_tool):
+    files = [{"path": f"out/d{i}/x.txt", "content": str(i)} for i in range(20)]
+    result = await make_tool(BatchWriteFilesTool, tmp_path).execute(files, verify=False)
+
+    assert result.success and result.metadata["success_count"] == 20
+    assert (tmp_path / "out" / "d3" / "x.txt").read_text() == "3"
+
+    paths = [f["path"] for f in files] + ["out/nope.txt", "out"]
+    deleted = await make_tool(BatchDeleteFilesTool, tmp_path).execute(paths)
+
+    assert deleted.metadata["deleted_count"] == 20
+    assert deleted.metadata["deleted_files"][0] == "Deleted: out/d0/x.txt"
+    assert deleted.metadata["errors"] == ["Not found: out/nope.txt", "Not a file: out"]
+    assert not (tmp_path / "out" / "d3" / "x.txt").exists()
@@ -0,0 +1,119 @@
+"""
+测试模糊匹配引擎
+
+验证位并行 Levenshtein、提前终止、窗口匹配与逐格/逐窗口计算结果一致
+"""
+
+import random
+
+from daoyoucode.agents.tools.fuzzy_match import (
+    levenshtein,
+    line_offsets,
+    line_span,
+    best_window_match,
+    normalize_whitespace,
+    DistanceCache,
+)
+from daoyoucode.agents.tools.diff_tools import IntelligentDiffEditTool
+
+
+def _reference_levenshtein(a: str, b: str) -> int:
+    """逐格 DP 参考实现"""
+    prev = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        cur = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + cost)
+        prev = cur
+    return prev[-1]
+
+
+def _reference_best_window(content_lines, search_lines, threshold):
+    """逐窗口参考实现"""
+    best = None
+    best_similarity = 0.0
+    m = len(search_lines)
+    for i in range(len(content_lines) - m + 1):
+        total = 0.0
+        for a, b in zip(content_lines[i:i + m], search_lines):
+            a, b = normalize_whitespace(a), normalize_whitespace(b)
+            if a == b:
+                total += 1.0
+            else:
+                total += 1.0 - (_reference_levenshtein(a, b) / max(len(a), len(b)))
+        similarity = total / m
+        if similarity > best_similarity and similarity >= threshold:
+            best_similarity = similarity
+            best = (i, similarity)
+    return best
+
+
+def test_levenshtein_matches_reference():
+    """随机字符串上与 DP 结果一致，上限截断语义正确"""
+    rng = random.Random(42)
+    for _ in range(2000):
+        a = ''.join(rng.choice('ab c_') for _ in range(rng.randint(0, 25)))
+        b = ''.join(rng.choice('ab c_') for _ in range(rng.randint(0, 25)))
+        expected = _reference_levenshtein(a, b)
+        assert levenshtein(a, b) == expected
+
+        limit = rng.randint(0, 10)
+        capped = levenshtein(a, b, limit)
+        assert capped == (expected if expected <= limit else limit + 1)
+
+    # 超过机器字长的长串
+    a = "x" * 150 + "middle" + "y" * 150
+    b = "x" * 149 + "muddle" + "y" * 152
+    assert levenshtein(a, b) == _reference_levenshtein(a, b)
+
+
+def test_distance_cache_reuses_bounds():
+    cache = DistanceCache()
+    assert cache.distance("kitten", "sitting", 1) == 2      # 超限，仅记录下界
+    assert cache.distance("kitten", "sitting", 0) == 1
+    assert cache.distance("kitten", "sitting") == 3
+    assert cache.distance("kitten", "sitting", 2) == 3
+    assert cache.similarity("", "") == 1.0
+
+
+def test_line_offsets_and_span():
+    content = "ab\n\ncde\nf"
+    lines = content.split("\n")
+    offsets = line_offsets(lines)
+    start, end = line_span(offsets, 1, 2)
+    assert content[start:end] == "\ncde"
+    start, end = line_span(offsets, 3, 3)
+    assert content[start:end] == "f"
+
+
+def test_best_window_matches_reference():
+    """窗口剪枝不改变选中的窗口和相似度"""
+    rng = random.Random(7)
+    words = ["x = 1", "return x", "}", "", "if a:", "foo(bar)", "pass", "def f():"]
+    for _ in range(300):
+        content = [rng.choice(words) + rng.choice(["", " ", "z"]) for _ in range(rng.randint(1, 30))]
+        i = rng.randrange(len(content))
+        search = [line + rng.choice(["", "q"]) for line in content[i:i + rng.randint(1, 5)]]
+        threshold = rng.choice([0.0, 0.5, 0.8, 0.95])
+        assert best_window_match(content, search, threshold) == \
+            _reference_best_window(content, search, threshold)
+
+
+def test_find_best_match_char_positions():
+    """IntelligentDiffEditTool 模糊匹配返回正确的字符区间"""
+    lines = [f"    value_{i} = compute(arg_{i}, other)" for i in range(2000)]
+    content = "\n".join(lines)
+    search = "\n".join(line.replace("other", "0ther") for line in lines[1500:1504])
+
+    tool = IntelligentDiffEditTool()
+    start, end, similarity = tool._find_best_match(content, search, True, 0.8)
+    assert content[start:end] == "\n".join(lines[1500:1504])
+    assert 0.9 < similarity < 1.0
+
+    assert tool._find_best_match(content, search, True, 0.999) is None
+
+
+if __name__ == "__main__":
+    import pytest
+    raise SystemExit(pytest.main([__file__, "-v", "-s"]))
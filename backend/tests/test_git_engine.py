@@ -0,0 +1,151 @@
+"""
+测试 git 状态引擎
+
+验证 porcelain v2 解析、按 index/HEAD 失效的状态缓存，
+以及 git_status / git_diff / git_log 工具走异步引擎
+"""
+
+import subprocess
+
+import pytest
+
+from daoyoucode.agents.tools import git_engine
+from daoyoucode.agents.tools.git_engine import GitEngine, get_git_engine
+from daoyoucode.agents.tools.git_tools import GitDiffTool, GitLogTool, GitStatusTool
+
+pytestmark = pytest.mark.skipif(not git_engine.git_available(), reason="需要 git")
+
+
+def git(root, *args):
+    subprocess.run(["git", *args], cwd=root, check=True, capture_output=True)
+
+
+@pytest.fixture
+def repo(tmp_path):
+    git(tmp_path, "init", "-q", "-b", "main")
+    git(tmp_path, "config", "user.name", "Tester")
+    git(tmp_path, "config", "user.email", "tester@example.com")
+    (tmp_path / "a.py").write_text("a = 1\n")
+    (tmp_path / "old name.py").write_text("b = 2\n")
+    git(tmp_path, "add", ".")
+    git(tmp_path, "commit", "-q", "-m", "初始提交")
+    return tmp_path
+
+
+async def test_status_parses_porcelain_v2(repo):
+    (repo / "a.py").write_text("a = 2\n")
+    git(repo, "mv", "old name.py", "new name.py")
+    (repo / "sub").mkdir()
+    (repo / "sub" / "new.txt").write_text("x")
+
+    status = await GitEngine(repo).status()
+
+    assert status.branch == "main"
+    assert [(c.path, c.change_type) for c in status.modified] == [("a.py", "M")]
+    assert [(c.path, c.change_type, c.orig_path) for c in status.staged] == [
+        ("new name.py", "R", "old name.py")
+    ]
+    assert status.untracked == ["sub/new.txt"]
+    assert status.is_dirty
+    assert [c.message for c in status.recent_commits] == ["初始提交"]
+
+
+async def test_status_cache_invalidated_by_index(repo, monkeypatch):
+    monkeypatch.setattr(git_engine, "STATUS_TTL", 3600)
+    engine = GitEngine(repo)
+    notified = []
+    engine.add_change_listener(lambda root, changed: notified.append(changed))
+
+    first = await engine.status()
+    (repo / "a.py").write_text("a = 3\n")
+    assert await engine.status() is first  # 只改工作区：TTL 内使用缓存
+    assert engine.get_stats()["status_hits"] == 1
+
+    git(repo, "add", "a.py")
+    second = await engine.status()
+    assert second is not first
+    assert [c.path for c in second.staged] == ["a.py"]
+    assert notified == [{"a.py"}]
+
+    engine.invalidate()
+    assert (await engine.status()) is not second
+    assert len(notified) == 1  # 变化集合没变
+
+
+async def test_git_tools_use_engine(repo, make_tool):
+    (repo / "a.py").write_text("a = 42\n")
+    subdir = repo / "sub"
+    subdir.mkdir()
+
+    status = await make_tool(GitStatusTool, repo).execute()
+    assert status.success
+    assert status.metadata["modified_files"] == [{"path": "a.py", "change_type": "M"}]
+    assert status.metadata["is_dirty"]
+
+    diff = await make_tool(GitDiffTool, subdir).execute(file_path="../a.py")
+    assert diff.success and "+a = 42" in diff.content
+    staged = await make_tool(GitDiffTool, repo).execute(staged=True)
+    assert staged.content == "No changes"
+
+    log = await make_tool(GitLogTool, repo).execute(max_count=3)
+    assert log.success and log.metadata["commits"][0]["message"] == "初始提交"
+
+    assert get_git_engine(subdir).root == repo.resolve()
+    assert get_git_engine(repo.parent) is None or get_git_engine(repo.parent).root != repo
+
+
+async def test_commit_refreshes_codebase_index(repo, monkeypatch):
+    from daoyoucode.agents.memory import codebase_index, codebase_warmup
+
+    monkeypatch.setattr(codebase_index, "_index_cache", {})
+    index = codebase_index.CodebaseIndex.get_index(repo)
+    index.chunks = [
+        {"path": "a.py", "start": 1, "end": 1, "text": "a = 1\n"},
+        {"path": "old name.py", "start": 1, "end": 1, "text": "b = 2\n"},
+    ]
+    index._built = True
+
+    engine = GitEngine(repo)
+    await engine.status()
+    (repo / "a.py").write_text("def fresh():\n    return 2\n")
+    git(repo, "commit", "-q", "-am", "改 a")
+    await engine.status()   # HEAD 变化：a.py 在两个提交间不同
+
+    codebase_warmup._executor.submit(lambda: None).result(timeout=10)  # 等后台刷新
+    texts = [c["text"] for c in index.chunks if c["path"] == "a.py"]
+    assert texts and "def fresh" in texts[0] and not index.is_stale
+    assert any(c["path"] == "old name.py" for c in index.chunks)  # 其他文件保留
+
+
+def test_refreshed_chunks_keep_index_structure(repo, monkeypatch):
+    """刷新的 chunk 与全量构建的结构一致，混合索引上的引用扩展不报错"""
+    from daoyoucode.agents.memory import codebase_index
+
+    monkeypatch.setattr(codebase_index, "_index_cache", {})
+    index = codebase_index.CodebaseIndex.get_index(repo)
+    index.chunks = [{
+        "path": "b.py", "start": 1, "end": 2, "text": "def caller():\n    fresh()\n",
+        "type": "function", "name": "caller", "pagerank_score": 0.5,
+        "calls": ["fresh"], "called_by": ["a.py"],
+    }]
+    index._built = True
+    (repo / "a.py").write_text("def fresh():\n    return 2\n")
+
+    # 有定义时按 AST 路径分块
+    definitions = {"a.py": [{"kind": "def", "type": "function", "name": "fresh", "line": 1, "end_line": 2}]}
+    monkeypatch.setattr(index, "_parse_structure", lambda: (definitions, {}, {"a.py": 0.2}))
+    index.mark_stale(["a.py"])
+    index.build_index()
+    fresh = next(c for c in index.chunks if c["path"] == "a.py")
+    assert (fresh["type"], fresh["name"], fresh["pagerank_score"]) == ("function", "fresh", 0.2)
+
+    expanded = index._expand_by_references(index.chunks[:1])
+    assert [c["path"] for c in expanded] == ["b.py", "a.py"]
+
+    # 解析不到定义时按行分块，同样带齐元数据字段
+    monkeypatch.setattr(index, "_parse_structure", lambda: ({}, {}, {}))
+    index.mark_stale(["a.py"])
+    index.build_index()
+    plain = next(c for c in index.chunks if c["path"] == "a.py")
+    assert plain["name"] == "" and plain["calls"] == [] and plain["type"] == "block"
+    assert index._expand_by_references(index.chunks[:1])[0]["path"] == "b.py"
@@ -0,0 +1,144 @@
+"""
+测试并行 grep 引擎
+
+验证整块搜索与逐行语义一致、gitignore/二进制过滤、trigram 剪枝和流式提前停止
+"""
+
+import asyncio
+from pathlib import Path
+
+from daoyoucode.agents.tools.base import ToolContext
+from daoyoucode.agents.tools import grep_engine
+from daoyoucode.agents.tools.grep_engine import GrepEngine, GrepQuery, find_in_text, get_grep_engine
+from daoyoucode.agents.tools.search_tools import TextSearchTool, RegexSearchTool
+
+
+def _make_repo(root: Path):
+    (root / "src").mkdir()
+    (root / "src" / "app.py").write_text(
+        "import os\n"
+        "def hello():\n"
+        "    return 'Hello World'\n"
+        "# TODO: hello again hello\n",
+        encoding='utf-8'
+    )
+    (root / "src" / "util.js").write_text("function hello() {}\n", encoding='utf-8')
+    (root / "logs").mkdir()
+    (root / "logs" / "run.log").write_text("hello from log\n", encoding='utf-8')
+    (root / "data.bin.txt").write_bytes(b"hello\x00\x01\x02binary")
+    (root / ".gitignore").write_text("logs/\n", encoding='utf-8')
+
+
+def test_find_in_text_matches_line_semantics():
+    """整块搜索：每行一条、行号正确、不跨行匹配"""
+    text = "alpha\nbeta gamma beta\n\nbeta\n"
+    query = GrepQuery.regex(r"beta")
+    matches = find_in_text(Path("x"), text, query, limit=10)
+    assert [(m.line, m.content) for m in matches] == [(2, "beta gamma beta"), (4, "beta")]
+
+    # \s+ 在整块中可以跨越换行，但逐行语义下 "alpha\nbeta" 不应算作命中
+    query = GrepQuery.regex(r"a\s+b")
+    assert find_in_text(Path("x"), "alpha\nbeta\n", query, limit=10) == []
+
+    # ^ / $ 按行生效
+    query = GrepQuery.regex(r"^beta$")
+    assert [m.line for m in find_in_text(Path("x"), text, query, limit=10)] == [4]
+
+    # 分组
+    query = GrepQuery.regex(r"(g\w+)")
+    assert find_in_text(Path("x"), text, query, limit=10)[0].groups == ("gamma",)
+
+
+def test_engine_filters_and_patterns(tmp_path):
+    """gitignore、二进制嗅探、文件名模式"""
+    _make_repo(tmp_path)
+    engine = GrepEngine(tmp_path, max_workers=2)
+
+    files = {str(p.relative_to(tmp_path)).replace("\\", "/") for p, _, _ in engine.list_files()}
+    assert "logs/run.log" not in files
+    assert "src/app.py" in files
+
+    matches = list(engine.iter_matches(GrepQuery.text("hello"), tmp_path, None, 100))
+    paths = {m.path.name for m in matches}
+    assert paths == {"app.py", "util.js"}
+
+    matches = list(engine.iter_matches(GrepQuery.text("hello"), tmp_path, "*.py", 100))
+    assert [m.line for m in matches] == [2, 3, 4]
+
+    # 大小写
+    matches = list(engine.iter_matches(GrepQuery.text("Hello", case_sensitive=True), tmp_path, None, 100))
+    assert [m.line for m in matches] == [3]
+
+
+def test_trigram_index_prunes_files(tmp_path):
+    """trigram 索引在第二次查询时排除不可能命中的文件"""
+    _make_repo(tmp_path)
+    engine = GrepEngine(tmp_path, max_workers=2, use_trigram_index=True)
+
+    list(engine.iter_matches(GrepQuery.text("hello"), tmp_path, None, 100))
+    assert len(engine.trigram_index) >= 2
+
+    candidates = engine._prune(engine.list_files(), GrepQuery.text("function"))
+    assert [p.name for p, _, _ in candidates] == ["util.js"]
+
+    matches = list(engine.iter_matches(GrepQuery.text("FUNCTION"), tmp_path, None, 100))
+    assert [m.path.name for m in matches] == ["util.js"]
+
+
+def test_max_results_stops_early(tmp_path):
+    """达到上限后停止"""
+    for i in range(30):
+        (tmp_path / f"f{i:02d}.txt").write_text("needle\nneedle\n", encoding='utf-8')
+    engine = GrepEngine(tmp_path, max_workers=4)
+
+    matches = list(engine.iter_matches(GrepQuery.text("needle"), tmp_path, None, 5))
+    assert len(matches) == 5
+    # 顺序确定：按路径排序
+    assert [m.path.name for m in matches] == ["f00.txt", "f00.txt", "f01.txt", "f01.txt", "f02.txt"]
+
+
+def test_search_tools_use_engine(tmp_path):
+    """text_search / regex_search 通过引擎返回相对路径"""
+    _make_repo(tmp_path)
+    context = ToolContext(repo_path=tmp_path)
+
+    async def run():
+        text_tool = TextSearchTool()
+        text_tool.set_context(context)
+        result = await text_tool.execute(query="hello", directory="src", max_results=2)
+        assert result.success
+        assert result.metadata['truncated'] is True
+        assert [r['file'].replace("\\", "/") for r in result.content] == ["src/app.py", "src/app.py"]
+
+        regex_tool = RegexSearchTool()
+        regex_tool.set_context(context)
+        result = await regex_tool.execute(pattern=r"def (\w+)", directory=".")
+        assert result.success
+        assert result.content[0]['groups'] == ("hello",)
+
+        result = await regex_tool.execute(pattern="(", directory=".")
+        assert not result.success
+
+    asyncio.run(run())
+
+
+def test_engine_cache_is_bounded(tmp_path, monkeypatch):
+    """引擎按 LRU 淘汰，所有引擎共用一个扫描线程池"""
+    monkeypatch.setattr(grep_engine, "_engines", grep_engine.OrderedDict())
+    monkeypatch.setattr(grep_engine, "MAX_CACHED_ENGINES", 2)
+    roots = [tmp_path / name for name in ("a", "b", "c")]
+    for root in roots:
+        root.mkdir()
+
+    first = get_grep_engine(roots[0])
+    get_grep_engine(roots[1])
+    assert get_grep_engine(roots[0]) is first
+    get_grep_engine(roots[2])
+
+    assert list(grep_engine._engines) == [str(roots[0].resolve()), str(roots[2].resolve())]
+    assert all(e._executor is grep_engine.get_grep_executor() for e in grep_engine._engines.values())
+
+
+if __name__ == "__main__":
+    import pytest
+    raise SystemExit(pytest.main([__file__, "-v", "-s"]))
@@ -0,0 +1,73 @@
+"""
+测试工具延迟注册
+
+验证导入 agents 包时不导入工具实现、schema 从缓存读取、首次执行时才加载工具
+"""
+
+import json
+import subprocess
+import sys
+
+from daoyoucode.agents.tools.base import ToolRegistry
+from daoyoucode.agents.tools.schema_cache import ToolSchemaCache
+
+FILE_TOOLS = "daoyoucode.agents.tools.file_tools"
+
+
+def make_registry(tmp_path):
+    registry = ToolRegistry(ToolSchemaCache(tmp_path / "schemas.json"))
+    registry.register_lazy("read_file", FILE_TOOLS, "ReadFileTool")
+    registry.register_lazy("broken", "daoyoucode.agents.tools.no_such_module", "Nope")
+    return registry
+
+
+def test_import_does_not_load_tool_modules():
+    code = (
+        "import sys, json\n"
+        "import daoyoucode.agents\n"
+        "from daoyoucode.agents.tools import get_tool_registry\n"
+        "heavy = [m for m in ('lsp_tools', 'repomap_tools', 'git_tools', 'ast_tools', 'file_tools')\n"
+        "         if 'daoyoucode.agents.tools.' + m in sys.modules]\n"
+        "print(json.dumps({'heavy': heavy, 'tools': get_tool_registry().list_tools()}))\n"
+    )
+    out = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    ).stdout
+    result = json.loads(out.strip().splitlines()[-1])
+
+    assert result["heavy"] == []
+    assert {"repo_map", "lsp_symbols", "git_status", "read_file"} <= set(result["tools"])
+
+
+def test_schema_cached_across_registries(tmp_path):
+    first = make_registry(tmp_path)
+    schema = first.get_function_schemas(["read_file"])[0]
+
+    assert schema["name"] == "read_file"
+    assert "offset" in schema["parameters"]["properties"]
+    assert first.is_loaded("read_file")
+
+    second = make_registry(tmp_path)
+    assert second.get_function_schemas(["read_file"]) == [schema]
+    assert not second.is_loaded("read_file")
+
+
+async def test_tool_loaded_on_first_execution(tmp_path):
+    (tmp_path / "a.txt").write_text("hello")
+    registry = make_registry(tmp_path)
+    registry.set_working_directory(str(tmp_path))
+
+    assert not registry.is_loaded("read_file")
+    result = await registry.execute_tool("read_file", file_path="a.txt")
+
+    assert result.success and result.content == "hello"
+    assert registry.is_loaded("read_file")
+
+
+def test_broken_lazy_tool_is_dropped(tmp_path):
+    registry = make_registry(tmp_path)
+
+    assert "broken" in registry.list_tools()
+    assert registry.get_tool("broken") is None
+    assert "broken" not in registry.list_tools()
+    assert registry.filter_tool_names(["broken", "read_file"]) == ["read_file"]
@@ -0,0 +1,76 @@
+"""
+测试LSP增强检索的符号批量获取
+
+验证候选按文件分组、每个文件只请求一次 documentSymbol、按内容哈希跨查询缓存
+"""
+
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from daoyoucode.agents.memory.codebase_index_lsp_enhanced import LSPEnhancedCodebaseIndex
+from daoyoucode.agents.tools import lsp_tools
+
+
+class FakeManager:
+    def find_server_for_extension(self, ext):
+        return SimpleNamespace(id="fake-lsp") if ext == ".py" else None
+
+    def is_server_installed(self, config):
+        return True
+
+
+@pytest.fixture
+def lsp_requests(monkeypatch):
+    calls = []
+
+    async def fake_with_lsp_client(file_path, callback):
+        calls.append(file_path)
+        await asyncio.sleep(0.2)
+        return [
+            {"name": "f", "kind": 12, "detail": "(x: int) -> int",
+             "range": {"start": {"line": 0}, "end": {"line": 1}}},
+            {"name": "g", "kind": 12, "detail": "",
+             "range": {"start": {"line": 10}, "end": {"line": 12}}},
+        ]
+
+    monkeypatch.setattr(lsp_tools, "get_lsp_manager", FakeManager)
+    monkeypatch.setattr(lsp_tools, "with_lsp_client", fake_with_lsp_client)
+    return calls
+
+
+def candidates():
+    return [
+        {"path": "a.py", "start": 0, "end": 2, "hybrid_score": 1.0},
+        {"path": "a.py", "start": 10, "end": 12, "hybrid_score": 0.9},
+        {"path": "b.py", "start": 0, "end": 2, "hybrid_score": 0.8},
+        {"path": "c.md", "start": 0, "end": 2, "hybrid_score": 0.7},
+    ]
+
+
+async def test_one_request_per_file_and_cached_by_content(tmp_path, lsp_requests):
+    (tmp_path / "a.py").write_text("def f(x: int) -> int:\n    return x\n")
+    (tmp_path / "b.py").write_text("def f(x: int) -> int:\n    return x\n")
+    (tmp_path / "c.md").write_text("# doc\n")
+    index = LSPEnhancedCodebaseIndex(tmp_path)
+
+    start = time.monotonic()
+    enhanced = await index._enhance_with_lsp(candidates(), "int function")
+    # 两个文件并发请求
+    assert time.monotonic() - start < 0.39
+    assert sorted(lsp_requests) == [str(tmp_path / "a.py"), str(tmp_path / "b.py")]
+
+    assert [c["symbol_count"] for c in enhanced] == [1, 1, 1, 0]
+    assert enhanced[0]["has_type_annotations"] and not enhanced[1]["has_type_annotations"]
+    assert not enhanced[3]["has_lsp_info"]
+
+    # 文件未变：直接使用缓存
+    await index._enhance_with_lsp(candidates(), "int function")
+    assert len(lsp_requests) == 2
+
+    # 内容变化：只重新请求变化的文件
+    (tmp_path / "b.py").write_text("def g():\n    pass\n")
+    await index._enhance_with_lsp(candidates(), "int function")
+    assert lsp_requests[2:] == [str(tmp_path / "b.py")]
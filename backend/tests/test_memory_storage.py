@@ -81,6 +81,9 @@ def test_basic_storage():
     )
     print(f"✓ 添加对话")
     
+    # 对话历史经写回队列异步落盘，检查前先刷新
+    storage.flush()
+    
     # 检查对话历史文件
     if storage._chat_history_file and storage._chat_history_file.exists():
         print(f"✓ 对话历史文件已创建: {storage._chat_history_file}")
@@ -0,0 +1,196 @@
+"""
+测试轮后任务流水线
+
+验证合并去重、并发上限、失败重试、持久化恢复，以及 Agent 不再等待后台任务；
+任务在流水线自己的后台线程上执行，主循环不运行时也有进展
+"""
+
+import asyncio
+import threading
+import time
+from unittest.mock import MagicMock
+
+from daoyoucode.agents.memory.post_turn import PostTurnPipeline, PostTurnJob
+
+
+class FakeLongTermMemory:
+    def __init__(self, delay=0.0, fail_times=0):
+        self.delay = delay
+        self.fail_times = fail_times
+        self.calls = []
+        self.active = 0
+        self.max_active = 0
+
+    async def _work(self, kind, target):
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        try:
+            await asyncio.sleep(self.delay)
+            self.calls.append((kind, target))
+            if self.fail_times > 0:
+                self.fail_times -= 1
+                return None
+            return kind
+        finally:
+            self.active -= 1
+
+    async def generate_summary(self, session_id, history, llm_client):
+        return await self._work('summary', session_id) or ""
+
+    async def build_user_profile(self, user_id, all_sessions=None, llm_client=None):
+        await self._work('profile', user_id)
+        return {"common_topics": []}
+
+
+class FakeStorage:
+    def __init__(self, jobs=None):
+        self.jobs = list(jobs or [])
+
+    def save_post_turn_jobs(self, jobs):
+        self.jobs = list(jobs)
+
+    def get_post_turn_jobs(self):
+        return list(self.jobs)
+
+
+class FakeMemory:
+    def __init__(self, ltm, storage=None):
+        self.long_term_memory = ltm
+        self.storage = storage or FakeStorage()
+
+    def get_conversation_history(self, session_id):
+        return [{"user": "q", "ai": "a"}]
+
+    def get_user_sessions(self, user_id):
+        return ["s1"]
+
+
+def make_pipeline(ltm, storage=None, **kwargs):
+    return PostTurnPipeline(
+        FakeMemory(ltm, storage),
+        client_factory=lambda model: MagicMock(model=model),
+        **kwargs
+    )
+
+
+async def test_submit_returns_immediately_and_coalesces():
+    ltm = FakeLongTermMemory(delay=0.05)
+    pipeline = make_pipeline(ltm)
+
+    assert pipeline.submit('summary', 's1', model='m') is True
+    assert pipeline.submit('profile', 'u1', model='m') is True
+    assert ltm.calls == []
+
+    assert await pipeline.drain(timeout=5)
+    assert sorted(ltm.calls) == [('profile', 'u1'), ('summary', 's1')]
+    stats = pipeline.get_stats()
+    assert stats['completed'] == 2
+    assert stats['pending'] == 0 and stats['running'] == 0
+
+
+def test_submit_coalesces_pending_job():
+    ltm = FakeLongTermMemory(delay=0.2)
+    pipeline = make_pipeline(ltm, max_concurrency=1)
+    pipeline.submit('summary', 's1', model='m')
+    pipeline.submit('summary', 's2', model='m')     # s1 执行时 s2 在队列中等待
+    time.sleep(0.05)
+    assert pipeline.submit('summary', 's2', model='m2') is False
+    assert pipeline.wait(timeout=5)
+    assert ltm.calls == [('summary', 's1'), ('summary', 's2')]
+    assert pipeline.get_stats()['coalesced'] == 1
+
+
+def test_jobs_progress_without_caller_loop():
+    """CLI 在两轮之间不运行事件循环：任务仍在后台线程完成"""
+    ltm = FakeLongTermMemory(delay=0.01)
+    pipeline = make_pipeline(ltm)
+    pipeline.submit('summary', 's1', model='m')     # 没有运行中的事件循环
+    assert pipeline.wait(timeout=5)
+    assert ltm.calls == [('summary', 's1')]
+    assert pipeline._thread is not threading.current_thread() and pipeline._thread.daemon
+
+
+async def test_same_key_runs_serially_and_reruns_after_new_submit():
+    ltm = FakeLongTermMemory(delay=0.05)
+    pipeline = make_pipeline(ltm, max_concurrency=4)
+
+    pipeline.submit('summary', 's1', model='m')
+    await asyncio.sleep(0.02)          # 第一次正在执行
+    pipeline.submit('summary', 's1', model='m')
+    assert await pipeline.drain(timeout=5)
+
+    assert ltm.calls == [('summary', 's1'), ('summary', 's1')]
+    assert ltm.max_active == 1
+
+
+async def test_bounded_concurrency():
+    ltm = FakeLongTermMemory(delay=0.03)
+    pipeline = make_pipeline(ltm, max_concurrency=2)
+    for i in range(6):
+        pipeline.submit('summary', f's{i}', model='m')
+    assert await pipeline.drain(timeout=5)
+    assert len(ltm.calls) == 6
+    assert ltm.max_active == 2
+
+
+async def test_retry_then_give_up():
+    ltm = FakeLongTermMemory(fail_times=1)
+    pipeline = make_pipeline(ltm, retry_delay=0.01)
+    pipeline.submit('summary', 's1', model='m')
+    assert await pipeline.drain(timeout=5)
+    assert len(ltm.calls) == 2
+    assert pipeline.get_stats()['retried'] == 1
+
+    ltm = FakeLongTermMemory(fail_times=10)
+    pipeline = make_pipeline(ltm, retry_delay=0.01, max_attempts=3)
+    pipeline.submit('summary', 's1', model='m')
+    assert await pipeline.drain(timeout=5)
+    assert len(ltm.calls) == 3
+    assert pipeline.get_stats()['failed'] == 1
+
+
+async def test_pending_jobs_are_persisted_and_restored():
+    storage = FakeStorage()
+    pipeline = make_pipeline(FakeLongTermMemory(delay=1), storage=storage)
+    pipeline.submit('profile', 'u1', model='m')   # 执行之前已记录
+    pipeline.submit('summary', 's1', model='m')   # 依赖内存中的历史，不记录
+    assert [(j['kind'], j['target']) for j in storage.jobs] == [('profile', 'u1')]
+
+    # 模拟进程退出后重启：恢复的任务立即在后台开始执行
+    ltm = FakeLongTermMemory()
+    restored = make_pipeline(ltm, storage=FakeStorage(storage.jobs))
+    assert await restored.drain(timeout=5)
+    assert ltm.calls == [('profile', 'u1')]
+    assert restored.profile_version('u1') == 1
+    assert restored.memory.storage.jobs == []
+
+
+def test_job_roundtrip():
+    job = PostTurnJob(kind='summary', target='s1', model='m', attempts=2)
+    assert PostTurnJob.from_dict(job.to_dict()) == job
+
+
+async def test_agent_does_not_await_summary(tmp_path, monkeypatch):
+    """Agent 只提交任务，摘要在后台生成"""
+    from daoyoucode.agents.core.agent import BaseAgent, AgentConfig
+    from daoyoucode.agents.memory import manager as manager_module
+
+    memory = manager_module.MemoryManager(enable_tree=False, project_path=tmp_path)
+    monkeypatch.setattr(manager_module, '_memory_manager_instance', memory)
+
+    agent = BaseAgent(AgentConfig(name="bg", description="", model="qwen-max"))
+    for i in range(3):
+        memory.add_conversation('s-bg', f'q{i}', f'a{i}', user_id='u-bg')
+
+    release = threading.Event()
+
+    async def blocked(job):
+        while not release.is_set():
+            await asyncio.sleep(0.01)
+
+    memory.post_turn._handlers = {kind: blocked for kind in memory.post_turn._handlers}
+    agent._schedule_summary('s-bg', {'model': 'qwen-max'})
+    stats = memory.post_turn.get_stats()
+    assert stats['submitted'] == 1 and stats['completed'] == 0
+    release.set()
+    assert await memory.post_turn.drain(timeout=5)
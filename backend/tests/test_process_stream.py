@@ -0,0 +1,138 @@
+"""
+测试流式子进程输出
+
+验证头尾缓冲的内存上限、测试输出解析、失败时提前结束、超时返回部分输出和进度上报
+"""
+
+import sys
+import time
+
+from daoyoucode.agents.tools.base import (
+    reset_tool_progress_callback,
+    set_tool_progress_callback,
+)
+from daoyoucode.agents.tools.process_stream import (
+    HeadTailBuffer,
+    TestProgressParser,
+    run_streaming,
+)
+
+
+def python_command(code: str) -> list:
+    return [sys.executable, "-c", code]
+
+
+def test_head_tail_buffer_keeps_both_ends():
+    buffer = HeadTailBuffer(head_lines=3, tail_lines=2, max_line_chars=10)
+    for i in range(100):
+        buffer.append(f"line {i}")
+    buffer.append("x" * 50)
+
+    assert buffer.total_lines == 101
+    assert buffer.dropped == 96
+    assert buffer.text().splitlines() == [
+        "line 0", "line 1", "line 2",
+        "... 省略 96 行 ...",
+        "line 99", "xxxxxxxxxx...（截断 40 字符）",
+    ]
+
+
+def test_pytest_parser_counts_and_failures():
+    parser = TestProgressParser("pytest")
+    lines = [
+        "collected 3 items",
+        "tests/test_a.py::test_ok PASSED",
+        "tests/test_a.py::test_bad FAILED",
+        "tests/test_a.py::test_skip SKIPPED (no db)",
+        "=================================== FAILURES ===================================",
+        "___________________________________ test_bad ___________________________________",
+        "    def test_bad():",
+        ">       assert 1 == 2",
+        "E       assert 1 == 2",
+        "=========================== short test summary info ============================",
+        "FAILED tests/test_a.py::test_bad - assert 1 == 2",
+        "==================== 1 failed, 1 passed, 1 skipped in 0.05s ====================",
+    ]
+    for line in lines:
+        parser.feed(line)
+
+    assert parser.counts() == {"passed": 1, "failed": 1, "skipped": 1, "errors": 0, "total": 3}
+    assert parser.failures == ["tests/test_a.py::test_bad"]
+    summary = parser.format_summary()
+    assert summary.startswith("测试结果: 1 passed, 1 failed, 1 skipped（共 3）")
+    assert "E       assert 1 == 2" in summary
+
+
+def test_unittest_parser_reads_result_line():
+    parser = TestProgressParser("unittest")
+    for line in [
+        "test_a (tests.test_x.T.test_a) ... ok",
+        "test_b (tests.test_x.T.test_b) ... FAIL",
+        "======================================================================",
+        "FAIL: test_b (tests.test_x.T.test_b)",
+        "----------------------------------------------------------------------",
+        "Ran 2 tests in 0.001s",
+        "FAILED (failures=1)",
+    ]:
+        parser.feed(line)
+
+    assert parser.counts()["passed"] == 1 and parser.counts()["failed"] == 1
+    assert parser.failure_detected and len(parser.failures) == 1
+
+
+async def test_large_output_is_bounded():
+    run = await run_streaming(
+        python_command("for i in range(100000): print('row', i)"),
+        shell=False, head_lines=10, tail_lines=10,
+    )
+
+    assert run.returncode == 0
+    assert run.stdout_lines == 100000 and run.truncated
+    assert run.stdout.splitlines()[0] == "row 0"
+    assert run.stdout.splitlines()[-1] == "row 99999"
+    assert len(run.stdout.splitlines()) == 21
+
+
+async def test_stop_on_failure_ends_early():
+    code = (
+        "import sys, time\n"
+        "print('collected 2 items', flush=True)\n"
+        "print('t.py::test_bad FAILED', flush=True)\n"
+        "time.sleep(30)\n"
+        "print('t.py::test_ok PASSED')\n"
+    )
+    parser = TestProgressParser("pytest")
+
+    start = time.monotonic()
+    run = await run_streaming(python_command(code), shell=False, parser=parser, stop_on_failure=True)
+
+    assert time.monotonic() - start < 10
+    assert run.stopped_early and not run.timed_out
+    assert parser.failures == ["t.py::test_bad"]
+
+
+async def test_timeout_keeps_partial_output():
+    code = "import time\nprint('started', flush=True)\ntime.sleep(30)\n"
+
+    start = time.monotonic()
+    run = await run_streaming(python_command(code), shell=False, timeout=1)
+
+    assert time.monotonic() - start < 10
+    assert run.timed_out and run.returncode is None
+    assert run.stdout == "started"
+
+
+async def test_progress_reported_to_callback():
+    events = []
+    token = set_tool_progress_callback(events.append)
+    try:
+        await run_streaming(
+            python_command("print('collected 1 item'); print('t.py::test_ok PASSED')"),
+            shell=False, parser=TestProgressParser("pytest"),
+        )
+    finally:
+        reset_tool_progress_callback(token)
+
+    assert events and events[-1]["message"] == "完成"
+    assert events[-1]["completed"] == 1 and events[-1]["total"] == 1
+    assert events[-1]["passed"] == 1
@@ -0,0 +1,123 @@
+"""
+测试用户画像增量聚合
+
+验证逐轮更新与全量重建结果一致、画像读取实时、统计可持久化
+"""
+
+import asyncio
+
+from daoyoucode.agents.memory.profile_aggregator import (
+    ProfileAggregator, RECENT_PROJECT_WINDOW, MAX_TRACKED_SESSIONS
+)
+from daoyoucode.agents.memory.storage import MemoryStorage
+from daoyoucode.agents.memory.long_term_memory import LongTermMemory
+
+
+MESSAGES = [
+    ("How do I improve python performance?", "2026-01-01T20:10:00"),
+    ("Explain the architecture of my project atlas please", "2026-01-01T21:00:00"),
+    ("write a lambda with map and filter", "2026-01-02T09:30:00"),
+    ("docker and kubernetes api question", "2026-01-02T23:45:00"),
+    ("Next project orion needs testing help", "2026-01-03T08:00:00"),
+]
+
+
+def test_incremental_matches_rebuild():
+    incremental = ProfileAggregator()
+    for msg, ts in MESSAGES:
+        incremental.record_conversation('u1', msg, ts)
+    incremental.record_key_info('u1', 's1', {'main_topics': ['python', 'profiling']})
+
+    rebuilt = ProfileAggregator()
+    profile = rebuilt.rebuild(
+        'u1',
+        [{'user': m, 'timestamp': t} for m, t in MESSAGES],
+        {'s1': {'main_topics': ['python', 'profiling']}}
+    )
+
+    assert incremental.get_profile('u1') == profile
+    assert profile['total_conversations'] == 5
+    assert profile['common_topics'][0] == 'python'
+    assert profile['skill_level'] == 'advanced'
+    assert profile['preferred_style'] == 'functional'
+    assert profile['recent_projects'] == ['orion', 'atlas']
+
+
+def test_key_info_replaces_previous_topics_of_session():
+    agg = ProfileAggregator()
+    agg.record_key_info('u1', 's1', {'main_topics': ['alpha', 'beta']})
+    agg.record_key_info('u1', 's1', {'main_topics': ['beta']})
+    agg.record_key_info('u1', 's2', {'main_topics': ['gamma']})
+    state = agg._users['u1']
+    assert state['key_topics'] == {'beta': 1, 'gamma': 1}
+
+
+def test_tracked_sessions_are_bounded():
+    agg = ProfileAggregator()
+    for i in range(MAX_TRACKED_SESSIONS + 10):
+        agg.record_key_info('u1', f's{i}', {'main_topics': ['python']})
+    agg.record_key_info('u1', 's10', {'main_topics': ['python']})   # 更新后变为最近的会话
+    sessions = agg._users['u1']['session_key_topics']
+    assert len(sessions) == MAX_TRACKED_SESSIONS
+    assert 's0' not in sessions and list(sessions)[-1] == 's10'
+    assert agg._users['u1']['key_topics'] == {'python': MAX_TRACKED_SESSIONS + 10}
+
+
+def test_recent_projects_window():
+    agg = ProfileAggregator()
+    agg.record_conversation('u1', 'project legacy rewrite')
+    for _ in range(RECENT_PROJECT_WINDOW):
+        agg.record_conversation('u1', 'unrelated question')
+    assert agg.get_profile('u1')['recent_projects'] == []
+    assert agg.get_profile('missing') is None
+
+
+def test_live_profile_and_persistence(tmp_path):
+    storage = MemoryStorage(storage_dir=str(tmp_path), flush_interval=0)
+    ltm = LongTermMemory(storage=storage)
+    storage.add_conversation('s1', 'hello', 'hi', user_id='u1')
+    for msg, ts in MESSAGES:
+        storage.add_conversation('s1', msg, 'ok')
+        ltm.record_conversation('s1', msg, timestamp=ts)    # 按会话映射找到用户
+
+    profile = ltm.get_user_profile('u1')
+    assert profile['total_conversations'] == 6
+    assert 'python' in profile['common_topics']
+
+    # 保存画像后，should_update_profile 以保存时的对话数为准
+    built = asyncio.run(ltm.build_user_profile('u1'))
+    assert built['total_sessions'] == 1 and built['total_conversations'] == 6
+    assert ltm.should_update_profile('u1', 10) is False
+    assert ltm.should_update_profile('u1', 26) is True
+
+    storage.flush()
+    reloaded = ProfileAggregator(MemoryStorage(storage_dir=str(tmp_path), flush_interval=0))
+    assert reloaded.get_profile('u1') == ltm.aggregator.get_profile('u1')
+
+
+
+def test_existing_history_is_rebuilt_on_first_record(tmp_path):
+    storage = MemoryStorage(storage_dir=str(tmp_path), flush_interval=0)
+    for msg, _ in MESSAGES:
+        storage.add_conversation('s1', msg, 'ok', user_id='u1')
+    storage.add_conversation('s2', 'another python question', 'ok', user_id='u1')
+
+    # 升级前的历史没有统计：第一次计入时从全部已保存的历史重建
+    ltm = LongTermMemory(storage=storage)
+    assert not ltm.aggregator.has_user('u1')
+    ltm.record_conversation('s2', 'another python question')
+    assert ltm.aggregator.conversation_count('u1') == 6
+
+    storage.add_conversation('s2', 'one more', 'ok')
+    ltm.record_conversation('s2', 'one more')
+    assert ltm.aggregator.conversation_count('u1') == 7
+
+    # 落盘的是快照，之后的更新不会影响已交给存储的数据
+    saved = storage.get_profile_aggregates()['u1']
+    ltm.aggregator.record_conversation('u1', 'not saved yet')
+    assert saved['conversations'] == 8 - 1
+
+
+if __name__ == "__main__":
+    import pytest
+    raise SystemExit(pytest.main([__file__, "-v"]))
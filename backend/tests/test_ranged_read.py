@@ -0,0 +1,135 @@
+"""
+测试按行区间读取文件
+
+验证 offset/limit 分页、行索引缓存按文件变化失效、大文件默认只读第一页
+"""
+
+import pytest
+
+from daoyoucode.agents.tools import line_index
+from daoyoucode.agents.tools.file_tools import BatchReadFilesTool, ReadFileTool
+from daoyoucode.agents.tools.line_index import read_line_range
+
+
+@pytest.fixture(autouse=True)
+def fresh_indexes():
+    line_index.clear_line_indexes()
+    yield
+    line_index.clear_line_indexes()
+
+
+def test_read_line_range_pages(tmp_path):
+    path = tmp_path / "log.txt"
+    path.write_text("".join(f"line {i}\n" for i in range(1, 101)))
+
+    first = read_line_range(path, 1, 10)
+    assert first.text.splitlines() == [f"line {i}" for i in range(1, 11)]
+    assert (first.start_line, first.end_line) == (1, 10)
+
+    last = read_line_range(path, 95, 10)
+    assert last.text.splitlines() == [f"line {i}" for i in range(95, 101)]
+    assert last.end_line == 100 and last.total_lines == 100 and not last.has_more
+
+    beyond = read_line_range(path, 200, 10)
+    assert beyond.text == "" and beyond.end_line == 100 and not beyond.has_more
+
+
+def test_crlf_lines_are_normalised(tmp_path):
+    path = tmp_path / "win.txt"
+    path.write_bytes(b"a\r\nb\r\nc")
+
+    assert read_line_range(path).text == "a\nb\nc"
+    chunk = read_line_range(path, 2, 5)
+    assert chunk.text == "b\nc" and chunk.end_line == 3
+
+    with pytest.raises(ValueError):
+        read_line_range(path, 1, 0)
+
+
+def test_index_is_extended_on_demand(tmp_path, monkeypatch):
+    monkeypatch.setattr(line_index, "SCAN_CHUNK_BYTES", 64)
+    path = tmp_path / "big.txt"
+    path.write_text("x" * 20 + "\n" + "".join(f"{i}\n" for i in range(10_000)))
+
+    chunk = read_line_range(path, 1, 2)
+    index = line_index._indexes[path.resolve()]
+    # 只扫描了开头几块，不知道总行数
+    assert index.scanned < 1024
+    assert chunk.total_lines is None and chunk.has_more
+    assert chunk.text == "x" * 20 + "\n0"
+
+
+def test_index_invalidated_when_file_changes(tmp_path):
+    path = tmp_path / "a.txt"
+    path.write_text("a\nb\nc")
+    assert read_line_range(path, 3, 1).text == "c"
+
+    path.write_text("one\ntwo\nthree\nfour\n")
+    chunk = read_line_range(path, 3, 5)
+    assert chunk.text == "three\nfour"
+    assert chunk.total_lines == 4
+
+
+async def test_read_file_tool_offset_limit(tmp_path, make_tool):
+    (tmp_path / "m.py").write_text("".join(f"x{i} = {i}\n" for i in range(1, 51)))
+    tool = make_tool(ReadFileTool, tmp_path)
+
+    result = await tool.execute("m.py", offset=11, limit=5)
+
+    assert result.success
+    assert result.content.startswith("x11 = 11\n") and "x15 = 15" in result.content
+    assert "x16" not in result.content.split("...")[0]
+    assert "offset=16" in result.content
+    assert result.metadata["start_line"] == 11
+    assert result.metadata["end_line"] == 15
+    assert result.metadata["has_more"]
+
+    # 小文件不指定区间时仍然完整读取
+    whole = await tool.execute("m.py")
+    assert whole.content == (tmp_path / "m.py").read_text()
+
+    invalid = await tool.execute("m.py", offset=1, limit=-1)
+    assert not invalid.success and "limit" in invalid.error
+
+
+async def test_large_file_defaults_to_first_page(tmp_path, make_tool):
+    (tmp_path / "gen.txt").write_text("".join(f"row {i}\n" for i in range(50_000)))
+    tool = make_tool(ReadFileTool, tmp_path)
+    tool.WHOLE_FILE_BYTES = 1024
+
+    result = await tool.execute("gen.txt")
+
+    last = ReadFileTool.MAX_OUTPUT_LINES - ReadFileTool.FOOTER_LINES
+    assert result.metadata["end_line"] == last
+    assert f"offset={last + 1}" in result.content
+
+
+async def test_page_fits_registry_output_limit(tmp_path, make_tool):
+    """一页连同分页提示不超过输出上限，注册表不会截掉中间的行"""
+    (tmp_path / "wide.txt").write_text("".join(f"line {i:06d} " + "x" * 88 + "\n" for i in range(1, 1001)))
+    tool = make_tool(ReadFileTool, tmp_path)
+
+    result = await tool.execute("wide.txt", offset=1, limit=200)
+
+    end = result.metadata["end_line"]
+    assert 1 < end < 200 and result.metadata["has_more"]
+    assert tool.truncate_output(result.content) == result.content
+    lines = result.content.split("\n\n... [")[0].splitlines()
+    assert lines == [f"line {i:06d} " + "x" * 88 for i in range(1, end + 1)]
+    assert f"offset={end + 1}" in result.content
+
+
+async def test_batch_read_applies_range(tmp_path, make_tool):
+    (tmp_path / "a.txt").write_text("a1\na2\na3\n")
+    (tmp_path / "b.txt").write_text("b1\nb2\n")
+    tool = make_tool(BatchReadFilesTool, tmp_path)
+
+    result = await tool.execute(["a.txt", "b.txt"], offset=2, limit=1)
+
+    assert result.metadata["results"] == {"a.txt": "a2", "b.txt": "b2"}
+    assert result.metadata["ranges"]["a.txt"]["has_more"]
+    assert not result.metadata["ranges"]["b.txt"]["has_more"]
+    assert "第 2-2 行" in result.content
+
+    invalid = await tool.execute(["a.txt"], limit=0)
+    assert not invalid.success and "limit" in invalid.error
@@ -0,0 +1,204 @@
+"""
+测试共享符号存储
+
+验证 repo_map、get_file_symbols 等使用者共用一份解析结果，文件改动只重新解析一次，
+增量更新的引用图与全量构建一致
+"""
+
+import os
+import re
+
+import pytest
+
+from daoyoucode.agents.llm.utils.tokenizer import count_tokens
+from daoyoucode.agents.tools import repomap_tools
+from daoyoucode.agents.tools.base import ToolContext
+from daoyoucode.agents.tools.file_inventory import get_file_inventory
+from daoyoucode.agents.tools.repomap_tools import (
+    ByteBoundedLRU,
+    GetFileSymbolsTool,
+    RepoMapTool,
+    build_reference_graph,
+    get_repo_symbol_store,
+)
+
+DEF_RE = re.compile(r"^(?:def|class) (\w+)", re.MULTILINE)
+REF_RE = re.compile(r"\b(\w+)\(")
+
+
+@pytest.fixture
+def parsed(monkeypatch):
+    """用正则代替 tree-sitter，记录解析过的文件"""
+    calls = []
+
+    def parse(path):
+        calls.append(path.name)
+        code = path.read_text()
+        tags = [
+            {"type": "function", "name": m.group(1), "line": code.count("\n", 0, m.start()) + 1, "kind": "def"}
+            for m in DEF_RE.finditer(code)
+        ]
+        tags += [{"type": "reference", "name": n, "line": -1, "kind": "ref"} for n in REF_RE.findall(code)]
+        return tags
+
+    monkeypatch.setattr(repomap_tools, "parse_file_tags", parse)
+    return calls
+
+
+@pytest.fixture
+def repo(tmp_path):
+    (tmp_path / "core.py").write_text("def load():\n    return 1\n")
+    (tmp_path / "api.py").write_text("def handler():\n    return load()\n")
+    (tmp_path / "cli.py").write_text("def main():\n    handler()\n    load()\n")
+    return tmp_path
+
+
+def touch(path, content, offset):
+    path.write_text(content)
+    st = path.stat()
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + offset * 1_000_000_000))
+    get_file_inventory(path.parent).invalidate()
+
+
+def make(cls, repo):
+    tool = cls()
+    tool.set_context(ToolContext(repo_path=repo))
+    return tool
+
+
+async def test_consumers_share_one_parse(repo, parsed):
+    first = await make(RepoMapTool, repo).execute(str(repo), enable_lsp=False)
+    assert first.success and sorted(parsed) == ["api.py", "cli.py", "core.py"]
+
+    # 另一个实例、公开API、单文件符号都不再解析
+    second = await make(RepoMapTool, repo).execute(str(repo), max_tokens=500, enable_lsp=False)
+    definitions = make(RepoMapTool, repo).get_definitions(str(repo))
+    symbols = await make(GetFileSymbolsTool, repo).execute("core.py")
+
+    assert second.success and "core.py" in definitions
+    assert "function load (line 1)" in symbols.content
+    assert len(parsed) == 3
+
+
+async def test_incremental_refresh_matches_full_build(repo, parsed):
+    store = get_repo_symbol_store(repo)
+    store.refresh()
+    version = store.version
+    parsed.clear()
+
+    touch(repo / "api.py", "def handler():\n    return 2\n", offset=5)
+    (repo / "cli.py").unlink()
+    get_file_inventory(repo).invalidate()
+
+    assert sorted(store.refresh()) == ["api.py", "cli.py"]
+    assert parsed == ["api.py"]
+    assert store.version == version + 1
+
+    tags, graph, _ = store.snapshot()
+    assert "cli.py" not in tags
+    assert graph == build_reference_graph(tags)
+
+
+async def test_default_pagerank_is_cached(repo, parsed, monkeypatch):
+    tool = make(RepoMapTool, repo)
+    scores = tool.get_pagerank_scores(str(repo))
+    assert max(scores, key=scores.get) == "core.py"
+
+    def fail(*args, **kwargs):
+        raise AssertionError("PageRank 不应重新计算")
+
+    monkeypatch.setattr(repomap_tools, "rank_files", fail)
+    assert make(RepoMapTool, repo).get_pagerank_scores(str(repo)) == scores
+
+
+async def test_map_fills_token_budget_exactly(tmp_path, parsed):
+    for i in range(12):
+        body = "".join(f"def 处理_{i}_{j}():\n    pass\n" for j in range(6))
+        (tmp_path / f"mod{i}.py").write_text(body + "def use():\n    main()\n")
+    (tmp_path / "main.py").write_text("def main():\n    pass\n")
+    tool = make(RepoMapTool, tmp_path)
+    header = "# 代码地图 (Top {} 文件)\n"
+
+    sizes = []
+    for budget in (40, 80, 160, 320):
+        content = (await tool.execute(
+            str(tmp_path), max_tokens=budget, auto_scale=False, enable_lsp=False
+        )).content
+        assert count_tokens(content) <= budget
+        sizes.append(len(content))
+
+        # 地图是排序后所有行的前缀，再多一个定义就会超出预算
+        store = get_repo_symbol_store(tmp_path)
+        ranked = store.ranked()
+        all_lines = [line for path, _ in ranked for line in store.rendered(path).lines]
+        shown = next(k for k in range(len(all_lines), 0, -1)
+                     if tool._assemble_map(header, all_lines[:k]) == content)
+        if shown < len(all_lines):
+            more = shown + (2 if all_lines[shown].startswith("\n") else 1)
+            assert count_tokens(tool._assemble_map(header, all_lines[:more])) > budget
+    assert sizes == sorted(sizes) and sizes[0] < sizes[-1]
+
+
+async def test_personalized_ranking_reuses_rendered_lines(repo, parsed, monkeypatch):
+    tool = make(RepoMapTool, repo)
+    base = await tool.execute(str(repo), enable_lsp=False)
+
+    def fail(*args, **kwargs):
+        raise AssertionError("个性化排序不应重新渲染")
+
+    monkeypatch.setattr(repomap_tools, "render_file", fail)
+    focused = await tool.execute(str(repo), chat_files=["cli.py"], enable_lsp=False)
+
+    assert base.success and focused.success
+    assert focused.content.index("cli.py") < focused.content.index("api.py")
+    assert sorted(base.content.splitlines()) == sorted(focused.content.splitlines())
+
+
+async def test_ranked_cache_is_canonical_and_versioned(repo, parsed):
+    store = get_repo_symbol_store(repo)
+    store.refresh()
+
+    first = store.ranked(["cli.py", "api.py"], ["Load", "handler"])
+    assert store.ranked(["api.py", "cli.py", "api.py"], ["HANDLER", "load"]) is first
+    assert isinstance(first, tuple)  # 缓存的结果不可变
+    assert store.stats["rank_hits"] == 1
+
+    touch(repo / "core.py", "def load():\n    return 2\n", offset=5)
+    store.refresh()
+    assert store.ranked(["cli.py", "api.py"], ["load", "handler"]) is not first
+    assert store.stats["rank_misses"] == 2
+
+
+async def test_ranking_warm_starts_from_nearest_personalization(tmp_path, parsed):
+    for i in range(40):
+        calls = "".join(f"    f{j}()\n" for j in range(i))
+        (tmp_path / f"m{i}.py").write_text(f"def f{i}():\n    pass\ndef g{i}():\n{calls}    pass\n")
+    store = get_repo_symbol_store(tmp_path)
+    store.refresh()
+
+    store.ranked(["m3.py"])
+    cold = store.stats["rank_iterations"]
+    warm_ranked = store.ranked(["m3.py", "m4.py"])
+    warm = store.stats["rank_iterations"] - cold
+    assert warm < cold
+
+    # 热启动收敛到与冷启动相同的结果
+    expected = repomap_tools.rank_files(
+        store.snapshot()[1], store.snapshot()[0], ["m3.py", "m4.py"], [],
+        iterations=repomap_tools.RANK_MAX_ITERATIONS, tol=repomap_tools.RANK_TOLERANCE
+    )
+    assert [p for p, _ in warm_ranked] == [p for p, _ in expected]
+    assert dict(warm_ranked) == pytest.approx(dict(expected), abs=1e-5)
+
+
+def test_byte_bounded_lru_evicts_oldest():
+    cache = ByteBoundedLRU(100)
+    cache.put("a", 1, 40)
+    cache.put("b", 2, 40)
+    assert cache.get("a") == 1  # a 变为最近使用
+    cache.put("c", 3, 40)
+    cache.put("huge", 4, 500)
+
+    assert "b" not in cache and "huge" not in cache
+    assert cache.get("a") == 1 and cache.get("c") == 3
+    assert cache.size_bytes == 80
@@ -0,0 +1,109 @@
+"""
+测试符号定义索引
+
+验证 ContextSelector 的定义查找结果、增量更新、持久化，以及复用 RepoMap 标签缓存
+"""
+
+import os
+
+from daoyoucode.agents.core.context_selector import ContextSelector
+from daoyoucode.agents.tools.file_inventory import get_file_inventory
+from daoyoucode.agents.tools.symbol_index import (
+    SymbolIndex, extract_definitions_regex, CLASS_TYPES, FUNCTION_TYPES
+)
+
+
+def make_repo(tmp_path):
+    (tmp_path / "pkg").mkdir()
+    (tmp_path / "pkg" / "core.py").write_text(
+        "class Engine(Base):\n"
+        "    async def start_engine(self):\n"
+        "        pass\n"
+        "\n"
+        "def helper_func():\n"
+        "    return 1\n"
+    )
+    (tmp_path / "pkg" / "copy.py").write_text("def helper_func():\n    return 2\n")
+    (tmp_path / "web").mkdir()
+    (tmp_path / "web" / "app.js").write_text(
+        "class Widget {\n}\n\nfunction renderWidget(x) {\n  return x;\n}\n"
+    )
+    (tmp_path / "web" / "types.ts").write_text("interface Props {\n  a: number;\n}\n")
+    return tmp_path
+
+
+def test_regex_extraction():
+    defs = extract_definitions_regex("a.py", "import x\n\nclass Foo:\n    def bar(self):\n        pass\n")
+    assert defs == [("Foo", "class", 3), ("bar", "function", 4)]
+    assert extract_definitions_regex("a.txt", "def foo(): pass") == []
+
+
+def test_context_selector_lookups(tmp_path):
+    repo = make_repo(tmp_path)
+    selector = ContextSelector(repo)
+
+    assert selector._find_class_definition("Engine", set()) == os.path.join("pkg", "core.py")
+    assert selector._find_function_definition("start_engine", set()) == os.path.join("pkg", "core.py")
+    assert selector._find_function_definition("renderWidget", set()) == os.path.join("web", "app.js")
+    assert selector._find_class_definition("Widget", set()) == os.path.join("web", "app.js")
+    assert selector._find_class_definition("Missing", set()) is None
+
+    # 已在上下文中的文件被跳过，回退到其他定义
+    assert selector._find_function_definition(
+        "helper_func", {os.path.join("pkg", "copy.py")}
+    ) == os.path.join("pkg", "core.py")
+
+    added = selector.auto_select_files("修改函数 renderWidget 和类 `Engine`", set())
+    assert set(added) == {os.path.join("web", "app.js"), os.path.join("pkg", "core.py")}
+
+
+def test_incremental_refresh_and_persistence(tmp_path):
+    repo = make_repo(tmp_path)
+    index = SymbolIndex(repo, refresh_interval=0)
+    assert [loc.path for loc in index.find_definitions("Props", CLASS_TYPES)] == ["web/types.ts"]
+    assert index.get_stats()['regex_parses'] == 4
+
+    core = repo / "pkg" / "core.py"
+    core.write_text("def renamed():\n    pass\n")
+    os.utime(core, ns=(core.stat().st_mtime_ns + 10**9,) * 2)
+    (repo / "web" / "types.ts").unlink()
+    get_file_inventory(repo).invalidate()
+
+    assert index.find_definitions("Engine") == []
+    assert index.find_definitions("Props") == []
+    assert [loc.line for loc in index.find_definitions("renamed", FUNCTION_TYPES)] == [1]
+    stats = index.get_stats()
+    assert stats['regex_parses'] == 5 and stats['removed'] == 1
+
+    # 新实例从持久化文件加载，不再重新提取
+    reloaded = SymbolIndex(repo, refresh_interval=0)
+    assert [loc.path for loc in reloaded.find_definitions("renderWidget")] == ["web/app.js"]
+    assert reloaded.get_stats()['regex_parses'] == 0
+
+
+def test_uses_repomap_tag_cache(tmp_path):
+    from diskcache import Cache
+
+    repo = make_repo(tmp_path)
+    entry = get_file_inventory(repo).get("pkg/core.py")
+    cache = Cache(str(repo / ".daoyoucode" / "cache" / "repomap"))
+    cache[os.path.join("pkg", "core.py")] = {
+        "mtime": entry.mtime,
+        "data": [
+            {"type": "class", "name": "Engine", "line": 1, "kind": "def"},
+            {"type": "method", "name": "start_engine", "line": 2, "kind": "def"},
+            {"type": "reference", "name": "Base", "line": -1, "kind": "ref"},
+        ],
+    }
+    cache.close()
+
+    index = SymbolIndex(repo, persist=False)
+    assert [loc.type for loc in index.find_definitions("start_engine")] == ["method"]
+    assert index.find_definitions("Base") == []
+    assert index.find_definitions("helper_func")[0].path == "pkg/copy.py"  # 只有 copy.py 走正则
+    assert index.get_stats()['tag_hits'] == 1
+
+
+if __name__ == "__main__":
+    import pytest
+    raise SystemExit(pytest.main([__file__, "-v"]))
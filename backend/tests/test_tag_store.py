@@ -0,0 +1,66 @@
+"""
+测试紧凑标签存储
+
+验证 FileTags 与字典列表等价、视图按需创建且保留修改，pickle 体积更小
+"""
+
+import pickle
+
+from daoyoucode.agents.tools.tag_store import (
+    FileTags,
+    compact_tags,
+    definition_names,
+    definition_tags,
+    reference_names,
+)
+
+
+def sample_tags():
+    tags = [
+        {"type": "class", "name": "Agent", "line": 3, "kind": "def", "parent": None, "scope": "global"},
+        {"type": "method", "name": "run", "line": 5, "kind": "def", "parent": "Agent", "scope": "class"},
+        {"type": "call", "name": "helper", "line": 6, "kind": "ref", "parent": None, "scope": "global"},
+    ]
+    # Pygments 补充的引用没有 parent/scope 字段
+    tags += [{"type": "reference", "name": f"ident{i % 50}", "line": -1, "kind": "ref"} for i in range(2000)]
+    return tags
+
+
+def test_round_trip_matches_dicts():
+    tags = sample_tags()
+    compact = FileTags.from_dicts(tags)
+
+    assert len(compact) == len(tags)
+    assert compact == tags
+    assert compact[1] == tags[1] and compact[-1] == tags[-1]
+    assert list(compact[:2]) == tags[:2]
+    assert compact_tags(compact) is compact
+
+
+def test_columns_avoid_creating_views():
+    compact = FileTags.from_dicts(sample_tags())
+
+    assert definition_names(compact) == ["Agent", "run"]
+    assert reference_names(compact) == {"helper"} | {f"ident{i}" for i in range(50)}
+    assert compact._views is None
+
+    defs = definition_tags(compact)
+    defs[0]["end_line"] = 10  # 调用方对视图的修改会保留
+    assert [d["name"] for d in defs] == ["Agent", "run"]
+    assert compact[0]["end_line"] == 10
+    assert len(compact._views) == 2
+
+    plain = sample_tags()
+    assert definition_names(plain) == definition_names(compact)
+    assert reference_names(plain) == reference_names(compact)
+
+
+def test_pickle_is_compact():
+    tags = sample_tags()
+    compact = FileTags.from_dicts(tags)
+    data = pickle.dumps(compact)
+
+    assert len(data) * 3 < len(pickle.dumps(tags))
+    restored = pickle.loads(data)
+    assert restored == tags
+    assert restored[3]["name"] is compact[3]["name"]  # 名称已 intern
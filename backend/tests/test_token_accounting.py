@@ -0,0 +1,122 @@
+"""
+测试Token计数
+
+验证近似分词器对中文的计数、可替换的分词器、上下文变量token数缓存和预算装箱
+"""
+
+import hashlib
+
+import pytest
+
+from daoyoucode.agents.core.context import ContextManager
+from daoyoucode.agents.llm.utils import tokenizer as tokenizer_module
+from daoyoucode.agents.llm.utils.tokenizer import (
+    HeuristicTokenizer,
+    Tokenizer,
+    count_tokens,
+    set_tokenizer,
+)
+
+
+class CountingTokenizer(Tokenizer):
+    """每个字符 1 个 token，并记录调用次数"""
+
+    name = "counting"
+
+    def __init__(self):
+        self.calls = 0
+
+    def count(self, text):
+        self.calls += 1
+        return len(text)
+
+
+@pytest.fixture
+def tokenizer():
+    tokenizer = CountingTokenizer()
+    set_tokenizer(tokenizer)
+    yield tokenizer
+    set_tokenizer(None)
+
+
+def test_heuristic_counts_chinese_per_character():
+    tokenizer = HeuristicTokenizer()
+
+    assert tokenizer.count("上下文管理器") == 6
+    assert tokenizer.count("hello world") == 2
+    assert tokenizer.count("1234567") == 3
+    assert tokenizer.count("") == 0
+    # 旧估算（4 字符 1 个）会把中文低估到四分之一
+    text = "按问检索相关代码块" * 100
+    assert tokenizer.count(text) >= len(text) * 0.9
+
+
+def test_auto_mode_never_downloads_bpe(tmp_path, monkeypatch):
+    created = []
+    monkeypatch.setattr(
+        tokenizer_module, "TiktokenTokenizer",
+        lambda name, bpe_file: created.append((name, bpe_file)) or CountingTokenizer()
+    )
+    monkeypatch.delenv("DAOYOUCODE_TOKENIZER", raising=False)
+    monkeypatch.delenv("DAOYOUCODE_BPE_FILE", raising=False)
+    monkeypatch.setenv("TIKTOKEN_CACHE_DIR", str(tmp_path))
+
+    # 词表不在本地缓存：不创建 tiktoken 分词器
+    assert isinstance(tokenizer_module._create_tokenizer(), HeuristicTokenizer)
+    assert created == []
+
+    url = tokenizer_module._BPE_URL.format("cl100k_base")
+    (tmp_path / hashlib.sha1(url.encode()).hexdigest()).write_bytes(b"")
+    assert isinstance(tokenizer_module._create_tokenizer(), CountingTokenizer)
+
+    monkeypatch.setenv("DAOYOUCODE_BPE_FILE", "/opt/cl100k_base.tiktoken")
+    tokenizer_module._create_tokenizer()
+    assert created[-1] == ("cl100k_base", "/opt/cl100k_base.tiktoken")
+
+
+def test_tokenizer_requires_count():
+    class Incomplete(Tokenizer):
+        pass
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+
+def test_tokenizer_is_pluggable(tokenizer):
+    assert count_tokens("abc") == 3
+    assert tokenizer.calls == 1
+
+
+def test_context_caches_variable_counts(tokenizer):
+    manager = ContextManager(default_token_budget=10_000)
+    context = manager.create_context("s")
+    context.set("repo_map", "x" * 5000)
+    context.set("note", "short")
+
+    first = manager.enforce_token_budget("s")
+    calls = tokenizer.calls
+    second = manager.enforce_token_budget("s")
+
+    assert first["original_tokens"] == second["original_tokens"]
+    # 第二次没有重新计数任何变量
+    assert tokenizer.calls == calls
+
+    # 重新设置的变量才重新计数
+    context.set("note", "longer note")
+    manager.enforce_token_budget("s")
+    assert tokenizer.calls == calls + 2
+
+
+def test_budget_packs_smaller_variables_after_skipping_large_one(tokenizer):
+    manager = ContextManager()
+    context = manager.create_context("s")
+    context.set("a", "x" * 50)
+    context.set("big", "y" * 500)
+    context.set("c", "z" * 30)
+
+    stats = manager.enforce_token_budget("s", token_budget=100)
+
+    assert stats["removed_keys"] == ["big"]
+    assert stats["final_tokens"] <= 100
+    assert context.has("a") and context.has("c") and not context.has("big")
+    assert context.total_tokens() == stats["final_tokens"]
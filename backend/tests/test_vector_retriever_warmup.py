@@ -0,0 +1,106 @@
+"""
+测试本地向量检索器的后台加载
+
+验证模型在后台线程加载（构造不阻塞、加载中按未启用处理）、
+推理在专用线程进行，以及并发 encode 合并成一次推理
+"""
+
+import asyncio
+import threading
+
+import numpy as np
+import pytest
+
+from daoyoucode.agents.memory import vector_retriever
+from daoyoucode.agents.memory.vector_retriever import VectorRetriever
+
+
+class FakeModel:
+    """按关键词计数的假模型，记录每次 encode 的输入和线程"""
+
+    words = ["python", "bug", "部署"]
+
+    def __init__(self):
+        self.calls = []
+        self.device = type("Device", (), {"type": "cpu"})()
+
+    def encode(self, texts, convert_to_numpy=True, **kwargs):
+        self.calls.append((texts, threading.current_thread().name))
+        if isinstance(texts, str):
+            return np.array([texts.count(w) + 0.01 for w in self.words], dtype=np.float32)
+        return np.array([[t.count(w) + 0.01 for w in self.words] for t in texts], dtype=np.float32)
+
+    def get_sentence_embedding_dimension(self):
+        return len(self.words)
+
+
+@pytest.fixture
+def gated_model(monkeypatch):
+    """模型加载停在后台，直到测试放行"""
+    release = threading.Event()
+    model = FakeModel()
+
+    def create_model(self):
+        release.wait(10)
+        return model
+
+    monkeypatch.setattr(VectorRetriever, "_create_model", create_model)
+    yield release, model
+    release.set()
+
+
+async def test_model_loads_in_background(gated_model, monkeypatch):
+    release, model = gated_model
+    monkeypatch.setattr(vector_retriever, "READY_TIMEOUT", 0.05)
+
+    retriever = VectorRetriever()
+    assert retriever.loading and not retriever.enabled
+    assert retriever.encode("python") is None
+    history = [{"user": "python bug"}]
+    assert await retriever.find_relevant_history("python bug", history) == []
+    assert retriever.enable() is retriever.ready  # 加载中不会重复加载
+
+    release.set()
+    assert await retriever.wait_ready_async(5)
+    assert not retriever.loading
+    assert retriever.get_stats()["embedding_dim"] == 3
+    assert retriever.encode("部署") is not None
+    assert model.calls[-1][1].startswith("embedding-model")
+    # 模型线程是守护线程，不阻塞解释器退出
+    assert retriever._executor._thread.daemon
+
+
+async def test_concurrent_encodes_share_one_inference(gated_model):
+    release, model = gated_model
+    release.set()
+    retriever = VectorRetriever(background=False)
+    model.calls.clear()
+
+    vectors = await asyncio.gather(
+        retriever.aencode("python bug"),
+        retriever.aencode("部署"),
+        retriever.aencode("python bug"),
+    )
+
+    assert len(model.calls) == 1
+    texts, thread_name = model.calls[0]
+    assert texts == ["python bug", "部署"]
+    assert thread_name.startswith("embedding-model")
+    assert np.allclose(vectors[0], vectors[2])
+
+    history = [{"user": "python bug 怎么修"}, {"user": ""}, {"user": "部署到服务器"}]
+    results = await retriever.find_relevant_history("又是 python bug", history, threshold=0.9)
+    assert [idx for idx, _ in results] == [0]
+    assert model.calls[-1][0] == ["又是 python bug", "python bug 怎么修", "部署到服务器"]
+
+
+def test_missing_dependency_disables_after_load(monkeypatch):
+    def create_model(self):
+        raise ImportError("No module named 'sentence_transformers'")
+
+    monkeypatch.setattr(VectorRetriever, "_create_model", create_model)
+    retriever = VectorRetriever()
+
+    assert retriever.wait_ready(5) is False
+    assert not retriever.enabled and not retriever.loading
+    assert retriever.encode_batch(["x"]) is None
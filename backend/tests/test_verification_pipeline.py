@@ -0,0 +1,119 @@
+"""
+测试按改动范围并行验证
+
+验证受影响测试的选择、语法诊断、逐项返回结果和 fail_fast 取消
+"""
+
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+from daoyoucode.agents.core.test_impact import TestImpactAnalyzer, is_test_file
+from daoyoucode.agents.core.verification import (
+    VerificationLevel,
+    get_verification_manager,
+)
+
+
+def make_project(root):
+    (root / "pkg").mkdir()
+    (root / "pkg" / "__init__.py").write_text("")
+    (root / "pkg" / "a.py").write_text("def value():\n    return 1\n")
+    (root / "pkg" / "b.py").write_text("from .a import value\n\ndef double():\n    return value() * 2\n")
+    (root / "pkg" / "c.py").write_text("def other():\n    return 3\n")
+    (root / "tests").mkdir()
+    (root / "tests" / "test_b.py").write_text(
+        "from pkg.b import double\n\ndef test_double():\n    assert double() == 2\n"
+    )
+    (root / "tests" / "test_c.py").write_text(
+        "import pkg.c\n\ndef test_other():\n    assert pkg.c.other() == 3\n"
+    )
+    (root / "web").mkdir()
+    (root / "web" / "x.ts").write_text("export const x = 1;\n")
+    (root / "web" / "x.test.ts").write_text("import { x } from './x';\n")
+    return root
+
+
+@pytest.fixture
+def manager(tmp_path):
+    manager = get_verification_manager()
+    manager.configure(project_root=make_project(tmp_path), use_lsp=False, max_workers=4)
+    yield manager
+    manager.configure(project_root=Path("."))
+
+
+def test_affected_tests_follow_import_graph(tmp_path):
+    make_project(tmp_path)
+    analyzer = TestImpactAnalyzer(tmp_path)
+
+    assert analyzer.affected_tests(["pkg/a.py"]) == ["tests/test_b.py"]
+    assert analyzer.affected_tests([tmp_path / "pkg" / "c.py"]) == ["tests/test_c.py"]
+    assert analyzer.affected_tests(["pkg/__init__.py"]) == ["tests/test_b.py", "tests/test_c.py"]
+    assert analyzer.affected_tests(["web/x.ts"]) == ["web/x.test.ts"]
+    # 无法按导入关系判断的改动：运行全部测试
+    assert analyzer.affected_tests(["pyproject.toml"]) is None
+    assert analyzer.affected_tests(["tests/conftest.py"]) is None
+
+    assert is_test_file("tests/test_b.py") and is_test_file("a/b.spec.js")
+    assert not is_test_file("pkg/a.py")
+
+
+async def test_syntax_errors_stream_per_file(manager, tmp_path):
+    (tmp_path / "pkg" / "c.py").write_text("def broken(:\n    pass\n")
+
+    checks = []
+    result = await manager.verify(
+        result={},
+        level=VerificationLevel.BASIC,
+        modified_files=["pkg/a.py", "pkg/c.py"],
+        on_check=checks.append,
+    )
+
+    names = {c.name: c for c in checks}
+    assert set(names) == {"file_check", "diagnostics:pkg/a.py", "diagnostics:pkg/c.py"}
+    assert names["diagnostics:pkg/a.py"].passed
+    assert not names["diagnostics:pkg/c.py"].passed
+    assert result.passed is False and result.diagnostics_passed is False
+    assert result.errors[0].startswith("pkg/c.py:1: SyntaxError")
+
+
+async def test_strict_runs_only_affected_tests(manager):
+    manager.configure(
+        project_root=manager.project_root,
+        test_command=f"{sys.executable} -m pytest -q -p no:cacheprovider",
+        use_lsp=False,
+    )
+
+    result = await manager.verify(
+        result={},
+        level=VerificationLevel.STRICT,
+        modified_files=["pkg/a.py"],
+    )
+
+    assert result.passed, result.errors
+    tests = result.details["tests"]["checks"]
+    assert [c["details"]["selected"] for c in tests] == [["tests/test_b.py"]]
+    assert "1 passed" in tests[0]["details"]["stdout"]
+
+
+async def test_fail_fast_cancels_remaining_checks(manager):
+    manager.configure(
+        project_root=manager.project_root,
+        build_command=f'{sys.executable} -c "import sys; sys.exit(1)"',
+        test_command=f'{sys.executable} -c "import time; time.sleep(30)"',
+        use_lsp=False,
+    )
+
+    start = time.monotonic()
+    result = await manager.verify(
+        result={},
+        level=VerificationLevel.STRICT,
+        modified_files=["pkg/a.py"],
+        fail_fast=True,
+    )
+
+    assert time.monotonic() - start < 10
+    assert result.passed is False and result.build_passed is False
+    assert result.details["cancelled"] == ["tests"]
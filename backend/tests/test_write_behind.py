@@ -0,0 +1,134 @@
+"""
+测试写回队列
+
+验证记忆存储的批量落盘、合并写入、退出刷新和对话历史轮转
+"""
+
+import json
+import time
+from datetime import datetime, timedelta
+
+from daoyoucode.agents.memory.write_behind import WriteBehindQueue
+from daoyoucode.agents.memory import storage as storage_module
+from daoyoucode.agents.memory.storage import MemoryStorage
+
+
+def test_json_writes_are_coalesced(tmp_path):
+    """同一文件多次保存只落盘最后一次"""
+    print("\n" + "="*60)
+    print("测试：JSON 合并写入")
+    print("="*60)
+
+    queue = WriteBehindQueue(flush_interval=60)
+    target = tmp_path / "data.json"
+
+    for i in range(5):
+        queue.write_json(target, lambda i=i: json.dumps({'value': i}))
+
+    assert not target.exists(), "刷新前不应落盘"
+    assert queue.pending_count == 1
+
+    queue.flush()
+
+    assert json.loads(target.read_text(encoding='utf-8')) == {'value': 4}
+    assert queue.get_stats()['json_writes'] == 1
+    print("✓ 5 次保存合并为 1 次写入")
+
+    queue.close()
+
+
+def test_appends_flush_in_background(tmp_path):
+    """追加内容由后台线程按间隔落盘"""
+    print("\n" + "="*60)
+    print("测试：后台批量追加")
+    print("="*60)
+
+    queue = WriteBehindQueue(flush_interval=0.05)
+    target = tmp_path / "chat.history.md"
+
+    for i in range(10):
+        queue.append_text(target, f"line {i}\n")
+
+    deadline = time.time() + 2
+    while queue.pending_count and time.time() < deadline:
+        time.sleep(0.02)
+
+    lines = target.read_text(encoding='utf-8').splitlines()
+    assert lines == [f"line {i}" for i in range(10)]
+    print(f"✓ 后台写入 {len(lines)} 行")
+
+    queue.close()
+
+
+def test_storage_persists_on_flush(tmp_path):
+    """存储在 flush 后落盘，重新加载可读到数据"""
+    print("\n" + "="*60)
+    print("测试：MemoryStorage 写回")
+    print("="*60)
+
+    user_dir = tmp_path / "user"
+    project = tmp_path / "project"
+    project.mkdir()
+
+    storage = MemoryStorage(storage_dir=str(user_dir), project_path=project, flush_interval=60)
+    storage.save_summary('s1', '摘要1')
+    storage.save_key_info('s1', {'files': ['a.py']})
+    storage.add_conversation('s1', '你好', '你好！', user_id='u1')
+
+    assert not (project / '.daoyoucode' / 'summaries.json').exists()
+
+    storage.close()
+
+    reloaded = MemoryStorage(storage_dir=str(user_dir), project_path=project, flush_interval=0)
+    assert reloaded.get_summary('s1') == '摘要1'
+    assert reloaded.get_key_info('s1') == {'files': ['a.py']}
+    assert reloaded.get_session_user('s1') == 'u1'
+
+    history = (project / '.daoyoucode' / 'chat.history.md').read_text(encoding='utf-8')
+    assert '**User**: 你好' in history
+    print("✓ 关闭后数据完整落盘")
+
+
+def test_chat_history_rotation(tmp_path, monkeypatch):
+    """对话历史超限后在刷新时轮转，旧对话进入归档"""
+    print("\n" + "="*60)
+    print("测试：对话历史轮转")
+    print("="*60)
+
+    monkeypatch.setattr(storage_module, 'CHAT_HISTORY_MAX_BYTES', 2048)
+
+    project = tmp_path / "project"
+    project.mkdir()
+    storage = MemoryStorage(
+        storage_dir=str(tmp_path / "user"),
+        project_path=project,
+        flush_interval=60
+    )
+    storage._writer.set_rotation(storage._chat_history_file, 2048, storage._rotate_chat_history)
+
+    old_date = (datetime.now() - timedelta(days=60)).strftime("%Y-%m-%d %H:%M:%S")
+    storage._chat_history_file.write_text(
+        f"\n## {old_date}\n\n**User**: 旧问题\n\n**AI**: 旧回答\n\n---\n",
+        encoding='utf-8'
+    )
+
+    for i in range(40):
+        storage.add_conversation('s1', f'问题{i}', '回答' * 20)
+    storage.flush()
+
+    archive_dir = project / '.daoyoucode' / 'archive'
+    archived = ''.join(p.read_text(encoding='utf-8') for p in archive_dir.glob('*.md'))
+    current = storage._chat_history_file.read_text(encoding='utf-8')
+
+    assert '旧问题' in archived
+    assert '旧问题' not in current
+    assert '问题39' in current
+    assert len(current.encode('utf-8')) <= 2048
+    print(f"✓ 轮转完成，当前文件 {len(current.encode('utf-8'))} bytes")
+
+    storage.close()
+
+
+if __name__ == "__main__":
+    import pytest
+    raise SystemExit(pytest.main([__file__, "-v", "-s"]))